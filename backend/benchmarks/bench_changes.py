@@ -0,0 +1,45 @@
+"""
+Benchmarki feedu zmian /api/changes/ (lokalny cache SPA).
+
+Pierwsza synchronizacja (pełny stan, strona po stronie) rośnie z liczbą
+faktur; kolejna - od kursora - ma tyle samo zapytań i czas zależny tylko
+od liczby zmian, nie od wielkości tabel. Zgodność feedu ze stanem bazy
+sprawdzają testy w invoices/tests/test_changes.py.
+"""
+from datetime import timedelta
+
+import pytest
+from django.utils import timezone
+
+from customers.models import Contractor
+from invoices.models import Invoice
+
+
+@pytest.fixture
+def synced_cursor(api_client):
+    """Kursor po pełnej synchronizacji feedu (jak pierwsze uruchomienie SPA)."""
+    # Dane z seed_perf_data powstały przed chwilą - inaczej każda synchronizacja
+    # w oknie CHANGES_FEED_OVERLAP_SECONDS zwracałaby je wszystkie
+    day_ago = timezone.now() - timedelta(days=1)
+    Invoice.objects.update(updated_at=day_ago)
+    Contractor.objects.update(updated_at=day_ago)
+    cursor = None
+    while True:
+        page = api_client.get('/api/changes/', {'since': cursor} if cursor else {}).json()
+        cursor = page['cursor']
+        if not page['has_more']:
+            return cursor
+
+
+def bench_changes_full_page(api_client, measure):
+    response = measure('changes-full-page', lambda: api_client.get('/api/changes/'))
+    assert response.json()['reset']
+
+
+def bench_changes_delta(api_client, measure, synced_cursor):
+    invoice = Invoice.objects.order_by('id').first()
+    api_client.patch(f'/api/invoices/{invoice.pk}/', {'notatki': 'zmiana'}, format='json')
+    response = measure('changes-delta', lambda: api_client.get('/api/changes/', {'since': synced_cursor}))
+    page = response.json()
+    assert not page['reset'] and not page['has_more']
+    assert invoice.pk in {row['id'] for row in page['invoices']}
@@ -0,0 +1,78 @@
+"""
+Benchmarki endpointów kontrahentów (ContractorViewSet) i ustawień firmy.
+"""
+import random
+
+import pytest
+
+from customers.models import Company, Contractor
+from invoices.perf_data import SEED_MARKER, random_nip
+
+# Osobne ziarno niż seed_perf_data - NIP-y nowych kontrahentów się nie powtarzają
+_rng = random.Random('benchmarks')
+
+
+def new_contractor_data():
+    nip = random_nip(_rng)
+    return {
+        'nazwa': f'Kontrahent Benchmarku {nip}',
+        'nip': nip,
+        'ulica': 'ul. Testowa 1',
+        'miasto': 'Warszawa',
+        'kod_pocztowy': '00-001',
+        'kraj': 'Polska',
+    }
+
+
+@pytest.fixture
+def contractor(db):
+    return Contractor.objects.filter(notatki=SEED_MARKER).order_by('id').first()
+
+
+def bench_contractor_list(api_client, measure):
+    measure('contractor-list', lambda: api_client.get('/api/contractors/'))
+
+
+def bench_contractor_search(api_client, measure):
+    measure('contractor-search', lambda: api_client.get('/api/contractors/', {'search': 'Hurtownia'}))
+
+
+def bench_contractor_retrieve(api_client, measure, contractor):
+    measure('contractor-retrieve', lambda: api_client.get(f'/api/contractors/{contractor.pk}/'))
+
+
+def bench_contractor_create(api_client, measure):
+    measure('contractor-create', lambda data: api_client.post('/api/contractors/', data, format='json'),
+            setup=lambda: ((new_contractor_data(),), {}), status=201)
+
+
+def bench_contractor_update(api_client, measure, contractor):
+    data = {
+        'nazwa': contractor.nazwa,
+        'nip': contractor.nip,
+        'ulica': contractor.ulica,
+        'miasto': contractor.miasto,
+        'kod_pocztowy': contractor.kod_pocztowy,
+        'kraj': contractor.kraj,
+        'notatki': contractor.notatki,
+    }
+    measure('contractor-update', lambda: api_client.put(f'/api/contractors/{contractor.pk}/', data, format='json'))
+
+
+def bench_contractor_partial_update(api_client, measure, contractor):
+    measure('contractor-partial-update', lambda: api_client.patch(
+        f'/api/contractors/{contractor.pk}/', {'telefon': '+48 600 000 000'}, format='json'
+    ))
+
+
+def bench_contractor_destroy(api_client, measure):
+    def setup():
+        company = Company.objects.order_by('id').first()
+        return (Contractor.objects.create(company=company, **new_contractor_data()).pk,), {}
+
+    measure('contractor-destroy', lambda pk: api_client.delete(f'/api/contractors/{pk}/'),
+            setup=setup, status=204)
+
+
+def bench_settings(api_client, measure):
+    measure('settings', lambda: api_client.get('/api/settings/'))
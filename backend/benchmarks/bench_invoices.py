@@ -0,0 +1,211 @@
+"""
+Benchmarki endpointów faktur: InvoiceViewSet, widoki async i dashboard.
+
+Endpointy rozmawiające z KSeF mierzy bench_ksef.py na lokalnym symulatorze.
+"""
+import itertools
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+from customers.models import Company
+from invoices.models import Invoice
+from invoices.perf_data import NUMBER_PREFIX
+
+_counter = itertools.count(1)
+
+
+def unique(prefix):
+    return f'{prefix}/{next(_counter)}'
+
+
+@pytest.fixture
+def invoice(db):
+    return (
+        Invoice.objects.filter(numer__startswith=NUMBER_PREFIX, ksef_numer__gt='')
+        .select_related('kontrahent').order_by('id').first()
+    )
+
+
+def new_invoice(**overrides):
+    fields = {
+        # Firma benchmarków z conftest.py (pierwsza)
+        'company': Company.objects.order_by('id').first(),
+        'numer': unique('BENCH'),
+        'data': date.today(),
+        'kwota': Decimal('1230.00'),
+        'dostawca': 'Dostawca Benchmarku Sp. z o.o.',
+        'termin_platnosci': date.today() + timedelta(days=14),
+        'status': 'niezaplacona',
+    }
+    fields.update(overrides)
+    invoice = Invoice(**fields)
+    invoice.fill_fingerprint()
+    invoice.save()
+    return invoice
+
+
+# ============ Lista i CRUD ============
+
+def bench_invoice_list(api_client, measure):
+    measure('invoice-list', lambda: api_client.get('/api/invoices/'))
+
+
+def bench_invoice_list_filtered(api_client, measure):
+    measure('invoice-list-filtered', lambda: api_client.get('/api/invoices/', {
+        'status': 'niezaplacona', 'days_until_due__lte': 30, 'ordering': 'days_until_due',
+    }))
+
+
+def bench_invoice_list_month(api_client, measure, invoice):
+    measure('invoice-list-month', lambda: api_client.get('/api/invoices/', {
+        'year': invoice.data.year, 'month': invoice.data.month,
+    }))
+
+
+def bench_invoice_retrieve(api_client, measure, invoice):
+    measure('invoice-retrieve', lambda: api_client.get(f'/api/invoices/{invoice.pk}/'))
+
+
+def bench_invoice_create(api_client, measure):
+    def setup():
+        return (), {'data': {
+            'numer': unique('BENCH/API'),
+            'data': date.today().isoformat(),
+            'kwota': '1230.00',
+            'dostawca': 'Dostawca Benchmarku Sp. z o.o.',
+            'termin_platnosci': (date.today() + timedelta(days=14)).isoformat(),
+            'status': 'niezaplacona',
+        }}
+
+    measure('invoice-create', lambda data: api_client.post('/api/invoices/', data, format='json'),
+            setup=setup, status=201)
+
+
+def bench_invoice_update(api_client, measure, invoice):
+    data = {
+        'numer': invoice.numer,
+        'data': invoice.data.isoformat(),
+        'kwota': str(invoice.kwota),
+        'dostawca': invoice.dostawca,
+        'termin_platnosci': invoice.termin_platnosci.isoformat(),
+        'status': invoice.status,
+        'kontrahent': invoice.kontrahent_id,
+        'notatki': 'benchmark',
+    }
+    measure('invoice-update', lambda: api_client.put(f'/api/invoices/{invoice.pk}/', data, format='json'))
+
+
+def bench_invoice_partial_update(api_client, measure, invoice):
+    measure('invoice-partial-update', lambda: api_client.patch(
+        f'/api/invoices/{invoice.pk}/', {'notatki': 'benchmark'}, format='json'
+    ))
+
+
+def bench_invoice_destroy(api_client, measure):
+    def setup():
+        return (new_invoice().pk,), {}
+
+    measure('invoice-destroy', lambda pk: api_client.delete(f'/api/invoices/{pk}/'),
+            setup=setup, status=204)
+
+
+# ============ Akcje ============
+
+def bench_invoice_mark_paid(api_client, measure, invoice):
+    measure('invoice-mark-paid', lambda: api_client.post(f'/api/invoices/{invoice.pk}/mark_paid/'))
+
+
+def bench_invoice_mark_unpaid(api_client, measure, invoice):
+    measure('invoice-mark-unpaid', lambda: api_client.post(f'/api/invoices/{invoice.pk}/mark_unpaid/'))
+
+
+def bench_invoice_ksef_data(api_client, measure, invoice):
+    measure('invoice-ksef-data', lambda: api_client.get(f'/api/invoices/{invoice.pk}/ksef_data/'))
+
+
+def bench_invoice_supplier_stats(api_client, measure, invoice):
+    year = invoice.data.year
+    measure('invoice-supplier-stats', lambda: api_client.get('/api/invoices/supplier_stats/', {
+        'date_from': f'{year}-01-01', 'date_to': f'{year}-12-31',
+    }))
+
+
+def bench_invoice_purchase_register(api_client, measure, invoice):
+    measure('invoice-purchase-register', lambda: api_client.get('/api/invoices/purchase_register/', {
+        'year': invoice.data.year, 'month': invoice.data.month,
+    }))
+
+
+def bench_invoice_purchase_register_validate(api_client, measure, invoice):
+    measure('invoice-purchase-register-validate', lambda: api_client.get('/api/invoices/purchase_register/', {
+        'year': invoice.data.year, 'month': invoice.data.month, 'validate': 'true',
+    }))
+
+
+def bench_invoice_duplicates(api_client, measure):
+    measure('invoice-duplicates', lambda: api_client.get('/api/invoices/duplicates/'))
+
+
+def bench_invoice_ksef_sync_runs(api_client, measure):
+    measure('invoice-ksef-sync-runs', lambda: api_client.get('/api/invoices/ksef_sync_runs/'))
+
+
+def bench_invoice_import_csv(api_client, measure):
+    from django.core.files.uploadedfile import SimpleUploadedFile
+
+    def setup():
+        batch = unique('CSV')
+        lines = ['numer;data;kwota;dostawca;dostawca_nip;termin_platnosci']
+        for i in range(100):
+            lines.append(
+                f'{batch}/{i};{date.today().isoformat()};{100 + i}.50;Dostawca CSV {i % 10};'
+                f';{(date.today() + timedelta(days=30)).isoformat()}'
+            )
+        upload = SimpleUploadedFile('faktury.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+        return (upload,), {}
+
+    measure('invoice-import-csv', lambda upload: api_client.post(
+        '/api/invoices/import_csv/', {'file': upload}, format='multipart'
+    ), setup=setup)
+
+
+def bench_invoice_import_ksef(api_client, measure):
+    def setup():
+        batch = unique('KSEF')
+        invoices = [{
+            'numer': f'{batch}/{i}',
+            'data': date.today().isoformat(),
+            'kwota': f'{500 + i}.00',
+            'dostawca': f'Dostawca KSeF {i % 5}',
+            'dostawca_nip': f'52500010{i % 5:02d}',
+            'termin_platnosci': (date.today() + timedelta(days=21)).isoformat(),
+            'ksef_numer': f'{batch}-{i}',
+            'kwota_netto': '400.00',
+            'kwota_vat': f'{100 + i}.00',
+            'pozycje': [{'nazwa': 'Usługa', 'ilosc': '1', 'cena_netto': '400.00', 'stawka_vat': '23'}],
+        } for i in range(50)]
+        return ({'invoices': invoices},), {}
+
+    measure('invoice-import-ksef', lambda data: api_client.post(
+        '/api/invoices/import_ksef_invoices/', data, format='json'
+    ), setup=setup)
+
+
+# ============ Widoki async ============
+
+def bench_invoice_stats(api_client, measure):
+    measure('invoice-stats', lambda: api_client.get('/api/invoices/stats/'))
+
+
+def bench_invoice_recent_unpaid(api_client, measure):
+    measure('invoice-recent-unpaid', lambda: api_client.get('/api/invoices/recent_unpaid/'))
+
+
+def bench_invoice_available_years(api_client, measure):
+    measure('invoice-available-years', lambda: api_client.get('/api/invoices/available_years/'))
+
+
+def bench_dashboard(api_client, measure):
+    measure('dashboard', lambda: api_client.get('/api/dashboard/'))
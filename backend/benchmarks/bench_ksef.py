@@ -0,0 +1,106 @@
+"""
+Benchmarki pobierania z KSeF na lokalnym symulatorze (invoices.ksef_simulator).
+
+Mierzony jest cały potok fetch_invoices_from_ksef - autoryzacja, eksport,
+pobranie paczki przez HTTP i parsowanie FA(3) - endpoint fetch_from_ksef
+oraz samo parsowanie dużej paczki w bieżącym procesie i w puli procesów,
+także osobno dla każdego backendu XML (ElementTree i lxml). Eksport jest
+gotowy od razu, więc czas nie zawiera czekania na KSeF. Zgodność backendów,
+zdarzenia postępu i anulowanie sprawdzają testy w invoices/tests/test_ksef.py.
+
+Skala: BENCH_KSEF_INVOICES (domyślnie 500 faktur, 1-20 wierszy każda),
+BENCH_KSEF_PARSE_INVOICES dla parsowania (domyślnie 5000).
+"""
+import os
+from datetime import date, timedelta
+
+import pytest
+from django.test import override_settings
+
+from invoices.ksef_parser import parse_package, shutdown_pool
+from invoices.ksef_service import fetch_invoices_from_ksef
+from invoices.ksef_simulator import KSeFSimulator, use_simulator, write_package
+
+INVOICES = int(os.environ.get('BENCH_KSEF_INVOICES', '500'))
+PARSE_INVOICES = int(os.environ.get('BENCH_KSEF_PARSE_INVOICES', '5000'))
+LINES = (1, 20)
+NIP = '5250001009'
+DATE_TO = date.today()
+DATE_FROM = DATE_TO - timedelta(days=30)
+
+
+@pytest.fixture(scope='module')
+def simulator():
+    with KSeFSimulator(invoices=INVOICES, lines=LINES, export_delay=0) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def ksef(simulator):
+    with use_simulator(simulator.url), override_settings(KSEF_EXPORT_POLL_SECONDS=0.01):
+        yield simulator
+
+
+def bench_ksef_fetch_pipeline(benchmark, ksef):
+    def fetch():
+        return fetch_invoices_from_ksef('sim-token', NIP, 'test', DATE_FROM.isoformat(), DATE_TO.isoformat())
+
+    invoices, message = benchmark.pedantic(fetch, rounds=5, warmup_rounds=1)
+    assert message.startswith('Pobrano'), message
+    assert len(invoices) == INVOICES
+    benchmark.extra_info['invoices'] = INVOICES
+
+
+@pytest.fixture(scope='module')
+def large_package(tmp_path_factory):
+    path = tmp_path_factory.mktemp('ksef') / 'paczka.zip'
+    size = write_package(path, PARSE_INVOICES, NIP, lines=LINES, date_from=DATE_FROM, date_to=DATE_TO)
+    yield path, size
+    shutdown_pool()
+
+
+@pytest.mark.parametrize('mode', ['serial', 'parallel'])
+def bench_ksef_parse_package(benchmark, large_package, mode):
+    path, size = large_package
+    # Co najmniej 2 procesy - na maszynie z jednym rdzeniem widać sam narzut puli
+    workers = 1 if mode == 'serial' else max(2, os.cpu_count() or 1)
+    details = {}
+    if mode == 'parallel':
+        # Start puli procesów nie wchodzi do pomiaru
+        parse_package(path, workers=workers, min_parallel=0)
+
+    invoices = benchmark.pedantic(
+        parse_package, args=(path,), kwargs={'workers': workers, 'min_parallel': 0, 'details': details}, rounds=3,
+    )
+    assert len(invoices) == PARSE_INVOICES
+    assert details['workers'] == workers
+    benchmark.extra_info.update(invoices=PARSE_INVOICES, bytes=size, workers=workers)
+
+
+@pytest.mark.parametrize('backend', ['etree', 'lxml'])
+def bench_ksef_parse_backend(benchmark, large_package, backend):
+    if backend == 'lxml':
+        pytest.importorskip('lxml')
+    path, size = large_package
+    details = {}
+
+    invoices = benchmark.pedantic(
+        parse_package, args=(path,), kwargs={'workers': 1, 'details': details, 'backend': backend}, rounds=3,
+    )
+    assert len(invoices) == PARSE_INVOICES
+    assert details['xml_backend'] == backend
+    benchmark.extra_info.update(invoices=PARSE_INVOICES, bytes=size)
+
+
+def bench_ksef_fetch_endpoint(api_client, measure, ksef):
+    from customers.encryption import encrypt_token
+    from customers.models import Company
+
+    Company.objects.update(ksef_token=encrypt_token('sim-token'), ksef_environment='test')
+    # Cache firm unieważniany jest po commicie, a test działa w wycofywanej transakcji
+    Company.invalidate_cache()
+
+    response = measure('ksef-fetch-from-ksef', lambda: api_client.post('/api/invoices/fetch_from_ksef/', {
+        'date_from': DATE_FROM.isoformat(), 'date_to': DATE_TO.isoformat(),
+    }, format='json'))
+    assert response.json()['total_found'] == INVOICES
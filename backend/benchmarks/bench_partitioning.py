@@ -0,0 +1,55 @@
+"""
+Zapytania o bieżący rok niezależne od długości historii faktur.
+
+Lista faktur z filtrem rok/miesiąc i statystyki bieżącego miesiąca mierzone
+są na danych z seed_perf_data oraz po dołożeniu HISTORY_YEARS lat starszych
+faktur (dwa razy tyle co seed). Na PostgreSQL tabela jest wcześniej
+partycjonowana po roku (invoices/partitioning.py - konwersja wycofywana
+razem z transakcją testu). Przycinanie partycji i zakres dat w filtrze
+okresu sprawdzają testy w invoices/tests/test_partitioning.py.
+"""
+import random
+from datetime import date
+
+import pytest
+from django.db import connection
+
+from customers.models import Company, Contractor
+from invoices.models import Invoice
+from invoices.partitioning import convert_to_partitioned
+from invoices.perf_data import SEED_MARKER, generate_invoices
+
+HISTORY_YEARS = 10
+
+
+def _add_history(company, count):
+    """Faktury sprzed bieżącego roku - nie zmieniają wyników zapytań o bieżący rok."""
+    contractors = list(Contractor.objects.for_company(company).filter(notatki=SEED_MARKER)[:200])
+    last_year_end = date(date.today().year - 1, 12, 31)
+    Invoice.objects.bulk_create(generate_invoices(
+        count, contractors, random.Random(7), years=HISTORY_YEARS, today=last_year_end,
+        start=10_000_000, company_id=company.pk,
+    ), batch_size=2000)
+
+
+@pytest.fixture(params=['seed', 'history'])
+def history(request, db):
+    company = Company.objects.order_by('id').first()
+    if request.param == 'history':
+        _add_history(company, 2 * Invoice.objects.for_company(company).count())
+    if connection.vendor == 'postgresql':
+        convert_to_partitioned()
+    return request.param
+
+
+def bench_invoice_list_current_month(api_client, measure, history):
+    today = date.today()
+    measure(f'invoice-list-current-month-{history}', lambda: api_client.get(
+        '/api/invoices/', {'year': today.year, 'month': today.month}
+    ))
+
+
+def bench_invoice_stats_current_month(api_client, measure, history):
+    measure(f'invoice-stats-current-month-{history}', lambda: api_client.get(
+        '/api/invoices/stats/', {'current_month': 'true'}
+    ))
@@ -0,0 +1,32 @@
+"""
+Skompresowane dane KSeF faktur (fakturex/fields.py, Invoice.ksef_xml).
+
+Mierzone jest pakowanie i rozpakowanie typowego JSON-a KSeF każdym
+dostępnym kodekiem. Zapis przez ORM i komendę compress_ksef_payloads
+sprawdzają testy w invoices/tests/test_payloads.py.
+"""
+import pytest
+
+from fakturex.fields import compress_text, decompress_text, zstandard
+from invoices.models import Invoice
+
+CODECS = ['zlib', 'zstd'] if zstandard is not None else ['zlib']
+
+
+@pytest.fixture(scope='module')
+def payload(django_db_blocker):
+    with django_db_blocker.unblock():
+        return Invoice.objects.exclude(ksef_xml='').order_by('id').values_list('ksef_xml', flat=True).first()
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def bench_payload_compress(benchmark, payload, codec):
+    packed = benchmark(compress_text, payload, codec)
+    benchmark.extra_info['ratio'] = round(len(packed) / len(payload.encode('utf-8')), 3)
+    assert decompress_text(packed) == payload
+
+
+@pytest.mark.parametrize('codec', CODECS)
+def bench_payload_decompress(benchmark, payload, codec):
+    packed = compress_text(payload, codec)
+    assert benchmark(decompress_text, packed) == payload
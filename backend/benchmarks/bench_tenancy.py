@@ -0,0 +1,12 @@
+"""
+Benchmark listy firm użytkownika (/api/companies/).
+
+Izolację firm sprawdzają testy w customers/tests/test_tenancy.py,
+a harmonogram synchronizacji KSeF - invoices/tests/test_scheduler.py.
+"""
+from customers.models import Company
+
+
+def bench_company_list(api_client, measure):
+    response = measure('company-list', lambda: api_client.get('/api/companies/'))
+    assert response.json()['current'] == Company.objects.order_by('id').first().pk
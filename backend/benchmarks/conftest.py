@@ -0,0 +1,163 @@
+"""
+Benchmarki endpointów API na danych z seed_perf_data.
+
+Baza testowa wypełniana jest raz na sesję (domyślnie 10 000 faktur),
+każdy benchmark działa w transakcji wycofywanej po teście. Dla każdego
+endpointu mierzony jest czas (pytest-benchmark) i liczba zapytań SQL
+jednego wywołania - liczba zapytań nie zależy od maszyny, więc to ona
+jest porównywana z benchmarks/baseline.json (więcej zapytań = błąd).
+Mediany czasów zapisywane są w baseline tylko informacyjnie.
+
+Użycie (z katalogu backend/):
+    pytest benchmarks                       # same benchmarki, porównanie z baseline.json
+    pytest --bench-invoices=200000          # większa skala (też BENCH_INVOICES)
+    pytest --update-baseline                # zapisz nowy baseline
+    pytest --benchmark-json=wyniki.json     # pełne statystyki pytest-benchmark
+    DATABASE_URL=postgres://... pytest      # pomiar na PostgreSQL (seed przez COPY)
+"""
+import json
+import os
+from pathlib import Path
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+BASELINE_PATH = Path(__file__).with_name('baseline.json')
+
+_results = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('fakturex')
+    group.addoption(
+        '--bench-invoices', type=int, default=int(os.environ.get('BENCH_INVOICES', '10000')),
+        help='Number of seeded invoices (default 10000, env BENCH_INVOICES)',
+    )
+    group.addoption(
+        '--baseline', default=str(BASELINE_PATH),
+        help='Baseline JSON file with query counts per endpoint',
+    )
+    group.addoption(
+        '--update-baseline', action='store_true',
+        help='Write measured query counts and medians to the baseline file',
+    )
+
+
+def _load_baseline(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f).get('endpoints', {})
+    except FileNotFoundError:
+        return {}
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    if not config.getoption('--update-baseline', default=False) or not _results:
+        return
+    path = config.getoption('--baseline')
+    # Zachowaj endpointy, których nie uruchomiono (np. wybranych przez -k)
+    endpoints = _load_baseline(path)
+    endpoints.update(_results)
+    payload = {
+        'meta': {
+            'invoices': config.getoption('--bench-invoices'),
+            'vendor': connection.vendor,
+        },
+        'endpoints': dict(sorted(endpoints.items())),
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, indent=2, ensure_ascii=False)
+        f.write('\n')
+
+
+@pytest.fixture(scope='session')
+def django_db_setup(django_db_setup, django_db_blocker, request):
+    """Baza testowa z danymi seed_perf_data i użytkownikiem benchmarków (dostęp do firmy z danymi)."""
+    from django.contrib.auth.models import User
+    from customers.models import Company, CompanyMembership
+    from invoices.perf_data import seed
+
+    with django_db_blocker.unblock():
+        # Firmę domyślną tworzy migracja customers 0005
+        company = Company.objects.order_by('id').first()
+        company.nazwa = 'Fakturex Benchmark Sp. z o.o.'
+        company.nip = '5250001009'
+        company.save()
+        seed(company, invoices=request.config.getoption('--bench-invoices'))
+        user = User.objects.create_user('bench', password='bench-password', is_staff=True)
+        CompanyMembership.objects.create(user=user, company=company)
+
+
+@pytest.fixture
+def api_client(db):
+    """Klient z prawdziwym tokenem JWT (przechodzi całą ścieżkę uwierzytelniania)."""
+    from django.contrib.auth.models import User
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import RefreshToken
+    from customers.models import Company
+    from users.authentication import invalidate_user_cache
+
+    user = User.objects.get(username='bench')
+    # Pierwsze wywołanie w teście zawsze z zimnym cache firm i dostępów - liczba
+    # zapytań nie zależy od kolejności testów
+    invalidate_user_cache(user.pk)
+    Company.invalidate_cache()
+
+    client = APIClient()
+    token = RefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    return client
+
+
+def _consume(response):
+    # Odpowiedzi strumieniowe (ewidencja zakupu) generują treść dopiero przy odczycie
+    if response.streaming:
+        b''.join(response.streaming_content)
+    return response
+
+
+@pytest.fixture
+def measure(benchmark, request):
+    """
+    measure(name, call, setup=None, status=200)
+
+    call() wykonuje żądanie. Gdy endpoint zmienia dane tak, że wywołania
+    nie można powtórzyć (create, delete), setup() przygotowuje argumenty
+    dla każdej rundy: zwraca (args, kwargs) jak w benchmark.pedantic.
+    """
+    config = request.config
+    baseline = _load_baseline(config.getoption('--baseline'))
+
+    def run(name, call, setup=None, status=200, rounds=20):
+        def timed(*args, **kwargs):
+            return _consume(call(*args, **kwargs))
+
+        args, kwargs = setup() if setup else ((), {})
+        with CaptureQueriesContext(connection) as ctx:
+            response = timed(*args, **kwargs)
+        assert response.status_code == status, getattr(response, 'content', b'')[:500]
+        queries = len(ctx.captured_queries)
+
+        if setup:
+            benchmark.pedantic(timed, setup=setup, rounds=rounds)
+        else:
+            benchmark(timed)
+
+        benchmark.extra_info['queries'] = queries
+        median = benchmark.stats.stats.median if benchmark.stats else None
+        _results[name] = {
+            'queries': queries,
+            'median_ms': round(median * 1000, 2) if median is not None else None,
+        }
+
+        expected = baseline.get(name)
+        if expected is not None and not config.getoption('--update-baseline'):
+            assert queries <= expected['queries'], (
+                f'{name}: {queries} zapytań SQL, baseline {expected["queries"]} '
+                f'(zaktualizuj: pytest --update-baseline)'
+            )
+        return response
+
+    return run
@@ -0,0 +1,20 @@
+"""
+Ustawienia benchmarków - produkcyjne ustawienia z lokalnym cache.
+
+pytest-django wczytuje ustawienia przed conftest.py, więc brakujący
+SECRET_KEY trzeba uzupełnić tutaj. Cache w pamięci procesu - plikowy
+cache z poprzedniego uruchomienia zafałszowałby pierwsze pomiary.
+"""
+import os
+
+os.environ.setdefault('SECRET_KEY', 'benchmark-only-secret-key-not-for-production')
+
+from fakturex.settings import *  # noqa: E402,F401,F403
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fakturex-benchmarks',
+    }
+}
+
@@ -0,0 +1,152 @@
+"""
+Szybki start backendu - jeden interpreter zamiast kilku osobnych django.setup().
+
+Kroki:
+  1. Sprawdzenie połączenia z bazą.
+  2. Migracje tylko gdy są niezastosowane (pusty plan = nic nie robimy).
+  3. Usunięcie starych śladów usunięć feedu zmian (invoices/changes.py).
+  4. Partycje faktur na bieżący i następny rok, gdy tabela jest
+     partycjonowana (invoices/partitioning.py).
+  5. Opcjonalnie admin z DJANGO_SUPERUSER_USERNAME / DJANGO_SUPERUSER_PASSWORD
+     (tworzony tylko gdy go brak; hasło resetowane tylko przy
+     DJANGO_SUPERUSER_RESET_PASSWORD=true).
+  6. exec gunicorna w tym samym procesie.
+
+Użycie:
+    python boot.py              # start serwera
+    python boot.py --no-serve   # tylko migracje i admin (np. faza release)
+"""
+import argparse
+import os
+import sys
+import time
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fakturex.settings')
+
+# Klucz blokady doradczej PostgreSQL - kilka instancji nie migruje naraz
+MIGRATION_LOCK_ID = 720_260_217
+
+
+def log(message, started=None):
+    suffix = f' ({(time.perf_counter() - started) * 1000:.0f} ms)' if started else ''
+    print(f'[boot] {message}{suffix}', flush=True)
+
+
+def check_database(connection):
+    started = time.perf_counter()
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1')
+    log(f"database OK: {connection.settings_dict['ENGINE']}", started)
+
+
+def migrate_if_needed(connection):
+    from django.core.management import call_command
+    from django.db.migrations.executor import MigrationExecutor
+
+    started = time.perf_counter()
+    is_postgres = connection.vendor == 'postgresql'
+    if is_postgres:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_advisory_lock(%s)', [MIGRATION_LOCK_ID])
+    try:
+        executor = MigrationExecutor(connection)
+        plan = executor.migration_plan(executor.loader.graph.leaf_nodes())
+        if not plan:
+            log('migrations up to date', started)
+            return
+        log(f'applying {len(plan)} migration(s)')
+        call_command('migrate', interactive=False, verbosity=1)
+        log('migrations applied', started)
+    finally:
+        if is_postgres:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT pg_advisory_unlock(%s)', [MIGRATION_LOCK_ID])
+
+
+def bootstrap_admin():
+    username = os.environ.get('DJANGO_SUPERUSER_USERNAME')
+    password = os.environ.get('DJANGO_SUPERUSER_PASSWORD')
+    if not username or not password:
+        log('admin bootstrap skipped (DJANGO_SUPERUSER_USERNAME/PASSWORD not set)')
+        return
+
+    from django.contrib.auth import get_user_model
+
+    started = time.perf_counter()
+    User = get_user_model()
+    user = User.objects.filter(username=username).first()
+    if user is None:
+        User.objects.create_superuser(
+            username=username,
+            email=os.environ.get('DJANGO_SUPERUSER_EMAIL', ''),
+            password=password,
+        )
+        log(f'superuser {username} created', started)
+    elif os.environ.get('DJANGO_SUPERUSER_RESET_PASSWORD', 'false').lower() == 'true':
+        user.set_password(password)
+        user.save(update_fields=['password'])
+        log(f'superuser {username} password reset', started)
+    else:
+        log(f'superuser {username} exists', started)
+
+
+def purge_tombstones():
+    from invoices.changes import purge_tombstones as purge
+
+    started = time.perf_counter()
+    log(f'purged {purge()} change tombstone(s)', started)
+
+
+def ensure_invoice_partitions():
+    from invoices.partitioning import ensure_partitions, is_partitioned
+
+    if not is_partitioned():
+        return
+    started = time.perf_counter()
+    created = ensure_partitions()
+    log(f"invoice partitions created: {', '.join(map(str, created))}" if created else 'invoice partitions OK', started)
+
+
+def serve():
+    port = os.environ.get('PORT', '8000')
+    args = [
+        'gunicorn', 'fakturex.asgi:application',
+        '-k', 'uvicorn.workers.UvicornWorker',
+        '--bind', f'0.0.0.0:{port}',
+    ]
+    log('starting gunicorn (ASGI)')
+    os.execvp(args[0], args)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fakturex fast boot')
+    parser.add_argument('--no-serve', action='store_true', help='only migrate and bootstrap, do not start gunicorn')
+    options = parser.parse_args()
+
+    started = time.perf_counter()
+    import django
+    django.setup()
+    log('django.setup()', started)
+
+    from django.db import connection, connections
+
+    check_database(connection)
+    migrate_if_needed(connection)
+    purge_tombstones()
+    ensure_invoice_partitions()
+    bootstrap_admin()
+
+    # Nie przekazuj otwartych połączeń do procesu gunicorna
+    connections.close_all()
+    log('boot complete', started)
+
+    if not options.no_serve:
+        serve()
+
+
+if __name__ == '__main__':
+    try:
+        main()
+    except Exception as e:
+        log(f'FAILED: {e}')
+        sys.exit(1)
@@ -25,5 +25,6 @@ def show_columns(table_name):
 # Check main tables
 show_columns('invoices_invoice')
 show_columns('customers_contractor')
-show_columns('customers_settings')
+show_columns('customers_company')
+show_columns('customers_companymembership')
 show_columns('auth_user')
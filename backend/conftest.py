@@ -0,0 +1,125 @@
+"""
+Wspólne fixture testów aplikacji (customers/tests, invoices/tests, users/tests,
+fakturex/tests).
+
+Każdy test dostaje własną firmę i użytkownika z dostępem tylko do niej,
+więc dane seed_perf_data, którymi benchmarks/conftest.py wypełnia bazę
+w tej samej sesji pytest, wyników testów nie zmieniają. Zapytania testów
+obejmują tylko firmę testu (Invoice.objects.for_company itp.).
+
+Użycie (z katalogu backend/):
+    pytest customers invoices users fakturex    # same testy
+    pytest                                      # testy i benchmarki
+"""
+import itertools
+import random
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+
+_counter = itertools.count(1)
+# Osobne ziarno niż seed_perf_data i benchmarki - NIP-y się nie powtarzają
+_rng = random.Random('tests')
+
+
+def _jwt_client(user, company=None):
+    from rest_framework.test import APIClient
+    from rest_framework_simplejwt.tokens import RefreshToken
+
+    client = APIClient()
+    headers = {'HTTP_X_COMPANY_ID': str(company.pk)} if company is not None else {}
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {RefreshToken.for_user(user).access_token}', **headers)
+    return client
+
+
+@pytest.fixture
+def company(db):
+    from customers.models import Company
+
+    company = Company.objects.create(nazwa='Fakturex Test Sp. z o.o.', nip='5250001009')
+    # Id firmy z wycofanej transakcji poprzedniego testu może wrócić - bez wpisów z cache
+    Company.invalidate_cache()
+    return company
+
+
+@pytest.fixture
+def member(db):
+    """member(username, company, **fields) - użytkownik z dostępem do firmy i pustym cache."""
+    from django.contrib.auth.models import User
+    from customers.models import CompanyMembership
+    from users.authentication import invalidate_user_cache
+
+    def create(username, company, **fields):
+        user = User.objects.create_user(username, password=f'{username}-password', **fields)
+        CompanyMembership.objects.create(user=user, company=company)
+        invalidate_user_cache(user.pk)
+        return user
+
+    return create
+
+
+@pytest.fixture
+def user(member, company):
+    return member('tester', company, is_staff=True)
+
+
+@pytest.fixture
+def jwt_client():
+    """jwt_client(user, company=None) - klient z tokenem JWT i opcjonalnym nagłówkiem X-Company-Id."""
+    return _jwt_client
+
+
+@pytest.fixture
+def api_client(user):
+    """Klient użytkownika user z prawdziwym tokenem JWT."""
+    return _jwt_client(user)
+
+
+@pytest.fixture
+def make_invoice(company):
+    """make_invoice(**pola) - zapisana faktura firmy company (domyślnie niezapłacona, termin za 14 dni)."""
+    from invoices.models import Invoice
+
+    def create(**overrides):
+        fields = {
+            'company': company,
+            'numer': f'TEST/{next(_counter)}',
+            'data': date.today(),
+            'kwota': Decimal('1230.00'),
+            'dostawca': 'Dostawca Testowy Sp. z o.o.',
+            'termin_platnosci': date.today() + timedelta(days=14),
+            'status': 'niezaplacona',
+        }
+        fields.update(overrides)
+        invoice = Invoice(**fields)
+        invoice.fill_fingerprint()
+        invoice.save()
+        return invoice
+
+    return create
+
+
+@pytest.fixture
+def contractor_data():
+    """contractor_data() - dane nowego kontrahenta z losowym poprawnym NIP."""
+    from invoices.perf_data import random_nip
+
+    def data():
+        nip = random_nip(_rng)
+        return {
+            'nazwa': f'Kontrahent Testowy {nip}',
+            'nip': nip,
+            'ulica': 'ul. Testowa 1',
+            'miasto': 'Warszawa',
+            'kod_pocztowy': '00-001',
+            'kraj': 'Polska',
+        }
+
+    return data
+
+
+@pytest.fixture
+def unique_number():
+    """unique_number(prefix) - numer niepowtarzalny w sesji testów."""
+    return lambda prefix: f'{prefix}/{next(_counter)}'
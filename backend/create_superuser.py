@@ -7,7 +7,7 @@ django.setup()
 
 from django.contrib.auth import get_user_model
 from django.db import connection
-from customers.models import Settings
+from customers.models import Company, CompanyMembership
 
 User = get_user_model()
 
@@ -77,15 +77,17 @@ print("=== Users after setup ===")
 for u in User.objects.all():
     print(f"  - {u.username} (id={u.id}, is_superuser={u.is_superuser})")
 
-# Utwórz domyślne ustawienia jeśli nie istnieją
-if not Settings.objects.exists():
-    Settings.objects.create(
-        firma_nazwa='Moja Firma',
-        firma_nip='',
+# Utwórz domyślną firmę jeśli nie istnieje
+company = Company.objects.order_by('id').first()
+if company is None:
+    company = Company.objects.create(
+        nazwa='Moja Firma',
+        nip='',
         ksef_token='',
         ksef_environment='test',
         auto_fetch_ksef=False
     )
-    print('Default settings created')
+    print('Default company created')
 else:
-    print('Settings already exist')
+    print('Company already exists')
+CompanyMembership.objects.get_or_create(user=user, company=company)
@@ -1,17 +1,17 @@
 from django.contrib import admin
-from .models import Contractor, Settings
+from .models import Company, CompanyMembership, Contractor
 
 
 @admin.register(Contractor)
 class ContractorAdmin(admin.ModelAdmin):
-    list_display = ['nazwa', 'nip', 'miasto', 'email', 'telefon']
-    list_filter = ['miasto', 'kraj']
+    list_display = ['nazwa', 'nip', 'miasto', 'email', 'telefon', 'company']
+    list_filter = ['company', 'kraj']
     search_fields = ['nazwa', 'nip', 'email']
     ordering = ['nazwa']
     
     fieldsets = (
         ('Dane kontrahenta', {
-            'fields': ('nazwa', 'nip')
+            'fields': ('company', 'nazwa', 'nip')
         }),
         ('Adres', {
             'fields': ('ulica', 'kod_pocztowy', 'miasto', 'kraj')
@@ -26,22 +26,24 @@ class ContractorAdmin(admin.ModelAdmin):
     )
 
 
-@admin.register(Settings)
-class SettingsAdmin(admin.ModelAdmin):
-    list_display = ['firma_nazwa', 'firma_nip', 'ksef_environment', 'auto_fetch_ksef']
+class CompanyMembershipInline(admin.TabularInline):
+    model = CompanyMembership
+    extra = 1
+    autocomplete_fields = ['user']
+
+
+@admin.register(Company)
+class CompanyAdmin(admin.ModelAdmin):
+    list_display = ['nazwa', 'nip', 'ksef_environment', 'auto_fetch_ksef']
+    list_filter = ['ksef_environment', 'auto_fetch_ksef']
+    search_fields = ['nazwa', 'nip']
+    inlines = [CompanyMembershipInline]
     
     fieldsets = (
         ('Dane firmy', {
-            'fields': ('firma_nazwa', 'firma_nip')
+            'fields': ('nazwa', 'nip')
         }),
         ('KSeF', {
             'fields': ('ksef_token', 'ksef_environment', 'auto_fetch_ksef')
         }),
     )
-    
-    def has_add_permission(self, request):
-        # Tylko jeden rekord ustawień
-        return not Settings.objects.exists()
-    
-    def has_delete_permission(self, request, obj=None):
-        return False
\ No newline at end of file
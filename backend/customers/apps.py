@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class CustomersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'customers'
+    verbose_name = 'Kontrahenci'
+
+    def ready(self):
+        # Podłącz sygnały (unieważnianie cache firm i dostępów)
+        from . import signals  # noqa: F401
@@ -1,31 +1,80 @@
 """
 Szyfrowanie tokenów KSeF.
-Używa Fernet (symetryczne szyfrowanie AES-128).
+Używa Fernet (symetryczne szyfrowanie AES-128) przez MultiFernet:
+pierwszy klucz szyfruje, pozostałe nadal odszyfrowują - dzięki temu klucz
+można zrotować bez utraty zapisanych tokenów (komenda rotate_encryption_keys).
 """
 import base64
 import os
-from cryptography.fernet import Fernet
+from functools import lru_cache
+from cryptography.fernet import Fernet, MultiFernet, InvalidToken
 from django.conf import settings
 
+# Pola przechowujące zaszyfrowane sekrety - przetwarzane przez rotate_encryption_keys
+ENCRYPTED_FIELDS = [
+    ('customers.Company', 'ksef_token'),
+]
 
-def get_encryption_key():
+
+class TokenDecryptionError(Exception):
+    """Token wygląda na zaszyfrowany, ale żaden ze skonfigurowanych kluczy go nie odszyfrowuje."""
+
+
+def _key_from_secret_key():
+    # Fallback - użyj SECRET_KEY jako bazy (nie idealne, ale działa)
+    secret = settings.SECRET_KEY.encode()
+    # Fernet wymaga 32-bajtowego klucza zakodowanego w base64
+    return base64.urlsafe_b64encode(secret[:32].ljust(32, b'0'))
+
+
+def _legacy_key_enabled():
+    value = getattr(settings, 'ENCRYPTION_LEGACY_SECRET_KEY', None)
+    if value is None:
+        value = os.environ.get('ENCRYPTION_LEGACY_SECRET_KEY', 'false')
+    return value is True or str(value).lower() == 'true'
+
+
+def get_encryption_keys():
     """
-    Pobierz klucz szyfrowania z ustawień Django.
-    Jeśli nie istnieje, wygeneruj nowy.
+    Lista kluczy szyfrowania, pierwszy jest aktualny.
+    Źródła: ENCRYPTION_KEYS (po przecinku, od najnowszego) albo ENCRYPTION_KEY.
+    Klucz wyprowadzony z SECRET_KEY używany jest tylko bez tych ustawień,
+    a obok nich jedynie przy ENCRYPTION_LEGACY_SECRET_KEY=true - do
+    zrotowania tokenów zapisanych przed ustawieniem kluczy. Potem flagę się
+    usuwa i klucz z SECRET_KEY przestaje cokolwiek odszyfrowywać.
     """
-    key = getattr(settings, 'ENCRYPTION_KEY', None)
-    if not key:
-        key = os.environ.get('ENCRYPTION_KEY')
-    
-    if not key:
-        # Fallback - użyj SECRET_KEY jako bazy (nie idealne, ale działa)
-        secret = settings.SECRET_KEY.encode()
-        # Fernet wymaga 32-bajtowego klucza zakodowanego w base64
-        key = base64.urlsafe_b64encode(secret[:32].ljust(32, b'0'))
-    elif isinstance(key, str):
-        key = key.encode()
-    
-    return key
+    raw = getattr(settings, 'ENCRYPTION_KEYS', None) or os.environ.get('ENCRYPTION_KEYS')
+    if isinstance(raw, str):
+        keys = [k.strip() for k in raw.split(',') if k.strip()]
+    else:
+        keys = list(raw or [])
+
+    if not keys:
+        key = getattr(settings, 'ENCRYPTION_KEY', None) or os.environ.get('ENCRYPTION_KEY')
+        if key:
+            keys = [key]
+
+    keys = [k.encode() if isinstance(k, str) else k for k in keys]
+    fallback = _key_from_secret_key()
+    if not keys or (_legacy_key_enabled() and fallback not in keys):
+        keys.append(fallback)
+    return keys
+
+
+def get_encryption_key():
+    """Aktualny klucz szyfrowania (pierwszy z listy)."""
+    return get_encryption_keys()[0]
+
+
+@lru_cache(maxsize=1)
+def get_cipher() -> MultiFernet:
+    """Szyfr budowany raz na proces - klucze czytane są przy pierwszym użyciu."""
+    return MultiFernet([Fernet(key) for key in get_encryption_keys()])
+
+
+def reset_cipher_cache():
+    """Wymuś ponowne wczytanie kluczy (np. po zmianie ENCRYPTION_KEYS w testach)."""
+    get_cipher.cache_clear()
 
 
 def encrypt_token(plain_token: str) -> str:
@@ -35,30 +84,47 @@ def encrypt_token(plain_token: str) -> str:
     """
     if not plain_token:
         return ''
-    
-    key = get_encryption_key()
-    f = Fernet(key)
-    encrypted = f.encrypt(plain_token.encode())
+
+    encrypted = get_cipher().encrypt(plain_token.encode())
     return encrypted.decode()
 
 
 def decrypt_token(encrypted_token: str) -> str:
     """
     Odszyfruj token KSeF.
-    Zwraca oryginalny token.
+    Token niezaszyfrowany (stary format) zwracany jest bez zmian;
+    gdy odszyfrowanie się nie uda, zgłaszany jest TokenDecryptionError.
     """
     if not encrypted_token:
         return ''
-    
-    try:
-        key = get_encryption_key()
-        f = Fernet(key)
-        decrypted = f.decrypt(encrypted_token.encode())
-        return decrypted.decode()
-    except Exception:
-        # Token może być niezaszyfrowany (stary format)
+
+    if not is_token_encrypted(encrypted_token):
         return encrypted_token
 
+    try:
+        return get_cipher().decrypt(encrypted_token.encode()).decode()
+    except InvalidToken as e:
+        raise TokenDecryptionError(
+            'Nie można odszyfrować tokenu KSeF żadnym kluczem - sprawdź ENCRYPTION_KEYS / ENCRYPTION_KEY.'
+        ) from e
+
+
+def rotate_token(token: str) -> str:
+    """
+    Zaszyfruj token ponownie aktualnym kluczem.
+    Token w starym, niezaszyfrowanym formacie zostaje zaszyfrowany.
+    """
+    if not token:
+        return ''
+
+    if not is_token_encrypted(token):
+        return encrypt_token(token)
+
+    try:
+        return get_cipher().rotate(token.encode()).decode()
+    except InvalidToken as e:
+        raise TokenDecryptionError('Nie można odszyfrować tokenu żadnym kluczem.') from e
+
 
 def is_token_encrypted(token: str) -> bool:
     """
@@ -66,7 +132,7 @@ def is_token_encrypted(token: str) -> bool:
     """
     if not token:
         return False
-    
+
     try:
         # Fernet tokens zaczynają się od 'gAAAAA'
         return token.startswith('gAAAAA')
@@ -0,0 +1,109 @@
+"""
+Scalanie kontrahentów firmy o tym samym NIP.
+
+Migracja 0002 zostawiła NIP znormalizowany tylko najstarszemu kontrahentowi
+o danym NIP; pozostali mają nip_normalized = NULL i nie są łączeni
+z fakturami z KSeF. Bez --apply komenda tylko wypisuje, co by zmieniła.
+Z --apply w każdej grupie zostaje kontrahent z NIP znormalizowanym (albo
+najstarszy), dostaje puste pola pozostałych, ich faktury są do niego
+przepinane, a oni sami usuwani (ślady usunięć trafiają do feedu zmian).
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from customers.models import Company, Contractor
+from customers.resolver import normalize_nip
+from invoices.models import Invoice
+
+# Pola uzupełniane u pozostawionego kontrahenta, gdy są u niego puste
+MERGED_FIELDS = ['ulica', 'miasto', 'kod_pocztowy', 'email', 'telefon', 'notatki']
+
+
+def duplicate_groups(company=None):
+    """
+    Grupy kontrahentów o tym samym znormalizowanym NIP w obrębie firmy.
+    Zwraca listę (NIP, pozostawiony kontrahent, [duplikaty]); kontrahenci
+    mają adnotację invoice_count.
+    """
+    contractors = Contractor.objects.exclude(nip='').annotate(invoice_count=Count('faktury')).order_by('id')
+    if company is not None:
+        contractors = contractors.for_company(company)
+    groups = {}
+    for contractor in contractors:
+        key = normalize_nip(contractor.nip)
+        if key:
+            groups.setdefault((contractor.company_id, key), []).append(contractor)
+
+    result = []
+    for (_, key), members in groups.items():
+        if len(members) == 1 and members[0].nip_normalized == key:
+            continue
+        keeper = next((c for c in members if c.nip_normalized == key), members[0])
+        result.append((key, keeper, [c for c in members if c.pk != keeper.pk]))
+    return result
+
+
+def merge_group(key, keeper, duplicates):
+    """Scal duplikaty w keeper (w jednej transakcji)."""
+    with transaction.atomic():
+        for duplicate in duplicates:
+            for field in MERGED_FIELDS:
+                if not getattr(keeper, field) and getattr(duplicate, field):
+                    setattr(keeper, field, getattr(duplicate, field))
+        # updated_at - feed zmian wyśle faktury z nowym kontrahentem
+        Invoice.objects.filter(kontrahent__in=duplicates).update(kontrahent=keeper, updated_at=timezone.now())
+        for duplicate in duplicates:
+            duplicate.delete()
+        keeper.nip_normalized = key
+        keeper.save()
+
+
+class Command(BaseCommand):
+    help = 'Merge contractors of a company that share a NIP (dry run unless --apply is given)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--company',
+            type=int,
+            help='Company id (default: all companies)'
+        )
+        parser.add_argument(
+            '--apply',
+            action='store_true',
+            help='Merge the contractors; without it only report what would change'
+        )
+
+    def handle(self, *args, **options):
+        company = None
+        if options['company'] is not None:
+            try:
+                company = Company.objects.get(pk=options['company'])
+            except Company.DoesNotExist:
+                raise CommandError(f"Company {options['company']} does not exist")
+
+        groups = duplicate_groups(company)
+        if not groups:
+            self.stdout.write('No contractors share a NIP')
+            return
+
+        for key, keeper, duplicates in groups:
+            self.stdout.write(
+                f'Company {keeper.company_id}, NIP {key}: keep #{keeper.pk} {keeper.nazwa} '
+                f'({keeper.invoice_count} invoice(s))'
+            )
+            for duplicate in duplicates:
+                self.stdout.write(
+                    f'  merge #{duplicate.pk} {duplicate.nazwa} ({duplicate.invoice_count} invoice(s))'
+                )
+
+        merged = sum(len(duplicates) for _, _, duplicates in groups)
+        if not options['apply']:
+            self.stdout.write(f'Dry run: {merged} contractor(s) in {len(groups)} group(s) would be merged, '
+                              f'run with --apply to merge them')
+            return
+
+        for key, keeper, duplicates in groups:
+            merge_group(key, keeper, duplicates)
+        self.stdout.write(self.style.SUCCESS(f'Merged {merged} contractor(s) in {len(groups)} group(s)'))
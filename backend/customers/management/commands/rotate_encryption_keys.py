@@ -0,0 +1,75 @@
+"""
+Ponowne szyfrowanie zapisanych sekretów aktualnym kluczem.
+
+Rotacja klucza:
+  1. Dopisz nowy klucz na początek ENCRYPTION_KEYS (stary zostaje dalej na liście).
+  2. Uruchom: python manage.py rotate_encryption_keys
+  3. Gdy komenda nie zgłosi błędów, usuń stary klucz z ENCRYPTION_KEYS.
+
+Tokeny zaszyfrowane kluczem z SECRET_KEY (sprzed ustawienia kluczy):
+ustaw ENCRYPTION_KEYS i na czas komendy ENCRYPTION_LEGACY_SECRET_KEY=true,
+potem flagę usuń.
+"""
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from customers.encryption import ENCRYPTED_FIELDS, TokenDecryptionError, rotate_token
+
+
+class Command(BaseCommand):
+    help = 'Re-encrypt all stored secrets with the current (first) encryption key'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Check that every secret can be decrypted without saving anything',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Rows per bulk update',
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        batch_size = options['batch_size']
+        failures = []
+
+        for model_label, field in ENCRYPTED_FIELDS:
+            model = apps.get_model(model_label)
+            rotated = 0
+            batch = []
+
+            queryset = model.objects.exclude(**{field: ''}).only('pk', field).order_by('pk')
+            for obj in queryset.iterator(chunk_size=batch_size):
+                try:
+                    setattr(obj, field, rotate_token(getattr(obj, field)))
+                except TokenDecryptionError as e:
+                    failures.append(f'{model_label}(pk={obj.pk}).{field}: {e}')
+                    continue
+                batch.append(obj)
+                rotated += 1
+
+                if len(batch) >= batch_size:
+                    self._save(model, field, batch, dry_run)
+                    batch = []
+
+            self._save(model, field, batch, dry_run)
+            self.stdout.write(f'{model_label}.{field}: {rotated} re-encrypted')
+
+        if failures:
+            for failure in failures:
+                self.stderr.write(self.style.ERROR(f'  FAILED {failure}'))
+            raise CommandError(f'{len(failures)} secret(s) could not be decrypted with any configured key')
+
+        suffix = ' (dry run, nothing saved)' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(f'All secrets use the current key{suffix}'))
+
+    def _save(self, model, field, batch, dry_run):
+        if dry_run or not batch:
+            return
+        with transaction.atomic():
+            model.objects.bulk_update(batch, [field])
@@ -0,0 +1,54 @@
+import re
+
+from django.db import migrations, models
+
+
+def normalize_nip(nip):
+    # Kopia customers.resolver.normalize_nip - migracja nie importuje kodu aplikacji
+    if not nip:
+        return None
+    value = re.sub(r'[^0-9A-Za-z]', '', str(nip)).upper()
+    if value.startswith('PL') and value[2:].isdigit():
+        value = value[2:]
+    return value[:20] or None
+
+
+def populate_nip_normalized(apps, schema_editor):
+    """
+    Wypełnij znormalizowany NIP. Przy duplikatach NIP zostaje przy najstarszym
+    kontrahencie, pozostałe dostają NULL - migracja niczego nie usuwa.
+    Contractor.save() zostawia im NULL, a scala je świadomie
+    manage.py merge_contractors (bez --apply tylko raport).
+    """
+    Contractor = apps.get_model('customers', 'Contractor')
+    seen = set()
+    to_update = []
+    for contractor in Contractor.objects.exclude(nip='').order_by('id').only('id', 'nip'):
+        key = normalize_nip(contractor.nip)
+        if not key or key in seen:
+            continue
+        seen.add(key)
+        contractor.nip_normalized = key
+        to_update.append(contractor)
+    Contractor.objects.bulk_update(to_update, ['nip_normalized'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='contractor',
+            name='nip_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='NIP (znormalizowany)'),
+        ),
+        migrations.RunPython(populate_nip_normalized, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='contractor',
+            name='nip_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, unique=True, verbose_name='NIP (znormalizowany)'),
+        ),
+    ]
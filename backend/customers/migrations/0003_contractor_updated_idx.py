@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 04:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0002_contractor_nip_normalized'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='contractor',
+            index=models.Index(fields=['updated_at', 'id'], name='contractor_updated_idx'),
+        ),
+    ]
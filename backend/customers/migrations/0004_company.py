@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """
+    Ustawienia (singleton pk=1) stają się pierwszą firmą. Kontrahent dostaje
+    kolumnę company - najpierw bez NOT NULL, wypełnia ją 0005.
+    """
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('customers', '0003_contractor_updated_idx'),
+    ]
+
+    operations = [
+        migrations.RenameModel('Settings', 'Company'),
+        migrations.RenameField('company', 'firma_nazwa', 'nazwa'),
+        migrations.RenameField('company', 'firma_nip', 'nip'),
+        migrations.AlterModelOptions(
+            name='company',
+            options={'ordering': ['id'], 'verbose_name': 'Firma', 'verbose_name_plural': 'Firmy'},
+        ),
+        migrations.CreateModel(
+            name='CompanyMembership',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('company', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to='customers.company')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='memberships', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Dostęp do firmy',
+                'verbose_name_plural': 'Dostępy do firm',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='companymembership',
+            constraint=models.UniqueConstraint(fields=('user', 'company'), name='company_membership_unique'),
+        ),
+        migrations.AddField(
+            model_name='contractor',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='kontrahenci', to='customers.company', verbose_name='Firma'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.db import migrations
+
+
+def assign_default_company(apps, schema_editor):
+    """
+    Dotychczasowe dane należą do pierwszej firmy (dawne ustawienia pk=1,
+    a gdy ich nie było - nowa firma). Każdy istniejący użytkownik dostaje
+    do niej dostęp.
+    """
+    Company = apps.get_model('customers', 'Company')
+    CompanyMembership = apps.get_model('customers', 'CompanyMembership')
+    Contractor = apps.get_model('customers', 'Contractor')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        # Singleton zapisywał pk=1 wprost, więc sekwencja id mogła nie ruszyć
+        table = Company._meta.db_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), COALESCE(MAX(id), 1)) FROM {table}"
+            )
+
+    company = Company.objects.order_by('id').first()
+    if company is None:
+        company = Company.objects.create(nazwa='Moja firma')
+
+    CompanyMembership.objects.bulk_create(
+        [CompanyMembership(user_id=user_id, company=company) for user_id in User.objects.values_list('id', flat=True)],
+        ignore_conflicts=True,
+    )
+    Contractor.objects.filter(company__isnull=True).update(company=company)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('customers', '0004_company'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_default_company, migrations.RunPython.noop),
+    ]
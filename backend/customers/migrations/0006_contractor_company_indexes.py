@@ -0,0 +1,39 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """NOT NULL dla company i indeksy złożone zaczynające się od firmy."""
+
+    dependencies = [
+        ('customers', '0005_default_company'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='contractor',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='kontrahenci', to='customers.company', verbose_name='Firma'),
+        ),
+        migrations.AlterField(
+            model_name='contractor',
+            name='nip_normalized',
+            field=models.CharField(blank=True, editable=False, max_length=20, null=True, verbose_name='NIP (znormalizowany)'),
+        ),
+        migrations.AddConstraint(
+            model_name='contractor',
+            constraint=models.UniqueConstraint(fields=('company', 'nip_normalized'), name='contractor_company_nip_unique'),
+        ),
+        migrations.RemoveIndex(
+            model_name='contractor',
+            name='contractor_updated_idx',
+        ),
+        migrations.AddIndex(
+            model_name='contractor',
+            index=models.Index(fields=['company', 'nazwa'], name='contractor_company_nazwa_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='contractor',
+            index=models.Index(fields=['company', 'updated_at', 'id'], name='contractor_company_updated_idx'),
+        ),
+    ]
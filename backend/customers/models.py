@@ -1,13 +1,148 @@
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
 from django.db import models
 
+# Licznik wersji firm we wspólnym cache - zapis dowolnej firmy w dowolnym workerze go podbija
+COMPANY_VERSION_KEY = 'customers:company_version'
+# Co ile sekund proces sprawdza licznik wersji
+COMPANY_VERSION_CHECK_SECONDS = 5
+# Limit firm trzymanych w pamięci procesu - po przekroczeniu cache jest czyszczony
+MAX_CACHED_COMPANIES = 1000
+
+_company_lock = threading.Lock()
+_company_cache = {'companies': {}, 'version': None, 'checked_at': 0.0}
+
+
+def _check_company_version():
+    """Wyczyść firmy procesu, gdy zmienił się licznik wersji (wołane pod _company_lock)."""
+    now = time.monotonic()
+    if now - _company_cache['checked_at'] >= COMPANY_VERSION_CHECK_SECONDS:
+        version = cache.get(COMPANY_VERSION_KEY, 0)
+        if version != _company_cache['version']:
+            _company_cache['companies'].clear()
+            _company_cache['version'] = version
+        _company_cache['checked_at'] = now
+
+
+class Company(models.Model):
+    """
+    Firma (dzierżawca) - NIP, token KSeF, środowisko. Faktury, kontrahenci
+    i historia synchronizacji należą do firmy, użytkownicy mają dostęp do
+    firm przez CompanyMembership. Wcześniej singleton Settings (pk=1).
+    """
+    ENVIRONMENT_CHOICES = [
+        ('production', 'Produkcja'),
+        ('test', 'Test'),
+        ('demo', 'Demo'),
+    ]
+    
+    nazwa = models.CharField(max_length=255, blank=True, verbose_name='Nazwa firmy')
+    nip = models.CharField(max_length=15, blank=True, verbose_name='NIP firmy')
+    ksef_token = models.TextField(blank=True, verbose_name='Token KSeF')
+    ksef_environment = models.CharField(
+        max_length=20, 
+        choices=ENVIRONMENT_CHOICES, 
+        default='test', 
+        verbose_name='Środowisko KSeF'
+    )
+    auto_fetch_ksef = models.BooleanField(default=False, verbose_name='Automatyczne pobieranie z KSeF')
+    
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Firma'
+        verbose_name_plural = 'Firmy'
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.nazwa or 'Firma'} ({self.nip or 'brak NIP'})"
+
+    @classmethod
+    def get_cached(cls, pk):
+        """
+        Firma o podanym id (Company.DoesNotExist, gdy brak).
+        Rekordy trzymane są w pamięci procesu i odświeżane, gdy zmieni się
+        licznik wersji we wspólnym cache. Zwracana jest płytka kopia, więc
+        zmiany po stronie wywołującego nie trafiają do cache.
+        """
+        with _company_lock:
+            _check_company_version()
+            obj = _company_cache['companies'].get(pk)
+
+        if obj is None:
+            obj = cls.objects.get(pk=pk)
+            cls.cache_instances([obj])
+        return copy.copy(obj)
+
+    @classmethod
+    def cache_instances(cls, companies):
+        """Zapamiętaj świeżo odczytane firmy (np. razem z dostępami użytkownika)."""
+        with _company_lock:
+            # Najpierw ewentualne czyszczenie po zmianie wersji, inaczej zapisane
+            # firmy zniknęłyby przy najbliższym get_cached()
+            _check_company_version()
+            if len(_company_cache['companies']) + len(companies) > MAX_CACHED_COMPANIES:
+                _company_cache['companies'].clear()
+            for company in companies:
+                _company_cache['companies'][company.pk] = company
+
+    @classmethod
+    def invalidate_cache(cls):
+        """Unieważnij firmy w tym procesie i (przez licznik wersji) w pozostałych."""
+        with _company_lock:
+            _company_cache['companies'].clear()
+        try:
+            cache.incr(COMPANY_VERSION_KEY)
+        except ValueError:
+            cache.set(COMPANY_VERSION_KEY, 1, None)
+
+
+class CompanyMembership(models.Model):
+    """Dostęp użytkownika do firmy. Superużytkownik widzi wszystkie firmy."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='memberships')
+    company = models.ForeignKey(Company, on_delete=models.CASCADE, related_name='memberships')
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Dostęp do firmy'
+        verbose_name_plural = 'Dostępy do firm'
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'company'], name='company_membership_unique'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} -> {self.company}"
+
+
+class CompanyQuerySet(models.QuerySet):
+    """Wspólne dla modeli należących do firmy (Contractor, Invoice)."""
+
+    def for_company(self, company):
+        return self.filter(company=company)
+
 
 class Contractor(models.Model):
     """
     Model kontrahenta/dostawcy.
     Zgodny z oryginalną aplikacją Fakturex Next.
     """
+    # Indeks kolumny zbędny - pokrywają ją indeksy złożone zaczynające się od company
+    company = models.ForeignKey(
+        Company, on_delete=models.CASCADE, related_name='kontrahenci', db_index=False,
+        verbose_name='Firma'
+    )
     nazwa = models.CharField(max_length=255, verbose_name='Nazwa')
     nip = models.CharField(max_length=15, blank=True, verbose_name='NIP')
+    # NIP bez separatorów i prefiksu PL - po nim łączymy faktury z KSeF (unikalny w firmie)
+    nip_normalized = models.CharField(
+        max_length=20, null=True, blank=True, editable=False,
+        verbose_name='NIP (znormalizowany)'
+    )
     
     # Adres
     ulica = models.CharField(max_length=255, blank=True, verbose_name='Ulica')
@@ -23,59 +158,42 @@ class Contractor(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CompanyQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Kontrahent'
         verbose_name_plural = 'Kontrahenci'
         ordering = ['nazwa']
+        constraints = [
+            models.UniqueConstraint(fields=['company', 'nip_normalized'], name='contractor_company_nip_unique'),
+        ]
+        indexes = [
+            # Lista kontrahentów firmy sortowana po nazwie
+            models.Index(fields=['company', 'nazwa'], name='contractor_company_nazwa_idx'),
+            # Feed zmian (/api/changes/) pyta o kontrahentów firmy zmienionych po kursorze
+            models.Index(fields=['company', 'updated_at', 'id'], name='contractor_company_updated_idx'),
+        ]
 
     def __str__(self):
         return self.nazwa
 
+    def save(self, *args, **kwargs):
+        from .resolver import normalize_nip
+        key = normalize_nip(self.nip)
+        if (
+            key and not self._state.adding and self.nip_normalized is None
+            and Contractor.objects.filter(company_id=self.company_id, nip_normalized=key).exclude(pk=self.pk).exists()
+        ):
+            # Duplikat NIP zostawiony przez migrację 0002 - bez NIP znormalizowanego do czasu
+            # scalenia (manage.py merge_contractors), inaczej zapis łamie unikalność
+            key = None
+        self.nip_normalized = key
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'nip' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'nip_normalized'}
+        super().save(*args, **kwargs)
+
     @property
     def pelny_adres(self):
         parts = [self.ulica, f"{self.kod_pocztowy} {self.miasto}".strip(), self.kraj]
         return ", ".join(p for p in parts if p)
-
-
-class Settings(models.Model):
-    """
-    Ustawienia firmy - NIP, token KSeF, środowisko.
-    Singleton - tylko jeden rekord.
-    """
-    ENVIRONMENT_CHOICES = [
-        ('production', 'Produkcja'),
-        ('test', 'Test'),
-        ('demo', 'Demo'),
-    ]
-    
-    firma_nazwa = models.CharField(max_length=255, blank=True, verbose_name='Nazwa firmy')
-    firma_nip = models.CharField(max_length=15, blank=True, verbose_name='NIP firmy')
-    ksef_token = models.TextField(blank=True, verbose_name='Token KSeF')
-    ksef_environment = models.CharField(
-        max_length=20, 
-        choices=ENVIRONMENT_CHOICES, 
-        default='test', 
-        verbose_name='Środowisko KSeF'
-    )
-    auto_fetch_ksef = models.BooleanField(default=False, verbose_name='Automatyczne pobieranie z KSeF')
-    
-    created_at = models.DateTimeField(auto_now_add=True)
-    updated_at = models.DateTimeField(auto_now=True)
-
-    class Meta:
-        verbose_name = 'Ustawienia'
-        verbose_name_plural = 'Ustawienia'
-
-    def __str__(self):
-        return f"Ustawienia - {self.firma_nip or 'Brak NIP'}"
-
-    def save(self, *args, **kwargs):
-        # Singleton - zawsze nadpisuj rekord o id=1
-        self.pk = 1
-        super().save(*args, **kwargs)
-
-    @classmethod
-    def get_settings(cls):
-        """Pobierz lub utwórz ustawienia"""
-        obj, created = cls.objects.get_or_create(pk=1)
-        return obj
\ No newline at end of file
@@ -0,0 +1,113 @@
+"""
+Rozpoznawanie kontrahentów po NIP.
+
+Kontrahent identyfikowany jest po znormalizowanym NIP (Contractor.nip_normalized,
+unikalny w obrębie firmy). resolve_contractors() obsługuje całą paczkę importu w stałej
+liczbie zapytań, niezależnie od liczby faktur i dostawców.
+"""
+import re
+
+from django.utils import timezone
+
+from .models import Contractor
+
+_POSTAL_CODE = re.compile(r'(\d{2}-\d{3})\s*(.*)')
+
+
+def normalize_nip(nip):
+    """
+    Znormalizuj NIP: bez spacji, myślników i prefiksu PL.
+    Zwraca None dla pustego NIP (kolumna unikalna dopuszcza wiele NULL).
+    """
+    if not nip:
+        return None
+    value = re.sub(r'[^0-9A-Za-z]', '', str(nip)).upper()
+    if value.startswith('PL') and value[2:].isdigit():
+        value = value[2:]
+    return value[:20] or None
+
+
+def parse_address(adres):
+    """
+    Rozbij adres z KSeF ("AdresL1, AdresL2") na ulicę, kod pocztowy i miasto.
+    """
+    result = {'ulica': '', 'kod_pocztowy': '', 'miasto': ''}
+    if not adres:
+        return result
+
+    parts = [p.strip() for p in adres.split(',') if p.strip()]
+    for i, part in enumerate(parts):
+        match = _POSTAL_CODE.search(part)
+        if match:
+            result['kod_pocztowy'] = match.group(1)
+            result['miasto'] = match.group(2).strip()[:100]
+            before = part[:match.start()].strip()
+            result['ulica'] = ', '.join(parts[:i] + ([before] if before else []))[:255]
+            return result
+
+    # Bez kodu pocztowego: ostatni człon traktujemy jako miasto
+    if len(parts) > 1:
+        result['miasto'] = parts[-1][:100]
+        result['ulica'] = ', '.join(parts[:-1])[:255]
+    else:
+        result['ulica'] = parts[0][:255]
+    return result
+
+
+def resolve_contractors(company, suppliers):
+    """
+    Znajdź lub utwórz kontrahentów firmy company dla paczki dostawców.
+
+    suppliers - iterowalne słowniki z kluczami nip, nazwa, adres.
+    Zwraca słownik {znormalizowany NIP: Contractor}. Dostawcy bez NIP są pomijani.
+    Istniejącym kontrahentom uzupełniane są tylko puste pola (nie nadpisujemy
+    ręcznych zmian). Zapytania: odczyt, bulk_create, ponowny odczyt utworzonych,
+    bulk_update - niezależnie od wielkości paczki.
+    """
+    wanted = {}
+    for supplier in suppliers:
+        key = normalize_nip(supplier.get('nip'))
+        if key and key not in wanted:
+            wanted[key] = supplier
+    if not wanted:
+        return {}
+
+    contractors = Contractor.objects.for_company(company)
+    resolved = {c.nip_normalized: c for c in contractors.filter(nip_normalized__in=wanted)}
+
+    to_update = []
+    now = timezone.now()
+    for key, contractor in resolved.items():
+        supplier = wanted[key]
+        changed = False
+        values = dict(parse_address(supplier.get('adres')), nazwa=(supplier.get('nazwa') or '')[:255])
+        for field, value in values.items():
+            if value and not getattr(contractor, field):
+                setattr(contractor, field, value)
+                changed = True
+        if changed:
+            # bulk_update pomija auto_now, a po updated_at działa feed zmian
+            contractor.updated_at = now
+            to_update.append(contractor)
+    if to_update:
+        Contractor.objects.bulk_update(to_update, ['nazwa', 'ulica', 'kod_pocztowy', 'miasto', 'updated_at'])
+
+    missing = [key for key in wanted if key not in resolved]
+    if missing:
+        new_contractors = []
+        for key in missing:
+            supplier = wanted[key]
+            new_contractors.append(Contractor(
+                company=company,
+                nazwa=(supplier.get('nazwa') or key)[:255],
+                nip=str(supplier.get('nip'))[:15],
+                nip_normalized=key,
+                **parse_address(supplier.get('adres')),
+            ))
+        # ignore_conflicts: równoległy import mógł właśnie utworzyć tego samego kontrahenta
+        Contractor.objects.bulk_create(new_contractors, ignore_conflicts=True)
+        resolved.update(
+            (c.nip_normalized, c) for c in contractors.filter(nip_normalized__in=missing)
+        )
+
+    return resolved
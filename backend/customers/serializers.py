@@ -1,5 +1,5 @@
 from rest_framework import serializers
-from .models import Contractor, Settings
+from .models import Company, Contractor
 from .encryption import encrypt_token, decrypt_token, is_token_encrypted
 
 
@@ -17,17 +17,46 @@ class ContractorSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ['created_at', 'updated_at']
 
+    def validate_nip(self, value):
+        from .resolver import normalize_nip
+        key = normalize_nip(value)
+        # Niezmieniony NIP - także duplikat sprzed migracji 0002, czekający na merge_contractors
+        if key and not (self.instance is not None and normalize_nip(self.instance.nip) == key):
+            duplicates = Contractor.objects.filter(nip_normalized=key)
+            # Unikalność w obrębie firmy żądania (albo firmy edytowanego kontrahenta)
+            company = self.context.get('company')
+            if company is not None:
+                duplicates = duplicates.for_company(company)
+            elif self.instance is not None:
+                duplicates = duplicates.filter(company_id=self.instance.company_id)
+            if self.instance is not None:
+                duplicates = duplicates.exclude(pk=self.instance.pk)
+            if duplicates.exists():
+                raise serializers.ValidationError('Kontrahent o tym NIP już istnieje.')
+        return value
+
+
+class CompanySerializer(serializers.ModelSerializer):
+    """Firma na liście firm użytkownika."""
+
+    class Meta:
+        model = Company
+        fields = ['id', 'nazwa', 'nip']
+
 
 class SettingsSerializer(serializers.ModelSerializer):
     """
     Serializer ustawień firmy.
     Token KSeF jest szyfrowany przy zapisie i maskowany przy odczycie.
+    Klucze firma_nazwa / firma_nip zostają dla zgodności z SPA.
     """
+    firma_nazwa = serializers.CharField(source='nazwa', max_length=255, required=False, allow_blank=True)
+    firma_nip = serializers.CharField(source='nip', max_length=15, required=False, allow_blank=True)
     ksef_token_masked = serializers.SerializerMethodField()
     has_ksef_token = serializers.SerializerMethodField()
     
     class Meta:
-        model = Settings
+        model = Company
         fields = [
             'id', 'firma_nazwa', 'firma_nip', 'ksef_token', 'ksef_token_masked',
             'has_ksef_token', 'ksef_environment', 'auto_fetch_ksef', 
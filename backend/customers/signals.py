@@ -0,0 +1,23 @@
+"""
+Sygnały modułu kontrahentów.
+"""
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from users.authentication import invalidate_user_cache
+from .models import Company, CompanyMembership
+
+
+@receiver(post_save, sender=Company)
+@receiver(post_delete, sender=Company)
+def invalidate_company_cache(sender, **kwargs):
+    """Po zatwierdzeniu zmiany firmy unieważnij jej kopie we wszystkich workerach."""
+    transaction.on_commit(Company.invalidate_cache)
+
+
+@receiver(post_save, sender=CompanyMembership)
+@receiver(post_delete, sender=CompanyMembership)
+def invalidate_memberships(sender, instance, **kwargs):
+    """Dostępy do firm są w cache razem z użytkownikiem (customers/tenancy.py)."""
+    transaction.on_commit(lambda: invalidate_user_cache(instance.user_id))
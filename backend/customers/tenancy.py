@@ -0,0 +1,133 @@
+"""
+Firma (dzierżawca) bieżącego żądania.
+
+Użytkownik ma dostęp do firm przez CompanyMembership; superużytkownik do
+wszystkich. Klient wybiera firmę nagłówkiem X-Company-Id (EventSource,
+który nie wysyła nagłówków - parametrem ?company=). Bez wyboru używana
+jest pierwsza firma użytkownika.
+
+Dostępy trzymane są w pamięci procesu tak jak użytkownik w
+users/authentication.py - przez JWT_USER_CACHE_SECONDS, z kluczem
+zawierającym generację użytkownika. Zmiana dostępów podbija generację
+(customers/signals.py), więc wpisy znikają we wszystkich workerach.
+Firmy czytane są razem z dostępami i trafiają do Company.get_cached(),
+więc typowe żądanie nie dokłada żadnego zapytania, a pierwsze - jedno.
+"""
+import threading
+import time
+
+from django.conf import settings
+from rest_framework.exceptions import PermissionDenied
+
+from users.authentication import get_user_generation
+from .models import Company, CompanyMembership
+
+COMPANY_HEADER = 'HTTP_X_COMPANY_ID'
+COMPANY_PARAM = 'company'
+
+# Limit wpisów - po przekroczeniu cache jest czyszczony
+MAX_CACHED_MEMBERSHIPS = 1000
+
+_lock = threading.Lock()
+_memberships = {}
+
+
+def user_company_ids(user):
+    """Id firm, do których użytkownik ma dostęp (rosnąco)."""
+    key = (user.pk, get_user_generation(user.pk))
+    now = time.monotonic()
+    with _lock:
+        entry = _memberships.get(key)
+    if entry is not None and entry[0] > now:
+        return entry[1]
+
+    # Firmy przychodzą tym samym zapytaniem - get_request_company() nie pyta już bazy
+    memberships = CompanyMembership.objects.filter(user_id=user.pk).select_related('company').order_by('company_id')
+    companies = [membership.company for membership in memberships]
+    Company.cache_instances(companies)
+    company_ids = [company.pk for company in companies]
+    ttl = getattr(settings, 'JWT_USER_CACHE_SECONDS', 60)
+    with _lock:
+        if len(_memberships) >= MAX_CACHED_MEMBERSHIPS:
+            _memberships.clear()
+        _memberships[key] = (now + ttl, company_ids)
+    return company_ids
+
+
+def resolve_company(user, requested=None):
+    """
+    Firma, w której działa użytkownik. requested - id z nagłówka lub parametru.
+    PermissionDenied, gdy użytkownik nie ma dostępu do tej firmy lub do żadnej.
+    """
+    company_ids = user_company_ids(user)
+    if requested not in (None, ''):
+        try:
+            company_id = int(requested)
+        except (TypeError, ValueError):
+            raise PermissionDenied('Nieprawidłowy identyfikator firmy.')
+        if company_id not in company_ids and not user.is_superuser:
+            raise PermissionDenied('Brak dostępu do tej firmy.')
+    elif company_ids:
+        company_id = company_ids[0]
+    elif user.is_superuser:
+        company_id = Company.objects.order_by('id').values_list('id', flat=True).first()
+    else:
+        company_id = None
+
+    if company_id is None:
+        raise PermissionDenied('Użytkownik nie ma dostępu do żadnej firmy.')
+    try:
+        return Company.get_cached(company_id)
+    except Company.DoesNotExist:
+        raise PermissionDenied('Firma nie istnieje.')
+
+
+def get_request_company(request):
+    """Firma żądania (rest_framework Request), wyznaczana raz na żądanie."""
+    company = getattr(request, '_company', None)
+    if company is None:
+        requested = request.META.get(COMPANY_HEADER) or request.query_params.get(COMPANY_PARAM)
+        company = resolve_company(request.user, requested)
+        request._company = company
+    return company
+
+
+def user_companies(user):
+    """Firmy dostępne dla użytkownika - lista do przełącznika firm."""
+    if user.is_superuser:
+        return Company.objects.order_by('id')
+    return Company.objects.filter(id__in=user_company_ids(user)).order_by('id')
+
+
+class CompanyScopedMixin:
+    """
+    Mixin widoków DRF: self.company to firma żądania, get_queryset()
+    widoku zaczyna od Model.objects.for_company(self.company), a nowe
+    obiekty dostają firmę w perform_create. Serializer widzi firmę
+    w context['company'] (np. do sprawdzania duplikatów).
+    """
+
+    @property
+    def company(self):
+        return get_request_company(self.request)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['company'] = self.company
+        return context
+
+    def perform_create(self, serializer):
+        serializer.save(company=self.company)
+
+
+def command_company(company_id=None):
+    """
+    Firma dla komendy zarządzania (--company <id>); bez id - pierwsza firma.
+    Company.DoesNotExist, gdy brak.
+    """
+    if company_id is not None:
+        return Company.objects.get(pk=company_id)
+    company = Company.objects.order_by('id').first()
+    if company is None:
+        raise Company.DoesNotExist('Brak firm w bazie.')
+    return company
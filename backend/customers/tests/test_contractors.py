@@ -0,0 +1,73 @@
+"""
+Kontrahenci: rozpoznawanie po NIP przy imporcie (customers.resolver)
+i kontrahenci o tym samym NIP - edycja działa, a scala ich komenda
+merge_contractors.
+"""
+import io
+
+from django.core.management import call_command
+
+from customers.models import Company, Contractor
+from customers.resolver import resolve_contractors
+from invoices.models import ChangeTombstone
+
+
+def test_resolve_contractors(company, contractor_data, django_assert_max_num_queries):
+    other = Company.objects.create(nazwa='Inna Firma')
+    existing = Contractor.objects.create(company=company, **dict(contractor_data(), nazwa='Ręczna nazwa', miasto=''))
+    new_nip = contractor_data()['nip']
+    suppliers = [
+        {'nip': f'PL {existing.nip[:3]}-{existing.nip[3:]}', 'nazwa': 'Nazwa z KSeF', 'adres': 'ul. Nowa 2, 31-100 Kraków'},
+        {'nip': new_nip, 'nazwa': 'Nowy Dostawca', 'adres': 'ul. Długa 5, 80-001 Gdańsk'},
+        {'nip': f'PL{new_nip}', 'nazwa': 'Nowy Dostawca (powtórka)'},
+        {'nip': '', 'nazwa': 'Bez NIP'},
+    ]
+
+    # Odczyt, bulk_create, odczyt utworzonych, bulk_update - niezależnie od wielkości paczki
+    with django_assert_max_num_queries(4):
+        resolved = resolve_contractors(company, suppliers)
+    assert set(resolved) == {existing.nip, new_nip}
+    existing.refresh_from_db()
+    # Uzupełniane są tylko puste pola
+    assert (existing.nazwa, existing.ulica, existing.miasto) == ('Ręczna nazwa', 'ul. Testowa 1', 'Kraków')
+    created = resolved[new_nip]
+    assert (created.company_id, created.nazwa, created.kod_pocztowy, created.miasto) == (
+        company.pk, 'Nowy Dostawca', '80-001', 'Gdańsk',
+    )
+
+    # Ta sama paczka jeszcze raz nic nie tworzy; inna firma dostaje własnych kontrahentów
+    assert resolve_contractors(company, suppliers)[new_nip].pk == created.pk
+    assert Contractor.objects.filter(nip_normalized=new_nip).count() == 1
+    assert resolve_contractors(other, suppliers)[new_nip].company_id == other.pk
+    assert Contractor.objects.filter(nip_normalized=new_nip).count() == 2
+
+
+def test_merge_duplicate_nip_contractors(company, api_client, contractor_data, make_invoice):
+    data = contractor_data()
+    keeper = Contractor.objects.create(company=company, **dict(data, telefon=''))
+    # Duplikat jak po migracji 0002: ten sam NIP inaczej zapisany, nip_normalized = NULL
+    duplicate = Contractor.objects.create(company=company, **dict(data, nip='', telefon='+48 600 000 001'))
+    Contractor.objects.filter(pk=duplicate.pk).update(nip=f"PL {data['nip']}")
+    invoice = make_invoice(kontrahent=duplicate)
+
+    # Edycja duplikatu działa, a on czeka na scalenie
+    response = api_client.patch(f'/api/contractors/{duplicate.pk}/', {'notatki': 'duplikat'}, format='json')
+    assert response.status_code == 200, response.content
+    response = api_client.put(f'/api/contractors/{duplicate.pk}/', dict(data, nip=f"PL {data['nip']}"), format='json')
+    assert response.status_code == 200, response.content
+    assert Contractor.objects.get(pk=duplicate.pk).nip_normalized is None
+
+    # Bez --apply tylko raport
+    out = io.StringIO()
+    call_command('merge_contractors', company=company.pk, stdout=out)
+    assert f"NIP {data['nip']}: keep #{keeper.pk}" in out.getvalue()
+    assert f'merge #{duplicate.pk}' in out.getvalue()
+    assert Contractor.objects.filter(pk=duplicate.pk).exists()
+
+    call_command('merge_contractors', company=company.pk, apply=True, stdout=io.StringIO())
+    assert not Contractor.objects.filter(pk=duplicate.pk).exists()
+    invoice.refresh_from_db()
+    assert invoice.kontrahent_id == keeper.pk
+    keeper.refresh_from_db()
+    assert (keeper.nip_normalized, keeper.telefon) == (data['nip'], '+48 600 000 001')
+    assert ChangeTombstone.objects.filter(model='contractor', object_id=duplicate.pk).exists()
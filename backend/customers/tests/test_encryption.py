@@ -0,0 +1,98 @@
+"""
+Szyfrowanie tokenów KSeF i rotacja kluczy (customers/encryption.py).
+
+Klucz wyprowadzony z SECRET_KEY działa tylko bez ENCRYPTION_KEYS /
+ENCRYPTION_KEY albo przy ENCRYPTION_LEGACY_SECRET_KEY=true - po rotacji
+tokenów da się go wycofać. rotate_encryption_keys przepisuje tokeny
+aktualnym kluczem, po czym stary klucz można usunąć z listy.
+"""
+import io
+
+import pytest
+from cryptography.fernet import Fernet
+from django.core.management import call_command
+from django.test import override_settings
+
+from customers.encryption import (
+    TokenDecryptionError, _key_from_secret_key, decrypt_token, encrypt_token, get_encryption_keys,
+    reset_cipher_cache,
+)
+from customers.models import Company
+
+OLD_KEY = Fernet.generate_key().decode()
+NEW_KEY = Fernet.generate_key().decode()
+
+
+@pytest.fixture
+def keys():
+    """keys(ENCRYPTION_KEYS, legacy=False) - ustawienia kluczy z przeładowaniem szyfru."""
+    overrides = []
+
+    def configure(encryption_keys, legacy=False):
+        override = override_settings(
+            ENCRYPTION_KEYS=encryption_keys, ENCRYPTION_KEY='', ENCRYPTION_LEGACY_SECRET_KEY=legacy,
+        )
+        override.enable()
+        overrides.append(override)
+        reset_cipher_cache()
+
+    yield configure
+    for override in reversed(overrides):
+        override.disable()
+    reset_cipher_cache()
+
+
+def _company_token(company):
+    return Company.objects.values_list('ksef_token', flat=True).get(pk=company.pk)
+
+
+def test_secret_key_fallback_only_without_keys(keys):
+    keys('')
+    assert get_encryption_keys() == [_key_from_secret_key()]
+    legacy_token = encrypt_token('ksef-token')
+
+    keys(OLD_KEY)
+    assert get_encryption_keys() == [OLD_KEY.encode()]
+    with pytest.raises(TokenDecryptionError):
+        decrypt_token(legacy_token)
+
+    keys(OLD_KEY, legacy=True)
+    assert get_encryption_keys() == [OLD_KEY.encode(), _key_from_secret_key()]
+    assert decrypt_token(legacy_token) == 'ksef-token'
+
+
+def test_rotate_encryption_keys(company, keys):
+    # Token sprzed ustawienia kluczy -> ENCRYPTION_KEYS z flagą legacy na czas rotacji
+    keys('')
+    Company.objects.filter(pk=company.pk).update(ksef_token=encrypt_token('ksef-token'))
+    keys(OLD_KEY, legacy=True)
+    call_command('rotate_encryption_keys', stdout=io.StringIO())
+    keys(OLD_KEY)
+    assert decrypt_token(_company_token(company)) == 'ksef-token'
+
+    # Nowy klucz na początku listy, rotacja, usunięcie starego
+    keys(f'{NEW_KEY},{OLD_KEY}')
+    call_command('rotate_encryption_keys', stdout=io.StringIO())
+    keys(NEW_KEY)
+    assert decrypt_token(_company_token(company)) == 'ksef-token'
+    keys(OLD_KEY)
+    with pytest.raises(TokenDecryptionError):
+        decrypt_token(_company_token(company))
+
+
+def test_diagnostics_accepts_plaintext_token(company, api_client, keys):
+    from invoices.ksef_simulator import KSeFSimulator, use_simulator
+
+    keys(OLD_KEY)
+    # Token zapisany przed wprowadzeniem szyfrowania - czysty tekst
+    Company.objects.filter(pk=company.pk).update(ksef_token='sim-token', ksef_environment='test')
+    Company.invalidate_cache()
+    with KSeFSimulator(invoices=1, export_delay=0) as simulator, use_simulator(simulator.url):
+        diag = api_client.post('/api/invoices/ksef_diagnostics/').json()
+    assert (diag['token_is_encrypted'], diag['decryption_worked']) == (False, True)
+
+    Company.objects.filter(pk=company.pk).update(ksef_token=encrypt_token('sim-token'))
+    Company.invalidate_cache()
+    keys(NEW_KEY)
+    diag = api_client.post('/api/invoices/ksef_diagnostics/').json()
+    assert (diag['token_is_encrypted'], diag['decryption_worked']) == (True, False)
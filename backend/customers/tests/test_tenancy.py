@@ -0,0 +1,108 @@
+"""
+Izolacja firm (dzierżawców).
+
+Użytkownik drugiej firmy nie widzi ani nie zmienia faktur i kontrahentów
+firmy testu, a nagłówek X-Company-Id z cudzą firmą kończy się 403
+(także w widokach async i ustawieniach; superużytkownik wybiera dowolną firmę).
+Lista i usuwanie użytkowników obejmują tylko użytkowników bieżącej firmy.
+"""
+from datetime import date, timedelta
+
+import pytest
+from django.contrib.auth.models import User
+
+from customers.models import Company, CompanyMembership, Contractor
+from users.authentication import invalidate_user_cache
+
+NIP = '7740001454'
+
+
+@pytest.fixture
+def other_company(db, member):
+    company = Company.objects.create(nazwa='Druga Firma Sp. z o.o.', nip=NIP)
+    return company, member('other', company)
+
+
+def test_company_isolation(company, api_client, other_company, jwt_client, make_invoice, contractor_data):
+    other, user = other_company
+    client = jwt_client(user)
+    invoice = make_invoice()
+    contractor = Contractor.objects.create(company=company, **contractor_data())
+
+    assert client.get('/api/invoices/').json() == []
+    assert client.get('/api/contractors/').json() == []
+    assert client.get(f'/api/invoices/{invoice.pk}/').status_code == 404
+    assert client.patch(f'/api/invoices/{invoice.pk}/', {'status': 'zaplacona'}, format='json').status_code == 404
+    assert client.delete(f'/api/contractors/{contractor.pk}/').status_code == 404
+    assert client.get('/api/settings/').json()['firma_nip'] == NIP
+
+    # Nowe obiekty trafiają do firmy użytkownika, cudzy kontrahent jest odrzucany
+    response = client.post('/api/contractors/', contractor_data(), format='json')
+    assert response.status_code == 201, response.content[:500]
+    assert Contractor.objects.get(pk=response.json()['id']).company_id == other.pk
+    response = client.post('/api/invoices/', {
+        'numer': 'FV/OTHER/1', 'data': str(date.today()), 'kwota': '100.00', 'dostawca': 'Dostawca',
+        'termin_platnosci': str(date.today() + timedelta(days=7)), 'kontrahent': contractor.pk,
+    }, format='json')
+    assert response.status_code == 400
+    assert 'kontrahent' in response.json()
+
+    # Cudza firma w nagłówku i w parametrze - 403
+    assert jwt_client(user, company).get('/api/invoices/').status_code == 403
+    assert client.get('/api/dashboard/', {'company': company.pk}).status_code == 403
+    assert client.get('/api/companies/').json() == {
+        'current': other.pk, 'companies': [{'id': other.pk, 'nazwa': other.nazwa, 'nip': NIP}],
+    }
+
+    # Użytkownik z dostępem do obu firm przełącza się nagłówkiem
+    CompanyMembership.objects.create(user=user, company=company)
+    # Cache dostępów unieważniany jest po commicie, a test działa w wycofywanej transakcji
+    invalidate_user_cache(user.pk)
+    assert jwt_client(user, company).get(f'/api/invoices/{invoice.pk}/').status_code == 200
+    assert jwt_client(user, other).get(f'/api/invoices/{invoice.pk}/').status_code == 404
+
+
+def test_company_permissions(company, other_company, jwt_client):
+    other, user = other_company
+    client = jwt_client(user)
+
+    # Ustawienia zmieniają tylko firmę użytkownika
+    response = client.patch('/api/settings/', {'firma_nazwa': 'Druga Firma S.A.'}, format='json')
+    assert response.status_code == 200, response.content
+    assert Company.objects.get(pk=other.pk).nazwa == 'Druga Firma S.A.'
+    assert Company.objects.get(pk=company.pk).nazwa != 'Druga Firma S.A.'
+
+    # Widoki async i nieprawidłowy identyfikator firmy
+    assert jwt_client(user, company).get('/api/invoices/stats/').status_code == 403
+    assert jwt_client(user, company).patch('/api/settings/', {'firma_nazwa': 'X'}, format='json').status_code == 403
+    assert client.get('/api/invoices/', HTTP_X_COMPANY_ID='abc').status_code == 403
+    assert client.get('/api/invoices/stats/').json()['total_count'] == 0
+
+    # Bez dostępu do żadnej firmy - 403; superużytkownik widzi każdą firmę (domyślnie pierwszą)
+    nobody = User.objects.create_user('nobody', password='nobody-password')
+    invalidate_user_cache(nobody.pk)
+    assert jwt_client(nobody).get('/api/invoices/').status_code == 403
+    admin = User.objects.create_superuser('root-admin', password='admin-password')
+    invalidate_user_cache(admin.pk)
+    assert jwt_client(admin, other).get('/api/companies/').json()['current'] == other.pk
+    assert jwt_client(admin).get('/api/companies/').json()['current'] == Company.objects.order_by('id').first().pk
+
+
+def test_user_admin_scoped_to_company(company, user, api_client, other_company, member, jwt_client):
+    second, other = other_company
+    assert other.username not in [u['username'] for u in api_client.get('/api/auth/users/').json()]
+    assert [u['username'] for u in jwt_client(other).get('/api/auth/users/').json()] == ['other']
+
+    # Użytkownika innej firmy nie da się usunąć; endpoint debug nie istnieje
+    assert jwt_client(other).delete(f'/api/auth/users/{user.pk}/delete/').status_code == 404
+    assert api_client.delete(f'/api/auth/users/{other.pk}/delete/').status_code == 404
+    assert api_client.get('/api/auth/debug/').status_code == 404
+    assert User.objects.filter(pk__in=[user.pk, other.pk]).count() == 2
+
+    # Członek dwóch firm usunięty w jednej traci tylko dostęp do niej
+    shared = member('shared', second)
+    CompanyMembership.objects.create(user=shared, company=company)
+    assert jwt_client(other).delete(f'/api/auth/users/{shared.pk}/delete/').status_code == 200
+    assert list(shared.memberships.values_list('company_id', flat=True)) == [company.pk]
+    assert api_client.delete(f'/api/auth/users/{shared.pk}/delete/').status_code == 200
+    assert not User.objects.filter(pk=shared.pk).exists()
@@ -1,6 +1,6 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import ContractorViewSet, SettingsView
+from .views import CompanyListView, ContractorViewSet, SettingsView
 
 router = DefaultRouter()
 router.register(r'contractors', ContractorViewSet, basename='contractor')
@@ -8,4 +8,5 @@ router.register(r'contractors', ContractorViewSet, basename='contractor')
 urlpatterns = [
     path('', include(router.urls)),
     path('settings/', SettingsView.as_view(), name='settings'),
+    path('companies/', CompanyListView.as_view(), name='companies'),
 ]
\ No newline at end of file
@@ -1,19 +1,22 @@
 from rest_framework import viewsets
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from .models import Contractor, Settings
-from .serializers import ContractorSerializer, SettingsSerializer
+from .models import Contractor
+from .serializers import CompanySerializer, ContractorSerializer, SettingsSerializer
+from .tenancy import CompanyScopedMixin, get_request_company, user_companies
+from fakturex.db_router import ReplicaReadMixin
 
 
-class ContractorViewSet(viewsets.ModelViewSet):
+class ContractorViewSet(CompanyScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """
-    API ViewSet dla kontrahentów/dostawców.
+    API ViewSet dla kontrahentów/dostawców (tylko firmy bieżącego żądania).
     """
+    replica_actions = {'list'}
     queryset = Contractor.objects.all()
     serializer_class = ContractorSerializer
     
     def get_queryset(self):
-        queryset = Contractor.objects.all()
+        queryset = Contractor.objects.for_company(self.company)
         
         # Wyszukiwanie
         search = self.request.query_params.get('search')
@@ -29,27 +32,37 @@ class ContractorViewSet(viewsets.ModelViewSet):
 
 class SettingsView(APIView):
     """
-    API View dla ustawień firmy (singleton).
+    API View dla ustawień firmy bieżącego żądania.
     GET - pobierz ustawienia
     PUT/PATCH - zaktualizuj ustawienia
     """
     def get(self, request):
-        settings = Settings.get_settings()
-        serializer = SettingsSerializer(settings)
+        serializer = SettingsSerializer(get_request_company(request))
         return Response(serializer.data)
     
     def put(self, request):
-        settings = Settings.get_settings()
-        serializer = SettingsSerializer(settings, data=request.data)
+        serializer = SettingsSerializer(get_request_company(request), data=request.data)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
         return Response(serializer.errors, status=400)
     
     def patch(self, request):
-        settings = Settings.get_settings()
-        serializer = SettingsSerializer(settings, data=request.data, partial=True)
+        serializer = SettingsSerializer(get_request_company(request), data=request.data, partial=True)
         if serializer.is_valid():
             serializer.save()
             return Response(serializer.data)
-        return Response(serializer.errors, status=400)
\ No newline at end of file
+        return Response(serializer.errors, status=400)
+
+
+class CompanyListView(APIView):
+    """
+    GET - firmy dostępne dla użytkownika (przełącznik firm w SPA).
+    Firmę wybiera się nagłówkiem X-Company-Id.
+    """
+    def get(self, request):
+        companies = user_companies(request.user)
+        return Response({
+            'current': get_request_company(request).pk,
+            'companies': CompanySerializer(companies, many=True).data,
+        })
@@ -0,0 +1,95 @@
+import asyncio
+import contextvars
+import os
+
+import django
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIHandler
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'fakturex.settings')
+
+# receive bieżącego żądania - send_response go nie dostaje, a strumień SSE
+# musi zauważyć rozłączenie klienta
+_receive = contextvars.ContextVar('asgi_receive', default=None)
+
+
+class StreamingASGIHandler(ASGIHandler):
+    """
+    Django 3.2 iteruje StreamingHttpResponse bezpośrednio w pętli zdarzeń,
+    więc generator czytający z bazy (np. wyciąg ewidencji zakupu) kończy się
+    SynchronousOnlyOperation i blokuje pętlę. Tutaj każda część odpowiedzi
+    pobierana jest w wątku sync (tym samym co widoki - to samo połączenie DB).
+
+    Odpowiedzi z async_content (strumień SSE, invoices/ksef_progress.py)
+    iterowane są w pętli zdarzeń i kończone, gdy klient się rozłączy.
+
+    send_response powtarza wysyłanie nagłówków z ASGIHandler.send_response
+    Django 3.2, dlatego requirements.txt przypina Django do 3.2.x. Django 4.2
+    sam obsługuje strumienie async - przy aktualizacji nadpisanie do usunięcia.
+    """
+
+    async def __call__(self, scope, receive, send):
+        token = _receive.set(receive)
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            _receive.reset(token)
+
+    async def send_response(self, response, send):
+        if not response.streaming:
+            return await super().send_response(response, send)
+
+        response_headers = []
+        for header, value in response.items():
+            if isinstance(header, str):
+                header = header.encode('ascii')
+            if isinstance(value, str):
+                value = value.encode('latin1')
+            response_headers.append((bytes(header), bytes(value)))
+        for c in response.cookies.values():
+            response_headers.append(
+                (b'Set-Cookie', c.output(header='').encode('ascii').strip())
+            )
+        await send({
+            'type': 'http.response.start',
+            'status': response.status_code,
+            'headers': response_headers,
+        })
+
+        if getattr(response, 'async_content', None) is not None:
+            return await self._send_async_stream(response, send)
+
+        iterator = iter(response)
+        next_part = sync_to_async(next, thread_sensitive=True)
+        finished = object()
+        try:
+            while True:
+                part = await next_part(iterator, finished)
+                if part is finished:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            await send({'type': 'http.response.body'})
+        finally:
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+    async def _send_async_stream(self, response, send):
+        receive = _receive.get()
+        # Ciało żądania jest już przeczytane - następny komunikat to http.disconnect
+        disconnected = asyncio.ensure_future(receive()) if receive else asyncio.get_running_loop().create_future()
+        content = response.async_content
+        try:
+            async for part in content:
+                if disconnected.done():
+                    break
+                await send({'type': 'http.response.body', 'body': part, 'more_body': True})
+            if not disconnected.done():
+                await send({'type': 'http.response.body'})
+        finally:
+            disconnected.cancel()
+            await content.aclose()
+            await sync_to_async(response.close, thread_sensitive=True)()
+
+
+django.setup(set_prefix=False)
+application = StreamingASGIHandler()
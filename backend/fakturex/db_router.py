@@ -0,0 +1,112 @@
+"""
+Routing zapytań do replik bazy danych.
+
+Repliki konfiguruje się zmienną DATABASE_REPLICA_URLS (lista URL-i po przecinku),
+każda trafia do DATABASES jako 'replica_<n>'. Domyślnie wszystko idzie do 'default' -
+na replikę trafiają tylko bezpieczne odczyty z akcji oznaczonych jako raportowe
+(lista, statystyki, eksporty, analityka).
+
+Po zapisie klient jest "przypięty" do bazy głównej na REPLICA_PIN_SECONDS sekund,
+żeby od razu widział własne zmiany mimo opóźnienia replikacji.
+Lokalnie można to sprawdzić na dwóch plikach SQLite:
+    DATABASE_REPLICA_URLS=sqlite:////tmp/replica.sqlite3
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import random
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.deprecation import MiddlewareMixin
+from rest_framework.permissions import SAFE_METHODS
+
+REPLICA_PREFIX = 'replica_'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias.startswith(REPLICA_PREFIX)]
+
+
+def client_key(request):
+    """Identyfikator klienta do przypinania: użytkownik albo adres IP."""
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated:
+        return f'user:{user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def pin_to_primary(request):
+    cache.set(f'db_pin:{client_key(request)}', True, getattr(settings, 'REPLICA_PIN_SECONDS', 10))
+
+
+def is_pinned_to_primary(request):
+    return bool(cache.get(f'db_pin:{client_key(request)}'))
+
+
+def can_use_replica(request):
+    return bool(replica_aliases()) and request.method in SAFE_METHODS and not is_pinned_to_primary(request)
+
+
+@contextmanager
+def read_from_replica(enabled=True):
+    """Odczyty ORM wewnątrz bloku idą do repliki (o ile jakaś jest skonfigurowana)."""
+    token = _use_replica.set(enabled)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    """Odczyty do repliki tylko wewnątrz read_from_replica(), zapisy zawsze do 'default'."""
+
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            aliases = replica_aliases()
+            if aliases:
+                return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Repliki mają te same dane co baza główna
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Schemat replik pochodzi z replikacji, nie z migracji
+        return db == 'default'
+
+
+class ReplicaReadMixin:
+    """
+    Mixin dla ViewSetów DRF: akcje z `replica_actions` czytają z repliki,
+    chyba że klient niedawno coś zapisał.
+    """
+    replica_actions = set()
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        # initial() już uwierzytelnił użytkownika, więc można sprawdzić przypięcie
+        if self.action in self.replica_actions and can_use_replica(request):
+            self._replica_token = _use_replica.set(True)
+
+    def dispatch(self, request, *args, **kwargs):
+        self._replica_token = None
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            if self._replica_token is not None:
+                _use_replica.reset(self._replica_token)
+
+
+class ReplicaPinMiddleware(MiddlewareMixin):
+    """Po udanym zapisie przypnij klienta do bazy głównej."""
+
+    def process_response(self, request, response):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request)
+        return response
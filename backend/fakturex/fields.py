@@ -0,0 +1,111 @@
+"""
+Pola modeli wspólne dla aplikacji.
+
+CompressedTextField - TextField zapisywany w bazie skompresowany. Wartość
+w bazie to marker formatu i base64 danych ('zlib:eJz...', 'zstd:KLUv...'),
+więc kolumna zostaje typu text (bez przebudowy tabeli), a wiersze zapisane
+wcześniej czystym tekstem czytają się bez zmian. Po stronie Pythona pole
+zawsze ma zwykły str.
+
+Kodek zapisu wybiera TEXT_COMPRESSION: auto (domyślnie - zstd, gdy jest
+pakiet zstandard, inaczej zlib), zstd, zlib albo none (zapis czystym
+tekstem - np. przed wycofaniem zstandard; odczyt spakowanych wierszy działa
+nadal). Krótkie wartości (poniżej min_length znaków) nie są pakowane -
+base64 i nagłówek zjadłyby zysk.
+
+Wyszukiwanie po treści (contains, startswith) nie widzi spakowanych
+wierszy - pole jest na dane czytane w całości.
+"""
+import base64
+import zlib
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import models
+
+try:
+    import zstandard
+except ImportError:  # opcjonalny - bez niego zlib
+    zstandard = None
+
+ZLIB_MARKER = 'zlib:'
+ZSTD_MARKER = 'zstd:'
+MARKERS = {'zlib': ZLIB_MARKER, 'zstd': ZSTD_MARKER}
+CODECS = ('auto', 'zstd', 'zlib', 'none')
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+# Poniżej tej długości tekst zostaje niespakowany
+DEFAULT_MIN_LENGTH = 256
+
+
+def text_codec():
+    """Kodek zapisu z TEXT_COMPRESSION: 'zstd', 'zlib' albo 'none'."""
+    name = getattr(settings, 'TEXT_COMPRESSION', 'auto')
+    if name not in CODECS:
+        raise ImproperlyConfigured(f'TEXT_COMPRESSION must be one of: {", ".join(CODECS)}')
+    if name == 'auto':
+        return 'zstd' if zstandard is not None else 'zlib'
+    if name == 'zstd' and zstandard is None:
+        raise ImproperlyConfigured('TEXT_COMPRESSION=zstd requires the zstandard package')
+    return name
+
+
+def is_compressed(value):
+    return value.startswith((ZLIB_MARKER, ZSTD_MARKER))
+
+
+def compress_text(value, codec=None):
+    """Tekst -> marker + base64 spakowanych bajtów UTF-8 (codec 'none' - bez zmian)."""
+    codec = codec or text_codec()
+    if codec == 'none':
+        return value
+    raw = value.encode('utf-8')
+    if codec == 'zstd':
+        # ZstdCompressor nie jest bezpieczny wątkowo - nowy na każde wywołanie
+        packed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+    else:
+        packed = zlib.compress(raw, ZLIB_LEVEL)
+    return MARKERS[codec] + base64.b64encode(packed).decode('ascii')
+
+
+def decompress_text(value):
+    """Odwrotność compress_text; tekst bez markera zwracany jest bez zmian."""
+    if value.startswith(ZLIB_MARKER):
+        return zlib.decompress(base64.b64decode(value[len(ZLIB_MARKER):])).decode('utf-8')
+    if value.startswith(ZSTD_MARKER):
+        if zstandard is None:
+            raise ImproperlyConfigured('Reading zstd-compressed text requires the zstandard package')
+        return zstandard.ZstdDecompressor().decompress(base64.b64decode(value[len(ZSTD_MARKER):])).decode('utf-8')
+    return value
+
+
+class CompressedTextField(models.TextField):
+    """TextField przechowywany w bazie w postaci skompresowanej (opis w docstringu modułu)."""
+
+    def __init__(self, *args, min_length=DEFAULT_MIN_LENGTH, **kwargs):
+        self.min_length = min_length
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        if self.min_length != DEFAULT_MIN_LENGTH:
+            kwargs['min_length'] = self.min_length
+        return name, path, args, kwargs
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return decompress_text(value)
+
+    def to_python(self, value):
+        value = super().to_python(value)
+        if isinstance(value, str):
+            return decompress_text(value)
+        return value
+
+    def get_prep_value(self, value):
+        # to_python rozpakowuje, więc wartość spakowana innym kodekiem jest pakowana ponownie
+        value = super().get_prep_value(value)
+        if value is None or len(value) < self.min_length:
+            return value
+        return compress_text(value)
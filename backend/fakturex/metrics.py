@@ -0,0 +1,273 @@
+"""
+Metryki Prometheus i nagłówek Server-Timing.
+
+MetricsMiddleware mierzy każde żądanie: czas widoku (histogram per widok),
+liczbę i łączny czas zapytań SQL, rozmiar odpowiedzi. Zapytania liczy
+execute_wrapper instalowany na każdym połączeniu (sygnał connection_created);
+bieżące żądanie trzymane jest w ContextVar, więc liczą się też zapytania
+z wątków sync_to_async i równoległych widżetów dashboardu.
+
+Pod gunicornem metryki zbierane są w trybie multiprocess - każdy worker
+zapisuje pliki w PROMETHEUS_MULTIPROC_DIR (ustawiane w gunicorn.conf.py),
+a /metrics agreguje je wszystkie. Bez tej zmiennej (runserver, uvicorn)
+używany jest zwykły rejestr procesu.
+
+Dostęp do /metrics: nagłówek "Authorization: Bearer <METRICS_TOKEN>"
+albo zalogowany użytkownik z is_staff (JWT lub sesja admina).
+
+Nagłówek Server-Timing zdradza czasy zapytań, więc dostają go tylko
+użytkownicy is_staff, wszyscy przy DEBUG albo z ustawieniem SERVER_TIMING.
+
+Bez pakietu prometheus_client metryki są wyłączone, Server-Timing działa dalej.
+"""
+import asyncio
+import hmac
+import logging
+import os
+import time
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.http import HttpResponse, JsonResponse
+from django.utils.functional import SimpleLazyObject, empty
+
+logger = logging.getLogger(__name__)
+
+try:
+    import prometheus_client
+    from prometheus_client import Counter, Histogram
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    prometheus_client = None
+    PROMETHEUS_AVAILABLE = False
+
+UNRESOLVED_VIEW = '<unresolved>'
+
+_request_stats = ContextVar('request_stats', default=None)
+
+
+if PROMETHEUS_AVAILABLE:
+    REQUEST_LATENCY = Histogram(
+        'fakturex_http_request_duration_seconds',
+        'Czas obsługi żądania HTTP',
+        ['view', 'method'],
+        buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60),
+    )
+    REQUESTS = Counter(
+        'fakturex_http_requests_total',
+        'Liczba żądań HTTP',
+        ['view', 'method', 'status'],
+    )
+    RESPONSE_SIZE = Histogram(
+        'fakturex_http_response_size_bytes',
+        'Rozmiar odpowiedzi HTTP (bez odpowiedzi strumieniowych)',
+        ['view'],
+        buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304),
+    )
+    DB_QUERIES = Histogram(
+        'fakturex_db_queries_per_request',
+        'Liczba zapytań SQL na żądanie',
+        ['view'],
+        buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100, 500),
+    )
+    DB_TIME = Histogram(
+        'fakturex_db_time_seconds',
+        'Łączny czas zapytań SQL na żądanie',
+        ['view'],
+        buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5),
+    )
+    KSEF_CALLS = Counter(
+        'fakturex_ksef_calls_total',
+        'Wywołania API KSeF',
+        ['operation', 'outcome'],
+    )
+    KSEF_LATENCY = Histogram(
+        'fakturex_ksef_call_duration_seconds',
+        'Czas wywołań API KSeF',
+        ['operation'],
+        buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300),
+    )
+    KSEF_INVOICES = Counter(
+        'fakturex_ksef_invoices_fetched_total',
+        'Faktury pobrane z KSeF',
+    )
+
+
+class RequestStats:
+    """Zapytania SQL jednego żądania (lista czasów - append jest bezpieczny między wątkami)."""
+
+    __slots__ = ('query_times',)
+
+    def __init__(self):
+        self.query_times = []
+
+    @property
+    def query_count(self):
+        return len(self.query_times)
+
+    @property
+    def query_seconds(self):
+        return sum(self.query_times)
+
+
+def _count_queries(execute, sql, params, many, context):
+    stats = _request_stats.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.query_times.append(time.perf_counter() - started)
+
+
+def install_query_counter(sender, connection, **kwargs):
+    # Wrapper obiektu połączenia przeżywa ponowne łączenie - instaluj raz
+    if _count_queries not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_queries)
+
+
+connection_created.connect(install_query_counter, dispatch_uid='fakturex_metrics_query_counter')
+
+
+# ============ Zapis metryk ============
+
+def record_ksef_call(operation, success, seconds):
+    """Wywołanie KSeF (authorize, fetch_invoices, terminate_session)."""
+    if not PROMETHEUS_AVAILABLE:
+        return
+    KSEF_CALLS.labels(operation, 'ok' if success else 'error').inc()
+    KSEF_LATENCY.labels(operation).observe(seconds)
+
+
+def record_ksef_invoices(count):
+    if PROMETHEUS_AVAILABLE and count:
+        KSEF_INVOICES.inc(count)
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED_VIEW
+    return match.view_name or match.route or UNRESOLVED_VIEW
+
+
+def _server_timing_allowed(request):
+    if settings.DEBUG or getattr(settings, 'SERVER_TIMING', False):
+        return True
+    user = getattr(request, 'user', None)
+    # Użytkownik sesji jeszcze niewczytany - nie pytamy o niego bazy (i nie w pętli zdarzeń)
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return False
+    return user.is_authenticated and user.is_staff
+
+
+def _finish(request, response, stats, started):
+    elapsed = time.perf_counter() - started
+    view = _view_name(request)
+
+    if _server_timing_allowed(request):
+        timing = (
+            f'db;dur={stats.query_seconds * 1000:.1f};desc="{stats.query_count} queries", '
+            f'app;dur={elapsed * 1000:.1f}'
+        )
+        # Widok mógł ustawić własne pozycje (np. widżety dashboardu)
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+    elif response.has_header('Server-Timing'):
+        del response['Server-Timing']
+
+    if not PROMETHEUS_AVAILABLE:
+        return response
+    try:
+        REQUEST_LATENCY.labels(view, request.method).observe(elapsed)
+        REQUESTS.labels(view, request.method, str(response.status_code)).inc()
+        DB_QUERIES.labels(view).observe(stats.query_count)
+        DB_TIME.labels(view).observe(stats.query_seconds)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+    except Exception:
+        # Metryki nigdy nie psują odpowiedzi
+        logger.exception('Recording request metrics failed')
+    return response
+
+
+class MetricsMiddleware:
+    """Middleware sync i async - widoki async nie są przełączane do wątku."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._is_async = asyncio.iscoroutinefunction(get_response)
+        if self._is_async:
+            # Django rozpoznaje middleware async po atrybucie _is_coroutine
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return _finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request_stats.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request_stats.reset(token)
+        return _finish(request, response, stats, started)
+
+
+# ============ Endpoint /metrics ============
+
+def _is_authorized(request):
+    expected = getattr(settings, 'METRICS_TOKEN', '')
+    header = request.META.get('HTTP_AUTHORIZATION', '')
+    if expected and header.startswith('Bearer ') and hmac.compare_digest(header[7:].strip(), expected):
+        return True
+
+    user = getattr(request, 'user', None)
+    if user is not None and user.is_authenticated and user.is_staff:
+        return True
+
+    if header.startswith('Bearer '):
+        from rest_framework.exceptions import AuthenticationFailed
+        from users.authentication import CachedJWTAuthentication
+        try:
+            result = CachedJWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return bool(result and result[0].is_staff)
+    return False
+
+
+def registry():
+    """Rejestr do eksportu - w trybie multiprocess zbiera pliki wszystkich workerów."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        from prometheus_client import CollectorRegistry, multiprocess
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return collector_registry
+    return prometheus_client.REGISTRY
+
+
+def metrics_view(request):
+    if not _is_authorized(request):
+        return JsonResponse({'error': 'Brak dostępu do metryk'}, status=403)
+    if not PROMETHEUS_AVAILABLE:
+        return JsonResponse({'error': 'Pakiet prometheus_client nie jest zainstalowany'}, status=503)
+    return HttpResponse(
+        prometheus_client.generate_latest(registry()),
+        content_type=prometheus_client.CONTENT_TYPE_LATEST,
+    )
@@ -0,0 +1,41 @@
+"""
+Middleware plików statycznych zgodne z ASGI.
+
+WhiteNoiseMiddleware jest tylko synchroniczne. Django opakowuje je wtedy
+w sync_to_async, a widok async pod nim (np. fetch_from_ksef, który czeka
+na eksport KSeF) przez cały czas trzyma jedyny wątek "thread sensitive".
+Każde inne żądanie czeka na ten wątek - nawet /health/ i anulowanie
+pobierania. Tutaj w trybie async wyszukanie pliku jest słownikiem
+w pamięci, a tylko serwowanie pliku idzie do wątku.
+"""
+import asyncio
+
+from asgiref.sync import sync_to_async
+from whitenoise.middleware import WhiteNoiseMiddleware
+
+
+class AsyncWhiteNoiseMiddleware(WhiteNoiseMiddleware):
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response=None):
+        super().__init__(get_response)
+        self._is_async = asyncio.iscoroutinefunction(get_response)
+        if self._is_async:
+            # Django rozpoznaje middleware async po atrybucie _is_coroutine
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self._is_async:
+            return self.__acall__(request)
+        return super().__call__(request)
+
+    async def __acall__(self, request):
+        if self.autorefresh:
+            static_file = await sync_to_async(self.find_file)(request.path_info)
+        else:
+            static_file = self.files.get(request.path_info)
+        if static_file is not None:
+            return await sync_to_async(self.serve)(static_file, request)
+        return await self.get_response(request)
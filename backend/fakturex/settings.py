@@ -35,8 +35,11 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Pierwszy - mierzy całe żądanie (metryki Prometheus + Server-Timing)
+    'fakturex.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    # WhiteNoise w wersji async - sync middleware blokowałoby wątek widokom async
+    'fakturex.middleware.AsyncWhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -65,6 +68,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'fakturex.wsgi.application'
+ASGI_APPLICATION = 'fakturex.asgi.application'
 
 # Database
 DATABASES = {
@@ -74,8 +78,35 @@ DATABASES = {
     )
 }
 
+# Opcjonalne repliki do odczytu raportów (lista URL-i po przecinku) - patrz fakturex/db_router.py
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get('DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+for index, replica_url in enumerate(DATABASE_REPLICA_URLS):
+    DATABASES[f'replica_{index}'] = dj_database_url.parse(replica_url, conn_max_age=600)
+    # W testach replika to ta sama baza co default
+    DATABASES[f'replica_{index}']['TEST'] = {'MIRROR': 'default'}
+
+# Ile sekund po zapisie klient czyta wyłącznie z bazy głównej
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', '10'))
+
+if DATABASE_REPLICA_URLS:
+    DATABASE_ROUTERS = ['fakturex.db_router.ReplicaRouter']
+    MIDDLEWARE.append('fakturex.db_router.ReplicaPinMiddleware')
+
+# Token dla scrapera Prometheusa (Authorization: Bearer ...); bez niego /metrics tylko dla is_staff
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+# Nagłówek Server-Timing (czasy SQL i widoku) dla wszystkich; bez tego tylko przy DEBUG i dla is_staff
+SERVER_TIMING = os.environ.get('SERVER_TIMING', 'false').lower() == 'true'
+
 # Password validation defined at the bottom of settings
 
+# Cache - domyślnie plikowy, współdzielony przez wszystkie workery gunicorna
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.filebased.FileBasedCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', '/tmp/fakturex_cache'),
+    }
+}
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 
@@ -98,6 +129,9 @@ CORS_ALLOWED_ORIGINS = os.environ.get(
     'http://localhost:5173,http://127.0.0.1:5173,https://fakturex.up.railway.app'
 ).split(',')
 CORS_ALLOW_CREDENTIALS = True
+# Wybór firmy (customers/tenancy.py) - nagłówek spoza domyślnej listy
+from corsheaders.defaults import default_headers
+CORS_ALLOW_HEADERS = (*default_headers, 'x-company-id')
 
 # CSRF settings for Railway
 CSRF_TRUSTED_ORIGINS = os.environ.get(
@@ -111,7 +145,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'users.authentication.CachedJWTAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -128,6 +162,55 @@ SIMPLE_JWT = {
     'AUTH_HEADER_TYPES': ('Bearer',),
 }
 
+# Jak długo (s) uwierzytelniony użytkownik jest trzymany w pamięci procesu
+JWT_USER_CACHE_SECONDS = int(os.environ.get('JWT_USER_CACHE_SECONDS', '60'))
+
+# Szczyt pamięci synchronizacji KSeF (tracemalloc) w historii KSeFSyncRun - spowalnia cały
+# proces workera, więc domyślnie wyłączony; włączać na czas diagnozy
+KSEF_TRACE_MEMORY = os.environ.get('KSEF_TRACE_MEMORY', 'false').lower() == 'true'
+
+# Odpytywanie o gotowość eksportu faktur z KSeF (co ile sekund, jak długo maksymalnie)
+KSEF_EXPORT_POLL_SECONDS = float(os.environ.get('KSEF_EXPORT_POLL_SECONDS', '3'))
+KSEF_EXPORT_TIMEOUT_SECONDS = float(os.environ.get('KSEF_EXPORT_TIMEOUT_SECONDS', '120'))
+
+# Równoległe parsowanie paczek eksportu KSeF: liczba procesów (domyślnie 1 = w bieżącym procesie,
+# 0 = liczba rdzeni) i minimalna liczba faktur w paczce, od której opłaca się użyć puli.
+# Pula jest opcjonalna - każdy worker gunicorna uruchamia własne procesy
+KSEF_PARSE_WORKERS = int(os.environ.get('KSEF_PARSE_WORKERS', '1'))
+KSEF_PARSE_PARALLEL_MIN = int(os.environ.get('KSEF_PARSE_PARALLEL_MIN', '200'))
+# Backend XML parsera faktur wybiera zmienna KSEF_XML_BACKEND (auto/lxml/etree) - czytana
+# bezpośrednio w invoices/ksef_xml.py, bo procesy robocze parsowania nie ładują Django
+
+# Strumień postępu pobierania z KSeF (SSE): co ile sekund odpytywać tabelę zdarzeń,
+# jak długo maksymalnie trzymać połączenie, po jakim czasie usuwać stare zdarzenia
+# i jak długo ważny jest jednorazowy token otwarcia strumienia
+KSEF_PROGRESS_POLL_SECONDS = float(os.environ.get('KSEF_PROGRESS_POLL_SECONDS', '0.5'))
+KSEF_PROGRESS_STREAM_SECONDS = int(os.environ.get('KSEF_PROGRESS_STREAM_SECONDS', '300'))
+KSEF_PROGRESS_RETENTION_SECONDS = int(os.environ.get('KSEF_PROGRESS_RETENTION_SECONDS', '3600'))
+KSEF_PROGRESS_TOKEN_SECONDS = int(os.environ.get('KSEF_PROGRESS_TOKEN_SECONDS', '60'))
+
+# Feed zmian /api/changes/: maksymalna liczba wierszy na stronę, o ile sekund kolejna
+# synchronizacja cofa się przed kursor (transakcje widoczne z opóźnieniem) i jak długo
+# trzymamy ślady usunięć - klient ze starszym kursorem dostaje pełny stan
+CHANGES_FEED_PAGE_SIZE = int(os.environ.get('CHANGES_FEED_PAGE_SIZE', '1000'))
+CHANGES_FEED_OVERLAP_SECONDS = int(os.environ.get('CHANGES_FEED_OVERLAP_SECONDS', '60'))
+CHANGES_TOMBSTONE_RETENTION_DAYS = int(os.environ.get('CHANGES_TOMBSTONE_RETENTION_DAYS', '30'))
+
+# Harmonogram synchronizacji KSeF firm (manage.py sync_ksef_companies): ile firm naraz
+# (wątki), ile dni wstecz przy pierwszej synchronizacji i jak długo trzymać blokadę firmy
+KSEF_SYNC_WORKERS = int(os.environ.get('KSEF_SYNC_WORKERS', '4'))
+KSEF_SYNC_INITIAL_DAYS = int(os.environ.get('KSEF_SYNC_INITIAL_DAYS', '30'))
+KSEF_SYNC_LOCK_SECONDS = int(os.environ.get('KSEF_SYNC_LOCK_SECONDS', '1800'))
+
+# Kompresja dużych pól tekstowych (dane KSeF faktur, fakturex/fields.py): auto (zstd, gdy
+# zainstalowany zstandard, inaczej zlib), zstd, zlib albo none; istniejące wiersze
+# przepakowuje manage.py compress_ksef_payloads
+TEXT_COMPRESSION = os.environ.get('TEXT_COMPRESSION', 'auto')
+
+# Adres lokalnego symulatora KSeF (manage.py ksef_simulator) - tylko do testów obciążeniowych,
+# zastępuje SDK ksef2 i adresy API Ministerstwa
+KSEF_SIMULATOR_URL = os.environ.get('KSEF_SIMULATOR_URL', '').rstrip('/')
+
 # ==========================================
 # SECURITY SETTINGS FOR PRODUCTION
 # ==========================================
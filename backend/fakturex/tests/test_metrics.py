@@ -0,0 +1,16 @@
+"""
+Nagłówek Server-Timing (fakturex/metrics.py) - tylko dla personelu, przy
+DEBUG albo SERVER_TIMING=true.
+"""
+
+
+def test_server_timing_only_for_staff(company, api_client, member, jwt_client, settings):
+    settings.DEBUG = False
+    assert 'stats;dur=' in api_client.get('/api/dashboard/')['Server-Timing']
+
+    client = jwt_client(member('timing-user', company))
+    assert not client.get('/api/dashboard/').has_header('Server-Timing')
+    assert not client.get('/api/invoices/').has_header('Server-Timing')
+
+    settings.SERVER_TIMING = True
+    assert 'db;dur=' in client.get('/api/invoices/')['Server-Timing']
@@ -0,0 +1,84 @@
+"""
+Odczyty z replik bazy (fakturex/db_router.py).
+
+Testowa baza nie ma repliki, więc replica_aliases() zwraca udawany alias,
+a RecordingRouter zapisuje, dokąd poszedłby odczyt faktur, i kieruje go
+do 'default'. Akcje raportowe czytają z repliki, pozostałe z bazy głównej,
+a klient po zapisie jest przypięty do bazy głównej na REPLICA_PIN_SECONDS.
+"""
+import pytest
+from django.conf import settings
+from django.core.cache import cache
+from django.test import override_settings
+
+from fakturex import db_router
+from invoices.models import Invoice
+
+_reads = []
+
+
+class RecordingRouter(db_router.ReplicaRouter):
+
+    def db_for_read(self, model, **hints):
+        alias = super().db_for_read(model, **hints)
+        if model is Invoice:
+            _reads.append(alias)
+        return 'default'
+
+
+@pytest.fixture
+def replica(db, monkeypatch):
+    monkeypatch.setattr(db_router, 'replica_aliases', lambda: ['replica_0'])
+    with override_settings(
+        DATABASE_ROUTERS=['fakturex.tests.test_replicas.RecordingRouter'],
+        MIDDLEWARE=settings.MIDDLEWARE + ['fakturex.db_router.ReplicaPinMiddleware'],
+    ):
+        yield
+
+
+@pytest.fixture
+def pinnable(company, member):
+    """pinnable(username) - użytkownik firmy testu bez przypięcia do bazy głównej."""
+    def create(username):
+        user = member(username, company)
+        # Przypięcie z poprzedniego testu (id użytkownika z wycofanej transakcji wraca)
+        cache.delete(f'db_pin:user:{user.pk}')
+        return user
+
+    return create
+
+
+def _databases(client, method, path):
+    _reads.clear()
+    response = getattr(client, method)(path)
+    assert response.status_code == 200, response.content[:500]
+    return set(_reads)
+
+
+def test_replica_routing(replica):
+    router = db_router.ReplicaRouter()
+    assert router.db_for_read(Invoice) == 'default'
+    with db_router.read_from_replica():
+        assert router.db_for_read(Invoice) == 'replica_0'
+        assert router.db_for_write(Invoice) == 'default'
+    assert not router.allow_migrate('replica_0', 'invoices')
+
+
+def test_replica_pinned_after_write(replica, pinnable, jwt_client, make_invoice):
+    invoice = make_invoice()
+    user = pinnable('replica-writer')
+    client = jwt_client(user)
+    other = jwt_client(pinnable('replica-reader'))
+
+    # Lista z repliki, szczegóły z bazy głównej
+    assert _databases(client, 'get', '/api/invoices/') == {'replica_0'}
+    assert _databases(client, 'get', f'/api/invoices/{invoice.pk}/') == {'default'}
+
+    # Po zapisie klient czyta z bazy głównej, inni dalej z repliki
+    _databases(client, 'post', f'/api/invoices/{invoice.pk}/mark_paid/')
+    assert _databases(client, 'get', '/api/invoices/') == {'default'}
+    assert _databases(other, 'get', '/api/invoices/') == {'replica_0'}
+
+    # Po wygaśnięciu przypięcia znów replika
+    cache.delete(f'db_pin:user:{user.pk}')
+    assert _databases(client, 'get', '/api/invoices/') == {'replica_0'}
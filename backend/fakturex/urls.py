@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from invoices.async_views import dashboard
+from invoices.views import ChangesView
+from fakturex.metrics import metrics_view
 
 def api_root(request):
     return JsonResponse({
@@ -8,8 +11,11 @@ def api_root(request):
         'message': 'Fakturex API',
         'endpoints': {
             'invoices': '/api/invoices/',
+            'dashboard': '/api/dashboard/',
+            'changes': '/api/changes/',
             'contractors': '/api/contractors/',
             'settings': '/api/settings/',
+            'companies': '/api/companies/',
         }
     })
 
@@ -20,8 +26,11 @@ def health_check(request):
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('health/', health_check, name='health-check'),
+    path('metrics', metrics_view, name='metrics'),
     path('api/', api_root, name='api-root'),
+    path('api/dashboard/', dashboard, name='dashboard'),
+    path('api/changes/', ChangesView.as_view(), name='changes'),
     path('api/invoices/', include('invoices.urls')),
-    path('api/', include('customers.urls')),  # contractors/ i settings/
+    path('api/', include('customers.urls')),  # contractors/, settings/ i companies/
     path('api/auth/', include('users.urls')),  # login, logout, me, refresh
 ]
\ No newline at end of file
@@ -0,0 +1,26 @@
+"""
+Konfiguracja gunicorna (wczytywana automatycznie z katalogu roboczego).
+
+Metryki Prometheus w trybie multiprocess: każdy worker zapisuje swoje
+liczniki w PROMETHEUS_MULTIPROC_DIR, /metrics agreguje wszystkie pliki.
+Katalog czyszczony jest przy starcie mastera (stare PID-y zawyżałyby
+liczniki), a pliki martwych workerów oznaczane w child_exit.
+"""
+import os
+import shutil
+
+# Musi być ustawione przed importem prometheus_client w workerach
+metrics_dir = os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/fakturex_metrics')
+
+
+def on_starting(server):
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+
+def child_exit(server, worker):
+    try:
+        from prometheus_client import multiprocess
+    except ImportError:
+        return
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,90 @@
+"""
+Raport czasu importów przy starcie (python -X importtime).
+
+Uruchamia osobny interpreter, który robi to samo co worker przy starcie
+(django.setup(), aplikacja ASGI, URLconf) i podsumowuje wyjście -X importtime:
+łączny czas, najwolniejsze pakiety najwyższego poziomu i pojedyncze moduły.
+Kończy się kodem 1, gdy łączny czas przekracza budżet.
+
+Użycie:
+    python importtime_report.py [--budget-ms 1500] [--top 15]
+"""
+import argparse
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+BOOT_SNIPPET = (
+    "import django; django.setup(); "
+    "import fakturex.asgi; "
+    "from django.urls import get_resolver; get_resolver().url_patterns"
+)
+
+# Pakiety, które nie powinny być ładowane przy starcie (importowane leniwie)
+LAZY_PACKAGES = ('ksef2',)
+
+
+def run_importtime():
+    env = dict(os.environ)
+    env.setdefault('DJANGO_SETTINGS_MODULE', 'fakturex.settings')
+    env.setdefault('SECRET_KEY', 'importtime-report')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', BOOT_SNIPPET],
+        env=env, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        # Ostatnie linie stderr to traceback, nie importtime
+        sys.stderr.write(result.stderr[-2000:])
+        sys.exit(result.returncode)
+    return result.stderr
+
+
+def parse(stderr):
+    """Zwraca listę (moduł, self_us, cumulative_us, głębokość)."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        parts = line[len('import time:'):].split('|')
+        self_us, cumulative_us, name = int(parts[0]), int(parts[1]), parts[2]
+        depth = (len(name) - len(name.lstrip(' '))) // 2
+        rows.append((name.strip(), self_us, cumulative_us, depth))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import-time budget report for the boot path')
+    parser.add_argument('--budget-ms', type=float, default=1500.0)
+    parser.add_argument('--top', type=int, default=15)
+    args = parser.parse_args()
+
+    rows = parse(run_importtime())
+    total_ms = sum(self_us for _, self_us, _, _ in rows) / 1000
+
+    packages = defaultdict(int)
+    for name, self_us, _, _ in rows:
+        packages[name.split('.')[0]] += self_us
+
+    print(f'=== Import time (boot path): {total_ms:.0f} ms, {len(rows)} modules, budget {args.budget_ms:.0f} ms ===')
+
+    print(f'\nTop {args.top} top-level packages (self time):')
+    for name, us in sorted(packages.items(), key=lambda item: -item[1])[:args.top]:
+        print(f'  {us / 1000:8.1f} ms  {name}')
+
+    print(f'\nTop {args.top} modules (cumulative):')
+    for name, _, cumulative_us, _ in sorted(rows, key=lambda row: -row[2])[:args.top]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  {name}')
+
+    eager = sorted(p for p in packages if p in LAZY_PACKAGES)
+    if eager:
+        print(f'\nWARNING: lazily-imported packages loaded at boot: {", ".join(eager)}')
+
+    if total_ms > args.budget_ms:
+        print(f'\nOVER BUDGET by {total_ms - args.budget_ms:.0f} ms')
+        sys.exit(1)
+    print('\nWithin budget')
+
+
+if __name__ == '__main__':
+    main()
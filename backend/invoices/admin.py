@@ -1,11 +1,11 @@
 from django.contrib import admin
-from .models import Invoice
+from .models import Invoice, KSeFSyncRun
 
 
 @admin.register(Invoice)
 class InvoiceAdmin(admin.ModelAdmin):
-    list_display = ['numer', 'dostawca', 'data', 'kwota', 'termin_platnosci', 'status', 'is_overdue']
-    list_filter = ['status', 'data', 'termin_platnosci']
+    list_display = ['numer', 'dostawca', 'data', 'kwota', 'termin_platnosci', 'status', 'is_overdue', 'company']
+    list_filter = ['company', 'status', 'data', 'termin_platnosci']
     search_fields = ['numer', 'dostawca', 'ksef_numer']
     date_hierarchy = 'data'
     list_editable = ['status']
@@ -13,7 +13,7 @@ class InvoiceAdmin(admin.ModelAdmin):
     
     fieldsets = (
         ('Dane faktury', {
-            'fields': ('numer', 'dostawca', 'kontrahent', 'data', 'kwota')
+            'fields': ('company', 'numer', 'dostawca', 'kontrahent', 'data', 'kwota')
         }),
         ('Płatność', {
             'fields': ('termin_platnosci', 'status')
@@ -31,4 +31,12 @@ class InvoiceAdmin(admin.ModelAdmin):
     def is_overdue(self, obj):
         return obj.is_overdue
     is_overdue.boolean = True
-    is_overdue.short_description = 'Przeterminowana'
\ No newline at end of file
+    is_overdue.short_description = 'Przeterminowana'
+
+
+@admin.register(KSeFSyncRun)
+class KSeFSyncRunAdmin(admin.ModelAdmin):
+    list_display = ['started_at', 'company', 'trigger', 'environment', 'outcome', 'duration_ms', 'invoices_parsed', 'invoices_saved', 'bytes_downloaded', 'peak_memory_bytes']
+    list_filter = ['trigger', 'outcome', 'environment', 'company']
+    date_hierarchy = 'started_at'
+    readonly_fields = [field.name for field in KSeFSyncRun._meta.fields]
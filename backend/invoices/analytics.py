@@ -0,0 +1,178 @@
+"""
+Analityka wydatków per dostawca.
+
+Wszystko liczone jest jednym zapytaniem SQL: GROUP BY (dostawca, miesiąc)
+plus funkcje okna (LAG, SUM() OVER, DENSE_RANK) - bez agregacji w Pythonie.
+Dostawca to powiązany kontrahent, a gdy go brak - znormalizowana nazwa
+z pola `dostawca` (małe litery, bez skrajnych spacji).
+"""
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import Case, CharField, Func, Max, Sum, Value, When, Window
+from django.db.models.functions import Cast, Coalesce, Concat, Lag, Lower, Trim, TruncMonth
+
+from .models import Invoice
+
+# Wyniki trzymamy w cache per okres; każda zmiana faktury podbija wersję
+ANALYTICS_CACHE_TIMEOUT = 600
+ANALYTICS_VERSION_KEY = 'invoices:analytics_version'
+
+
+class WindowSum(Func):
+    """
+    SUM(...) jako funkcja okna nad wartością już zagregowaną.
+    Django nie pozwala na Sum(Sum(...)), a SUM(SUM(x)) OVER (...) to poprawny SQL.
+    """
+    function = 'SUM'
+    window_compatible = True
+
+
+def get_analytics_version():
+    return cache.get_or_set(ANALYTICS_VERSION_KEY, 1, None)
+
+
+def bump_analytics_version():
+    """Unieważnij wszystkie zapisane wyniki analityk."""
+    try:
+        cache.incr(ANALYTICS_VERSION_KEY)
+    except ValueError:
+        cache.set(ANALYTICS_VERSION_KEY, 1, None)
+
+
+def supplier_key_expression():
+    """Klucz dostawcy: 'k:<id kontrahenta>' lub 'd:<znormalizowana nazwa>'."""
+    return Case(
+        When(kontrahent__isnull=False, then=Concat(Value('k:'), Cast('kontrahent_id', CharField()))),
+        default=Concat(Value('d:'), Lower(Trim('dostawca'))),
+        output_field=CharField(),
+    )
+
+
+def _supplier_month_queryset(company, date_from, date_to):
+    """Sumy per (dostawca, miesiąc) z poprzednim miesiącem i sumami okna."""
+    klucz = supplier_key_expression()
+    miesiac = TruncMonth('data')
+    return (
+        Invoice.objects.for_company(company)
+        .filter(data__gte=date_from, data__lte=date_to)
+        .annotate(klucz=klucz, miesiac=miesiac)
+        .order_by()
+        .values('klucz', 'miesiac')
+        .annotate(
+            nazwa=Max(Coalesce('kontrahent__nazwa', Trim('dostawca'))),
+            kontrahent_ref=Max('kontrahent_id'),
+            suma=Sum('kwota'),
+            poprzedni_miesiac=Window(Lag(miesiac), partition_by=[klucz], order_by=miesiac.asc()),
+            poprzednia_suma=Window(Lag(Sum('kwota')), partition_by=[klucz], order_by=miesiac.asc()),
+            suma_dostawcy=Window(WindowSum(Sum('kwota')), partition_by=[klucz]),
+            suma_okresu=Window(WindowSum(Sum('kwota'))),
+        )
+    )
+
+
+def _to_decimal(value):
+    if value is None:
+        return None
+    return Decimal(str(value)).quantize(Decimal('0.01'))
+
+
+def _month_key(value):
+    # SQLite zwraca tekst 'YYYY-MM-DD', PostgreSQL obiekt date
+    return str(value)[:7] if value else None
+
+
+def _previous_month_key(month_key):
+    year, month = int(month_key[:4]), int(month_key[5:7])
+    if month == 1:
+        return f'{year - 1}-12'
+    return f'{year}-{month - 1:02d}'
+
+
+def _growth_percent(current, previous):
+    if not previous:
+        return None
+    return round(float((current - previous) / previous * 100), 2)
+
+
+def compute_supplier_spend(company, date_from, date_to, limit=10):
+    """
+    Top-N dostawców firmy wg wydatków w okresie, z udziałem w całości
+    i dynamiką miesiąc do miesiąca. Jedno zapytanie do bazy.
+    """
+    qs = _supplier_month_queryset(company, date_from, date_to)
+    connection = connections[qs.db]
+    inner_sql, params = qs.query.get_compiler(qs.db).as_sql()
+
+    # Ranking musi być liczony na poziomie wyżej - funkcji okna nie można zagnieżdżać
+    sql = f"""
+        SELECT klucz, miesiac, nazwa, kontrahent_ref, suma, poprzedni_miesiac,
+               poprzednia_suma, suma_dostawcy, suma_okresu, ranking
+        FROM (
+            SELECT s.*, DENSE_RANK() OVER (ORDER BY s.suma_dostawcy DESC, s.klucz) AS ranking
+            FROM ({inner_sql}) s
+        ) r
+        WHERE r.ranking <= %s
+        ORDER BY r.ranking, r.miesiac
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [*params, limit])
+        rows = cursor.fetchall()
+
+    suppliers = []
+    suma_okresu = Decimal('0.00')
+    current = None
+    for (klucz, miesiac, nazwa, kontrahent_ref, suma, poprzedni_miesiac,
+         poprzednia_suma, suma_dostawcy, suma_calosci, ranking) in rows:
+        suma = _to_decimal(suma)
+        suma_okresu = _to_decimal(suma_calosci)
+        month_key = _month_key(miesiac)
+
+        # LAG zwraca poprzedni miesiąc z danymi - przy luce poprzedni miesiąc to 0
+        if _month_key(poprzedni_miesiac) != _previous_month_key(month_key):
+            poprzednia_suma = Decimal('0.00') if poprzedni_miesiac else None
+        else:
+            poprzednia_suma = _to_decimal(poprzednia_suma)
+
+        if current is None or current['klucz'] != klucz:
+            suma_dostawcy = _to_decimal(suma_dostawcy)
+            current = {
+                'ranking': ranking,
+                'klucz': klucz,
+                'kontrahent_id': kontrahent_ref,
+                'nazwa': nazwa,
+                'suma': float(suma_dostawcy),
+                'udzial_procent': round(float(suma_dostawcy / suma_okresu * 100), 2) if suma_okresu else 0.0,
+                'wzrost_mom_procent': None,
+                'miesiace': [],
+            }
+            suppliers.append(current)
+
+        growth = _growth_percent(suma, poprzednia_suma)
+        current['miesiace'].append({
+            'miesiac': month_key,
+            'suma': float(suma),
+            'poprzednia_suma': float(poprzednia_suma) if poprzednia_suma is not None else None,
+            'wzrost_procent': growth,
+        })
+        # Dynamika dostawcy = ostatni miesiąc okresu względem poprzedniego
+        current['wzrost_mom_procent'] = growth
+
+    return {
+        'date_from': str(date_from),
+        'date_to': str(date_to),
+        'limit': limit,
+        'suma_okresu': float(suma_okresu),
+        'dostawcy': suppliers,
+    }
+
+
+def supplier_spend(company, date_from, date_to, limit=10):
+    """Wersja z cache - klucz zależy od firmy, okresu, limitu i wersji danych."""
+    cache_key = f'invoices:supplier_spend:{get_analytics_version()}:{company.pk}:{date_from}:{date_to}:{limit}'
+    result = cache.get(cache_key)
+    if result is None:
+        result = compute_supplier_spend(company, date_from, date_to, limit)
+        cache.set(cache_key, result, ANALYTICS_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class InvoicesConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'invoices'
+    verbose_name = 'Faktury'
+
+    def ready(self):
+        # Podłącz sygnały (unieważnianie cache analityki itp.)
+        from . import signals  # noqa: F401
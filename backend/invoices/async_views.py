@@ -0,0 +1,624 @@
+"""
+Widoki asynchroniczne dla endpointów ograniczonych przez I/O.
+
+Akcje KSeF spędzają prawie cały czas na czekaniu na API Ministerstwa.
+Pod serwerem ASGI (uvicorn) wywołania KSeF idą do puli wątków
+(thread_sensitive=False), a pętla zdarzeń dalej obsługuje ruch CRUD.
+Praca z ORM przechodzi przez sync_to_async (wątek "thread sensitive").
+
+DRF nie wspiera widoków async, dlatego autoryzację JWT robimy tymi samymi
+klasami co w REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES']. Firmę
+żądania (customers/tenancy.py) wyznacza dekorator - widok bierze ją
+z get_request_company(request) bez zapytań do bazy.
+"""
+from datetime import date, datetime, timedelta
+from functools import wraps
+import asyncio
+import json
+import os
+import time
+import traceback
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from django.db.models import Sum, Count, Q
+from django.http import JsonResponse
+from rest_framework import exceptions, status
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from customers.tenancy import get_request_company
+from fakturex.db_router import can_use_replica, read_from_replica
+from .models import Invoice
+from .serializers import InvoiceSerializer
+
+
+def run_in_thread(func, *args, **kwargs):
+    """Uruchom blokujące wywołanie sieciowe (KSeF) poza pętlą zdarzeń."""
+    return sync_to_async(func, thread_sensitive=False)(*args, **kwargs)
+
+
+def async_api_view(methods, replica=False):
+    """
+    Dekorator widoku async: metoda HTTP, autoryzacja JWT, odpowiedź JSON.
+    Widok dostaje obiekt rest_framework.request.Request (query_params, data, user).
+    replica=True - odczyty mogą iść do repliki bazy (patrz fakturex/db_router.py).
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            if request.method not in methods:
+                return JsonResponse(
+                    {'detail': f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED
+                )
+
+            drf_request = Request(
+                request,
+                parsers=[JSONParser()],
+                authenticators=[auth() for auth in api_settings.DEFAULT_AUTHENTICATION_CLASSES],
+            )
+            try:
+                user = await sync_to_async(lambda: drf_request.user)()
+            except exceptions.APIException as exc:
+                return JsonResponse({'detail': str(exc.detail)}, status=exc.status_code)
+
+            if not user or not user.is_authenticated:
+                response = JsonResponse(
+                    {'detail': 'Authentication credentials were not provided.'},
+                    status=status.HTTP_401_UNAUTHORIZED
+                )
+                response['WWW-Authenticate'] = 'Bearer realm="api"'
+                return response
+
+            # Dostępy do firm z bazy głównej - świeżo nadany dostęp działa od razu
+            try:
+                await sync_to_async(get_request_company)(drf_request)
+            except exceptions.PermissionDenied as exc:
+                return JsonResponse({'error': str(exc.detail)}, status=exc.status_code)
+
+            with read_from_replica(replica and can_use_replica(request)):
+                return await view(drf_request, *args, **kwargs)
+
+        # Autoryzacja tokenem JWT - CSRF nie dotyczy (tak jak w APIView)
+        wrapped.csrf_exempt = True
+        return wrapped
+    return decorator
+
+
+# ============ DASHBOARD ============
+
+def get_available_years(company, today=None):
+    years = Invoice.objects.for_company(company).dates('data', 'year', order='DESC')
+    year_list = [d.year for d in years]
+
+    # Dodaj bieżący rok jeśli nie ma
+    current_year = (today or date.today()).year
+    if current_year not in year_list:
+        year_list.insert(0, current_year)
+
+    return {'years': year_list}
+
+
+def get_stats(company, current_month_only=False, today=None):
+    today = today or date.today()
+
+    # Wszystkie faktury firmy (lub tylko z bieżącego miesiąca)
+    all_invoices = Invoice.objects.for_company(company)
+    if current_month_only:
+        all_invoices = all_invoices.in_period(today.year, today.month)
+
+    # Wszystkie liczniki i sumy jednym zapytaniem (agregaty warunkowe)
+    zaplacone = Q(status='zaplacona')
+    niezaplacone = Q(status='niezaplacona')
+    przeterminowane = niezaplacone & Q(termin_platnosci__lt=today)
+    blisko_terminu = niezaplacone & Q(
+        termin_platnosci__gte=today,
+        termin_platnosci__lte=today + timedelta(days=3)
+    )
+    totals = all_invoices.aggregate(
+        total_count=Count('id'),
+        zaplacone_count=Count('id', filter=zaplacone),
+        niezaplacone_count=Count('id', filter=niezaplacone),
+        przeterminowane_count=Count('id', filter=przeterminowane),
+        blisko_terminu_count=Count('id', filter=blisko_terminu),
+        suma_wszystkich=Sum('kwota'),
+        suma_zaplaconych=Sum('kwota', filter=zaplacone),
+        suma_niezaplaconych=Sum('kwota', filter=niezaplacone),
+        suma_przeterminowanych=Sum('kwota', filter=przeterminowane),
+    )
+
+    return {
+        'total_count': totals['total_count'],
+        'zaplacone_count': totals['zaplacone_count'],
+        'niezaplacone_count': totals['niezaplacone_count'],
+        'przeterminowane_count': totals['przeterminowane_count'],
+        'blisko_terminu_count': totals['blisko_terminu_count'],
+        'suma_wszystkich': float(totals['suma_wszystkich'] or 0),
+        'suma_zaplaconych': float(totals['suma_zaplaconych'] or 0),
+        'suma_niezaplaconych': float(totals['suma_niezaplaconych'] or 0),
+        'suma_przeterminowanych': float(totals['suma_przeterminowanych'] or 0),
+        'current_month': current_month_only,
+        'month_name': today.strftime('%B %Y') if current_month_only else None,
+    }
+
+
+def get_recent_unpaid(company, limit=5, today=None):
+    today = today or date.today()
+
+    # Niezapłacone faktury - przeterminowane najpierw, potem po terminie płatności
+    invoices = (
+        Invoice.objects.for_company(company).filter(status='niezaplacona')
+        .select_related('kontrahent')
+        .defer('ksef_xml')
+        .with_due_info(today)
+        .order_by('-is_overdue', 'termin_platnosci')[:limit]
+    )
+
+    return InvoiceSerializer(invoices, many=True).data
+
+
+def _limit_param(request, default=5):
+    """Parametr limit (1-100) albo None, gdy nie jest liczbą."""
+    try:
+        return min(max(int(request.query_params.get('limit', default)), 1), 100)
+    except ValueError:
+        return None
+
+
+def _invalid_limit():
+    return JsonResponse({'error': 'Nieprawidłowy parametr limit, oczekiwana liczba.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+
+def _timed(func, *args):
+    """Wywołaj widżet dashboardu; zwraca (wynik, czas w ms)."""
+    started = time.perf_counter()
+    return func(*args), (time.perf_counter() - started) * 1000
+
+
+def _timed_in_worker(func, *args):
+    """Widżet w wątku z puli - własne połączenie DB, sprzątane jak po żądaniu."""
+    close_old_connections()
+    try:
+        return _timed(func, *args)
+    finally:
+        close_old_connections()
+
+
+def get_dashboard_sequential(widgets):
+    return {name: _timed(func, *args) for name, (func, args) in widgets.items()}
+
+
+@async_api_view(['GET'], replica=True)
+async def available_years(request):
+    """
+    Zwraca listę lat, dla których istnieją faktury.
+    """
+    return JsonResponse(await sync_to_async(get_available_years)(get_request_company(request)))
+
+
+@async_api_view(['GET'], replica=True)
+async def stats(request):
+    """
+    Statystyki faktur dla dashboardu.
+    Opcjonalny parametr current_month=true dla statystyk tylko z bieżącego miesiąca.
+    """
+    current_month_only = request.query_params.get('current_month') == 'true'
+    return JsonResponse(await sync_to_async(get_stats)(get_request_company(request), current_month_only))
+
+
+@async_api_view(['GET'], replica=True)
+async def recent_unpaid(request):
+    """
+    Ostatnie niezapłacone faktury dla dashboardu.
+    Domyślnie zwraca 5 faktur, można zmienić parametrem limit (1-100).
+    """
+    limit = _limit_param(request)
+    if limit is None:
+        return _invalid_limit()
+    return JsonResponse(await sync_to_async(get_recent_unpaid)(get_request_company(request), limit), safe=False)
+
+
+@async_api_view(['GET'], replica=True)
+async def dashboard(request):
+    """
+    Wszystkie widżety dashboardu w jednym żądaniu: statystyki (całość i bieżący
+    miesiąc), niezapłacone faktury i lata. Wspólna data "dziś" dla wszystkich.
+    Na PostgreSQL widżety liczą się równolegle (osobne wątki i połączenia),
+    na SQLite kolejno. Czasy widżetów w nagłówku Server-Timing.
+    """
+    started = time.perf_counter()
+    today = date.today()
+    company = get_request_company(request)
+    limit = _limit_param(request)
+    if limit is None:
+        return _invalid_limit()
+    widgets = {
+        'stats': (get_stats, (company, False, today)),
+        'stats_month': (get_stats, (company, True, today)),
+        'recent_unpaid': (get_recent_unpaid, (company, limit, today)),
+        'available_years': (get_available_years, (company, today)),
+    }
+
+    if connection.vendor == 'sqlite':
+        results = await sync_to_async(get_dashboard_sequential)(widgets)
+    else:
+        values = await asyncio.gather(*(
+            run_in_thread(_timed_in_worker, func, *args) for func, args in widgets.values()
+        ))
+        results = dict(zip(widgets, values))
+
+    response = JsonResponse({
+        'today': today.isoformat(),
+        'stats': results['stats'][0],
+        'stats_month': results['stats_month'][0],
+        'recent_unpaid': results['recent_unpaid'][0],
+        'available_years': results['available_years'][0]['years'],
+    })
+    timings = [f'{name};dur={ms:.1f}' for name, (_, ms) in results.items()]
+    timings.append(f'total;dur={(time.perf_counter() - started) * 1000:.1f}')
+    response['Server-Timing'] = ', '.join(timings)
+    return response
+
+
+# ============ KSeF ============
+
+@async_api_view(['POST'])
+async def refresh_ksef_data(request, pk):
+    """
+    Odśwież dane KSeF dla faktury - pobierz ponownie z KSeF bez zmiany statusu płatności.
+    """
+    from customers.encryption import decrypt_token
+    from .ksef_service import KSeFService, KSEF2_AVAILABLE
+    from .sync_recorder import SyncRecorder
+
+    company = get_request_company(request)
+    invoice = await sync_to_async(Invoice.objects.for_company(company).filter(pk=pk).first)()
+    if invoice is None:
+        return JsonResponse({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+
+    if not invoice.ksef_numer:
+        return JsonResponse(
+            {'error': 'Ta faktura nie pochodzi z KSeF.'},
+            status=status.HTTP_404_NOT_FOUND
+        )
+
+    # Sprawdź konfigurację KSeF
+    if not company.ksef_token or not company.nip:
+        return JsonResponse(
+            {'error': 'Brak konfiguracji KSeF. Uzupełnij token i NIP w ustawieniach.'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+
+    if not KSEF2_AVAILABLE:
+        return JsonResponse(
+            {'error': 'Biblioteka ksef2 nie jest dostępna.'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
+    # Przygotuj zakres dat - dzień przed i po dacie faktury
+    date_from = (invoice.data - timedelta(days=1)).strftime('%Y-%m-%d')
+    date_to = (invoice.data + timedelta(days=1)).strftime('%Y-%m-%d')
+    recorder = SyncRecorder('refresh', company.ksef_environment, date_from, date_to, company=company)
+    outcome = (False, '')
+
+    try:
+        token = decrypt_token(company.ksef_token)
+        service = KSeFService(token, company.nip, company.ksef_environment, recorder=recorder)
+
+        success, auth_msg = await run_in_thread(service.authorize)
+        if not success:
+            outcome = (False, auth_msg)
+            return JsonResponse(
+                {'error': f'Błąd autoryzacji KSeF: {auth_msg}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        try:
+            invoices_data, msg = await run_in_thread(service.fetch_invoices, date_from, date_to, 'SUBJECT2')
+
+            # Znajdź fakturę po ksef_numer
+            found = None
+            for inv in invoices_data:
+                if inv.get('ksef_numer') == invoice.ksef_numer:
+                    found = inv
+                    break
+
+            if not found:
+                outcome = (False, msg)
+                return JsonResponse(
+                    {'error': f'Nie znaleziono faktury {invoice.ksef_numer} w KSeF. Spróbuj rozszerzyć zakres dat.'},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+            # Zaktualizuj tylko dane KSeF (bez zmiany statusu)
+            ksef_data = {
+                'data_sprzedazy': found.get('data_sprzedazy'),
+                'dostawca_nip': found.get('dostawca_nip'),
+                'dostawca_adres': found.get('dostawca_adres'),
+                'nabywca': found.get('nabywca'),
+                'nabywca_nip': found.get('nabywca_nip'),
+                'forma_platnosci': found.get('forma_platnosci'),
+                'waluta': found.get('waluta'),
+                'kwota_netto': found.get('kwota_netto'),
+                'kwota_vat': found.get('kwota_vat'),
+                'pozycje': found.get('pozycje', []),
+            }
+
+            invoice.ksef_xml = json.dumps(ksef_data, ensure_ascii=False)
+            with recorder.phase('db_write'):
+                await sync_to_async(invoice.save)(update_fields=['ksef_xml'])
+            recorder.add_saved(1)
+            outcome = (True, msg)
+
+            return JsonResponse({
+                'success': True,
+                'message': 'Dane KSeF zostały zaktualizowane.',
+                'pozycje_count': len(ksef_data.get('pozycje', [])),
+                'nabywca': ksef_data.get('nabywca'),
+            })
+
+        finally:
+            await run_in_thread(service.terminate_session)
+
+    except Exception as e:
+        outcome = (False, str(e))
+        return JsonResponse(
+            {'error': f'Błąd pobierania danych: {str(e)}'},
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+    finally:
+        await sync_to_async(recorder.finish)(*outcome)
+
+
+@async_api_view(['POST'])
+async def ksef_diagnostics(request):
+    """
+    Diagnostyka połączenia z KSeF - sprawdź konfigurację i autoryzację.
+    """
+    from customers.encryption import decrypt_token, is_token_encrypted, TokenDecryptionError
+    from .ksef_service import KSeFService, KSEF2_AVAILABLE
+    from django.conf import settings as django_settings
+
+    try:
+        company = get_request_company(request)
+
+        # Wyczyść NIP
+        raw_nip = company.nip
+        clean_nip = raw_nip.replace('-', '').replace(' ', '').strip() if raw_nip else None
+
+        diag = {
+            'ksef2_available': KSEF2_AVAILABLE,
+            'settings_exists': True,
+            'has_token': bool(company.ksef_token),
+            'has_nip': bool(company.nip),
+            'environment': company.ksef_environment,
+            'nip_raw': raw_nip,
+            'nip_clean': clean_nip,
+            'nip_length': len(clean_nip) if clean_nip else 0,
+            'token_length': len(company.ksef_token),
+            'encryption_key_set': bool(
+                getattr(django_settings, 'ENCRYPTION_KEY', None) or os.environ.get('ENCRYPTION_KEY')
+                or os.environ.get('ENCRYPTION_KEYS')
+            ),
+        }
+
+        if company.ksef_token and company.nip:
+            encrypted_token = company.ksef_token
+            diag['token_is_encrypted'] = is_token_encrypted(encrypted_token)
+            diag['encrypted_token_starts'] = encrypted_token[:30] + '...' if len(encrypted_token) > 30 else encrypted_token
+
+            try:
+                token = decrypt_token(encrypted_token)
+            except TokenDecryptionError as e:
+                diag['decryption_worked'] = False
+                diag['decryption_error'] = str(e)
+                return JsonResponse(diag)
+            clean_token = token.strip().replace('\n', '').replace('\r', '').replace(' ', '')
+            diag['decrypted_token_length'] = len(token)
+            diag['clean_token_length'] = len(clean_token)
+            # Token w starym formacie (nieszyfrowany) też jest poprawny - liczy się brak błędu
+            diag['decryption_worked'] = True
+            diag['token_starts_with'] = clean_token[:30] + '...' if len(clean_token) > 30 else clean_token
+            diag['token_has_whitespace'] = token != clean_token
+
+            # Spróbuj autoryzacji
+            service = KSeFService(token, company.nip, company.ksef_environment)
+            diag['base_url'] = service.base_url
+
+            success, auth_msg = await run_in_thread(service.authorize)
+            diag['auth_success'] = success
+            diag['auth_message'] = auth_msg
+
+            await run_in_thread(service.terminate_session)
+
+        return JsonResponse(diag)
+
+    except Exception as e:
+        return JsonResponse({
+            'error': str(e),
+            'traceback': traceback.format_exc()
+        }, status=500)
+
+
+def _mark_existing(company, invoices_data):
+    # Sprawdź które faktury już istnieją w firmie - jedno zapytanie dla całej paczki
+    existing = set(Invoice.objects.for_company(company).filter(
+        ksef_numer__in=[inv_data['ksef_numer'] for inv_data in invoices_data]
+    ).values_list('ksef_numer', flat=True))
+    for inv_data in invoices_data:
+        inv_data['already_exists'] = inv_data['ksef_numer'] in existing
+
+
+def _fetch_in_worker(progress, **kwargs):
+    """Pobieranie w wątku z puli - zdarzenia postępu idą własnym połączeniem DB."""
+    from .ksef_service import fetch_invoices_from_ksef
+
+    close_old_connections()
+    try:
+        return fetch_invoices_from_ksef(progress=progress, **kwargs)
+    finally:
+        close_old_connections()
+
+
+@async_api_view(['POST'])
+async def fetch_from_ksef(request):
+    """
+    Pobierz faktury z KSeF - zwraca podgląd do wyboru, nie zapisuje.
+    Wymaga skonfigurowanego tokenu KSeF w ustawieniach.
+    Opcjonalny progress_id (nadany przez klienta) włącza zdarzenia postępu
+    dla strumienia ksef_progress i możliwość anulowania.
+    """
+    from customers.encryption import decrypt_token
+    from .ksef_progress import (
+        NullProgress, ProgressChannel, is_valid_progress_id, purge_events,
+    )
+    from .ksef_service import fetch_succeeded
+    from .sync_recorder import SyncRecorder
+
+    progress_id = request.data.get('progress_id')
+    if progress_id is not None and not is_valid_progress_id(progress_id):
+        return JsonResponse(
+            {'error': 'Nieprawidłowy progress_id (8-64 znaki: litery, cyfry, - lub _).'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    company = get_request_company(request)
+    progress = ProgressChannel(progress_id, company.pk, request.user.pk) if progress_id else NullProgress()
+
+    try:
+        if not company.ksef_token:
+            error = 'Brak skonfigurowanego tokenu KSeF. Przejdź do Ustawień i dodaj token.'
+            await sync_to_async(progress.publish)('error', message=error)
+            return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not company.nip:
+            error = 'Brak NIP firmy w ustawieniach. Przejdź do Ustawień i dodaj NIP.'
+            await sync_to_async(progress.publish)('error', message=error)
+            return JsonResponse({'error': error}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Odszyfruj token
+        token = decrypt_token(company.ksef_token)
+
+        # Zakres dat
+        date_from = request.data.get('date_from') or (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d')
+        date_to = request.data.get('date_to') or datetime.now().strftime('%Y-%m-%d')
+
+        if progress_id:
+            await sync_to_async(purge_events)()
+            await sync_to_async(progress.publish)('started', date_from=date_from, date_to=date_to)
+
+        # Pobierz faktury z KSeF - blokujące I/O poza pętlą zdarzeń
+        recorder = SyncRecorder('fetch', company.ksef_environment, date_from, date_to, company=company)
+        message = ''
+        try:
+            invoices_data, message = await run_in_thread(
+                _fetch_in_worker,
+                progress,
+                token=token,
+                nip=company.nip,
+                environment=company.ksef_environment,
+                date_from=date_from,
+                date_to=date_to,
+                recorder=recorder
+            )
+
+            with recorder.phase('db_check'):
+                await sync_to_async(_mark_existing)(company, invoices_data)
+        finally:
+            await sync_to_async(recorder.finish)(fetch_succeeded(message), message)
+
+        if progress.cancelled:
+            await sync_to_async(progress.publish)('cancelled', message=message)
+        elif fetch_succeeded(message):
+            await sync_to_async(progress.publish)('done', message=message, total=len(invoices_data))
+        else:
+            await sync_to_async(progress.publish)('error', message=message)
+
+        return JsonResponse({
+            'message': message,
+            'settings_configured': True,
+            'environment': company.ksef_environment,
+            'nip': company.nip,
+            'date_from': date_from,
+            'date_to': date_to,
+            'invoices': invoices_data,
+            'total_found': len(invoices_data),
+            'cancelled': progress.cancelled,
+        })
+
+    except Exception as e:
+        error = f'Błąd podczas pobierania z KSeF: {str(e)}'
+        await sync_to_async(progress.publish)('error', message=error)
+        return JsonResponse({'error': error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@async_api_view(['POST'])
+async def ksef_progress_token(request, progress_id):
+    """
+    Jednorazowy token do otwarcia strumienia ksef_progress dla pobierania
+    bieżącego użytkownika i firmy (EventSource nie wysyła nagłówka z JWT).
+    """
+    from .ksef_progress import is_valid_progress_id, issue_stream_token
+
+    if not is_valid_progress_id(progress_id):
+        return JsonResponse({'error': 'Nieprawidłowy progress_id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    token = await sync_to_async(issue_stream_token)(
+        progress_id, get_request_company(request).pk, request.user.pk
+    )
+    return JsonResponse({'token': token, 'expires_in': settings.KSEF_PROGRESS_TOKEN_SECONDS})
+
+
+async def ksef_progress(request, progress_id):
+    """
+    Strumień Server-Sent Events z postępem pobierania z KSeF (progress_id
+    z fetch_from_ksef). Kończy się po zdarzeniu done / error / cancelled.
+    Zamiast JWT parametr ?stream_token= z ksef_progress_token - działa raz.
+    """
+    from .ksef_progress import EventStreamResponse, consume_stream_token, is_valid_progress_id
+
+    if request.method != 'GET':
+        return JsonResponse(
+            {'detail': f'Method "{request.method}" not allowed.'},
+            status=status.HTTP_405_METHOD_NOT_ALLOWED
+        )
+    if not is_valid_progress_id(progress_id):
+        return JsonResponse({'error': 'Nieprawidłowy progress_id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    owner = await sync_to_async(consume_stream_token)(request.GET.get('stream_token'), progress_id)
+    if owner is None:
+        return JsonResponse(
+            {'detail': 'Nieprawidłowy lub wykorzystany token strumienia.'},
+            status=status.HTTP_401_UNAUTHORIZED
+        )
+
+    # Wznowienie po zerwaniu połączenia - id ostatniego otrzymanego zdarzenia
+    last_id = request.META.get('HTTP_LAST_EVENT_ID') or request.GET.get('last_event_id') or 0
+    try:
+        last_id = int(last_id)
+    except ValueError:
+        last_id = 0
+    return EventStreamResponse(progress_id, *owner, last_id)
+
+
+@async_api_view(['POST'])
+async def cancel_ksef_fetch(request, progress_id):
+    """
+    Anuluj pobieranie z KSeF. Potok przerywa pracę przy najbliższym
+    sprawdzeniu (między odpytaniami eksportu i porcjami parsowania).
+    """
+    from .ksef_progress import is_valid_progress_id, request_cancel
+
+    if not is_valid_progress_id(progress_id):
+        return JsonResponse({'error': 'Nieprawidłowy progress_id.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    company = get_request_company(request)
+    if not await sync_to_async(request_cancel)(progress_id, company.pk, request.user.pk):
+        return JsonResponse(
+            {'error': 'Pobieranie już się zakończyło.'},
+            status=status.HTTP_409_CONFLICT
+        )
+    return JsonResponse({'cancelled': True, 'progress_id': progress_id})
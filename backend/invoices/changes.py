@@ -0,0 +1,159 @@
+"""
+Feed zmian faktur i kontrahentów firmy (GET /api/changes/?since=<kursor>).
+
+SPA trzyma faktury i kontrahentów w lokalnym cache i przy odświeżeniu
+pyta tylko o to, co się zmieniło od ostatniego kursora:
+
+  - utworzone i zmienione wiersze - po updated_at (indeksy
+    invoice_company_updated_idx i contractor_company_updated_idx),
+  - usunięte - z tabeli ChangeTombstone (zapisuje ją invoices/signals.py).
+
+Kursor to czas serwera w mikrosekundach z chwili pierwszej strony
+synchronizacji - rośnie monotonicznie i jest nieprzezroczysty dla klienta.
+Kolejna synchronizacja zaczyna się CHANGES_FEED_OVERLAP_SECONDS przed
+kursorem: transakcja mogła zapisać updated_at wcześniej, niż stała się
+widoczna. Klient nakłada zmiany idempotentnie (upsert po id), więc
+powtórzone wiersze nie szkodzą.
+
+Duża synchronizacja jest stronicowana: kursor strony zawiera granice
+okna i pozycję ostatniego zwróconego wiersza (czas, źródło, id), a każde
+źródło czytane jest od tej pozycji po indeksie - bez OFFSET.
+
+Bez kursora albo z kursorem starszym niż CHANGES_TOMBSTONE_RETENTION_DAYS
+(ślady usunięć mogły już zniknąć) feed zwraca pełny stan z reset=true -
+klient czyści wtedy cache.
+"""
+import heapq
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from customers.models import Contractor
+from .models import ChangeTombstone, Invoice
+
+_FINAL_CURSOR = re.compile(r'^\d{1,20}$')
+_PAGE_CURSOR = re.compile(r'^p(-1|\d{1,20})\.(\d{1,20})\.(\d{1,20})\.([0-2])\.(\d{1,20})$')
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+# Kolejność źródeł przy tym samym czasie zmiany (część klucza stronicowania)
+INVOICES, CONTRACTORS, TOMBSTONES = 0, 1, 2
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def to_micros(value):
+    return (value - EPOCH) // timedelta(microseconds=1)
+
+
+def from_micros(value):
+    return EPOCH + timedelta(microseconds=value)
+
+
+def parse_cursor(cursor, now):
+    """
+    Kursor -> (lower, until, position). lower = None oznacza pełny stan,
+    position = (czas, źródło, id) ostatniego wysłanego wiersza albo None.
+    """
+    if not cursor:
+        return None, now, None
+
+    match = _PAGE_CURSOR.match(cursor)
+    if match:
+        lower, until, ts, source, pk = (int(group) for group in match.groups())
+        return (None if lower < 0 else lower), until, (ts, source, pk)
+
+    if not _FINAL_CURSOR.match(cursor):
+        raise InvalidCursor(cursor)
+    # Kursor z innego workera może wyprzedzać nasz zegar
+    since = min(int(cursor), now)
+    retention = timedelta(days=settings.CHANGES_TOMBSTONE_RETENTION_DAYS)
+    if since < to_micros(from_micros(now) - retention):
+        # Ślady usunięć z tego okresu mogły już zostać usunięte
+        return None, now, None
+    return max(since - settings.CHANGES_FEED_OVERLAP_SECONDS * 1_000_000, 0), now, None
+
+
+def _sources(company, today):
+    return (
+        (INVOICES, 'updated_at',
+         Invoice.objects.for_company(company).select_related('kontrahent').with_due_info(today)
+         .defer('ksef_xml').order_by()),
+        (CONTRACTORS, 'updated_at', Contractor.objects.for_company(company).order_by()),
+        (TOMBSTONES, 'deleted_at', ChangeTombstone.objects.filter(company=company).order_by()),
+    )
+
+
+def _window(queryset, field, source, lower, until, position):
+    """Wiersze źródła w oknie (lower, until] po pozycji position, w kolejności (czas, id)."""
+    queryset = queryset.filter(**{f'{field}__lte': from_micros(until)})
+    if lower is not None:
+        queryset = queryset.filter(**{f'{field}__gt': from_micros(lower)})
+    if position is not None:
+        ts, last_source, pk = position
+        moment = from_micros(ts)
+        if source < last_source:
+            queryset = queryset.filter(**{f'{field}__gt': moment})
+        elif source > last_source:
+            queryset = queryset.filter(**{f'{field}__gte': moment})
+        else:
+            queryset = queryset.filter(Q(**{f'{field}__gt': moment}) | Q(**{field: moment, 'id__gt': pk}))
+    return queryset.order_by(field, 'id')
+
+
+def changes_page(company, cursor=None, limit=None, today=None):
+    """
+    Jedna strona feedu zmian firmy company. Zwraca słownik z kluczami cursor, has_more,
+    reset, invoices i contractors (obiekty modeli) oraz deleted
+    ({'invoices': [id], 'contractors': [id]}). Przy has_more=true klient od
+    razu pyta o kolejną stronę z podanym kursorem; reset=true tylko na
+    pierwszej stronie pełnego stanu. InvalidCursor przy błędnym kursorze.
+    """
+    limit = limit or settings.CHANGES_FEED_PAGE_SIZE
+    now = to_micros(timezone.now())
+    lower, until, position = parse_cursor(cursor, now)
+
+    rows = []
+    for source, field, queryset in _sources(company, today):
+        if source == TOMBSTONES and lower is None:
+            # Pełny stan nie potrzebuje usunięć - klient zaczyna od pustego cache
+            continue
+        window = _window(queryset, field, source, lower, until, position)[:limit + 1]
+        rows.append([(to_micros(getattr(obj, field)), source, obj.id, obj) for obj in window])
+
+    page = list(heapq.merge(*rows, key=lambda row: row[:3]))
+    has_more = len(page) > limit
+    page = page[:limit]
+
+    result = {
+        'reset': lower is None and position is None,
+        'has_more': has_more,
+        'invoices': [],
+        'contractors': [],
+        'deleted': {'invoices': [], 'contractors': []},
+    }
+    for _, source, _, obj in page:
+        if source == INVOICES:
+            result['invoices'].append(obj)
+        elif source == CONTRACTORS:
+            result['contractors'].append(obj)
+        else:
+            result['deleted'][f'{obj.model}s'].append(obj.object_id)
+
+    if has_more:
+        ts, source, pk, _ = page[-1]
+        result['cursor'] = f"p{-1 if lower is None else lower}.{until}.{ts}.{source}.{pk}"
+    else:
+        result['cursor'] = str(until)
+    return result
+
+
+def purge_tombstones():
+    """Usuń ślady usunięć starsze niż CHANGES_TOMBSTONE_RETENTION_DAYS."""
+    cutoff = timezone.now() - timedelta(days=settings.CHANGES_TOMBSTONE_RETENTION_DAYS)
+    return ChangeTombstone.objects.filter(deleted_at__lt=cutoff).delete()[0]
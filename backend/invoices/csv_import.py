@@ -0,0 +1,367 @@
+"""
+Masowy import faktur i kontrahentów z CSV (wdrożenie nowej firmy).
+
+Plik czytany jest strumieniowo w paczkach. Każda paczka jest walidowana
+kolumnami (jedna funkcja konwersji na kolumnę, błędy zbierane per wiersz),
+a poprawne wiersze ładowane są w osobnej transakcji:
+  - PostgreSQL: COPY do tymczasowej tabeli stagingowej, potem
+    INSERT ... ON CONFLICT (company_id, nip_normalized) DO NOTHING dla
+    kontrahentów i jeden INSERT ... SELECT faktur z pominięciem istniejących
+    (NOT EXISTS po indeksie (company, numer)),
+  - inne bazy (SQLite): zapytanie o istniejące + bulk_create.
+Przed zapisem każdy wiersz przechodzi sprawdzenie duplikatów po odcisku
+(jak ręczne faktury i import z KSeF) - duplikaty trafiają do raportu.
+
+Faktury i kontrahenci trafiają do podanej firmy; istniejące faktury
+i kontrahenci szukani są tylko w niej.
+
+Kolumny (nagłówek, wielkość liter bez znaczenia, separator , lub ;):
+    numer, data, kwota, dostawca         - wymagane
+    termin_platnosci, status, dostawca_nip, ksef_numer, notatki - opcjonalne
+"""
+import csv
+import io
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from customers.models import Contractor
+from customers.resolver import normalize_nip, resolve_contractors
+from .fingerprint import invoice_fingerprint, known_fingerprints, matching_ids, supplier_key
+from .models import Invoice
+
+REQUIRED_COLUMNS = ('numer', 'data', 'kwota', 'dostawca')
+DEFAULT_CHUNK_SIZE = 5000
+# Ile błędów wierszy zwracać w raporcie (liczba wszystkich jest zawsze podana)
+MAX_REPORTED_ERRORS = 1000
+
+STAGING_TABLE = 'fakturex_csv_staging'
+STAGING_COLUMNS = (
+    'numer', 'data', 'kwota', 'dostawca', 'termin_platnosci', 'status',
+    'dostawca_nip', 'nip_normalized', 'ksef_numer', 'notatki', 'fingerprint',
+)
+
+
+class CsvImportError(Exception):
+    """Plik nie nadaje się do importu (np. brak wymaganych kolumn)."""
+
+
+# ============ Walidacja ============
+
+def _text(max_length, required=False):
+    def parse(value):
+        value = (value or '').strip()
+        if required and not value:
+            raise ValueError('pole wymagane')
+        if len(value) > max_length:
+            raise ValueError(f'maksymalnie {max_length} znaków')
+        return value
+    return parse
+
+
+def _date(value):
+    value = (value or '').strip()
+    if not value:
+        return None
+    for fmt in ('%Y-%m-%d', '%d.%m.%Y', '%d-%m-%Y', '%Y/%m/%d'):
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f'nieprawidłowa data: {value}')
+
+
+def _amount(value):
+    value = (value or '').strip().replace('\xa0', '').replace(' ', '').replace(',', '.')
+    if not value:
+        raise ValueError('pole wymagane')
+    try:
+        amount = Decimal(value).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f'nieprawidłowa kwota: {value}')
+    if abs(amount) >= Decimal('1e10'):
+        raise ValueError('kwota poza zakresem')
+    return amount
+
+
+def _status(value):
+    value = (value or '').strip().lower()
+    return 'zaplacona' if value in ('zapłacona', 'zaplacona', 'paid') else 'niezaplacona'
+
+
+COLUMN_PARSERS = {
+    'numer': _text(100, required=True),
+    'data': _date,
+    'kwota': _amount,
+    'dostawca': _text(255, required=True),
+    'termin_platnosci': _date,
+    'status': _status,
+    'dostawca_nip': _text(15),
+    'ksef_numer': _text(100),
+    'notatki': _text(10000),
+}
+
+
+def validate_chunk(line_numbers, rows):
+    """
+    Zwaliduj paczkę kolumnami. Zwraca (poprawne wiersze jako słowniki, błędy).
+    """
+    errors = {}
+    columns = {}
+    for column, parse in COLUMN_PARSERS.items():
+        values = []
+        for i, row in enumerate(rows):
+            try:
+                values.append(parse(row.get(column)))
+            except ValueError as e:
+                values.append(None)
+                errors.setdefault(i, []).append({'field': column, 'message': str(e)})
+        columns[column] = values
+
+    # Reguły między kolumnami
+    for i, data in enumerate(columns['data']):
+        if data is None and not any(e['field'] == 'data' for e in errors.get(i, [])):
+            errors.setdefault(i, []).append({'field': 'data', 'message': 'pole wymagane'})
+        if columns['termin_platnosci'][i] is None:
+            columns['termin_platnosci'][i] = data
+
+    valid = []
+    for i in range(len(rows)):
+        if i in errors:
+            continue
+        record = {column: values[i] for column, values in columns.items()}
+        record['nip_normalized'] = normalize_nip(record['dostawca_nip'])
+        record['fingerprint'] = invoice_fingerprint(record['numer'], record['kwota'], record['data'])
+        valid.append(record)
+
+    report = [
+        {'row': line_numbers[i], **error}
+        for i in sorted(errors) for error in errors[i]
+    ]
+    return valid, report
+
+
+# ============ Ładowanie ============
+
+def _drop_duplicates(company, records):
+    """
+    Odrzuć wiersze, które są duplikatami faktur firmy albo wcześniejszych
+    wierszy paczki: ten sam odcisk (numer, kwota, data) i dostawca (NIP albo
+    nazwa) - jedno zapytanie. Zwraca (pozostałe wiersze, duplikaty).
+    """
+    known = known_fingerprints(Invoice.objects.for_company(company), {r['fingerprint'] for r in records})
+    unique, duplicates = [], []
+    for record in records:
+        supplier = supplier_key(record['dostawca_nip'], record['dostawca'])
+        matches = matching_ids(known.get(record['fingerprint'], ()), supplier)
+        if matches:
+            duplicates.append({
+                'numer': record['numer'],
+                'dostawca': record['dostawca'],
+                # None - duplikat wcześniej w tej paczce
+                'duplicate_of': [invoice_id for invoice_id in matches if invoice_id is not None],
+            })
+            continue
+        known.setdefault(record['fingerprint'], []).append((None, supplier))
+        unique.append(record)
+    return unique, duplicates
+
+
+def _load_postgres(company, records):
+    """COPY do stagingu i scalenie dwoma zapytaniami. Zwraca (faktury, kontrahenci)."""
+    contractor_table = Contractor._meta.db_table
+    invoice_table = Invoice._meta.db_table
+    kontrahent_column = Invoice._meta.get_field('kontrahent').column
+    company_column = Invoice._meta.get_field('company').column
+    now = timezone.now()
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for record in records:
+        writer.writerow([
+            '' if record[column] is None else record[column] for column in STAGING_COLUMNS
+        ])
+    buffer.seek(0)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f'''
+            CREATE TEMP TABLE IF NOT EXISTS {STAGING_TABLE} (
+                numer varchar(100), data date, kwota numeric(12, 2), dostawca varchar(255),
+                termin_platnosci date, status varchar(20), dostawca_nip varchar(15),
+                nip_normalized varchar(20), ksef_numer varchar(100), notatki text,
+                fingerprint varchar(40)
+            ) ON COMMIT DELETE ROWS
+        ''')
+        cursor.copy_expert(
+            f"COPY {STAGING_TABLE} ({', '.join(STAGING_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '')",
+            buffer,
+        )
+
+        cursor.execute(f'''
+            INSERT INTO {contractor_table}
+                ({company_column}, nazwa, nip, nip_normalized, ulica, miasto, kod_pocztowy, kraj,
+                 email, telefon, notatki, created_at, updated_at)
+            SELECT DISTINCT ON (nip_normalized)
+                %s, dostawca, dostawca_nip, nip_normalized, '', '', '', 'Polska', '', '', '', %s, %s
+            FROM {STAGING_TABLE}
+            WHERE nip_normalized IS NOT NULL
+            ORDER BY nip_normalized
+            ON CONFLICT ({company_column}, nip_normalized) DO NOTHING
+        ''', [company.pk, now, now])
+        contractors_created = cursor.rowcount
+
+        # Faktura istnieje, gdy ma ten sam numer i dostawcę (bez wielkości liter);
+        # podzapytanie korzysta z indeksu (company, numer)
+        cursor.execute(f'''
+            INSERT INTO {invoice_table}
+                ({company_column}, numer, data, kwota, dostawca, termin_platnosci, status, {kontrahent_column},
+                 ksef_numer, ksef_xml, notatki, fingerprint, created_at, updated_at)
+            SELECT DISTINCT ON (s.numer, lower(s.dostawca))
+                %s, s.numer, s.data, s.kwota, s.dostawca, s.termin_platnosci, s.status, c.id,
+                coalesce(s.ksef_numer, ''), '', coalesce(s.notatki, ''), s.fingerprint, %s, %s
+            FROM {STAGING_TABLE} s
+            LEFT JOIN {contractor_table} c
+                ON c.{company_column} = %s AND c.nip_normalized = s.nip_normalized
+            WHERE NOT EXISTS (
+                SELECT 1 FROM {invoice_table} i
+                WHERE i.{company_column} = %s AND i.numer = s.numer AND lower(i.dostawca) = lower(s.dostawca)
+            )
+            ORDER BY s.numer, lower(s.dostawca)
+        ''', [company.pk, now, now, company.pk, company.pk])
+        invoices_created = cursor.rowcount
+
+    return invoices_created, contractors_created
+
+
+def _load_orm(company, records):
+    """Fallback bez COPY: jedno zapytanie o istniejące faktury + bulk_create."""
+    existing = {
+        (numer, dostawca.lower())
+        for numer, dostawca in Invoice.objects.for_company(company).filter(
+            numer__in={r['numer'] for r in records}
+        ).values_list('numer', 'dostawca')
+    }
+
+    contractors_before = Contractor.objects.for_company(company).filter(
+        nip_normalized__in={r['nip_normalized'] for r in records} - {None}
+    ).count()
+    contractors = resolve_contractors(
+        company, ({'nip': r['dostawca_nip'], 'nazwa': r['dostawca']} for r in records)
+    )
+
+    invoices = []
+    for record in records:
+        invoice = Invoice(
+            company=company,
+            numer=record['numer'],
+            data=record['data'],
+            kwota=record['kwota'],
+            dostawca=record['dostawca'],
+            termin_platnosci=record['termin_platnosci'],
+            status=record['status'],
+            kontrahent=contractors.get(record['nip_normalized']),
+            ksef_numer=record['ksef_numer'],
+            notatki=record['notatki'],
+        )
+        key = (invoice.numer, invoice.dostawca.lower())
+        if key in existing:
+            continue
+        existing.add(key)
+        invoice.fill_fingerprint()
+        invoices.append(invoice)
+    Invoice.objects.bulk_create(invoices, batch_size=1000)
+    return len(invoices), len(contractors) - contractors_before
+
+
+def _read_chunks(fileobj, chunk_size):
+    sample = fileobj.read(4096)
+    fileobj.seek(0)
+    try:
+        dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        dialect = csv.excel
+
+    reader = csv.DictReader(fileobj, dialect=dialect)
+    if not reader.fieldnames:
+        raise CsvImportError('Plik CSV jest pusty.')
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    missing = [c for c in REQUIRED_COLUMNS if c not in reader.fieldnames]
+    if missing:
+        raise CsvImportError(f"Brak wymaganych kolumn: {', '.join(missing)}")
+
+    line_numbers, rows = [], []
+    for row in reader:
+        line_numbers.append(reader.line_num)
+        rows.append(row)
+        if len(rows) >= chunk_size:
+            yield line_numbers, rows
+            line_numbers, rows = [], []
+    if rows:
+        yield line_numbers, rows
+
+
+def import_csv(fileobj, company, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False, progress=None):
+    """
+    Zaimportuj plik CSV (obiekt tekstowy z seek()) do firmy company.
+    progress - opcjonalna funkcja wołana po każdej paczce ze słownikiem wyniku.
+    """
+    use_copy = connection.vendor == 'postgresql'
+    result = {
+        'rows': 0,
+        'valid_rows': 0,
+        'imported': 0,
+        'skipped_existing': 0,
+        'duplicate_count': 0,
+        'duplicates': [],
+        'contractors_created': 0,
+        'errors_count': 0,
+        'errors': [],
+        'method': 'copy' if use_copy else 'bulk_create',
+        'dry_run': dry_run,
+    }
+    started = time.perf_counter()
+
+    for line_numbers, rows in _read_chunks(fileobj, chunk_size):
+        records, errors = validate_chunk(line_numbers, rows)
+        result['rows'] += len(rows)
+        result['valid_rows'] += len(records)
+        result['errors_count'] += len(errors)
+        room = MAX_REPORTED_ERRORS - len(result['errors'])
+        if room > 0:
+            result['errors'].extend(errors[:room])
+
+        if records and not dry_run:
+            with transaction.atomic():
+                records, duplicates = _drop_duplicates(company, records)
+                imported = contractors_created = 0
+                if records:
+                    if use_copy:
+                        imported, contractors_created = _load_postgres(company, records)
+                    else:
+                        imported, contractors_created = _load_orm(company, records)
+            result['imported'] += imported
+            result['skipped_existing'] += len(records) - imported
+            result['contractors_created'] += contractors_created
+            result['duplicate_count'] += len(duplicates)
+            room = MAX_REPORTED_ERRORS - len(result['duplicates'])
+            if room > 0:
+                result['duplicates'].extend(duplicates[:room])
+
+        elapsed = time.perf_counter() - started
+        result['seconds'] = round(elapsed, 3)
+        result['rows_per_sec'] = round(result['rows'] / elapsed) if elapsed else 0
+        if progress:
+            progress(result)
+
+    result.setdefault('seconds', 0)
+    result.setdefault('rows_per_sec', 0)
+
+    if result['imported'] or result['contractors_created']:
+        # Import omija sygnały post_save
+        from .analytics import bump_analytics_version
+        bump_analytics_version()
+
+    return result
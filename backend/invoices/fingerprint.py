@@ -0,0 +1,65 @@
+"""
+Odcisk faktury do wykrywania duplikatów.
+
+Ta sama faktura wpisana ręcznie i zaimportowana z KSeF ma zwykle inaczej
+zapisany numer ("FV 12/2024" vs "FV/12/2024") czy nazwę dostawcy, a ręczna
+często nie ma kontrahenta z NIP. Dlatego odcisk (SHA-1, kolumna
+Invoice.fingerprint z indeksem) liczony jest tylko ze znormalizowanego
+numeru, kwoty i daty - po obu stronach tak samo. Dostawcę porównuje
+same_supplier() na kandydatach o tym samym odcisku: po NIP, gdy obie
+faktury go mają, inaczej po znormalizowanej nazwie.
+"""
+import hashlib
+import re
+from datetime import date
+from decimal import Decimal
+
+from customers.resolver import normalize_nip
+
+_NON_ALNUM = re.compile(r'[^0-9a-ząćęłńóśźż]+')
+
+
+def normalize_number(numer):
+    """Numer bez wielkości liter, spacji i separatorów."""
+    return _NON_ALNUM.sub('', (numer or '').lower())
+
+
+def normalize_name(nazwa):
+    return _NON_ALNUM.sub(' ', (nazwa or '').lower()).strip()
+
+
+def invoice_fingerprint(numer, kwota, data):
+    if isinstance(data, date):
+        data = data.isoformat()
+    amount = Decimal(str(kwota)).quantize(Decimal('0.01'))
+    key = f'{normalize_number(numer)}|{amount}|{data}'
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def supplier_key(nip=None, dostawca=''):
+    """(znormalizowany NIP lub None, znormalizowana nazwa) - do same_supplier()."""
+    return normalize_nip(nip), normalize_name(dostawca)
+
+
+def same_supplier(a, b):
+    if a[0] and b[0]:
+        return a[0] == b[0]
+    return bool(a[1]) and a[1] == b[1]
+
+
+def known_fingerprints(queryset, fingerprints):
+    """
+    Faktury z queryset o podanych odciskach - jedno zapytanie.
+    Zwraca {odcisk: [(id, supplier_key)]}.
+    """
+    known = {}
+    for invoice_id, fingerprint, dostawca, nip in queryset.filter(fingerprint__in=fingerprints).values_list(
+        'id', 'fingerprint', 'dostawca', 'kontrahent__nip'
+    ):
+        known.setdefault(fingerprint, []).append((invoice_id, supplier_key(nip, dostawca)))
+    return known
+
+
+def matching_ids(candidates, supplier):
+    """Id kandydatów [(id, supplier_key)] od tego samego dostawcy."""
+    return [invoice_id for invoice_id, other in candidates if same_supplier(other, supplier)]
@@ -0,0 +1,144 @@
+"""
+Zapis faktur pobranych z KSeF do bazy.
+
+Wspólne dla akcji import_ksef_invoices (użytkownik wybiera faktury
+z podglądu) i harmonogramu synchronizacji firm (sync_ksef_companies).
+Cała paczka w stałej liczbie zapytań: istniejące numery KSeF, kontrahenci
+(resolve_contractors), duplikaty po odcisku, bulk_create.
+"""
+import json
+from datetime import date
+
+from django.db import transaction
+
+from customers.resolver import normalize_nip, resolve_contractors
+from .analytics import bump_analytics_version
+from .fingerprint import known_fingerprints, matching_ids
+from .models import Invoice
+from .sync_recorder import NullRecorder
+
+
+def _due_date(inv_data):
+    termin_str = inv_data.get('termin_platnosci', inv_data['data'])
+    if isinstance(termin_str, str):
+        try:
+            return date.fromisoformat(termin_str)
+        except ValueError:
+            return date.fromisoformat(inv_data['data'])
+    return termin_str if termin_str else date.fromisoformat(inv_data['data'])
+
+
+def import_ksef_invoices(company, invoices_data, allow_duplicates=False, recorder=None):
+    """
+    Zapisz faktury z KSeF (słowniki jak z ksef_parser) w firmie company.
+    Pomija faktury o numerze KSeF już obecnym w firmie oraz - bez
+    allow_duplicates - duplikaty po odcisku (numer, kwota, data) od tego samego dostawcy.
+    Zwraca słownik z liczbami i listą duplikatów.
+    """
+    recorder = recorder or NullRecorder()
+    invoices = Invoice.objects.for_company(company)
+    skipped_count = 0
+    today = date.today()
+    new_invoices = []
+
+    # Jedno zapytanie o wszystkie już zaimportowane numery KSeF z paczki
+    with recorder.phase('db_check'):
+        existing = set(invoices.filter(
+            ksef_numer__in=[inv['ksef_numer'] for inv in invoices_data]
+        ).values_list('ksef_numer', flat=True))
+
+    for inv_data in invoices_data:
+        # Sprawdź czy faktura już istnieje (w bazie lub wcześniej w tej paczce)
+        if inv_data['ksef_numer'] in existing:
+            skipped_count += 1
+            continue
+        existing.add(inv_data['ksef_numer'])
+
+        termin = _due_date(inv_data)
+
+        # Określ status - zapłacone jeśli:
+        # - termin płatności to dziś lub jutro (<=1 dzień)
+        # - forma płatności to gotówka
+        forma_platnosci = (inv_data.get('forma_platnosci') or '').lower()
+        days_until_due = (termin - today).days
+
+        if days_until_due <= 1 or 'gotówka' in forma_platnosci or 'gotowka' in forma_platnosci:
+            invoice_status = 'zaplacona'
+        else:
+            invoice_status = 'niezaplacona'
+
+        # Utwórz fakturę z pełnymi danymi KSeF
+        ksef_data = {
+            'data_sprzedazy': inv_data.get('data_sprzedazy'),
+            'dostawca_nip': inv_data.get('dostawca_nip'),
+            'dostawca_adres': inv_data.get('dostawca_adres'),
+            'nabywca': inv_data.get('nabywca'),
+            'nabywca_nip': inv_data.get('nabywca_nip'),
+            'forma_platnosci': inv_data.get('forma_platnosci'),
+            'waluta': inv_data.get('waluta'),
+            'kwota_netto': inv_data.get('kwota_netto'),
+            'kwota_vat': inv_data.get('kwota_vat'),
+            'pozycje': inv_data.get('pozycje', []),
+        }
+
+        new_invoices.append((inv_data, Invoice(
+            company=company,
+            numer=inv_data['numer'],
+            data=inv_data['data'],
+            kwota=inv_data['kwota'],
+            dostawca=inv_data['dostawca'],
+            termin_platnosci=termin,
+            status=invoice_status,
+            ksef_numer=inv_data['ksef_numer'],
+            ksef_xml=json.dumps(ksef_data, ensure_ascii=False),  # Zapisz dane KSeF jako JSON
+        )))
+
+    duplicates = []
+    to_create = []
+    with transaction.atomic():
+        # Kontrahenci całej paczki w stałej liczbie zapytań, po NIP dostawcy
+        with recorder.phase('resolve_contractors'):
+            contractors = resolve_contractors(company, (
+                {'nip': inv_data.get('dostawca_nip'), 'nazwa': inv_data.get('dostawca'),
+                 'adres': inv_data.get('dostawca_adres')}
+                for inv_data, _ in new_invoices
+            ))
+        for inv_data, invoice in new_invoices:
+            invoice.kontrahent = contractors.get(normalize_nip(inv_data.get('dostawca_nip')))
+            invoice.fill_fingerprint()
+
+        # Duplikaty (np. faktura wpisana wcześniej ręcznie) - jedno zapytanie po odciskach,
+        # dostawca porównywany po NIP albo nazwie
+        known = {}
+        if not allow_duplicates:
+            with recorder.phase('duplicate_check'):
+                known = known_fingerprints(invoices, {invoice.fingerprint for _, invoice in new_invoices})
+        for inv_data, invoice in new_invoices:
+            supplier = invoice.supplier_key()
+            matches = matching_ids(known.get(invoice.fingerprint, ()), supplier)
+            if matches:
+                duplicates.append({
+                    'ksef_numer': invoice.ksef_numer,
+                    'numer': invoice.numer,
+                    # None - duplikat wcześniej w tej paczce
+                    'duplicate_of': [invoice_id for invoice_id in matches if invoice_id is not None],
+                })
+                continue
+            if not allow_duplicates:
+                known.setdefault(invoice.fingerprint, []).append((None, supplier))
+            to_create.append(invoice)
+        with recorder.phase('db_write', invoices=len(to_create)):
+            Invoice.objects.bulk_create(to_create, batch_size=500)
+        recorder.add_saved(len(to_create))
+
+    if to_create:
+        # bulk_create nie wysyła sygnałów post_save
+        bump_analytics_version()
+
+    return {
+        'imported_count': len(to_create),
+        'skipped_count': skipped_count,
+        'linked_count': sum(1 for invoice in to_create if invoice.kontrahent_id),
+        'duplicate_count': len(duplicates),
+        'duplicates': duplicates,
+    }
@@ -0,0 +1,427 @@
+"""
+Parsowanie paczek eksportu KSeF (ZIP z plikami FA(3) XML).
+
+Parsowanie to czysty CPU (XML + Decimal), więc przy workers > 1 duże paczki
+rozdzielane są na procesy: pliki XML czytane są z ZIP-a jako surowe bajty,
+dzielone na porcje i parsowane w ProcessPoolExecutor (executor.map zachowuje
+kolejność). Małe paczki - poniżej min_parallel plików - parsowane są
+w bieżącym procesie, bo start porcji w innym procesie kosztuje więcej niż
+zysk.
+
+Dokumenty parsowane są prosto z bajtów backendem z ksef_xml.py (lxml,
+gdy zainstalowany, inaczej ElementTree). Moduł nie importuje Django -
+procesy robocze ładują tylko ten plik i ksef_xml.py.
+"""
+import functools
+import logging
+import math
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from decimal import Decimal
+from typing import Dict, List, Optional
+
+from .ksef_xml import get_backend
+
+logger = logging.getLogger(__name__)
+
+# Poniżej tylu plików XML paczka parsowana jest w bieżącym procesie
+DEFAULT_MIN_PARALLEL = 200
+# Porcja na jedno zadanie procesu - mniejsze porcje lepiej rozkładają pracę,
+# większe zmniejszają koszt przesyłania wyników
+MIN_CHUNK_SIZE = 25
+CHUNKS_PER_WORKER = 4
+# Co tyle plików parsowanie w bieżącym procesie zgłasza postęp (on_progress)
+PROGRESS_CHUNK_SIZE = 200
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def parse_invoice_xml(xml_content, filename: str = '', backend=None) -> Optional[Dict]:
+    """Parsuj XML faktury KSeF (bytes lub str). backend - nazwa z ksef_xml.BACKENDS, domyślnie KSEF_XML_BACKEND."""
+    try:
+        xml = get_backend(backend)
+        root = xml.fromstring(xml_content)
+
+        # Znajdź namespace używany w dokumencie
+        ns_match = re.search(r'\{([^}]+)\}', root.tag)
+        ns_uri = ns_match.group(1) if ns_match else ''
+        ns = {'fa': ns_uri} if ns_uri else {}
+
+        def find_text(paths, default=''):
+            """Helper do szukania tekstu w różnych ścieżkach."""
+            for path in paths:
+                try:
+                    if ns:
+                        result = xml.findtext(root, path, namespaces=ns)
+                    else:
+                        result = xml.findtext(root, path)
+                    if result:
+                        return result.strip()
+                except:
+                    pass
+            return default
+
+        def find_all_text(paths):
+            """Helper do szukania wszystkich wystąpień."""
+            results = []
+            for path in paths:
+                try:
+                    if ns:
+                        elements = xml.findall(root, path, namespaces=ns)
+                    else:
+                        elements = xml.findall(root, path)
+                    for el in elements:
+                        if el.text:
+                            results.append(el.text.strip())
+                except:
+                    pass
+            return results
+
+        # Wyciągnij numer KSeF z nazwy pliku
+        ksef_numer = filename.replace('.xml', '') if filename else ''
+
+        # Podstawowe dane faktury
+        numer = find_text(['.//fa:P_2', './/P_2', './/{*}P_2'])
+        data_wystawienia = find_text(['.//fa:P_1', './/P_1', './/{*}P_1'])
+        data_sprzedazy = find_text(['.//fa:P_6', './/P_6', './/{*}P_6'])
+
+        # Termin płatności - P_19A lub TerminPlatnosci
+        termin_platnosci = find_text([
+            './/fa:Platnosc//fa:TerminPlatnosci//fa:Termin',
+            './/fa:TerminPlatnosci//fa:Termin',
+            './/fa:P_19A',
+            './/Platnosc//TerminPlatnosci//Termin',
+            './/{*}Platnosc//{*}TerminPlatnosci//{*}Termin',
+            './/{*}P_19A',
+        ])
+
+        # Kwoty netto (P_13_1 do P_13_11) i VAT (P_14_1 do P_14_5) - potrzebne też do JPK
+        netto_values = []
+        for i in range(1, 12):
+            val = find_text([f'.//fa:P_13_{i}', f'.//P_13_{i}', f'.//*P_13_{i}'], '0')
+            if val and val != '0':
+                netto_values.append(Decimal(val))
+
+        vat_values = []
+        for i in range(1, 6):
+            val = find_text([f'.//fa:P_14_{i}', f'.//P_14_{i}', f'.//*P_14_{i}'], '0')
+            if val and val != '0':
+                vat_values.append(Decimal(val))
+
+        kwota_netto = sum(netto_values, Decimal('0'))
+        kwota_vat = sum(vat_values, Decimal('0'))
+
+        # Kwoty - P_15 to suma brutto (należność ogółem)
+        kwota_brutto_str = find_text(['.//fa:P_15', './/P_15', './/{*}P_15'], '0')
+
+        # Jeśli nie ma P_15, zsumuj netto + VAT
+        if not kwota_brutto_str or kwota_brutto_str == '0':
+            kwota_brutto = kwota_netto + kwota_vat
+        else:
+            kwota_brutto = Decimal(kwota_brutto_str.replace(',', '.').replace(' ', ''))
+
+        # Sprzedawca (Podmiot1)
+        sprzedawca_nazwa = find_text([
+            './/fa:Podmiot1//fa:DaneIdentyfikacyjne//fa:Nazwa',
+            './/fa:Podmiot1//fa:Nazwa',
+            './/Podmiot1//DaneIdentyfikacyjne//Nazwa',
+            './/{*}Podmiot1//{*}DaneIdentyfikacyjne//{*}Nazwa',
+            './/{*}Podmiot1//{*}Nazwa',
+        ])
+        sprzedawca_nip = find_text([
+            './/fa:Podmiot1//fa:DaneIdentyfikacyjne//fa:NIP',
+            './/fa:Podmiot1//fa:NIP',
+            './/{*}Podmiot1//{*}NIP',
+        ])
+        sprzedawca_adres = find_text([
+            './/fa:Podmiot1//fa:Adres//fa:AdresL1',
+            './/{*}Podmiot1//{*}Adres//{*}AdresL1',
+        ])
+        sprzedawca_miasto = find_text([
+            './/fa:Podmiot1//fa:Adres//fa:AdresL2',
+            './/{*}Podmiot1//{*}Adres//{*}AdresL2',
+        ])
+
+        # Nabywca (Podmiot2)
+        nabywca_nazwa = find_text([
+            './/fa:Podmiot2//fa:DaneIdentyfikacyjne//fa:Nazwa',
+            './/fa:Podmiot2//fa:Nazwa',
+            './/{*}Podmiot2//{*}DaneIdentyfikacyjne//{*}Nazwa',
+        ])
+        nabywca_nip = find_text([
+            './/fa:Podmiot2//fa:DaneIdentyfikacyjne//fa:NIP',
+            './/fa:Podmiot2//fa:NIP',
+            './/{*}Podmiot2//{*}NIP',
+        ])
+
+        # Pozycje faktury - FaWiersz (normalne faktury) lub Zamowienie (faktury zaliczkowe)
+        pozycje = []
+
+        # Najpierw szukaj FaWiersz (normalne faktury)
+        wiersz_paths = ['.//fa:FaWiersz', './/FaWiersz', './/{*}FaWiersz']
+        for path in wiersz_paths:
+            try:
+                if ns:
+                    wiersze = xml.findall(root, path, namespaces=ns)
+                else:
+                    wiersze = xml.findall(root, path)
+
+                if wiersze:
+                    for wiersz in wiersze:
+                        poz = {}
+                        # Nazwa towaru/usługi
+                        for name_path in ['fa:P_7', 'P_7', '{*}P_7']:
+                            el = xml.find(wiersz, name_path, namespaces=ns) if ns else xml.find(wiersz, name_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['nazwa'] = el.text.strip()
+                                break
+
+                        # Ilość
+                        for qty_path in ['fa:P_8B', 'P_8B']:
+                            el = xml.find(wiersz, qty_path, namespaces=ns) if ns else xml.find(wiersz, qty_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['ilosc'] = el.text.strip()
+                                break
+
+                        # Jednostka
+                        for unit_path in ['fa:P_8A', 'P_8A']:
+                            el = xml.find(wiersz, unit_path, namespaces=ns) if ns else xml.find(wiersz, unit_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['jednostka'] = el.text.strip()
+                                break
+
+                        # Cena jednostkowa netto
+                        for price_path in ['fa:P_9A', 'P_9A']:
+                            el = xml.find(wiersz, price_path, namespaces=ns) if ns else xml.find(wiersz, price_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['cena_netto'] = el.text.strip()
+                                break
+
+                        # Wartość netto
+                        for val_path in ['fa:P_11', 'P_11']:
+                            el = xml.find(wiersz, val_path, namespaces=ns) if ns else xml.find(wiersz, val_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['wartosc_netto'] = el.text.strip()
+                                break
+
+                        # Stawka VAT
+                        for vat_path in ['fa:P_12', 'P_12']:
+                            el = xml.find(wiersz, vat_path, namespaces=ns) if ns else xml.find(wiersz, vat_path.replace('fa:', ''))
+                            if el is not None and el.text:
+                                poz['stawka_vat'] = el.text.strip()
+                                break
+
+                        if poz.get('nazwa'):
+                            pozycje.append(poz)
+                    break
+            except Exception as e:
+                logger.debug(f"Error parsing positions: {e}")
+                continue
+
+        # Jeśli brak FaWiersz, szukaj Zamowienie (faktury zaliczkowe)
+        if not pozycje:
+            zamowienie_paths = [
+                './/fa:Zamowienie', './/Zamowienie', './/{*}Zamowienie',
+                './/fa:ZamowienieWiersz', './/ZamowienieWiersz', './/{*}ZamowienieWiersz',
+                './/fa:Zaliczka', './/Zaliczka', './/{*}Zaliczka',
+                './/fa:ZaliczkaCzesciowa', './/ZaliczkaCzesciowa', './/{*}ZaliczkaCzesciowa',
+            ]
+            for path in zamowienie_paths:
+                try:
+                    if ns:
+                        wiersze = xml.findall(root, path, namespaces=ns)
+                    else:
+                        wiersze = xml.findall(root, path)
+
+                    if wiersze:
+                        for wiersz in wiersze:
+                            poz = {}
+                            # Opis zamówienia/zaliczki
+                            for name_path in ['fa:OpisZamowienia', 'OpisZamowienia', '{*}OpisZamowienia',
+                                              'fa:P_7Z', 'P_7Z', '{*}P_7Z',
+                                              'fa:NazwaTowaru', 'NazwaTowaru', '{*}NazwaTowaru']:
+                                el = xml.find(wiersz, name_path, namespaces=ns) if ns else xml.find(wiersz, name_path.replace('fa:', ''))
+                                if el is not None and el.text:
+                                    poz['nazwa'] = el.text.strip()
+                                    break
+
+                            # Kwota zaliczki
+                            for kwota_path in ['fa:KwotaZaliczki', 'KwotaZaliczki', '{*}KwotaZaliczki',
+                                               'fa:WartoscBrutto', 'WartoscBrutto', '{*}WartoscBrutto',
+                                               'fa:P_11Z', 'P_11Z', '{*}P_11Z']:
+                                el = xml.find(wiersz, kwota_path, namespaces=ns) if ns else xml.find(wiersz, kwota_path.replace('fa:', ''))
+                                if el is not None and el.text:
+                                    poz['wartosc_netto'] = el.text.strip()
+                                    break
+
+                            # Stawka VAT zaliczki
+                            for vat_path in ['fa:StawkaVAT', 'StawkaVAT', '{*}StawkaVAT',
+                                             'fa:P_12Z', 'P_12Z', '{*}P_12Z']:
+                                el = xml.find(wiersz, vat_path, namespaces=ns) if ns else xml.find(wiersz, vat_path.replace('fa:', ''))
+                                if el is not None and el.text:
+                                    poz['stawka_vat'] = el.text.strip()
+                                    break
+
+                            if poz.get('nazwa') or poz.get('wartosc_netto'):
+                                if not poz.get('nazwa'):
+                                    poz['nazwa'] = 'Zaliczka'
+                                poz['ilosc'] = '1'
+                                poz['jednostka'] = 'szt.'
+                                pozycje.append(poz)
+                        if pozycje:
+                            break
+                except Exception as e:
+                    logger.debug(f"Error parsing zaliczka positions: {e}")
+                    continue
+
+        # Jeśli nadal brak pozycji, stwórz jedną z kwoty całkowitej
+        if not pozycje and kwota_brutto:
+            pozycje.append({
+                'nazwa': 'Pozycja faktury (szczegóły niedostępne)',
+                'ilosc': '1',
+                'jednostka': 'szt.',
+                'wartosc_netto': str(kwota_brutto),
+                'stawka_vat': '23'
+            })
+
+        # Waluta
+        waluta = find_text(['.//fa:KodWaluty', './/KodWaluty', './/{*}KodWaluty'], 'PLN')
+
+        # Forma płatności
+        forma_platnosci = find_text([
+            './/fa:Platnosc//fa:FormaPlatnosci',
+            './/{*}Platnosc//{*}FormaPlatnosci',
+        ])
+
+        logger.info(f"Parsed XML {filename}: numer={numer}, data={data_wystawienia}, "
+                   f"kwota={kwota_brutto}, termin={termin_platnosci}, pozycji={len(pozycje)}")
+
+        if not numer and not sprzedawca_nazwa:
+            logger.warning(f"Could not parse invoice from {filename}")
+            logger.debug(f"XML content (first 1000 chars): {xml_content[:1000]}")
+            return None
+
+        return {
+            'ksef_numer': ksef_numer,
+            'numer': numer,
+            'data': data_wystawienia[:10] if data_wystawienia else '',
+            'data_sprzedazy': data_sprzedazy[:10] if data_sprzedazy else '',
+            'termin_platnosci': termin_platnosci[:10] if termin_platnosci else '',
+            'kwota': float(kwota_brutto),
+            'kwota_netto': str(kwota_netto),
+            'kwota_vat': str(kwota_vat),
+            'waluta': waluta,
+            'dostawca': sprzedawca_nazwa,
+            'dostawca_nip': sprzedawca_nip,
+            'dostawca_adres': f"{sprzedawca_adres}, {sprzedawca_miasto}".strip(', '),
+            'nabywca': nabywca_nazwa,
+            'nabywca_nip': nabywca_nip,
+            'forma_platnosci': forma_platnosci,
+            'pozycje': pozycje,
+        }
+    except Exception as e:
+        logger.error(f"Błąd parsowania XML {filename}: {e}", exc_info=True)
+        return None
+
+
+
+def parse_members(members, backend=None):
+    """Parsuj porcję plików [(nazwa, bajty)] - funkcja procesów roboczych."""
+    return [parse_invoice_xml(content, name, backend) for name, content in members]
+
+
+def resolve_workers(workers):
+    """0 (lub None) = liczba rdzeni."""
+    if not workers:
+        return os.cpu_count() or 1
+    return max(1, int(workers))
+
+
+def _get_pool(workers):
+    """Wspólna pula procesów (start procesów jest drogi - pula żyje z procesem aplikacji)."""
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            # forkserver/spawn zamiast fork - fork wielowątkowego workera serwera
+            # mógłby skopiować zablokowane locki
+            method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+            _pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context(method))
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+def _chunks(members, workers):
+    size = max(MIN_CHUNK_SIZE, math.ceil(len(members) / (workers * CHUNKS_PER_WORKER)))
+    return [members[start:start + size] for start in range(0, len(members), size)]
+
+
+def parse_package(
+    path, workers=1, min_parallel=DEFAULT_MIN_PARALLEL, details=None, backend=None, on_progress=None,
+) -> List[Dict]:
+    """
+    Parsuj paczkę eksportu. workers=1 - zawsze w bieżącym procesie,
+    0 - tyle procesów, ile rdzeni. details (słownik, np. faza SyncRecorder)
+    dostaje liczbę plików, użytych procesów i backend XML. on_progress(done, total)
+    wołane jest po każdej porcji plików; wyjątek z niego przerywa parsowanie.
+    """
+    details = details if details is not None else {}
+    path_str = str(path)
+    if not path_str.endswith('.zip'):
+        logger.warning(f"File is not a ZIP: {path_str}")
+        return []
+
+    with zipfile.ZipFile(path_str, 'r') as zf:
+        members = [(name, zf.read(name)) for name in zf.namelist() if name.endswith('.xml')]
+    logger.info(f"Found {len(members)} XML files in ZIP {path_str}")
+
+    workers = resolve_workers(workers)
+    # Nazwa backendu (nie obiekt) - procesy robocze tworzą własny
+    backend = get_backend(backend).name
+    details['files'] = len(members)
+    details['xml_backend'] = backend
+    details['workers'] = 1
+
+    results = None
+    if workers > 1 and len(members) >= min_parallel:
+        try:
+            chunks = _chunks(members, workers)
+            parse_chunk = functools.partial(parse_members, backend=backend)
+            results = []
+            for chunk in _get_pool(workers).map(parse_chunk, chunks):
+                results.extend(chunk)
+                if on_progress:
+                    on_progress(len(results), len(members))
+            details['workers'] = workers
+            details['chunks'] = len(chunks)
+        except (BrokenProcessPool, OSError) as e:
+            # Np. proces zabity przez OOM - parsuj lokalnie, pulę utwórz od nowa
+            logger.error(f"Parallel KSeF parsing failed, falling back to in-process: {e}")
+            shutdown_pool()
+            # Wyniki części porcji przepadają - całą paczkę parsujemy od nowa
+            results = None
+    if results is None:
+        results = []
+        step = PROGRESS_CHUNK_SIZE if on_progress else len(members) or 1
+        for start in range(0, len(members), step):
+            results.extend(parse_members(members[start:start + step], backend))
+            if on_progress:
+                on_progress(len(results), len(members))
+
+    return [inv for inv in results if inv]
@@ -0,0 +1,241 @@
+"""
+Postęp pobierania faktur z KSeF na żywo (Server-Sent Events) i anulowanie.
+
+Przeglądarka nadaje pobieraniu identyfikator (UUID), otwiera strumień
+GET /api/invoices/ksef_progress/<id>/ i dopiero wtedy wysyła POST
+fetch_from_ksef z tym samym progress_id. Strumień i pobieranie mogą trafić
+do różnych workerów gunicorna, dlatego kanałem jest tabela KSeFProgressEvent:
+
+    potok KSeF --publish()--> KSeFProgressEvent <--odpytywanie-- strumień SSE
+    POST .../cancel/ --'cancel'--> KSeFProgressEvent <--check_cancelled()-- potok
+
+Etapy: started, authorized, export_scheduled, poll, downloaded, parsed,
+a na końcu jeden z done / error / cancelled (po nim strumień się zamyka).
+Identyfikator zdarzenia SSE to id wiersza - po zerwaniu połączenia
+przeglądarka podaje id ostatniego zdarzenia (last_event_id) i strumień
+wznawia się bez powtórzeń.
+
+Zdarzenia zapisywane są z firmą i użytkownikiem, którzy uruchomili pobieranie;
+odczyt i anulowanie widzą tylko własne zdarzenia, więc cudzy progress_id nic
+nie daje. EventSource nie wysyła nagłówków, a token JWT w adresie trafiałby
+do logów proxy - strumień otwiera się jednorazowym tokenem
+(issue_stream_token), ważnym KSEF_PROGRESS_TOKEN_SECONDS i tylko dla jednego
+progress_id - do wznowienia przeglądarka prosi o nowy.
+
+Stare zdarzenia usuwa purge_events() przy starcie każdego pobierania.
+"""
+import asyncio
+import json
+import logging
+import re
+import secrets
+import time
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STAGES = ('done', 'error', 'cancelled')
+CANCEL_STAGE = 'cancel'
+CANCELLED_MESSAGE = 'Pobieranie anulowane przez użytkownika'
+
+# Komentarz SSE co tyle sekund - proxy nie zamyka bezczynnego połączenia
+HEARTBEAT_SECONDS = 15
+# Po ilu ms EventSource ma się połączyć ponownie po zerwaniu
+RETRY_MS = 2000
+
+_PROGRESS_ID = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+class FetchCancelled(Exception):
+    """Użytkownik anulował pobieranie - potok przerywa pracę przy najbliższym sprawdzeniu."""
+
+
+def is_valid_progress_id(progress_id):
+    return bool(progress_id) and bool(_PROGRESS_ID.match(progress_id))
+
+
+class NullProgress:
+    """Postęp, którego nikt nie słucha - domyślny dla KSeFService (bez zapytań do bazy)."""
+    cancelled = False
+
+    def publish(self, stage, **data):
+        pass
+
+    def check_cancelled(self):
+        pass
+
+
+def _events(progress_id, company_id, user_id):
+    from .models import KSeFProgressEvent
+
+    return KSeFProgressEvent.objects.filter(progress_id=progress_id, company_id=company_id, user_id=user_id)
+
+
+class ProgressChannel(NullProgress):
+
+    def __init__(self, progress_id, company_id, user_id):
+        self.progress_id = progress_id
+        self.company_id = company_id
+        self.user_id = user_id
+        self.cancelled = False
+
+    def publish(self, stage, **data):
+        from .models import KSeFProgressEvent
+
+        try:
+            KSeFProgressEvent.objects.create(
+                progress_id=self.progress_id, company_id=self.company_id, user_id=self.user_id,
+                stage=stage, data=data,
+            )
+        except Exception:
+            # Podgląd postępu nie może zepsuć pobierania
+            logger.exception('Publishing KSeF progress event failed')
+
+    def check_cancelled(self):
+        """Zgłoś FetchCancelled, jeśli przyszło żądanie anulowania."""
+        if not self.cancelled:
+            self.cancelled = _events(self.progress_id, self.company_id, self.user_id).filter(
+                stage=CANCEL_STAGE
+            ).exists()
+        if self.cancelled:
+            raise FetchCancelled(CANCELLED_MESSAGE)
+
+
+def request_cancel(progress_id, company_id, user_id):
+    """Zapisz żądanie anulowania; zwraca False, gdy pobieranie już się zakończyło."""
+    from .models import KSeFProgressEvent
+
+    if _events(progress_id, company_id, user_id).filter(stage__in=TERMINAL_STAGES).exists():
+        return False
+    KSeFProgressEvent.objects.create(
+        progress_id=progress_id, company_id=company_id, user_id=user_id, stage=CANCEL_STAGE
+    )
+    return True
+
+
+def issue_stream_token(progress_id, company_id, user_id):
+    """Jednorazowy token otwarcia strumienia zdarzeń danego pobierania."""
+    token = secrets.token_urlsafe(32)
+    cache.set(
+        f'ksef_stream_token:{token}',
+        {'progress_id': progress_id, 'company_id': company_id, 'user_id': user_id},
+        settings.KSEF_PROGRESS_TOKEN_SECONDS,
+    )
+    return token
+
+
+def consume_stream_token(token, progress_id):
+    """(company_id, user_id) z tokenu strumienia albo None - token działa raz."""
+    if not token:
+        return None
+    key = f'ksef_stream_token:{token}'
+    owner = cache.get(key)
+    # delete() zwraca True tylko jednemu z równoległych żądań
+    if owner is None or not cache.delete(key) or owner['progress_id'] != progress_id:
+        return None
+    return owner['company_id'], owner['user_id']
+
+
+def purge_events():
+    """Usuń zdarzenia starsze niż KSEF_PROGRESS_RETENTION_SECONDS."""
+    from .models import KSeFProgressEvent
+
+    cutoff = timezone.now() - timedelta(seconds=settings.KSEF_PROGRESS_RETENTION_SECONDS)
+    return KSeFProgressEvent.objects.filter(created_at__lt=cutoff).delete()[0]
+
+
+def read_events(progress_id, company_id, user_id, after_id=0):
+    """Zdarzenia pobierania nowsze niż after_id jako (id, stage, data)."""
+    return list(
+        _events(progress_id, company_id, user_id).filter(id__gt=after_id)
+        .order_by('id')
+        .values_list('id', 'stage', 'data')
+    )
+
+
+def format_event(event_id, stage, data):
+    payload = json.dumps({'stage': stage, **data}, ensure_ascii=False, default=str)
+    return f'id: {event_id}\nevent: {stage}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+class _StreamState:
+    """Wspólna logika strumienia sync i async: co wysłać po kolejnym odczycie tabeli."""
+
+    def __init__(self, progress_id, last_id):
+        self.progress_id = progress_id
+        self.last_id = last_id
+        self.finished = False
+        now = time.monotonic()
+        self.deadline = now + settings.KSEF_PROGRESS_STREAM_SECONDS
+        self.last_sent = now
+
+    def start(self):
+        return f'retry: {RETRY_MS}\n\n'.encode('ascii')
+
+    def parts(self, events):
+        parts = []
+        for event_id, stage, data in events:
+            self.last_id = event_id
+            # Żądanie anulowania widzi potok, nie przeglądarka
+            if stage != CANCEL_STAGE:
+                parts.append(format_event(event_id, stage, data))
+            if stage in TERMINAL_STAGES:
+                self.finished = True
+                break
+
+        now = time.monotonic()
+        if now >= self.deadline:
+            self.finished = True
+        if parts:
+            self.last_sent = now
+        elif now - self.last_sent >= HEARTBEAT_SECONDS:
+            parts.append(b': keepalive\n\n')
+            self.last_sent = now
+        return parts
+
+
+def stream_events(progress_id, company_id, user_id, last_id=0):
+    """Strumień sync - gdy aplikacja działa pod WSGI (zajmuje wątek na czas pobierania)."""
+    state = _StreamState(progress_id, last_id)
+    yield state.start()
+    while True:
+        yield from state.parts(read_events(progress_id, company_id, user_id, state.last_id))
+        if state.finished:
+            return
+        time.sleep(settings.KSEF_PROGRESS_POLL_SECONDS)
+
+
+async def astream_events(progress_id, company_id, user_id, last_id=0):
+    """Strumień async - pod ASGI czeka w pętli zdarzeń, a nie w wątku."""
+    state = _StreamState(progress_id, last_id)
+    yield state.start()
+    while True:
+        events = await sync_to_async(read_events)(progress_id, company_id, user_id, state.last_id)
+        for part in state.parts(events):
+            yield part
+        if state.finished:
+            return
+        await asyncio.sleep(settings.KSEF_PROGRESS_POLL_SECONDS)
+
+
+class EventStreamResponse(StreamingHttpResponse):
+    """
+    Odpowiedź text/event-stream. StreamingASGIHandler (fakturex/asgi.py)
+    iteruje async_content; serwer WSGI i klient testowy - zwykły generator.
+    """
+
+    def __init__(self, progress_id, company_id, user_id, last_id=0):
+        super().__init__(
+            stream_events(progress_id, company_id, user_id, last_id),
+            content_type='text/event-stream; charset=utf-8',
+        )
+        self.async_content = astream_events(progress_id, company_id, user_id, last_id)
+        self['Cache-Control'] = 'no-cache'
+        # nginx/Railway: nie buforuj strumienia
+        self['X-Accel-Buffering'] = 'no'
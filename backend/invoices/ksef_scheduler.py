@@ -0,0 +1,146 @@
+"""
+Harmonogram synchronizacji KSeF wszystkich firm (manage.py sync_ksef_companies).
+
+Firmy z włączonym auto_fetch_ksef, tokenem i NIP-em synchronizowane są
+w ograniczonej puli wątków (KSEF_SYNC_WORKERS) - czas to głównie czekanie
+na API KSeF, więc kilka firm naraz nie obciąża bazy, a limit chroni przed
+setkami równoległych sesji. Kolejność: najdawniej synchronizowane najpierw,
+więc przerwany przebieg nie głodzi ciągle tych samych firm.
+
+Zakres dat firmy: od dnia przed końcem ostatniej udanej synchronizacji
+z harmonogramu (albo KSEF_SYNC_INITIAL_DAYS wstecz) do dziś. Faktury już
+zapisane (po numerze KSeF) są pomijane przy imporcie, więc nakładka jest
+bezpieczna.
+
+Blokada firmy w bazie (KSeFSyncLock) nie pozwala dwóm uruchomieniom - np.
+z crona na dwóch instancjach - synchronizować tej samej firmy naraz. Cache
+się do tego nie nadaje - domyślny FileBasedCache jest lokalny dla hosta.
+"""
+import logging
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from customers.models import Company
+from .models import KSeFSyncLock
+
+logger = logging.getLogger(__name__)
+
+TRIGGER = 'scheduled'
+# Dzień nakładki - faktury z KSeF bywają widoczne z opóźnieniem
+OVERLAP_DAYS = 1
+
+
+def acquire_lock(company_id):
+    """
+    Zablokuj firmę na KSEF_SYNC_LOCK_SECONDS. Zwraca identyfikator właściciela
+    (do release_lock) albo None, gdy blokadę trzyma inny proces.
+    """
+    now = timezone.now()
+    owner = uuid.uuid4().hex
+    locked_until = now + timedelta(seconds=settings.KSEF_SYNC_LOCK_SECONDS)
+    # Przejęcie wygasłej blokady - warunkowy UPDATE jest atomowy na każdej bazie
+    if KSeFSyncLock.objects.filter(company_id=company_id, locked_until__lt=now).update(
+        owner=owner, locked_until=locked_until
+    ):
+        return owner
+    try:
+        with transaction.atomic():
+            KSeFSyncLock.objects.create(company_id=company_id, owner=owner, locked_until=locked_until)
+    except IntegrityError:
+        return None
+    return owner
+
+
+def release_lock(company_id, owner):
+    KSeFSyncLock.objects.filter(company_id=company_id, owner=owner).delete()
+
+
+def due_companies(company_ids=None):
+    """Firmy do synchronizacji, najdawniej synchronizowane najpierw (z datą last_synced_to)."""
+    companies = (
+        Company.objects.filter(auto_fetch_ksef=True)
+        .exclude(ksef_token='').exclude(nip='')
+        .annotate(last_synced_to=Max(
+            'synchronizacje_ksef__date_to',
+            filter=Q(synchronizacje_ksef__trigger=TRIGGER, synchronizacje_ksef__outcome='success'),
+        ))
+    )
+    if company_ids:
+        companies = companies.filter(id__in=company_ids)
+    # Bez synchronizacji (NULL) na początku - na każdej bazie
+    return sorted(companies, key=lambda company: (company.last_synced_to or date.min, company.pk))
+
+
+def sync_range(company, today=None, days=None):
+    """(date_from, date_to) synchronizacji firmy; days wymusza zakres od dziś wstecz."""
+    today = today or date.today()
+    if days is not None:
+        return today - timedelta(days=days), today
+    last = getattr(company, 'last_synced_to', None)
+    if last is None:
+        return today - timedelta(days=settings.KSEF_SYNC_INITIAL_DAYS), today
+    return min(last - timedelta(days=OVERLAP_DAYS), today), today
+
+
+def sync_company(company, today=None, days=None):
+    """
+    Pobierz faktury firmy z KSeF i zapisz nowe. Zwraca słownik z wynikiem;
+    status 'locked', gdy firmę synchronizuje już inny proces.
+    """
+    from customers.encryption import decrypt_token
+    from .ksef_import import import_ksef_invoices
+    from .ksef_service import fetch_invoices_from_ksef, fetch_succeeded
+    from .sync_recorder import SyncRecorder
+
+    date_from, date_to = sync_range(company, today, days)
+    result = {'company': company.pk, 'date_from': str(date_from), 'date_to': str(date_to)}
+    owner = acquire_lock(company.pk)
+    if owner is None:
+        return dict(result, status='locked')
+
+    recorder = SyncRecorder(TRIGGER, company.ksef_environment, date_from, date_to, company=company)
+    success, message = False, ''
+    try:
+        invoices, message = fetch_invoices_from_ksef(
+            decrypt_token(company.ksef_token), company.nip, company.ksef_environment,
+            date_from.isoformat(), date_to.isoformat(), recorder=recorder,
+        )
+        success = fetch_succeeded(message)
+        if success:
+            result.update(import_ksef_invoices(company, invoices, recorder=recorder))
+            result.pop('duplicates')
+        result['found'] = len(invoices)
+    except Exception as e:
+        logger.exception('Scheduled KSeF sync failed for company %s', company.pk)
+        message = str(e)
+    finally:
+        recorder.finish(success, message)
+        release_lock(company.pk, owner)
+    return dict(result, status='success' if success else 'error', message=message)
+
+
+def _sync_in_worker(company, today, days):
+    """Synchronizacja w wątku z puli - własne połączenie DB, sprzątane po firmie."""
+    close_old_connections()
+    try:
+        return sync_company(company, today, days)
+    finally:
+        close_old_connections()
+
+
+def sync_companies(companies, workers=None, today=None, days=None):
+    """
+    Zsynchronizuj firmy najwyżej `workers` naraz (domyślnie KSEF_SYNC_WORKERS;
+    1 = po kolei w bieżącym wątku). Zwraca wyniki w kolejności firm.
+    """
+    workers = workers or settings.KSEF_SYNC_WORKERS
+    if workers <= 1 or len(companies) <= 1:
+        return [sync_company(company, today, days) for company in companies]
+    with ThreadPoolExecutor(max_workers=min(workers, len(companies)), thread_name_prefix='ksef-sync') as pool:
+        return list(pool.map(lambda company: _sync_in_worker(company, today, days), companies))
@@ -5,44 +5,90 @@ Wykorzystuje bibliotekę ksef2 do obsługi API.
 UWAGA: Od 2 lutego 2026 KSeF API 1.0 zostało wyłączone.
 Ten serwis używa ksef2 SDK dla API 2.0.
 """
+from contextlib import ExitStack
 from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from types import SimpleNamespace
 from typing import List, Dict, Optional, Tuple
 from decimal import Decimal
 import logging
 
-try:
-    from ksef2 import Client, Environment
-    from ksef2.domain.models import (
-        InvoiceQueryFilters, 
-        InvoiceSubjectType, 
-        InvoiceQueryDateRange, 
-        DateType,
-    )
-    KSEF2_AVAILABLE = True
-except ImportError:
-    KSEF2_AVAILABLE = False
-    logging.warning("ksef2 package not installed. KSeF functionality will be limited.")
-
 # Fallback do starej implementacji gdy ksef2 niedostępne
 import requests
 import json
 import base64
 import time
 
+from django.conf import settings
+
+from fakturex.metrics import record_ksef_call, record_ksef_invoices
+from .ksef_parser import parse_invoice_xml, parse_package
+from .ksef_progress import CANCELLED_MESSAGE, FetchCancelled, NullProgress
+from .sync_recorder import NullRecorder
+
 logger = logging.getLogger(__name__)
 
 
+@lru_cache(maxsize=None)
+def load_ksef2() -> Optional[SimpleNamespace]:
+    """
+    Leniwy import ksef2 - SDK jest ciężki, więc ładujemy go dopiero
+    przy pierwszym użyciu KSeF, a nie przy starcie procesu.
+    Zwraca przestrzeń nazw z używanymi klasami lub None, gdy pakietu brak.
+    Przy ustawionym KSEF_SIMULATOR_URL zwraca atrapę SDK lokalnego symulatora.
+    """
+    if settings.KSEF_SIMULATOR_URL:
+        from .ksef_simulator.sdk import simulator_sdk
+        logger.warning("KSeF simulator enabled at %s - not talking to the real KSeF API", settings.KSEF_SIMULATOR_URL)
+        return simulator_sdk(settings.KSEF_SIMULATOR_URL)
+
+    try:
+        from ksef2 import Client, Environment
+        from ksef2.domain.models import (
+            InvoiceQueryFilters,
+            InvoiceSubjectType,
+            InvoiceQueryDateRange,
+            DateType,
+            FormSchema,
+        )
+    except ImportError:
+        logger.warning("ksef2 package not installed. KSeF functionality will be limited.")
+        return None
+
+    return SimpleNamespace(
+        Client=Client,
+        Environment=Environment,
+        InvoiceQueryFilters=InvoiceQueryFilters,
+        InvoiceSubjectType=InvoiceSubjectType,
+        InvoiceQueryDateRange=InvoiceQueryDateRange,
+        DateType=DateType,
+        FormSchema=FormSchema,
+    )
+
+
+def ksef2_available() -> bool:
+    return load_ksef2() is not None
+
+
+def __getattr__(name):
+    # KSEF2_AVAILABLE zostaje dla zgodności, ale liczone jest leniwie (PEP 562)
+    if name == 'KSEF2_AVAILABLE':
+        return ksef2_available()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
 def get_environment(env_name: str):
     """Mapuj nazwę środowiska na obiekt Environment z ksef2."""
-    if not KSEF2_AVAILABLE:
+    sdk = load_ksef2()
+    if sdk is None:
         return env_name
     
     env_map = {
-        'production': Environment.PRODUCTION,
-        'demo': Environment.DEMO,
-        'test': Environment.TEST,
+        'production': sdk.Environment.PRODUCTION,
+        'demo': sdk.Environment.DEMO,
+        'test': sdk.Environment.TEST,
     }
-    return env_map.get(env_name, Environment.TEST)
+    return env_map.get(env_name, sdk.Environment.TEST)
 
 
 class KSeFService:
@@ -58,11 +104,17 @@ class KSeFService:
         'demo': 'https://api-demo.ksef.mf.gov.pl/v2'
     }
     
-    def __init__(self, token: str, nip: str, environment: str = 'test'):
+    def __init__(self, token: str, nip: str, environment: str = 'test', recorder=None, progress=None):
         self.token = token
         self.nip = nip
         self.environment = environment
         self.base_url = self.ENVIRONMENTS.get(environment, self.ENVIRONMENTS['test'])
+        if settings.KSEF_SIMULATOR_URL:
+            self.base_url = f'{settings.KSEF_SIMULATOR_URL}/v2'
+        # Pomiar faz synchronizacji (invoices.sync_recorder.SyncRecorder)
+        self.recorder = recorder or NullRecorder()
+        # Zdarzenia postępu i anulowanie (invoices.ksef_progress.ProgressChannel)
+        self.progress = progress or NullProgress()
         
         # ksef2 client i auth
         self._client = None
@@ -74,10 +126,17 @@ class KSeFService:
         Autoryzuj sesję w KSeF 2.0 za pomocą tokena.
         Wykorzystuje ksef2 SDK jeśli dostępne.
         """
-        if KSEF2_AVAILABLE:
-            return self._authorize_with_ksef2()
-        else:
-            return self._authorize_fallback()
+        started = time.perf_counter()
+        with self.recorder.phase('authorize') as phase:
+            if ksef2_available():
+                success, message = self._authorize_with_ksef2()
+            else:
+                success, message = self._authorize_fallback()
+            phase['ok'] = success
+        record_ksef_call('authorize', success, time.perf_counter() - started)
+        if success:
+            self.progress.publish('authorized')
+        return success, message
     
     def _authorize_with_ksef2(self) -> Tuple[bool, str]:
         """Autoryzacja z użyciem biblioteki ksef2."""
@@ -91,7 +150,7 @@ class KSeFService:
             
             logger.info(f"KSeF auth: env={self.environment}, env_obj={env}, nip={clean_nip} (len={len(clean_nip)}), token_len={len(clean_token)}, token_first10={clean_token[:10]}...")
             
-            self._client = Client(env)
+            self._client = load_ksef2().Client(env)
             
             # Token authentication
             self._auth = self._client.auth.authenticate_token(
@@ -200,14 +259,19 @@ class KSeFService:
         Pobierz faktury z KSeF 2.0 za podany okres.
         subject_type: 'SUBJECT1' = wystawione, 'SUBJECT2' = otrzymane (kosztowe)
         """
-        logger.info(f"fetch_invoices: KSEF2_AVAILABLE={KSEF2_AVAILABLE}, _auth={self._auth is not None}, _client={self._client is not None}")
+        logger.info(f"fetch_invoices: KSEF2_AVAILABLE={ksef2_available()}, _auth={self._auth is not None}, _client={self._client is not None}")
         
-        if KSEF2_AVAILABLE and self._auth:
+        started = time.perf_counter()
+        if ksef2_available() and self._auth:
             logger.info("fetch_invoices: using ksef2 SDK path")
-            return self._fetch_with_ksef2(date_from, date_to, subject_type)
+            invoices, message = self._fetch_with_ksef2(date_from, date_to, subject_type)
         else:
-            logger.warning(f"fetch_invoices: using fallback path (KSEF2={KSEF2_AVAILABLE}, auth={self._auth})")
-            return self._fetch_fallback(date_from, date_to, subject_type)
+            logger.warning(f"fetch_invoices: using fallback path (KSEF2={ksef2_available()}, auth={self._auth})")
+            invoices, message = self._fetch_fallback(date_from, date_to, subject_type)
+        # Sukces zwraca komunikat "Pobrano N faktur ...", błędy - pustą listę i opis
+        record_ksef_call('fetch_invoices', fetch_succeeded(message), time.perf_counter() - started)
+        record_ksef_invoices(len(invoices))
+        return invoices, message
     
     def _fetch_with_ksef2(
         self, 
@@ -217,15 +281,17 @@ class KSeFService:
     ) -> Tuple[List[Dict], str]:
         """Pobieranie faktur z ksef2 SDK."""
         try:
-            from ksef2.domain.models import FormSchema
+            sdk = load_ksef2()
             
             logger.info(f"KSeF fetch: opening online session for export, dates={date_from} to {date_to}")
             
             # Otwórz sesję online do eksportu
-            with self._client.sessions.open_online(
-                access_token=self._auth.access_token,
-                form_code=FormSchema.FA3,
-            ) as session:
+            with ExitStack() as stack:
+                with self.recorder.phase('open_session'):
+                    session = stack.enter_context(self._client.sessions.open_online(
+                        access_token=self._auth.access_token,
+                        form_code=sdk.FormSchema.FA3,
+                    ))
                 
                 logger.info(f"KSeF fetch: session opened, preparing filters")
                 
@@ -233,12 +299,12 @@ class KSeFService:
                 from_dt = datetime.strptime(date_from, '%Y-%m-%d').replace(tzinfo=timezone.utc)
                 to_dt = datetime.strptime(date_to, '%Y-%m-%d').replace(hour=23, minute=59, second=59, tzinfo=timezone.utc)
                 
-                subj_type = InvoiceSubjectType.SUBJECT2 if subject_type == 'SUBJECT2' else InvoiceSubjectType.SUBJECT1
+                subj_type = sdk.InvoiceSubjectType.SUBJECT2 if subject_type == 'SUBJECT2' else sdk.InvoiceSubjectType.SUBJECT1
                 
-                filters = InvoiceQueryFilters(
+                filters = sdk.InvoiceQueryFilters(
                     subject_type=subj_type,
-                    date_range=InvoiceQueryDateRange(
-                        date_type=DateType.ISSUE,
+                    date_range=sdk.InvoiceQueryDateRange(
+                        date_type=sdk.DateType.ISSUE,
                         from_=from_dt,
                         to=to_dt,
                     ),
@@ -247,20 +313,32 @@ class KSeFService:
                 logger.info(f"KSeF fetch: scheduling export with filters")
                 
                 # Zaplanuj eksport
-                export = session.schedule_invoices_export(filters=filters)
+                with self.recorder.phase('schedule_export'):
+                    export = session.schedule_invoices_export(filters=filters)
+                self.progress.publish('export_scheduled', reference=export.reference_number)
                 
                 logger.info(f"KSeF fetch: export scheduled, ref={export.reference_number}, waiting for completion...")
                 
                 # Poczekaj na gotowość eksportu - polling z timeout
                 import time
-                max_wait_seconds = 120
-                poll_interval = 3
+                max_wait_seconds = settings.KSEF_EXPORT_TIMEOUT_SECONDS
+                poll_interval = settings.KSEF_EXPORT_POLL_SECONDS
                 elapsed = 0
                 export_result = None
                 
+                attempt = 0
                 while elapsed < max_wait_seconds:
-                    export_result = session.get_export_status(
-                        reference_number=export.reference_number
+                    attempt += 1
+                    with self.recorder.phase('poll', attempt=attempt) as phase:
+                        export_result = session.get_export_status(
+                            reference_number=export.reference_number
+                        )
+                        status = getattr(export_result, 'status', None) or getattr(export_result, 'processing_status', None)
+                        phase['status'] = str(status) if status is not None else None
+                        phase['ready'] = export_result.package is not None
+                    self.progress.publish(
+                        'poll', attempt=attempt, status=phase['status'], ready=phase['ready'],
+                        elapsed=elapsed, timeout=max_wait_seconds,
                     )
                     
                     # Sprawdź czy eksport jest gotowy (ma pakiet)
@@ -268,8 +346,6 @@ class KSeFService:
                         logger.info(f"KSeF fetch: export ready after {elapsed}s, package available")
                         break
                     
-                    # Sprawdź status jeśli dostępny
-                    status = getattr(export_result, 'status', None) or getattr(export_result, 'processing_status', None)
                     logger.info(f"KSeF fetch: waiting... elapsed={elapsed}s, status={status}, package={export_result.package}")
                     
                     # Jeśli status to błąd lub zakończony bez danych
@@ -278,8 +354,11 @@ class KSeFService:
                             logger.warning(f"KSeF fetch: export finished but no package, status={status}")
                             break
                     
-                    time.sleep(poll_interval)
+                    self.progress.check_cancelled()
+                    with self.recorder.phase('wait'):
+                        time.sleep(poll_interval)
                     elapsed += poll_interval
+                    self.progress.check_cancelled()
                 
                 if not export_result:
                     return [], "Błąd: brak odpowiedzi eksportu"
@@ -294,24 +373,42 @@ class KSeFService:
                     temp_dir = tempfile.mkdtemp(prefix='ksef_export_')
                     logger.info(f"KSeF fetch: downloading package to {temp_dir}")
                     
-                    for path in session.fetch_package(
-                        package=export_result.package, 
-                        target_directory=temp_dir
-                    ):
-                        logger.info(f"KSeF fetch: downloaded file {path}")
-                        # Parsuj pobrany plik
-                        invoices.extend(self._parse_export_file(path))
-                    
-                    # Spróbuj posprzątać
                     try:
-                        import shutil
-                        shutil.rmtree(temp_dir)
-                    except Exception as cleanup_err:
-                        logger.warning(f"Could not clean up temp dir: {cleanup_err}")
+                        with self.recorder.phase('download') as phase:
+                            paths = list(session.fetch_package(
+                                package=export_result.package, 
+                                target_directory=temp_dir
+                            ))
+                            downloaded = sum(os.path.getsize(path) for path in paths)
+                            phase.update(files=len(paths), bytes=downloaded)
+                        self.recorder.add_bytes(downloaded)
+                        self.progress.publish('downloaded', files=len(paths), bytes=downloaded)
+                        self.progress.check_cancelled()
+
+                        for number, path in enumerate(paths, 1):
+                            logger.info(f"KSeF fetch: downloaded file {path}")
+                            # Parsuj pobrany plik
+                            with self.recorder.phase('parse', file=os.path.basename(str(path))) as phase:
+                                parsed = self._parse_export_file(
+                                    path, details=phase, on_progress=self._parse_progress(number, len(paths), len(invoices)),
+                                )
+                                phase['invoices'] = len(parsed)
+                            self.recorder.add_parsed(len(parsed))
+                            invoices.extend(parsed)
+                    finally:
+                        # Sprzątamy także po anulowaniu i błędzie
+                        try:
+                            import shutil
+                            shutil.rmtree(temp_dir)
+                        except Exception as cleanup_err:
+                            logger.warning(f"Could not clean up temp dir: {cleanup_err}")
                 
                 logger.info(f"KSeF fetch: SUCCESS, parsed {len(invoices)} invoices")
                 return invoices, f"Pobrano {len(invoices)} faktur (ksef2 SDK)"
                 
+        except FetchCancelled:
+            logger.info("KSeF fetch: cancelled by user")
+            return [], CANCELLED_MESSAGE
         except Exception as e:
             logger.error(f"Błąd pobierania z ksef2: {e}", exc_info=True)
             # Zwróć komunikat błędu zamiast fallback do nieistniejącego API
@@ -351,27 +448,35 @@ class KSeFService:
             
             logger.info(f"KSeF fallback: payload={payload}")
             
-            response = requests.post(
-                query_url,
-                json=payload,
-                headers={
-                    'Content-Type': 'application/json',
-                    'Accept': 'application/json',
-                    'Authorization': f'Bearer {self.access_token}'
-                },
-                timeout=60
-            )
+            with self.recorder.phase('query') as phase:
+                response = requests.post(
+                    query_url,
+                    json=payload,
+                    headers={
+                        'Content-Type': 'application/json',
+                        'Accept': 'application/json',
+                        'Authorization': f'Bearer {self.access_token}'
+                    },
+                    timeout=60
+                )
+                phase['status'] = response.status_code
+                phase['bytes'] = len(response.content)
+            self.recorder.add_bytes(len(response.content))
             
             logger.info(f"KSeF fallback: response status={response.status_code}")
             
             if response.status_code == 200:
-                data = response.json()
-                invoice_list = data.get('invoiceHeaders', []) or data.get('invoiceHeaderList', []) or data.get('items', [])
-                
-                for inv in invoice_list:
-                    invoice_data = self._parse_invoice_header(inv)
-                    if invoice_data:
-                        invoices.append(invoice_data)
+                with self.recorder.phase('parse') as phase:
+                    data = response.json()
+                    invoice_list = data.get('invoiceHeaders', []) or data.get('invoiceHeaderList', []) or data.get('items', [])
+                    
+                    for inv in invoice_list:
+                        invoice_data = self._parse_invoice_header(inv)
+                        if invoice_data:
+                            invoices.append(invoice_data)
+                    phase['invoices'] = len(invoices)
+                self.recorder.add_parsed(len(invoices))
+                self.progress.publish('parsed', done=len(invoices), total=len(invoices), file=1, files=1)
                 
                 return invoices, f"Pobrano {len(invoices)} faktur (API 2.0)"
             elif response.status_code == 401:
@@ -384,323 +489,38 @@ class KSeFService:
             logger.error(f"KSeF fallback exception: {e}", exc_info=True)
             return [], f"Błąd pobierania faktur: {str(e)}"
     
-    def _parse_export_file(self, path) -> List[Dict]:
-        """Parsuj plik eksportu z KSeF."""
-        invoices = []
+    def _parse_progress(self, number, files, parsed_before):
+        """Callback parse_package: zdarzenie 'parsed' i sprawdzenie anulowania po każdej porcji."""
+        def on_progress(done, total):
+            self.progress.publish(
+                'parsed', done=done, total=total, file=number, files=files, invoices=parsed_before + done,
+            )
+            self.progress.check_cancelled()
+        return on_progress
+
+    def _parse_export_file(self, path, details=None, on_progress=None) -> List[Dict]:
+        """
+        Parsuj plik eksportu z KSeF. Przy KSEF_PARSE_WORKERS > 1 duże paczki
+        parsowane są równolegle w puli procesów (patrz invoices/ksef_parser.py).
+        """
         try:
-            import zipfile
-            import xml.etree.ElementTree as ET
-            from pathlib import Path
-            
-            # Konwertuj na string jeśli to Path
-            path_str = str(path)
-            
-            logger.info(f"Parsing export file: {path_str}")
-            
-            if path_str.endswith('.zip'):
-                with zipfile.ZipFile(path_str, 'r') as zf:
-                    xml_files = [n for n in zf.namelist() if n.endswith('.xml')]
-                    logger.info(f"Found {len(xml_files)} XML files in ZIP: {xml_files}")
-                    
-                    for name in xml_files:
-                        with zf.open(name) as f:
-                            xml_content = f.read().decode('utf-8')
-                            logger.debug(f"Parsing XML: {name}, length={len(xml_content)}")
-                            inv = self._parse_invoice_xml(xml_content, name)
-                            if inv:
-                                invoices.append(inv)
-                                logger.info(f"Parsed invoice: {inv.get('numer', 'unknown')}")
-            else:
-                logger.warning(f"File is not a ZIP: {path_str}")
+            logger.info(f"Parsing export file: {path}")
+            return parse_package(
+                path,
+                workers=settings.KSEF_PARSE_WORKERS,
+                min_parallel=settings.KSEF_PARSE_PARALLEL_MIN,
+                details=details,
+                on_progress=on_progress,
+            )
+        except FetchCancelled:
+            raise
         except Exception as e:
             logger.error(f"Błąd parsowania eksportu: {e}", exc_info=True)
-        
-        return invoices
+            return []
     
-    def _parse_invoice_xml(self, xml_content: str, filename: str = '') -> Optional[Dict]:
+    def _parse_invoice_xml(self, xml_content, filename: str = '') -> Optional[Dict]:
         """Parsuj XML faktury KSeF."""
-        try:
-            import xml.etree.ElementTree as ET
-            import re
-            
-            root = ET.fromstring(xml_content)
-            
-            # Znajdź namespace używany w dokumencie
-            ns_match = re.search(r'\{([^}]+)\}', root.tag)
-            ns_uri = ns_match.group(1) if ns_match else ''
-            ns = {'fa': ns_uri} if ns_uri else {}
-            
-            def find_text(paths, default=''):
-                """Helper do szukania tekstu w różnych ścieżkach."""
-                for path in paths:
-                    try:
-                        if ns:
-                            result = root.findtext(path, default=None, namespaces=ns)
-                        else:
-                            result = root.findtext(path, default=None)
-                        if result:
-                            return result.strip()
-                    except:
-                        pass
-                return default
-            
-            def find_all_text(paths):
-                """Helper do szukania wszystkich wystąpień."""
-                results = []
-                for path in paths:
-                    try:
-                        if ns:
-                            elements = root.findall(path, namespaces=ns)
-                        else:
-                            elements = root.findall(path)
-                        for el in elements:
-                            if el.text:
-                                results.append(el.text.strip())
-                    except:
-                        pass
-                return results
-            
-            # Wyciągnij numer KSeF z nazwy pliku
-            ksef_numer = filename.replace('.xml', '') if filename else ''
-            
-            # Podstawowe dane faktury
-            numer = find_text(['.//fa:P_2', './/P_2', './/{*}P_2'])
-            data_wystawienia = find_text(['.//fa:P_1', './/P_1', './/{*}P_1'])
-            data_sprzedazy = find_text(['.//fa:P_6', './/P_6', './/{*}P_6'])
-            
-            # Termin płatności - P_19A lub TerminPlatnosci
-            termin_platnosci = find_text([
-                './/fa:Platnosc//fa:TerminPlatnosci//fa:Termin',
-                './/fa:TerminPlatnosci//fa:Termin',
-                './/fa:P_19A',
-                './/Platnosc//TerminPlatnosci//Termin',
-                './/{*}Platnosc//{*}TerminPlatnosci//{*}Termin',
-                './/{*}P_19A',
-            ])
-            
-            # Kwoty - P_15 to suma brutto (należność ogółem)
-            kwota_brutto_str = find_text(['.//fa:P_15', './/P_15', './/{*}P_15'], '0')
-            
-            # Jeśli nie ma P_15, spróbuj zsumować netto + VAT
-            if not kwota_brutto_str or kwota_brutto_str == '0':
-                # Zbierz wszystkie kwoty netto (P_13_1 do P_13_11)
-                netto_values = []
-                for i in range(1, 12):
-                    val = find_text([f'.//fa:P_13_{i}', f'.//P_13_{i}', f'.//*P_13_{i}'], '0')
-                    if val and val != '0':
-                        netto_values.append(Decimal(val))
-                
-                # Zbierz wszystkie kwoty VAT (P_14_1 do P_14_5)
-                vat_values = []
-                for i in range(1, 6):
-                    val = find_text([f'.//fa:P_14_{i}', f'.//P_14_{i}', f'.//*P_14_{i}'], '0')
-                    if val and val != '0':
-                        vat_values.append(Decimal(val))
-                
-                kwota_brutto = sum(netto_values, Decimal('0')) + sum(vat_values, Decimal('0'))
-            else:
-                kwota_brutto = Decimal(kwota_brutto_str.replace(',', '.').replace(' ', ''))
-            
-            # Sprzedawca (Podmiot1)
-            sprzedawca_nazwa = find_text([
-                './/fa:Podmiot1//fa:DaneIdentyfikacyjne//fa:Nazwa',
-                './/fa:Podmiot1//fa:Nazwa',
-                './/Podmiot1//DaneIdentyfikacyjne//Nazwa',
-                './/{*}Podmiot1//{*}DaneIdentyfikacyjne//{*}Nazwa',
-                './/{*}Podmiot1//{*}Nazwa',
-            ])
-            sprzedawca_nip = find_text([
-                './/fa:Podmiot1//fa:DaneIdentyfikacyjne//fa:NIP',
-                './/fa:Podmiot1//fa:NIP',
-                './/{*}Podmiot1//{*}NIP',
-            ])
-            sprzedawca_adres = find_text([
-                './/fa:Podmiot1//fa:Adres//fa:AdresL1',
-                './/{*}Podmiot1//{*}Adres//{*}AdresL1',
-            ])
-            sprzedawca_miasto = find_text([
-                './/fa:Podmiot1//fa:Adres//fa:AdresL2',
-                './/{*}Podmiot1//{*}Adres//{*}AdresL2',
-            ])
-            
-            # Nabywca (Podmiot2)
-            nabywca_nazwa = find_text([
-                './/fa:Podmiot2//fa:DaneIdentyfikacyjne//fa:Nazwa',
-                './/fa:Podmiot2//fa:Nazwa',
-                './/{*}Podmiot2//{*}DaneIdentyfikacyjne//{*}Nazwa',
-            ])
-            nabywca_nip = find_text([
-                './/fa:Podmiot2//fa:DaneIdentyfikacyjne//fa:NIP',
-                './/fa:Podmiot2//fa:NIP',
-                './/{*}Podmiot2//{*}NIP',
-            ])
-            
-            # Pozycje faktury - FaWiersz (normalne faktury) lub Zamowienie (faktury zaliczkowe)
-            pozycje = []
-            
-            # Najpierw szukaj FaWiersz (normalne faktury)
-            wiersz_paths = ['.//fa:FaWiersz', './/FaWiersz', './/{*}FaWiersz']
-            for path in wiersz_paths:
-                try:
-                    if ns:
-                        wiersze = root.findall(path, namespaces=ns)
-                    else:
-                        wiersze = root.findall(path)
-                    
-                    if wiersze:
-                        for wiersz in wiersze:
-                            poz = {}
-                            # Nazwa towaru/usługi
-                            for name_path in ['fa:P_7', 'P_7', '{*}P_7']:
-                                el = wiersz.find(name_path, namespaces=ns) if ns else wiersz.find(name_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['nazwa'] = el.text.strip()
-                                    break
-                            
-                            # Ilość
-                            for qty_path in ['fa:P_8B', 'P_8B']:
-                                el = wiersz.find(qty_path, namespaces=ns) if ns else wiersz.find(qty_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['ilosc'] = el.text.strip()
-                                    break
-                            
-                            # Jednostka
-                            for unit_path in ['fa:P_8A', 'P_8A']:
-                                el = wiersz.find(unit_path, namespaces=ns) if ns else wiersz.find(unit_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['jednostka'] = el.text.strip()
-                                    break
-                            
-                            # Cena jednostkowa netto
-                            for price_path in ['fa:P_9A', 'P_9A']:
-                                el = wiersz.find(price_path, namespaces=ns) if ns else wiersz.find(price_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['cena_netto'] = el.text.strip()
-                                    break
-                            
-                            # Wartość netto
-                            for val_path in ['fa:P_11', 'P_11']:
-                                el = wiersz.find(val_path, namespaces=ns) if ns else wiersz.find(val_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['wartosc_netto'] = el.text.strip()
-                                    break
-                            
-                            # Stawka VAT
-                            for vat_path in ['fa:P_12', 'P_12']:
-                                el = wiersz.find(vat_path, namespaces=ns) if ns else wiersz.find(vat_path.replace('fa:', ''))
-                                if el is not None and el.text:
-                                    poz['stawka_vat'] = el.text.strip()
-                                    break
-                            
-                            if poz.get('nazwa'):
-                                pozycje.append(poz)
-                        break
-                except Exception as e:
-                    logger.debug(f"Error parsing positions: {e}")
-                    continue
-            
-            # Jeśli brak FaWiersz, szukaj Zamowienie (faktury zaliczkowe)
-            if not pozycje:
-                zamowienie_paths = [
-                    './/fa:Zamowienie', './/Zamowienie', './/{*}Zamowienie',
-                    './/fa:ZamowienieWiersz', './/ZamowienieWiersz', './/{*}ZamowienieWiersz',
-                    './/fa:Zaliczka', './/Zaliczka', './/{*}Zaliczka',
-                    './/fa:ZaliczkaCzesciowa', './/ZaliczkaCzesciowa', './/{*}ZaliczkaCzesciowa',
-                ]
-                for path in zamowienie_paths:
-                    try:
-                        if ns:
-                            wiersze = root.findall(path, namespaces=ns)
-                        else:
-                            wiersze = root.findall(path)
-                        
-                        if wiersze:
-                            for wiersz in wiersze:
-                                poz = {}
-                                # Opis zamówienia/zaliczki
-                                for name_path in ['fa:OpisZamowienia', 'OpisZamowienia', '{*}OpisZamowienia',
-                                                  'fa:P_7Z', 'P_7Z', '{*}P_7Z',
-                                                  'fa:NazwaTowaru', 'NazwaTowaru', '{*}NazwaTowaru']:
-                                    el = wiersz.find(name_path, namespaces=ns) if ns else wiersz.find(name_path.replace('fa:', ''))
-                                    if el is not None and el.text:
-                                        poz['nazwa'] = el.text.strip()
-                                        break
-                                
-                                # Kwota zaliczki
-                                for kwota_path in ['fa:KwotaZaliczki', 'KwotaZaliczki', '{*}KwotaZaliczki',
-                                                   'fa:WartoscBrutto', 'WartoscBrutto', '{*}WartoscBrutto',
-                                                   'fa:P_11Z', 'P_11Z', '{*}P_11Z']:
-                                    el = wiersz.find(kwota_path, namespaces=ns) if ns else wiersz.find(kwota_path.replace('fa:', ''))
-                                    if el is not None and el.text:
-                                        poz['wartosc_netto'] = el.text.strip()
-                                        break
-                                
-                                # Stawka VAT zaliczki
-                                for vat_path in ['fa:StawkaVAT', 'StawkaVAT', '{*}StawkaVAT',
-                                                 'fa:P_12Z', 'P_12Z', '{*}P_12Z']:
-                                    el = wiersz.find(vat_path, namespaces=ns) if ns else wiersz.find(vat_path.replace('fa:', ''))
-                                    if el is not None and el.text:
-                                        poz['stawka_vat'] = el.text.strip()
-                                        break
-                                
-                                if poz.get('nazwa') or poz.get('wartosc_netto'):
-                                    if not poz.get('nazwa'):
-                                        poz['nazwa'] = 'Zaliczka'
-                                    poz['ilosc'] = '1'
-                                    poz['jednostka'] = 'szt.'
-                                    pozycje.append(poz)
-                            if pozycje:
-                                break
-                    except Exception as e:
-                        logger.debug(f"Error parsing zaliczka positions: {e}")
-                        continue
-            
-            # Jeśli nadal brak pozycji, stwórz jedną z kwoty całkowitej
-            if not pozycje and kwota_brutto:
-                pozycje.append({
-                    'nazwa': 'Pozycja faktury (szczegóły niedostępne)',
-                    'ilosc': '1',
-                    'jednostka': 'szt.',
-                    'wartosc_netto': str(kwota_brutto),
-                    'stawka_vat': '23'
-                })
-            
-            # Waluta
-            waluta = find_text(['.//fa:KodWaluty', './/KodWaluty', './/{*}KodWaluty'], 'PLN')
-            
-            # Forma płatności
-            forma_platnosci = find_text([
-                './/fa:Platnosc//fa:FormaPlatnosci',
-                './/{*}Platnosc//{*}FormaPlatnosci',
-            ])
-            
-            logger.info(f"Parsed XML {filename}: numer={numer}, data={data_wystawienia}, "
-                       f"kwota={kwota_brutto}, termin={termin_platnosci}, pozycji={len(pozycje)}")
-            
-            if not numer and not sprzedawca_nazwa:
-                logger.warning(f"Could not parse invoice from {filename}")
-                logger.debug(f"XML content (first 1000 chars): {xml_content[:1000]}")
-                return None
-            
-            return {
-                'ksef_numer': ksef_numer,
-                'numer': numer,
-                'data': data_wystawienia[:10] if data_wystawienia else '',
-                'data_sprzedazy': data_sprzedazy[:10] if data_sprzedazy else '',
-                'termin_platnosci': termin_platnosci[:10] if termin_platnosci else '',
-                'kwota': float(kwota_brutto),
-                'waluta': waluta,
-                'dostawca': sprzedawca_nazwa,
-                'dostawca_nip': sprzedawca_nip,
-                'dostawca_adres': f"{sprzedawca_adres}, {sprzedawca_miasto}".strip(', '),
-                'nabywca': nabywca_nazwa,
-                'nabywca_nip': nabywca_nip,
-                'forma_platnosci': forma_platnosci,
-                'pozycje': pozycje,
-            }
-        except Exception as e:
-            logger.error(f"Błąd parsowania XML {filename}: {e}", exc_info=True)
-            return None
+        return parse_invoice_xml(xml_content, filename)
     
     def _parse_invoice_header(self, header: Dict) -> Optional[Dict]:
         """Parsuj nagłówek faktury z API."""
@@ -728,32 +548,44 @@ class KSeFService:
     
     def terminate_session(self):
         """Zakończ sesję KSeF."""
-        if KSEF2_AVAILABLE and self._auth:
+        started = time.perf_counter()
+        if ksef2_available() and self._auth:
             try:
-                self._auth.sessions.terminate_current()
+                with self.recorder.phase('terminate_session'):
+                    self._auth.sessions.terminate_current()
+                record_ksef_call('terminate_session', True, time.perf_counter() - started)
             except Exception:
-                pass
+                record_ksef_call('terminate_session', False, time.perf_counter() - started)
         elif self.access_token:
             try:
-                requests.delete(
-                    f"{self.base_url}/auth/sessions/current",
-                    headers={'Authorization': f'Bearer {self.access_token}'},
-                    timeout=10
-                )
+                with self.recorder.phase('terminate_session'):
+                    requests.delete(
+                        f"{self.base_url}/auth/sessions/current",
+                        headers={'Authorization': f'Bearer {self.access_token}'},
+                        timeout=10
+                    )
+                record_ksef_call('terminate_session', True, time.perf_counter() - started)
             except Exception:
-                pass
+                record_ksef_call('terminate_session', False, time.perf_counter() - started)
         
         self.access_token = None
         self._auth = None
         self._client = None
 
 
+def fetch_succeeded(message: str) -> bool:
+    """fetch_invoices zwraca przy sukcesie komunikat "Pobrano N faktur ...", przy błędzie opis błędu."""
+    return message.startswith('Pobrano')
+
+
 def fetch_invoices_from_ksef(
     token: str,
     nip: str,
     environment: str,
     date_from: str = None,
-    date_to: str = None
+    date_to: str = None,
+    recorder=None,
+    progress=None
 ) -> Tuple[List[Dict], str]:
     """
     Wrapper do pobierania faktur z KSeF API 2.0.
@@ -764,6 +596,8 @@ def fetch_invoices_from_ksef(
         environment: 'production', 'demo', lub 'test'
         date_from: Data początkowa (YYYY-MM-DD)
         date_to: Data końcowa (YYYY-MM-DD)
+        recorder: Opcjonalny SyncRecorder mierzący fazy
+        progress: Opcjonalny ProgressChannel (zdarzenia postępu, anulowanie)
     
     Returns:
         Tuple[List[Dict], str]: Lista faktur i komunikat
@@ -773,17 +607,20 @@ def fetch_invoices_from_ksef(
     if not date_to:
         date_to = datetime.now().strftime('%Y-%m-%d')
     
-    service = KSeFService(token, nip, environment)
+    service = KSeFService(token, nip, environment, recorder=recorder, progress=progress)
     
     try:
         # Autoryzuj
         success, auth_msg = service.authorize()
         if not success:
             return [], auth_msg
+        service.progress.check_cancelled()
         
         # Pobierz faktury
         invoices, fetch_msg = service.fetch_invoices(date_from, date_to)
         return invoices, fetch_msg
+    except FetchCancelled:
+        return [], CANCELLED_MESSAGE
     except Exception as e:
         return [], f"Błąd: {str(e)}"
     finally:
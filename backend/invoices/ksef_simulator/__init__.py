@@ -0,0 +1,34 @@
+"""
+Lokalny symulator KSeF 2.0 do testów wydajności i obciążenia.
+
+    server.py - serwer HTTP (challenge/token/redeem, eksport z opóźnieniem, paczki ZIP)
+    sdk.py    - atrapa SDK ksef2 używana przez KSeFService zamiast prawdziwego klienta
+    fa3.py    - generator faktur FA(3) i paczek eksportu
+
+Uruchomienie obok serwera aplikacji (test obciążeniowy):
+    python manage.py ksef_simulator --port 8090 --invoices 2000 --lines 1-20
+    KSEF_SIMULATOR_URL=http://127.0.0.1:8090 gunicorn fakturex.asgi:application ...
+
+W kodzie (benchmarks/bench_ksef.py):
+    with KSeFSimulator(invoices=500) as simulator, use_simulator(simulator.url):
+        fetch_invoices_from_ksef(...)
+"""
+from contextlib import contextmanager
+
+from .fa3 import build_package, invoice_specs, invoice_xml, write_package
+from .server import KSeFSimulator
+
+
+@contextmanager
+def use_simulator(url):
+    """Skieruj KSeFService na symulator (KSEF_SIMULATOR_URL) na czas bloku."""
+    from django.test import override_settings
+    from invoices.ksef_service import load_ksef2
+
+    # load_ksef2() zapamiętuje wynik - wyczyść przed i po zmianie ustawienia
+    load_ksef2.cache_clear()
+    try:
+        with override_settings(KSEF_SIMULATOR_URL=url):
+            yield
+    finally:
+        load_ksef2.cache_clear()
@@ -0,0 +1,160 @@
+"""
+Generator faktur FA(3) i paczek eksportu KSeF (ZIP z plikami <numer KSeF>.xml).
+
+Faktury mają strukturę schematu FA(3): nagłówek, Podmiot1 (sprzedawca),
+Podmiot2 (nabywca), Fa z sumami P_13_x/P_14_x/P_15 zgodnymi z wierszami
+FaWiersz, adnotacje i płatność. Generator jest deterministyczny - ta sama
+para (seed, numer faktury) daje zawsze ten sam dokument.
+
+    xml = invoice_xml(spec)
+    data = build_package(invoice_specs(100, buyer_nip='5250001009', lines=(1, 20)))
+"""
+import io
+import random
+import zipfile
+from datetime import date, datetime, timedelta, timezone
+from decimal import Decimal
+from xml.sax.saxutils import escape
+
+from invoices.perf_data import (
+    CITIES, ITEMS, NAME_CORES, NAME_PREFIXES, NAME_SUFFIXES, PAYMENT_TERMS, STREETS, random_nip,
+)
+
+FA3_NAMESPACE = 'http://crd.gov.pl/wzor/2025/06/25/13775/'
+
+# Stawka VAT -> indeks pól P_13_x / P_14_x
+VAT_FIELDS = {'23': 1, '8': 2, '5': 3}
+LINE_RATES = ('23', '23', '23', '8', '5')
+# Kody formy płatności FA(3): 1 gotówka, 2 karta, 6 przelew
+PAYMENT_FORMS = ('6', '6', '6', '1', '2')
+
+
+def ksef_number(seller_nip, issue_date, index, rng):
+    """Numer KSeF w formacie <NIP>-<RRRRMMDD>-<12 znaków hex>-<2 znaki hex>."""
+    return f'{seller_nip}-{issue_date:%Y%m%d}-{index:012X}-{rng.randrange(256):02X}'
+
+
+def _seller(rng, index):
+    kod, miasto = rng.choice(CITIES)
+    nazwa = f'{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_CORES)} {index}'
+    return {
+        'nip': random_nip(rng),
+        'nazwa': f'{nazwa} {rng.choice(NAME_SUFFIXES)}'.strip(),
+        'adres_l1': f'ul. {rng.choice(STREETS)} {rng.randint(1, 200)}',
+        'adres_l2': f'{kod} {miasto}',
+    }
+
+
+def invoice_specs(count, buyer_nip, buyer_name='Fakturex Sp. z o.o.', date_from=None, date_to=None,
+                  lines=(1, 5), sellers=50, seed=42):
+    """
+    Opisy `count` faktur zakupowych dla nabywcy buyer_nip, z datami w zakresie
+    [date_from, date_to] i liczbą wierszy losowaną z przedziału lines (min, max).
+    """
+    rng = random.Random(seed)
+    date_to = date_to or date.today()
+    date_from = date_from or date_to - timedelta(days=30)
+    span = max(0, (date_to - date_from).days)
+    pool = [_seller(rng, i + 1) for i in range(max(1, sellers))]
+    min_lines, max_lines = lines
+
+    for index in range(1, count + 1):
+        seller = rng.choice(pool)
+        issue_date = date_from + timedelta(days=rng.randint(0, span))
+        wiersze = []
+        for lp in range(1, rng.randint(min_lines, max_lines) + 1):
+            nazwa, jednostka = rng.choice(ITEMS)
+            ilosc = Decimal(rng.randint(1, 20))
+            cena = Decimal(str(round(rng.lognormvariate(4, 1), 2))).quantize(Decimal('0.01')) or Decimal('1.00')
+            wiersze.append({
+                'lp': lp,
+                'nazwa': nazwa,
+                'jednostka': jednostka,
+                'ilosc': ilosc,
+                'cena': cena,
+                'netto': (ilosc * cena).quantize(Decimal('0.01')),
+                'stawka': rng.choice(LINE_RATES),
+            })
+        yield {
+            'ksef_numer': ksef_number(seller['nip'], issue_date, index, rng),
+            'numer': f'FV/{issue_date:%Y/%m}/{index:06d}',
+            'data': issue_date,
+            'termin': issue_date + timedelta(days=rng.choice(PAYMENT_TERMS)),
+            'forma_platnosci': rng.choice(PAYMENT_FORMS),
+            'sprzedawca': seller,
+            'nabywca': {'nip': buyer_nip, 'nazwa': buyer_name},
+            'wiersze': wiersze,
+        }
+
+
+def vat_totals(wiersze):
+    """Sumy netto i VAT per stawka (VAT liczony od sumy netto stawki)."""
+    netto = {}
+    for wiersz in wiersze:
+        netto[wiersz['stawka']] = netto.get(wiersz['stawka'], Decimal('0')) + wiersz['netto']
+    return {
+        stawka: (value, (value * Decimal(stawka) / 100).quantize(Decimal('0.01')))
+        for stawka, value in netto.items()
+    }
+
+
+def invoice_xml(spec, created_at=None):
+    """Dokument FA(3) dla opisu z invoice_specs()."""
+    created_at = created_at or datetime.now(timezone.utc).replace(microsecond=0)
+    seller = spec['sprzedawca']
+    buyer = spec['nabywca']
+    totals = vat_totals(spec['wiersze'])
+
+    sums = []
+    brutto = Decimal('0')
+    for stawka, field in sorted(VAT_FIELDS.items(), key=lambda item: item[1]):
+        if stawka in totals:
+            netto, vat = totals[stawka]
+            sums.append(f'<P_13_{field}>{netto}</P_13_{field}><P_14_{field}>{vat}</P_14_{field}>')
+            brutto += netto + vat
+
+    rows = ''.join(
+        f'<FaWiersz><NrWierszaFa>{w["lp"]}</NrWierszaFa><P_7>{escape(w["nazwa"])}</P_7>'
+        f'<P_8A>{escape(w["jednostka"])}</P_8A><P_8B>{w["ilosc"]}</P_8B><P_9A>{w["cena"]}</P_9A>'
+        f'<P_11>{w["netto"]}</P_11><P_12>{w["stawka"]}</P_12></FaWiersz>'
+        for w in spec['wiersze']
+    )
+
+    return (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        f'<Faktura xmlns="{FA3_NAMESPACE}">'
+        '<Naglowek><KodFormularza kodSystemowy="FA (3)" wersjaSchemy="1-0E">FA</KodFormularza>'
+        f'<WariantFormularza>3</WariantFormularza><DataWytworzeniaFa>{created_at.isoformat().replace("+00:00", "Z")}</DataWytworzeniaFa>'
+        '<SystemInfo>Fakturex KSeF simulator</SystemInfo></Naglowek>'
+        f'<Podmiot1><DaneIdentyfikacyjne><NIP>{seller["nip"]}</NIP><Nazwa>{escape(seller["nazwa"])}</Nazwa></DaneIdentyfikacyjne>'
+        f'<Adres><KodKraju>PL</KodKraju><AdresL1>{escape(seller["adres_l1"])}</AdresL1>'
+        f'<AdresL2>{escape(seller["adres_l2"])}</AdresL2></Adres></Podmiot1>'
+        f'<Podmiot2><DaneIdentyfikacyjne><NIP>{buyer["nip"]}</NIP><Nazwa>{escape(buyer["nazwa"])}</Nazwa></DaneIdentyfikacyjne>'
+        '<JST>2</JST><GV>2</GV></Podmiot2>'
+        f'<Fa><KodWaluty>PLN</KodWaluty><P_1>{spec["data"]}</P_1><P_2>{escape(spec["numer"])}</P_2>'
+        f'<P_6>{spec["data"]}</P_6>{"".join(sums)}<P_15>{brutto}</P_15>'
+        '<Adnotacje><P_16>2</P_16><P_17>2</P_17><P_18>2</P_18><P_18A>2</P_18A>'
+        '<Zwolnienie><P_19N>1</P_19N></Zwolnienie><NoweSrodkiTransportu><P_22N>1</P_22N></NoweSrodkiTransportu>'
+        '<P_23>2</P_23><PMarzy><P_PMarzyN>1</P_PMarzyN></PMarzy></Adnotacje>'
+        f'<RodzajFaktury>VAT</RodzajFaktury>{rows}'
+        f'<Platnosc><TerminPlatnosci><Termin>{spec["termin"]}</Termin></TerminPlatnosci>'
+        f'<FormaPlatnosci>{spec["forma_platnosci"]}</FormaPlatnosci></Platnosc></Fa>'
+        '</Faktura>'
+    )
+
+
+def build_package(specs, compression=zipfile.ZIP_DEFLATED):
+    """Paczka eksportu: ZIP z plikami <numer KSeF>.xml. Zwraca bajty archiwum."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', compression=compression) as zf:
+        for spec in specs:
+            zf.writestr(f'{spec["ksef_numer"]}.xml', invoice_xml(spec))
+    return buffer.getvalue()
+
+
+def write_package(path, count, buyer_nip, lines=(1, 5), seed=42, **kwargs):
+    """Zapisz paczkę N faktur do pliku (np. do ręcznego testu parsera)."""
+    data = build_package(invoice_specs(count, buyer_nip, lines=lines, seed=seed, **kwargs))
+    with open(path, 'wb') as f:
+        f.write(data)
+    return len(data)
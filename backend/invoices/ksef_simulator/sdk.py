@@ -0,0 +1,189 @@
+"""
+Atrapa SDK ksef2 rozmawiająca z symulatorem KSeF.
+
+Odwzorowuje tylko to, czego używa KSeFService: Client(environment) z
+auth.authenticate_token() i sessions.open_online(), w sesji
+schedule_invoices_export(), get_export_status() i fetch_package(),
+oraz klasy filtrów z ksef2.domain.models. Wszystko idzie prawdziwym
+HTTP do symulatora, więc pomiar obejmuje sieć, JSON i zapis paczek na dysk.
+
+simulator_sdk(url) zwraca przestrzeń nazw w kształcie load_ksef2().
+"""
+import os
+from contextlib import contextmanager
+from enum import Enum
+from types import SimpleNamespace
+
+import requests
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class SimulatorError(Exception):
+    """Błąd HTTP symulatora - kod statusu na początku komunikatu, jak w ksef2."""
+
+    def __init__(self, response):
+        self.response = response
+        super().__init__(f'{response.status_code} {response.reason}: {response.text[:300]}')
+
+
+class InvoiceSubjectType(Enum):
+    SUBJECT1 = 'Subject1'
+    SUBJECT2 = 'Subject2'
+    SUBJECT3 = 'Subject3'
+
+
+class DateType(Enum):
+    ISSUE = 'Issue'
+    INVOICING = 'Invoicing'
+    PERMANENT_STORAGE = 'PermanentStorage'
+
+
+class FormSchema(Enum):
+    FA3 = 'FA (3)'
+
+
+class InvoiceQueryDateRange:
+
+    def __init__(self, date_type, from_, to):
+        self.date_type = date_type
+        self.from_ = from_
+        self.to = to
+
+
+class InvoiceQueryFilters:
+
+    def __init__(self, subject_type, date_range):
+        self.subject_type = subject_type
+        self.date_range = date_range
+
+    def to_json(self):
+        return {
+            'subjectType': self.subject_type.value,
+            'dateRange': {
+                'dateType': self.date_range.date_type.value,
+                'from': self.date_range.from_.isoformat(),
+                'to': self.date_range.to.isoformat(),
+            },
+        }
+
+
+class _Http:
+
+    def __init__(self, base_url):
+        self.base_url = base_url
+        self.session = requests.Session()
+
+    def request(self, method, path, token=None, **kwargs):
+        headers = kwargs.pop('headers', {})
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+        url = path if path.startswith('http') else f'{self.base_url}{path}'
+        response = self.session.request(method, url, headers=headers, timeout=60, **kwargs)
+        if response.status_code >= 400:
+            raise SimulatorError(response)
+        return response
+
+
+class OnlineSession:
+
+    def __init__(self, http, access_token, reference_number):
+        self._http = http
+        self._access_token = access_token
+        self.reference_number = reference_number
+
+    def schedule_invoices_export(self, filters):
+        data = self._http.request(
+            'POST', '/v2/invoices/exports', self._access_token, json={'filters': filters.to_json()}
+        ).json()
+        return SimpleNamespace(reference_number=data['referenceNumber'])
+
+    def get_export_status(self, reference_number):
+        data = self._http.request('GET', f'/v2/invoices/exports/{reference_number}', self._access_token).json()
+        status = data['status']
+        package = data.get('package')
+        return SimpleNamespace(
+            status=status['code'],
+            description=status.get('description', ''),
+            package=SimpleNamespace(**package) if package else None,
+        )
+
+    def fetch_package(self, package, target_directory):
+        """Pobierz części paczki strumieniowo do plików; zwraca ścieżki kolejno."""
+        for part in package.parts:
+            path = os.path.join(target_directory, part['partName'])
+            response = self._http.request('GET', part['url'], self._access_token, stream=True)
+            with open(path, 'wb') as f:
+                for chunk in response.iter_content(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+            yield path
+
+
+class _Sessions:
+
+    def __init__(self, http):
+        self._http = http
+
+    @contextmanager
+    def open_online(self, access_token, form_code):
+        data = self._http.request(
+            'POST', '/v2/sessions/online', access_token, json={'formCode': {'value': form_code.value}}
+        ).json()
+        session = OnlineSession(self._http, access_token, data['referenceNumber'])
+        try:
+            yield session
+        finally:
+            self._http.request('POST', f'/v2/sessions/online/{session.reference_number}/close', access_token)
+
+
+class _CurrentSessions:
+
+    def __init__(self, http, access_token):
+        self._http = http
+        self._access_token = access_token
+
+    def terminate_current(self):
+        self._http.request('DELETE', '/v2/auth/sessions/current', self._access_token)
+
+
+class _Auth:
+
+    def __init__(self, http):
+        self._http = http
+
+    def authenticate_token(self, ksef_token, nip):
+        context = {'type': 'nip', 'value': nip}
+        challenge = self._http.request('POST', '/v2/auth/challenge', json={'contextIdentifier': context}).json()
+        auth = self._http.request('POST', '/v2/auth/ksef-token', json={
+            'contextIdentifier': context,
+            'challenge': challenge['challenge'],
+            'ksefToken': ksef_token,
+        }).json()
+        tokens = self._http.request('POST', '/v2/auth/token/redeem', auth['authenticationToken']).json()
+        return SimpleNamespace(
+            access_token=tokens['accessToken'],
+            refresh_token=tokens['refreshToken'],
+            sessions=_CurrentSessions(self._http, tokens['accessToken']),
+        )
+
+
+class Client:
+    """Odpowiednik ksef2.Client - environment to adres symulatora."""
+
+    def __init__(self, environment):
+        self._http = _Http(environment)
+        self.auth = _Auth(self._http)
+        self.sessions = _Sessions(self._http)
+
+
+def simulator_sdk(url):
+    """Przestrzeń nazw jak z load_ksef2(), z każdym środowiskiem wskazującym na symulator."""
+    return SimpleNamespace(
+        Client=Client,
+        Environment=SimpleNamespace(PRODUCTION=url, DEMO=url, TEST=url),
+        InvoiceQueryFilters=InvoiceQueryFilters,
+        InvoiceSubjectType=InvoiceSubjectType,
+        InvoiceQueryDateRange=InvoiceQueryDateRange,
+        DateType=DateType,
+        FormSchema=FormSchema,
+    )
@@ -0,0 +1,412 @@
+"""
+Serwer HTTP symulatora KSeF 2.0.
+
+Obsługiwane endpointy (prefiks /v2):
+    POST   /auth/challenge              challenge + timestamp
+    POST   /auth/ksef-token             token KSeF -> authenticationToken
+    POST   /auth/token/redeem           authenticationToken -> accessToken
+    DELETE /auth/sessions/current       zakończenie sesji
+    POST   /sessions/online             otwarcie sesji interaktywnej
+    POST   /sessions/online/<ref>/close zamknięcie sesji
+    POST   /invoices/exports            zaplanowanie eksportu (filtry z datami)
+    GET    /invoices/exports/<ref>      status eksportu; po export_delay lista części paczki
+    POST   /invoices/query              nagłówki faktur (ścieżka bez SDK ksef2)
+    GET    /packages/<ref>/<część>      pobranie części paczki (ZIP)
+
+Paczki budowane są w tle od razu po zaplanowaniu eksportu (jak w KSeF,
+który przygotowuje eksport asynchronicznie) i trzymane w pamięci - kolejne
+eksporty tego samego zakresu dat dostają gotowe bajty. W przeciwieństwie
+do KSeF paczki nie są szyfrowane.
+"""
+import base64
+import json
+import logging
+import re
+import secrets
+import threading
+import time
+from collections import OrderedDict
+from datetime import date, datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from .fa3 import build_package, invoice_specs, vat_totals
+
+logger = logging.getLogger(__name__)
+
+# Ile zbudowanych paczek (różnych zakresów dat) trzymać w pamięci
+PACKAGE_CACHE_SIZE = 8
+
+
+class Export:
+
+    def __init__(self, ready_at):
+        self.ready_at = ready_at
+        self.parts = None
+        self.invoice_count = 0
+        self.error = None
+        self.built = threading.Event()
+
+
+class KSeFSimulator:
+    """
+    Symulator KSeF w wątku tła albo na pierwszym planie (serve_forever).
+
+        with KSeFSimulator(invoices=500, lines=(1, 20), export_delay=0.5) as simulator:
+            ... simulator.url ...
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, invoices=100, lines=(1, 5), export_delay=2.0,
+                 part_size=1000, latency=0.0, token=None, seed=42):
+        self.invoices = invoices
+        self.lines = lines
+        self.export_delay = export_delay
+        self.part_size = max(1, part_size)
+        # Dodatkowe opóźnienie każdej odpowiedzi (s) - symulacja odległego API
+        self.latency = latency
+        # Gdy podany, akceptowany jest tylko ten token KSeF
+        self.token = token
+        self.seed = seed
+
+        self._lock = threading.Lock()
+        self._challenges = {}
+        # token -> NIP kontekstu, w którym go wydano
+        self._auth_tokens = {}
+        self._access_tokens = {}
+        self._exports = {}
+        self._packages = OrderedDict()
+        self.stats = {'requests': 0, 'exports': 0, 'bytes_sent': 0}
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.simulator = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.httpd.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='ksef-simulator', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+        return False
+
+    # ============ Stan ============
+
+    def new_challenge(self):
+        challenge = secrets.token_hex(16)
+        with self._lock:
+            self._challenges[challenge] = time.time()
+        return challenge
+
+    def redeem_challenge(self, challenge, token, nip):
+        with self._lock:
+            if self._challenges.pop(challenge, None) is None:
+                return None
+        if not token or (self.token is not None and token != self.token):
+            return None
+        auth_token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._auth_tokens[auth_token] = nip
+        return auth_token
+
+    def redeem_auth_token(self, auth_token):
+        with self._lock:
+            nip = self._auth_tokens.pop(auth_token, None)
+            if nip is None:
+                return None
+            access_token = secrets.token_urlsafe(32)
+            self._access_tokens[access_token] = nip
+        return access_token
+
+    def context_nip(self, access_token):
+        """NIP sesji dla tokena dostępowego albo None, gdy token nieważny."""
+        with self._lock:
+            return self._access_tokens.get(access_token)
+
+    def revoke(self, access_token):
+        with self._lock:
+            self._access_tokens.pop(access_token, None)
+
+    def schedule_export(self, buyer_nip, date_from, date_to):
+        reference = f'EXP-{secrets.token_hex(8).upper()}'
+        export = Export(time.monotonic() + self.export_delay)
+        with self._lock:
+            self._exports[reference] = export
+            self.stats['exports'] += 1
+        threading.Thread(
+            target=self._build, args=(export, buyer_nip, date_from, date_to), daemon=True
+        ).start()
+        return reference
+
+    def get_export(self, reference):
+        with self._lock:
+            return self._exports.get(reference)
+
+    def specs(self, buyer_nip, date_from, date_to):
+        return list(invoice_specs(
+            self.invoices, buyer_nip, date_from=date_from, date_to=date_to, lines=self.lines, seed=self.seed,
+        ))
+
+    def _build(self, export, buyer_nip, date_from, date_to):
+        key = (buyer_nip, date_from, date_to)
+        try:
+            with self._lock:
+                parts = self._packages.get(key)
+                if parts is not None:
+                    self._packages.move_to_end(key)
+            if parts is None:
+                specs = self.specs(buyer_nip, date_from, date_to)
+                parts = [
+                    build_package(specs[start:start + self.part_size])
+                    for start in range(0, len(specs), self.part_size)
+                ]
+                with self._lock:
+                    self._packages[key] = parts
+                    while len(self._packages) > PACKAGE_CACHE_SIZE:
+                        self._packages.popitem(last=False)
+            export.parts = parts
+            export.invoice_count = self.invoices
+        except Exception as e:
+            logger.exception('Building simulated KSeF package failed')
+            export.error = str(e)
+        finally:
+            export.built.set()
+
+
+def _parse_date(value, default):
+    if not value:
+        return default
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).date()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    ROUTES = (
+        ('POST', re.compile(r'^/v2/auth/challenge$'), 'auth_challenge'),
+        ('POST', re.compile(r'^/v2/auth/ksef-token$'), 'auth_ksef_token'),
+        ('POST', re.compile(r'^/v2/auth/token/redeem$'), 'auth_redeem'),
+        ('DELETE', re.compile(r'^/v2/auth/sessions/current$'), 'auth_terminate'),
+        ('POST', re.compile(r'^/v2/sessions/online$'), 'session_open'),
+        ('POST', re.compile(r'^/v2/sessions/online/(?P<reference>[\w-]+)/close$'), 'session_close'),
+        ('POST', re.compile(r'^/v2/invoices/exports$'), 'export_schedule'),
+        ('GET', re.compile(r'^/v2/invoices/exports/(?P<reference>[\w-]+)$'), 'export_status'),
+        ('POST', re.compile(r'^/v2/invoices/query$'), 'invoices_query'),
+        ('GET', re.compile(r'^/packages/(?P<reference>[\w-]+)/(?P<part>\d+)$'), 'package_part'),
+    )
+
+    @property
+    def simulator(self):
+        return self.server.simulator
+
+    def log_message(self, format, *args):
+        logger.debug('%s - %s', self.address_string(), format % args)
+
+    def do_GET(self):
+        self._dispatch('GET')
+
+    def do_POST(self):
+        self._dispatch('POST')
+
+    def do_DELETE(self):
+        self._dispatch('DELETE')
+
+    def _dispatch(self, method):
+        with self.simulator._lock:
+            self.simulator.stats['requests'] += 1
+        if self.simulator.latency:
+            time.sleep(self.simulator.latency)
+
+        path = self.path.split('?', 1)[0]
+        for route_method, pattern, handler in self.ROUTES:
+            match = pattern.match(path)
+            if match and route_method == method:
+                try:
+                    getattr(self, handler)(**match.groupdict())
+                except (ValueError, KeyError, TypeError) as e:
+                    self._json(400, _error(400, f'Nieprawidłowe żądanie: {e}'))
+                return
+        self._json(404, _error(404, f'Nie znaleziono: {method} {path}'))
+
+    # ============ Odpowiedzi ============
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        raw = self.rfile.read(length) if length else b''
+        return json.loads(raw) if raw else {}
+
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+        with self.simulator._lock:
+            self.simulator.stats['bytes_sent'] += len(body)
+
+    def _json(self, status, payload):
+        self._send(status, json.dumps(payload, ensure_ascii=False).encode('utf-8'), 'application/json')
+
+    def _bearer(self):
+        header = self.headers.get('Authorization', '')
+        return header[7:].strip() if header.startswith('Bearer ') else ''
+
+    def _require_access(self):
+        """NIP kontekstu sesji; None (po wysłaniu 401), gdy token nieważny."""
+        nip = self.simulator.context_nip(self._bearer())
+        if nip is None:
+            self._json(401, _error(401, 'Brak lub nieważny token dostępowy.'))
+        return nip
+
+    # ============ Uwierzytelnianie ============
+
+    def auth_challenge(self):
+        self._body()
+        self._json(200, {
+            'challenge': self.simulator.new_challenge(),
+            'timestamp': datetime.now(timezone.utc).isoformat().replace('+00:00', 'Z'),
+        })
+
+    def auth_ksef_token(self):
+        body = self._body()
+        # SDK przesyła token wprost, ścieżka bez SDK - base64("token|timestamp")
+        token = body.get('ksefToken') or body.get('encryptedToken', '')
+        if 'encryptedToken' in body and 'ksefToken' not in body:
+            token = base64.b64decode(token).decode('utf-8').split('|', 1)[0]
+        nip = body.get('contextIdentifier', {}).get('value', '')
+        auth_token = self.simulator.redeem_challenge(body.get('challenge'), token, nip)
+        if auth_token is None:
+            self._json(401, _error(401, 'Nieprawidłowy token KSeF lub challenge.'))
+            return
+        self._json(202, {
+            'referenceNumber': f'AUTH-{secrets.token_hex(6).upper()}',
+            'authenticationToken': auth_token,
+        })
+
+    def auth_redeem(self):
+        access_token = self.simulator.redeem_auth_token(self._bearer())
+        if access_token is None:
+            self._json(401, _error(401, 'Nieprawidłowy token uwierzytelniania.'))
+            return
+        self._json(200, {'accessToken': access_token, 'refreshToken': secrets.token_urlsafe(32)})
+
+    def auth_terminate(self):
+        self.simulator.revoke(self._bearer())
+        self._send(204, b'', 'application/json')
+
+    # ============ Sesje i eksport ============
+
+    def session_open(self):
+        if self._require_access() is None:
+            return
+        self._body()
+        self._json(201, {'referenceNumber': f'SES-{secrets.token_hex(8).upper()}'})
+
+    def session_close(self, reference):
+        if self._require_access() is None:
+            return
+        self._send(204, b'', 'application/json')
+
+    def export_schedule(self):
+        nip = self._require_access()
+        if nip is None:
+            return
+        body = self._body()
+        filters = body.get('filters', {})
+        date_range = filters.get('dateRange', {})
+        today = date.today()
+        reference = self.simulator.schedule_export(
+            nip,
+            _parse_date(date_range.get('from'), today),
+            _parse_date(date_range.get('to'), today),
+        )
+        self._json(202, {'referenceNumber': reference})
+
+    def export_status(self, reference):
+        if self._require_access() is None:
+            return
+        export = self.simulator.get_export(reference)
+        if export is None:
+            self._json(404, _error(404, f'Nie znaleziono eksportu {reference}.'))
+            return
+        if export.error:
+            self._json(200, {'status': {'code': 500, 'description': f'Błąd eksportu: {export.error}'}})
+            return
+        if time.monotonic() < export.ready_at or not export.built.is_set():
+            self._json(200, {'status': {'code': 100, 'description': 'Eksport w toku'}})
+            return
+        self._json(200, {
+            'status': {'code': 200, 'description': 'Eksport zakończony'},
+            'package': {
+                'invoiceCount': export.invoice_count,
+                'size': sum(len(part) for part in export.parts),
+                'isTruncated': False,
+                'parts': [
+                    {
+                        'ordinalNumber': index,
+                        'partName': f'{reference}-{index:03d}.zip',
+                        'partSize': len(part),
+                        'url': f'{self.simulator.url}/packages/{reference}/{index}',
+                    }
+                    for index, part in enumerate(export.parts, start=1)
+                ],
+            },
+        })
+
+    def package_part(self, reference, part):
+        export = self.simulator.get_export(reference)
+        index = int(part)
+        if export is None or not export.built.is_set() or not export.parts or not 1 <= index <= len(export.parts):
+            self._json(404, _error(404, 'Nie znaleziono części paczki.'))
+            return
+        self._send(200, export.parts[index - 1], 'application/zip')
+
+    def invoices_query(self):
+        nip = self._require_access()
+        if nip is None:
+            return
+        body = self._body()
+        criteria = body.get('queryCriteria', {})
+        date_range = criteria.get('dateRange', {})
+        today = date.today()
+        offset = int(body.get('pageOffset', 0))
+        size = int(body.get('pageSize', 100))
+        specs = self.simulator.specs(
+            nip, _parse_date(date_range.get('from'), today), _parse_date(date_range.get('to'), today)
+        )
+        headers = []
+        for spec in specs[offset * size:(offset + 1) * size]:
+            totals = vat_totals(spec['wiersze']).values()
+            netto = sum(value for value, _ in totals)
+            vat = sum(value for _, value in totals)
+            headers.append({
+                'ksefReferenceNumber': spec['ksef_numer'],
+                'invoiceReferenceNumber': spec['numer'],
+                'invoicingDate': spec['data'].isoformat(),
+                'net': str(netto),
+                'vat': str(vat),
+                'subjectName': spec['sprzedawca']['nazwa'],
+                'subjectNip': spec['sprzedawca']['nip'],
+            })
+        self._json(200, {'invoiceHeaders': headers, 'numberOfElements': len(specs)})
+
+
+def _error(code, description):
+    return {'exception': {'exceptionDetailList': [{'exceptionCode': code, 'exceptionDescription': description}]}}
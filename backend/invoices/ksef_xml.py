@@ -0,0 +1,145 @@
+"""
+Backendy XML dla parsera faktur KSeF (invoices/ksef_parser.py).
+
+Parser woła find/findall/findtext ze ścieżkami w składni ElementTree
+('.//fa:P_2', './/{*}Podmiot1//{*}NIP', 'fa:P_7'). Backend wykonuje je:
+
+  - ElementTreeBackend - biblioteka standardowa,
+  - LxmlBackend - lxml; każda ścieżka tłumaczona jest raz na XPath
+    ({*}X -> *[local-name()="X"]) i kompilowana (etree.XPath), skompilowane
+    wyrażenia są współdzielone przez wszystkie faktury. Dokument parsowany
+    jest prosto z bajtów, bez encji zewnętrznych i dostępu do sieci.
+
+Wybór: zmienna środowiskowa KSEF_XML_BACKEND = auto (domyślnie - lxml,
+gdy zainstalowany), lxml albo etree. Zmienna, a nie ustawienie Django,
+bo czytają ją też procesy robocze parsowania.
+"""
+import logging
+import os
+import re
+import threading
+import xml.etree.ElementTree as ET
+
+logger = logging.getLogger(__name__)
+
+# Górna granica liczby skompilowanych ścieżek (klucz zawiera URI przestrzeni nazw z dokumentu)
+MAX_COMPILED_PATHS = 2048
+
+_STEP = re.compile(r'^(?:\{\*\})?[A-Za-z_][\w.-]*$|^[A-Za-z_][\w.-]*:[A-Za-z_][\w.-]*$')
+
+
+def to_xpath(path):
+    """
+    Ścieżka ElementTree -> XPath 1.0. Obsługuje '.', '..', '//', '*',
+    nazwy z prefiksem i {*}nazwa; inne kroki zgłaszają SyntaxError.
+    """
+    steps = []
+    for step in path.split('/'):
+        if step in ('', '.', '..', '*'):
+            steps.append(step)
+        elif _STEP.match(step):
+            steps.append(f'*[local-name()="{step[3:]}"]' if step.startswith('{*}') else step)
+        else:
+            raise SyntaxError(f'Unsupported path step {step!r} in {path!r}')
+    return '/'.join(steps)
+
+
+class ElementTreeBackend:
+    name = 'etree'
+
+    def fromstring(self, content):
+        return ET.fromstring(content)
+
+    def find(self, element, path, namespaces=None):
+        return element.find(path, namespaces)
+
+    def findall(self, element, path, namespaces=None):
+        return element.findall(path, namespaces)
+
+    def findtext(self, element, path, namespaces=None):
+        return element.findtext(path, None, namespaces)
+
+
+class LxmlBackend:
+    name = 'lxml'
+
+    def __init__(self):
+        from lxml import etree
+        self._etree = etree
+        self._local = threading.local()
+        self._compiled = {}
+
+    def _parser(self):
+        # Parser lxml nie może być używany równolegle z kilku wątków.
+        # Komentarze i instrukcje przetwarzania usuwane jak w ElementTree.
+        parser = getattr(self._local, 'parser', None)
+        if parser is None:
+            parser = self._etree.XMLParser(
+                resolve_entities=False, no_network=True, remove_comments=True, remove_pis=True,
+            )
+            self._local.parser = parser
+        return parser
+
+    def fromstring(self, content):
+        if isinstance(content, str):
+            # lxml nie przyjmuje str z deklaracją kodowania
+            content = content.encode('utf-8')
+        return self._etree.fromstring(content, self._parser())
+
+    def _xpath(self, path, namespaces):
+        # Parser podaje zawsze te same słowniki przestrzeni nazw - klucz bez sortowania
+        key = (path, *namespaces.items()) if namespaces else path
+        try:
+            compiled = self._compiled[key]
+        except KeyError:
+            compiled = self._compile(key, path, namespaces)
+        if compiled.__class__ is not self._etree.XPath:
+            raise compiled
+        return compiled
+
+    def _compile(self, key, path, namespaces):
+        if len(self._compiled) >= MAX_COMPILED_PATHS:
+            self._compiled.clear()
+        try:
+            compiled = self._etree.XPath(to_xpath(path), namespaces=namespaces or None)
+        except (SyntaxError, self._etree.XPathError) as e:
+            # Błędną ścieżkę też zapamiętaj - parser próbuje jej dla każdej faktury
+            compiled = e
+        self._compiled[key] = compiled
+        return compiled
+
+    def find(self, element, path, namespaces=None):
+        found = self._xpath(path, namespaces)(element)
+        return found[0] if found else None
+
+    def findall(self, element, path, namespaces=None):
+        return self._xpath(path, namespaces)(element)
+
+    def findtext(self, element, path, namespaces=None):
+        found = self._xpath(path, namespaces)(element)
+        return (found[0].text or '') if found else None
+
+
+BACKENDS = {'etree': ElementTreeBackend, 'lxml': LxmlBackend}
+
+_instances = {}
+_instances_lock = threading.Lock()
+
+
+def get_backend(name=None):
+    """Backend o nazwie name; None - z KSEF_XML_BACKEND (auto: lxml, gdy dostępny)."""
+    name = (name or os.environ.get('KSEF_XML_BACKEND') or 'auto').lower()
+    with _instances_lock:
+        backend = _instances.get(name)
+        if backend is None:
+            if name == 'auto':
+                try:
+                    backend = LxmlBackend()
+                except ImportError:
+                    backend = ElementTreeBackend()
+            elif name in BACKENDS:
+                backend = BACKENDS[name]()
+            else:
+                raise ValueError(f'Unknown KSeF XML backend {name!r} (expected auto, lxml or etree)')
+            _instances[name] = backend
+        return backend
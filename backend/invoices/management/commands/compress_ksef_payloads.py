@@ -0,0 +1,145 @@
+"""
+Przepakowanie danych KSeF faktur (Invoice.ksef_xml) bieżącym kodekiem TEXT_COMPRESSION.
+
+Pole kompresuje przy zapisie (fakturex/fields.py), a ta komenda dociąga
+wiersze zapisane wcześniej czystym tekstem - albo innym kodekiem, np. po
+przejściu z zlib na zstd lub na none przed wycofaniem kompresji. Działa
+paczkami po id, każda paczka w osobnej transakcji, z opcjonalną przerwą
+między paczkami - można ją puścić w tle przy działającej aplikacji,
+a przerwaną wznowić tym samym poleceniem. updated_at się nie zmienia
+(bulk_update), więc feed zmian nie wysyła faktur ponownie.
+
+Przed i po wypisywany jest rozmiar danych KSeF; na PostgreSQL także
+rozmiar tabeli - miejsce po starych wersjach wierszy odzyskuje dopiero
+VACUUM (FULL).
+"""
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Count, Func, Q, Sum
+from django.db.models.functions import Length
+
+from fakturex.fields import MARKERS, ZLIB_MARKER, ZSTD_MARKER, text_codec
+from invoices.models import Invoice
+
+FIELD = 'ksef_xml'
+
+
+def _compressed():
+    return Q(ksef_xml__startswith=ZLIB_MARKER) | Q(ksef_xml__startswith=ZSTD_MARKER)
+
+
+def pending_payloads(codec):
+    """Faktury, których dane KSeF nie są zapisane kodekiem codec."""
+    invoices = Invoice.objects.exclude(ksef_xml='')
+    if codec == 'none':
+        return invoices.filter(_compressed())
+    min_length = Invoice._meta.get_field(FIELD).min_length
+    return (
+        invoices.annotate(payload_length=Length(FIELD))
+        .filter(Q(payload_length__gte=min_length) | _compressed())
+        .exclude(ksef_xml__startswith=MARKERS[codec])
+        # Stary format XML zastępuje update_ksef_data (szuka go po początku tekstu)
+        .exclude(ksef_xml__startswith='<?xml')
+    )
+
+
+def storage_stats():
+    """Liczba faktur z danymi KSeF, ile spakowanych, bajty danych i (PostgreSQL) rozmiar tabeli."""
+    if connection.vendor == 'postgresql':
+        # Rozmiar na dysku, po ewentualnej kompresji TOAST
+        size = Sum(Func(FIELD, function='pg_column_size'))
+    else:
+        size = Sum(Length(FIELD))
+    stats = Invoice.objects.exclude(ksef_xml='').aggregate(
+        payloads=Count('id'), compressed=Count('id', filter=_compressed()), payload_bytes=size,
+    )
+    stats['payload_bytes'] = stats['payload_bytes'] or 0
+    stats['table_bytes'] = None
+    if connection.vendor == 'postgresql':
+        table = Invoice._meta.db_table
+        with connection.cursor() as cursor:
+            # Tabela partycjonowana (invoices/partitioning.py) sama nie ma danych - sumujemy partycje
+            cursor.execute(
+                """
+                SELECT coalesce(sum(pg_total_relation_size(oid)), 0) FROM pg_class
+                WHERE oid = to_regclass(%s) OR oid IN (SELECT inhrelid FROM pg_inherits WHERE inhparent = to_regclass(%s))
+                """,
+                [table, table],
+            )
+            stats['table_bytes'] = cursor.fetchone()[0]
+    return stats
+
+
+def _mb(value):
+    return f'{value / 1024 / 1024:.1f} MB'
+
+
+class Command(BaseCommand):
+    help = 'Recompress stored KSeF invoice payloads with the current TEXT_COMPRESSION codec, in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=500,
+            help='Invoices per batch (default 500)'
+        )
+        parser.add_argument(
+            '--sleep',
+            type=float,
+            default=0,
+            help='Pause between batches in seconds, to limit load on a live database'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report storage and the number of invoices to recompress'
+        )
+
+    def report(self, label, stats):
+        line = (
+            f"{label}: {stats['payloads']} payload(s), {stats['compressed']} compressed, "
+            f"{_mb(stats['payload_bytes'])} of payload data"
+        )
+        if stats['table_bytes'] is not None:
+            line += f", table {_mb(stats['table_bytes'])}"
+        self.stdout.write(line)
+
+    def handle(self, *args, **options):
+        codec = text_codec()
+        before = storage_stats()
+        self.report('Before', before)
+
+        pending = pending_payloads(codec)
+        if options['dry_run']:
+            self.stdout.write(f'{pending.count()} invoice(s) to rewrite with codec {codec}')
+            return
+
+        started = time.perf_counter()
+        done = 0
+        last_id = 0
+        while True:
+            # Keyset po id - każda paczka to jedno zapytanie, niezależnie od postępu
+            batch = list(pending.filter(id__gt=last_id).order_by('id').only('id', FIELD)[:options['batch_size']])
+            if not batch:
+                break
+            with transaction.atomic():
+                # Wartości są już rozpakowane (from_db_value) - zapis pakuje je bieżącym kodekiem
+                Invoice.objects.bulk_update(batch, [FIELD])
+            done += len(batch)
+            last_id = batch[-1].id
+            self.stdout.write(f'  {done} invoice(s) rewritten ({time.perf_counter() - started:.1f}s)')
+            if options['sleep']:
+                time.sleep(options['sleep'])
+
+        after = storage_stats()
+        self.report('After', after)
+        if before['payload_bytes']:
+            saved = 1 - after['payload_bytes'] / before['payload_bytes']
+            self.stdout.write(self.style.SUCCESS(
+                f'Done: {done} invoice(s) rewritten with codec {codec}, payload data {saved:.0%} smaller'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Done: {done} invoice(s) rewritten with codec {codec}'))
@@ -0,0 +1,54 @@
+"""
+Django management command to export a month's purchase register extract (JPK_V7M row layout).
+"""
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.models import Company
+from customers.tenancy import command_company
+from invoices.purchase_register import generate_purchase_register, validate_purchase_register
+
+
+class Command(BaseCommand):
+    help = 'Export the purchase register extract for a month from KSeF data (not a complete JPK_V7M file)'
+
+    def add_arguments(self, parser):
+        today = date.today()
+        parser.add_argument('--year', type=int, default=today.year)
+        parser.add_argument('--month', type=int, default=today.month)
+        parser.add_argument('--output', type=str, default=None, help='Output file (default: ewidencja_zakupu_<year>_<month>.xml)')
+        parser.add_argument('--validate', action='store_true', help='Only check totals and report skipped invoices')
+        parser.add_argument('--company', type=int, default=None, help='Company id (default: the first company)')
+
+    def handle(self, *args, **options):
+        year, month = options['year'], options['month']
+        if not 1 <= month <= 12:
+            raise CommandError('Month must be between 1 and 12')
+        try:
+            company_obj = command_company(options['company'])
+        except Company.DoesNotExist:
+            raise CommandError('Company not found')
+
+        if options['validate']:
+            report = validate_purchase_register(year, month, company_obj.pk)
+            for issue in report['problemy']:
+                self.stderr.write(f'  {issue}')
+            self.stdout.write(
+                f"{report['liczba_wierszy']} rows, netto {report['suma_netto']}, "
+                f"VAT {report['podatek_naliczony']}, skipped {report['pominiete']}"
+            )
+            return
+
+        if not company_obj.nip:
+            raise CommandError('Company NIP is not configured in settings')
+
+        company = {'id': company_obj.pk, 'nip': company_obj.nip, 'nazwa': company_obj.nazwa}
+        output = options['output'] or f'ewidencja_zakupu_{year}_{month:02d}.xml'
+        size = 0
+        with open(output, 'wb') as f:
+            for chunk in generate_purchase_register(year, month, company):
+                f.write(chunk)
+                size += len(chunk)
+
+        self.stdout.write(self.style.SUCCESS(f'Written {output} ({size} bytes)'))
@@ -0,0 +1,73 @@
+"""
+Django management command to bulk-import invoices and contractors from CSV.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.models import Company
+from customers.tenancy import command_company
+from invoices.csv_import import DEFAULT_CHUNK_SIZE, CsvImportError, import_csv
+
+
+class Command(BaseCommand):
+    help = 'Bulk-import invoices (and their contractors) from a CSV file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', type=str, help='Path to the CSV file')
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=DEFAULT_CHUNK_SIZE,
+            help='Rows validated and loaded per transaction'
+        )
+        parser.add_argument(
+            '--encoding',
+            type=str,
+            default='utf-8-sig',
+            help='File encoding (e.g. cp1250 for Excel exports)'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only validate the file, do not import'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Company id to import into (default: the first company)'
+        )
+
+    def handle(self, *args, **options):
+        try:
+            company = command_company(options['company'])
+        except Company.DoesNotExist:
+            raise CommandError('Company not found')
+
+        def progress(result):
+            self.stdout.write(
+                f"  {result['rows']} rows, {result['imported']} imported, "
+                f"{result['errors_count']} errors, {result['rows_per_sec']} rows/s"
+            )
+
+        try:
+            with open(options['path'], encoding=options['encoding'], newline='') as f:
+                result = import_csv(
+                    f, company, chunk_size=options['chunk_size'], dry_run=options['dry_run'], progress=progress
+                )
+        except (OSError, CsvImportError, UnicodeDecodeError) as e:
+            raise CommandError(str(e))
+
+        for error in result['errors']:
+            self.stderr.write(f"  row {error['row']}: {error['field']} - {error['message']}")
+        if result['errors_count'] > len(result['errors']):
+            self.stderr.write(f"  ... and {result['errors_count'] - len(result['errors'])} more")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone ({result['method']}{', dry run' if result['dry_run'] else ''}): "
+            f"{result['rows']} rows in {result['seconds']} s ({result['rows_per_sec']} rows/s)"
+        ))
+        self.stdout.write(f"Invoices imported: {result['imported']}")
+        self.stdout.write(f"Skipped (already exist): {result['skipped_existing']}")
+        self.stdout.write(f"Skipped (duplicates): {result['duplicate_count']}")
+        self.stdout.write(f"Contractors created: {result['contractors_created']}")
+        self.stdout.write(f"Rows with errors: {len({e['row'] for e in result['errors']})}")
@@ -0,0 +1,132 @@
+"""
+Django management command to run the local KSeF 2.0 simulator.
+
+Symulator nie wymaga bazy danych. Serwer aplikacji kierujemy na niego
+zmienną KSEF_SIMULATOR_URL. Z --write-package komenda tylko zapisuje
+paczkę ZIP z fakturami FA(3) i kończy działanie.
+"""
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.ksef_simulator import KSeFSimulator, write_package
+
+
+def _lines_range(value):
+    try:
+        low, _, high = value.partition('-')
+        low, high = int(low), int(high or low)
+    except ValueError:
+        raise CommandError('--lines must be a number or a range like 1-20')
+    if not 1 <= low <= high:
+        raise CommandError('--lines must be a number or a range like 1-20')
+    return low, high
+
+
+class Command(BaseCommand):
+    help = 'Run a local KSeF 2.0 simulator (auth, export scheduling, FA(3) package download)'
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--host',
+            default='127.0.0.1',
+            help='Address to listen on'
+        )
+        parser.add_argument(
+            '--port',
+            type=int,
+            default=8090,
+            help='Port to listen on'
+        )
+        parser.add_argument(
+            '--invoices',
+            type=int,
+            default=100,
+            help='Invoices returned by every export'
+        )
+        parser.add_argument(
+            '--lines',
+            default='1-5',
+            help='Lines per invoice: a number or a range like 1-20'
+        )
+        parser.add_argument(
+            '--export-delay',
+            type=float,
+            default=2.0,
+            help='Seconds before a scheduled export is ready'
+        )
+        parser.add_argument(
+            '--part-size',
+            type=int,
+            default=1000,
+            help='Invoices per package part (ZIP file)'
+        )
+        parser.add_argument(
+            '--latency',
+            type=float,
+            default=0.0,
+            help='Extra delay in seconds added to every response'
+        )
+        parser.add_argument(
+            '--token',
+            default=None,
+            help='Accept only this KSeF token (default: any non-empty token)'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed for generated invoices'
+        )
+        parser.add_argument(
+            '--write-package',
+            metavar='PATH',
+            help='Write one ZIP package of --invoices invoices to PATH and exit'
+        )
+        parser.add_argument(
+            '--nip',
+            default='5250001009',
+            help='Buyer NIP used with --write-package'
+        )
+
+    def handle(self, *args, **options):
+        if options['invoices'] < 0:
+            raise CommandError('--invoices must be >= 0')
+        lines = _lines_range(options['lines'])
+
+        if options['write_package']:
+            today = date.today()
+            size = write_package(
+                options['write_package'], options['invoices'], options['nip'], lines=lines,
+                seed=options['seed'], date_from=today - timedelta(days=30), date_to=today,
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Wrote {options['invoices']} invoices ({size / 1024:.0f} KiB) to {options['write_package']}"
+            ))
+            return
+
+        simulator = KSeFSimulator(
+            host=options['host'],
+            port=options['port'],
+            invoices=options['invoices'],
+            lines=lines,
+            export_delay=options['export_delay'],
+            part_size=options['part_size'],
+            latency=options['latency'],
+            token=options['token'],
+            seed=options['seed'],
+        )
+        self.stdout.write(
+            f"KSeF simulator on {simulator.url} - {options['invoices']} invoices per export, "
+            f"{lines[0]}-{lines[1]} lines, export ready after {options['export_delay']}s"
+        )
+        self.stdout.write(f'Start the app with KSEF_SIMULATOR_URL={simulator.url}')
+        try:
+            simulator.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            simulator.httpd.server_close()
+            self.stdout.write(f"Stopped after {simulator.stats['requests']} requests, "
+                              f"{simulator.stats['exports']} exports")
@@ -1,13 +1,29 @@
 """
 Django management command to migrate data from SQLite (faktury.db) to PostgreSQL.
+
+Tabele czytane są strumieniowo (fetchmany) w paczkach. Dla każdej paczki:
+jedno zapytanie o istniejące rekordy, bulk_create w osobnej transakcji
+i zapis checkpointu (ostatni rowid) - przerwaną migrację wznawia się
+tym samym poleceniem. Ponowne przetworzenie paczki jest bezpieczne,
+bo istniejące rekordy są pomijane.
+
+Checkpoint należy do pary (plik SQLite, firma docelowa): domyślna nazwa
+zawiera id firmy, a w pliku zapisane są ścieżka źródła i firma - checkpoint
+innej pary jest ignorowany. Po udanej migracji plik jest usuwany.
 """
+import json
+import os
 import sqlite3
+import time
 from datetime import datetime
 from decimal import Decimal
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
+from django.db.models.functions import Lower
 from invoices.models import Invoice
-from customers.models import Contractor
+from customers.models import Company, Contractor
+from customers.resolver import normalize_nip
+from customers.tenancy import command_company
 
 
 class Command(BaseCommand):
@@ -25,13 +41,45 @@ class Command(BaseCommand):
             action='store_true',
             help='Show what would be migrated without actually migrating'
         )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=1000,
+            help='Rows fetched, checked and inserted per transaction'
+        )
+        parser.add_argument(
+            '--checkpoint',
+            type=str,
+            default=None,
+            help='Checkpoint file (default: <sqlite-path>.company-<id>.checkpoint.json)'
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore an existing checkpoint and start from the beginning'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Company id to migrate into (default: the first company)'
+        )
 
     def handle(self, *args, **options):
         sqlite_path = options['sqlite_path']
         dry_run = options['dry_run']
-        
+        self.chunk_size = options['chunk_size']
+        try:
+            self.company = command_company(options['company'])
+        except Company.DoesNotExist:
+            raise CommandError('Company not found')
+        self.source = os.path.abspath(sqlite_path)
+        self.checkpoint_path = options['checkpoint'] or f'{sqlite_path}.company-{self.company.pk}.checkpoint.json'
+        self.contractors = Contractor.objects.for_company(self.company)
+        self.invoices = Invoice.objects.for_company(self.company)
+
         self.stdout.write(f'Connecting to SQLite database: {sqlite_path}')
-        
+
         try:
             conn = sqlite3.connect(sqlite_path)
             conn.row_factory = sqlite3.Row
@@ -39,140 +87,224 @@ class Command(BaseCommand):
         except Exception as e:
             self.stderr.write(self.style.ERROR(f'Failed to connect to SQLite: {e}'))
             return
-        
+
         # Check existing counts
-        existing_contractors = Contractor.objects.count()
-        existing_invoices = Invoice.objects.count()
+        existing_contractors = self.contractors.count()
+        existing_invoices = self.invoices.count()
         self.stdout.write(f'Existing records in PostgreSQL:')
         self.stdout.write(f'  - Contractors: {existing_contractors}')
         self.stdout.write(f'  - Invoices: {existing_invoices}')
-        
+
         if dry_run:
             self.stdout.write(self.style.WARNING('\n=== DRY RUN MODE ===\n'))
-        
+
+        self.checkpoint = {} if options['restart'] else self.load_checkpoint()
+        if self.checkpoint:
+            self.stdout.write(f'Resuming from checkpoint {self.checkpoint_path}: {self.checkpoint}')
+
         # Migrate contractors
         self.stdout.write('\n--- Migrating Contractors ---')
         contractors_migrated = self.migrate_contractors(cursor, dry_run)
-        
+
         # Migrate invoices
         self.stdout.write('\n--- Migrating Invoices ---')
         invoices_migrated = self.migrate_invoices(cursor, dry_run)
-        
+
         conn.close()
-        
+
         self.stdout.write(self.style.SUCCESS(f'\n=== Migration Complete ==='))
         self.stdout.write(f'Contractors migrated: {contractors_migrated}')
         self.stdout.write(f'Invoices migrated: {invoices_migrated}')
+        if not dry_run and os.path.exists(self.checkpoint_path):
+            # Migracja zakończona - następne uruchomienie zaczyna od początku
+            os.remove(self.checkpoint_path)
+
+    # ============ Checkpoint ============
+
+    def load_checkpoint(self):
+        """Ostatnie rowid tabel z checkpointu tej samej pary źródło-firma."""
+        try:
+            with open(self.checkpoint_path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        if data.get('source') != self.source or data.get('company') != self.company.pk:
+            self.stderr.write(self.style.WARNING(
+                f'Ignoring checkpoint {self.checkpoint_path}: it belongs to '
+                f"{data.get('source')} / company {data.get('company')}"
+            ))
+            return {}
+        return data.get('tables', {})
+
+    def save_checkpoint(self, table, last_rowid):
+        self.checkpoint[table] = last_rowid
+        tmp_path = f'{self.checkpoint_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'source': self.source, 'company': self.company.pk, 'tables': self.checkpoint}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def stream(self, cursor, table, columns):
+        """Paczki wierszy z tabeli SQLite, od rowid zapisanego w checkpoincie."""
+        cursor.execute(
+            f'SELECT rowid AS _rowid, {columns} FROM {table} WHERE rowid > ? ORDER BY rowid',
+            [self.checkpoint.get(table, 0)]
+        )
+        while True:
+            rows = cursor.fetchmany(self.chunk_size)
+            if not rows:
+                return
+            yield rows
+
+    def report(self, table, processed, started):
+        elapsed = time.perf_counter() - started
+        rate = processed / elapsed if elapsed else 0
+        self.stdout.write(f'  {table}: {processed} rows, {rate:.0f} rows/s')
+
+    # ============ Tabele ============
 
     def migrate_contractors(self, cursor, dry_run):
-        cursor.execute('SELECT nazwa, nip FROM kontrahenci')
-        rows = cursor.fetchall()
-        
         migrated = 0
         skipped = 0
-        
-        for row in rows:
-            nazwa = row['nazwa'].strip() if row['nazwa'] else ''
-            nip = row['nip'].strip() if row['nip'] else ''
-            
-            if not nazwa:
-                continue
-            
-            # Check if contractor already exists
-            if Contractor.objects.filter(nazwa=nazwa).exists():
-                skipped += 1
-                continue
-            
-            if dry_run:
-                self.stdout.write(f'  [DRY] Would create: {nazwa} (NIP: {nip or "brak"})')
-            else:
-                Contractor.objects.create(
-                    nazwa=nazwa,
-                    nip=nip
-                )
-            migrated += 1
-        
+        processed = 0
+        started = time.perf_counter()
+
+        for rows in self.stream(cursor, 'kontrahenci', 'nazwa, nip'):
+            processed += len(rows)
+            candidates = {}
+            for row in rows:
+                nazwa = row['nazwa'].strip() if row['nazwa'] else ''
+                nip = row['nip'].strip() if row['nip'] else ''
+                if nazwa and nazwa not in candidates:
+                    candidates[nazwa] = nip
+
+            # Jedno zapytanie na paczkę: kontrahenci o tej nazwie lub tym NIP
+            nips = {normalize_nip(nip) for nip in candidates.values()} - {None}
+            existing_names = set()
+            existing_nips = set()
+            for nazwa, nip_normalized in self.contractors.filter(
+                nazwa__in=candidates
+            ).order_by().values_list('nazwa', 'nip_normalized').union(
+                self.contractors.filter(nip_normalized__in=nips).order_by().values_list('nazwa', 'nip_normalized')
+            ):
+                existing_names.add(nazwa)
+                existing_nips.add(nip_normalized)
+
+            to_create = []
+            for nazwa, nip in candidates.items():
+                nip_normalized = normalize_nip(nip)
+                if nazwa in existing_names or (nip_normalized and nip_normalized in existing_nips):
+                    skipped += 1
+                    continue
+                if nip_normalized:
+                    existing_nips.add(nip_normalized)
+                if dry_run:
+                    self.stdout.write(f'  [DRY] Would create: {nazwa} (NIP: {nip or "brak"})')
+                to_create.append(Contractor(
+                    company=self.company, nazwa=nazwa, nip=nip, nip_normalized=nip_normalized,
+                ))
+            migrated += len(to_create)
+
+            if not dry_run:
+                with transaction.atomic():
+                    Contractor.objects.bulk_create(to_create)
+                self.save_checkpoint('kontrahenci', rows[-1]['_rowid'])
+            self.report('kontrahenci', processed, started)
+
         self.stdout.write(f'  Migrated: {migrated}, Skipped (already exist): {skipped}')
         return migrated
 
     def migrate_invoices(self, cursor, dry_run):
-        cursor.execute('''
-            SELECT numer, data, kwota, dostawca, termin_platnosci, status, 
-                   type, ksef_number, ksef_status, ksef_upo, is_imported_from_ksef
-            FROM faktury
-        ''')
-        rows = cursor.fetchall()
-        
         migrated = 0
         skipped = 0
         errors = 0
-        
-        # Build contractor lookup
-        contractor_lookup = {}
-        for c in Contractor.objects.all():
-            contractor_lookup[c.nazwa.lower()] = c
-        
-        invoices_to_create = []
-        
-        for row in rows:
-            numer = row['numer']
-            
-            # Check if invoice already exists
-            if Invoice.objects.filter(numer=numer).exists():
-                skipped += 1
-                continue
-            
-            try:
-                # Parse data
-                data = row['data']
-                if isinstance(data, str):
-                    data = datetime.strptime(data, '%Y-%m-%d').date()
-                
-                termin = row['termin_platnosci']
-                if isinstance(termin, str):
-                    termin = datetime.strptime(termin, '%Y-%m-%d').date()
-                elif termin is None:
-                    termin = data
-                
-                kwota = Decimal(str(row['kwota']))
-                dostawca = row['dostawca'].strip() if row['dostawca'] else ''
-                
-                # Map status
-                status_raw = row['status'].lower() if row['status'] else 'niezapłacona'
-                if status_raw in ['zapłacona', 'zaplacona', 'paid']:
-                    status = 'zaplacona'
-                else:
-                    status = 'niezaplacona'
-                
-                # Find contractor
-                kontrahent = contractor_lookup.get(dostawca.lower())
-                
-                # KSeF data
-                ksef_numer = row['ksef_number'] or ''
-                
-                if dry_run:
-                    self.stdout.write(f'  [DRY] Would create: {numer} - {dostawca} ({kwota})')
-                else:
-                    invoices_to_create.append(Invoice(
-                        numer=numer,
-                        data=data,
-                        kwota=kwota,
-                        dostawca=dostawca,
-                        termin_platnosci=termin,
-                        status=status,
-                        kontrahent=kontrahent,
-                        ksef_numer=ksef_numer
-                    ))
-                migrated += 1
-                
-            except Exception as e:
-                errors += 1
-                self.stderr.write(self.style.WARNING(f'  Error processing invoice {numer}: {e}'))
-        
-        # Bulk create for efficiency
-        if not dry_run and invoices_to_create:
-            with transaction.atomic():
-                Invoice.objects.bulk_create(invoices_to_create, batch_size=100)
-        
+        processed = 0
+        started = time.perf_counter()
+
+        columns = '''numer, data, kwota, dostawca, termin_platnosci, status,
+                   type, ksef_number, ksef_status, ksef_upo, is_imported_from_ksef'''
+        for rows in self.stream(cursor, 'faktury', columns):
+            processed += len(rows)
+
+            # Jedno zapytanie o istniejące numery i jedno o kontrahentów paczki
+            existing = set(self.invoices.filter(
+                numer__in={row['numer'] for row in rows}
+            ).values_list('numer', flat=True))
+            names = {row['dostawca'].strip().lower() for row in rows if row['dostawca']}
+            contractor_lookup = {
+                c.nazwa_lower: c
+                for c in self.contractors.annotate(nazwa_lower=Lower('nazwa')).filter(nazwa_lower__in=names)
+            }
+
+            invoices_to_create = []
+            for row in rows:
+                numer = row['numer']
+
+                # Check if invoice already exists
+                if numer in existing:
+                    skipped += 1
+                    continue
+                existing.add(numer)
+
+                try:
+                    # Parse data
+                    data = row['data']
+                    if isinstance(data, str):
+                        data = datetime.strptime(data, '%Y-%m-%d').date()
+
+                    termin = row['termin_platnosci']
+                    if isinstance(termin, str):
+                        termin = datetime.strptime(termin, '%Y-%m-%d').date()
+                    elif termin is None:
+                        termin = data
+
+                    kwota = Decimal(str(row['kwota']))
+                    dostawca = row['dostawca'].strip() if row['dostawca'] else ''
+
+                    # Map status
+                    status_raw = row['status'].lower() if row['status'] else 'niezapłacona'
+                    if status_raw in ['zapłacona', 'zaplacona', 'paid']:
+                        status = 'zaplacona'
+                    else:
+                        status = 'niezaplacona'
+
+                    # Find contractor
+                    kontrahent = contractor_lookup.get(dostawca.lower())
+
+                    # KSeF data
+                    ksef_numer = row['ksef_number'] or ''
+
+                    if dry_run:
+                        self.stdout.write(f'  [DRY] Would create: {numer} - {dostawca} ({kwota})')
+                    else:
+                        invoice = Invoice(
+                            company=self.company,
+                            numer=numer,
+                            data=data,
+                            kwota=kwota,
+                            dostawca=dostawca,
+                            termin_platnosci=termin,
+                            status=status,
+                            kontrahent=kontrahent,
+                            ksef_numer=ksef_numer
+                        )
+                        invoice.fill_fingerprint()
+                        invoices_to_create.append(invoice)
+                    migrated += 1
+
+                except Exception as e:
+                    errors += 1
+                    self.stderr.write(self.style.WARNING(f'  Error processing invoice {numer}: {e}'))
+
+            if not dry_run:
+                with transaction.atomic():
+                    Invoice.objects.bulk_create(invoices_to_create)
+                self.save_checkpoint('faktury', rows[-1]['_rowid'])
+            self.report('faktury', processed, started)
+
+        if migrated and not dry_run:
+            # bulk_create nie wysyła sygnałów post_save
+            from invoices.analytics import bump_analytics_version
+            bump_analytics_version()
+
         self.stdout.write(f'  Migrated: {migrated}, Skipped (already exist): {skipped}, Errors: {errors}')
         return migrated
@@ -0,0 +1,55 @@
+"""
+Partycjonowanie tabeli faktur po roku (PostgreSQL) - patrz invoices/partitioning.py.
+
+Pierwsze uruchomienie zamienia istniejącą tabelę na partycjonowaną
+(kopiowanie wierszy pod blokadą tabeli - najlepiej w oknie serwisowym),
+kolejne tylko dokładają brakujące partycje, tak jak boot.py przy starcie.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from invoices.partitioning import (
+    YEARS_AHEAD, PartitioningError, convert_to_partitioned, ensure_partitions, is_partitioned, partitions,
+)
+
+
+class Command(BaseCommand):
+    help = 'Partition the invoice table by year on PostgreSQL and create upcoming yearly partitions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--years-ahead',
+            type=int,
+            default=YEARS_AHEAD,
+            help=f'Create partitions up to this many years after the current one (default {YEARS_AHEAD})'
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Only list partitions, do not change anything'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Invoice partitioning requires PostgreSQL')
+        if options['years_ahead'] < 0:
+            raise CommandError('--years-ahead must not be negative')
+
+        if not options['status']:
+            try:
+                if not is_partitioned():
+                    self.stdout.write('Converting the invoice table to a partitioned table...')
+                    years = convert_to_partitioned(years_ahead=options['years_ahead'])
+                    self.stdout.write(self.style.SUCCESS(f'Partitioned by year: {years[0]}-{years[-1]}'))
+                created = ensure_partitions(years_ahead=options['years_ahead'])
+            except PartitioningError as e:
+                raise CommandError(str(e))
+            if created:
+                self.stdout.write(f'Created partitions: {", ".join(map(str, created))}')
+
+        if not is_partitioned():
+            self.stdout.write('Invoice table is not partitioned')
+            return
+        for name, rows in partitions():
+            # reltuples = -1, gdy partycja nie była jeszcze analizowana
+            self.stdout.write(f'  {name}: ~{max(rows, 0)} row(s)')
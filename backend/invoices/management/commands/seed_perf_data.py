@@ -0,0 +1,94 @@
+"""
+Django management command to generate synthetic data for performance tests.
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from customers.models import Company
+from customers.tenancy import command_company
+from invoices.perf_data import DEFAULT_BATCH_SIZE, clear_seeded, seed
+
+
+class Command(BaseCommand):
+    help = 'Generate synthetic invoices, contractors and KSeF data (10k-5M rows) for performance tests'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--invoices',
+            type=int,
+            default=10000,
+            help='Number of invoices to generate'
+        )
+        parser.add_argument(
+            '--contractors',
+            type=int,
+            default=None,
+            help='Number of contractors (default: invoices / 50, at least 10)'
+        )
+        parser.add_argument(
+            '--years',
+            type=int,
+            default=3,
+            help='Spread invoice dates over this many past years'
+        )
+        parser.add_argument(
+            '--ksef-ratio',
+            type=float,
+            default=0.5,
+            help='Share of invoices with KSeF number and KSeF JSON (0-1)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Rows generated and inserted per transaction'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Random seed (same seed = same data)'
+        )
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Delete previously generated data before seeding'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Company id to seed (default: the first company)'
+        )
+
+    def handle(self, *args, **options):
+        if options['invoices'] < 0 or not 0 <= options['ksef_ratio'] <= 1:
+            raise CommandError('--invoices must be >= 0 and --ksef-ratio between 0 and 1')
+        try:
+            company = command_company(options['company'])
+        except Company.DoesNotExist:
+            raise CommandError('Company not found')
+
+        if options['clear']:
+            removed = clear_seeded()
+            self.stdout.write(f"Removed {removed['invoices']} invoices and {removed['contractors']} contractors")
+
+        def progress(created, elapsed):
+            rate = created / elapsed if elapsed else 0
+            self.stdout.write(f'  {created}/{options["invoices"]} invoices, {rate:.0f} rows/s')
+
+        result = seed(
+            company,
+            invoices=options['invoices'],
+            contractors=options['contractors'],
+            years=options['years'],
+            ksef_ratio=options['ksef_ratio'],
+            batch_size=options['batch_size'],
+            random_seed=options['seed'],
+            progress=progress,
+        )
+
+        self.stdout.write(self.style.SUCCESS(
+            f"\nDone ({result['method']}): {result['invoices']} invoices, "
+            f"{result['contractors']} new contractors in {result['seconds']} s "
+            f"({result['rows_per_sec']} rows/s)"
+        ))
@@ -0,0 +1,68 @@
+"""
+Harmonogram synchronizacji KSeF - uruchamiany z crona (np. co godzinę).
+
+Synchronizuje firmy z włączonym automatycznym pobieraniem w ograniczonej
+puli wątków (patrz invoices/ksef_scheduler.py).
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from invoices.ksef_scheduler import due_companies, sync_companies, sync_range
+
+
+class Command(BaseCommand):
+    help = 'Fetch new invoices from KSeF for every company with automatic fetching enabled'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=settings.KSEF_SYNC_WORKERS,
+            help='Companies synchronized at the same time (default: KSEF_SYNC_WORKERS)'
+        )
+        parser.add_argument(
+            '--company',
+            type=int,
+            action='append',
+            default=None,
+            help='Only this company id (can be repeated)'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=None,
+            help='Fetch this many days back instead of continuing from the last scheduled sync'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list companies and date ranges, do not contact KSeF'
+        )
+
+    def handle(self, *args, **options):
+        if options['workers'] < 1:
+            raise CommandError('--workers must be at least 1')
+
+        companies = due_companies(options['company'])
+        self.stdout.write(f'{len(companies)} company(ies) to synchronize, {options["workers"]} worker(s)')
+        if options['dry_run']:
+            for company in companies:
+                date_from, date_to = sync_range(company, days=options['days'])
+                self.stdout.write(f'  {company.pk} {company}: {date_from} - {date_to}')
+            return
+
+        failed = 0
+        for result in sync_companies(companies, workers=options['workers'], days=options['days']):
+            line = f"  company {result['company']} ({result['date_from']} - {result['date_to']}): {result['status']}"
+            if result['status'] == 'success':
+                line += f", {result['found']} found, {result['imported_count']} imported"
+                self.stdout.write(line)
+            elif result['status'] == 'locked':
+                self.stdout.write(self.style.WARNING(line + ' - already running elsewhere'))
+            else:
+                failed += 1
+                self.stderr.write(self.style.ERROR(f"{line} - {result['message']}"))
+
+        if failed:
+            raise CommandError(f'{failed} company(ies) failed')
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -4,7 +4,8 @@ This is needed because older imports didn't store full KSeF data in ksef_xml fie
 """
 from django.core.management.base import BaseCommand
 from invoices.models import Invoice
-from customers.models import Settings
+from customers.models import Company
+from customers.tenancy import command_company
 from customers.encryption import decrypt_token, is_token_encrypted
 import json
 import logging
@@ -27,6 +28,12 @@ class Command(BaseCommand):
             default=0,
             help='Limit number of invoices to process (0 = all)',
         )
+        parser.add_argument(
+            '--company',
+            type=int,
+            default=None,
+            help='Company id (default: the first company)',
+        )
 
     def handle(self, *args, **options):
         from invoices.ksef_service import KSeFService, KSEF2_AVAILABLE
@@ -38,14 +45,18 @@ class Command(BaseCommand):
             self.stderr.write(self.style.ERROR('ksef2 SDK is not available'))
             return
         
-        # Get settings
-        settings = Settings.objects.first()
-        if not settings or not settings.ksef_token:
+        # Get company settings
+        try:
+            company = command_company(options['company'])
+        except Company.DoesNotExist:
+            self.stderr.write(self.style.ERROR('Company not found'))
+            return
+        if not company.ksef_token:
             self.stderr.write(self.style.ERROR('KSeF token not configured'))
             return
         
         # Get invoices that need updating
-        invoices = Invoice.objects.filter(ksef_numer__isnull=False).exclude(ksef_numer='')
+        invoices = Invoice.objects.for_company(company).filter(ksef_numer__isnull=False).exclude(ksef_numer='')
         
         if not force:
             # Only process invoices without proper ksef_xml data
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['data', 'kontrahent'], name='invoice_data_kontrahent_idx'),
+        ),
+    ]
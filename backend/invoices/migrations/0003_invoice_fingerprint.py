@@ -0,0 +1,50 @@
+import hashlib
+import re
+from datetime import date
+from decimal import Decimal
+
+from django.db import migrations, models
+
+_NON_ALNUM = re.compile(r'[^0-9a-ząćęłńóśźż]+')
+
+
+def _fingerprint(numer, kwota, data):
+    # Kopia invoices.fingerprint.invoice_fingerprint - migracja nie importuje kodu aplikacji
+    if isinstance(data, date):
+        data = data.isoformat()
+    amount = Decimal(str(kwota)).quantize(Decimal('0.01'))
+    key = f"{_NON_ALNUM.sub('', (numer or '').lower())}|{amount}|{data}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+
+def backfill_fingerprints(apps, schema_editor):
+    Invoice = apps.get_model('invoices', 'Invoice')
+    batch = []
+    for invoice in Invoice.objects.only('id', 'numer', 'kwota', 'data').order_by('id').iterator(chunk_size=2000):
+        invoice.fingerprint = _fingerprint(invoice.numer, invoice.kwota, invoice.data)
+        batch.append(invoice)
+        if len(batch) >= 2000:
+            Invoice.objects.bulk_update(batch, ['fingerprint'])
+            batch = []
+    Invoice.objects.bulk_update(batch, ['fingerprint'])
+
+
+class Migration(migrations.Migration):
+    """
+    Odcisk bez dostawcy - dostawcę porównuje invoices.fingerprint.same_supplier
+    (NIP albo nazwa). Indeks (company, fingerprint) zakłada 0010, gdy faktury
+    mają już firmę.
+    """
+
+    dependencies = [
+        ('invoices', '0002_invoice_data_kontrahent_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='fingerprint',
+            field=models.CharField(blank=True, editable=False, max_length=40, verbose_name='Odcisk'),
+        ),
+        migrations.RunPython(backfill_fingerprints, migrations.RunPython.noop),
+    ]
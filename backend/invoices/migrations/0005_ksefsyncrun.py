@@ -0,0 +1,37 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:27
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0004_invoice_status_termin_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KSeFSyncRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('trigger', models.CharField(max_length=30, verbose_name='Wywołanie')),
+                ('environment', models.CharField(blank=True, max_length=20, verbose_name='Środowisko')),
+                ('date_from', models.DateField(blank=True, null=True)),
+                ('date_to', models.DateField(blank=True, null=True)),
+                ('started_at', models.DateTimeField(db_index=True)),
+                ('duration_ms', models.PositiveIntegerField(default=0)),
+                ('phases', models.JSONField(default=list)),
+                ('bytes_downloaded', models.BigIntegerField(default=0)),
+                ('invoices_parsed', models.PositiveIntegerField(default=0)),
+                ('invoices_saved', models.PositiveIntegerField(default=0)),
+                ('peak_memory_bytes', models.BigIntegerField(blank=True, null=True)),
+                ('outcome', models.CharField(choices=[('success', 'Sukces'), ('error', 'Błąd')], max_length=10, verbose_name='Wynik')),
+                ('message', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Synchronizacja KSeF',
+                'verbose_name_plural': 'Synchronizacje KSeF',
+                'ordering': ['-started_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 3.2.25 on 2026-10-19 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0005_ksefsyncrun'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KSeFProgressEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('progress_id', models.CharField(max_length=64)),
+                ('stage', models.CharField(max_length=30)),
+                ('data', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Postęp pobierania KSeF',
+                'verbose_name_plural': 'Postęp pobierania KSeF',
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='ksefprogressevent',
+            index=models.Index(fields=['progress_id', 'id'], name='ksef_progress_idx'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """Kolumna company - najpierw bez NOT NULL, wypełnia ją 0009."""
+
+    dependencies = [
+        ('customers', '0004_company'),
+        ('invoices', '0007_changetombstone_invoice_updated_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='invoice',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='faktury', to='customers.company', verbose_name='Firma'),
+        ),
+        migrations.AddField(
+            model_name='changetombstone',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='customers.company'),
+        ),
+        migrations.AddField(
+            model_name='ksefsyncrun',
+            name='company',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='synchronizacje_ksef', to='customers.company', verbose_name='Firma'),
+        ),
+    ]
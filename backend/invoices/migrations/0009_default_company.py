@@ -0,0 +1,21 @@
+from django.db import migrations
+
+
+def assign_default_company(apps, schema_editor):
+    """Dotychczasowe faktury, ślady usunięć i przebiegi KSeF należą do pierwszej firmy."""
+    Company = apps.get_model('customers', 'Company')
+    company = Company.objects.order_by('id').first()
+    for model in ('Invoice', 'ChangeTombstone', 'KSeFSyncRun'):
+        apps.get_model('invoices', model).objects.filter(company__isnull=True).update(company=company)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0005_default_company'),
+        ('invoices', '0008_company'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_default_company, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    """NOT NULL dla company i indeksy złożone zaczynające się od firmy."""
+
+    dependencies = [
+        ('invoices', '0009_default_company'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='faktury', to='customers.company', verbose_name='Firma'),
+        ),
+        migrations.AlterField(
+            model_name='changetombstone',
+            name='company',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='customers.company'),
+        ),
+        migrations.RemoveIndex(model_name='invoice', name='invoice_data_kontrahent_idx'),
+        migrations.RemoveIndex(model_name='invoice', name='invoice_status_termin_idx'),
+        migrations.RemoveIndex(model_name='invoice', name='invoice_updated_idx'),
+        migrations.RemoveIndex(model_name='changetombstone', name='change_tombstone_idx'),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'data', 'kontrahent'], name='invoice_company_data_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'fingerprint'], name='invoice_company_fp_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'status', 'termin_platnosci'], name='invoice_company_status_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'updated_at', 'id'], name='invoice_company_updated_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'ksef_numer'], name='invoice_company_ksef_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='changetombstone',
+            index=models.Index(fields=['company', 'deleted_at', 'id'], name='change_tombstone_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ksefsyncrun',
+            index=models.Index(fields=['company', 'started_at'], name='ksef_sync_company_idx'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.25 on 2026-10-19 04:42
+
+from django.db import migrations
+import fakturex.fields
+
+
+class Migration(migrations.Migration):
+    """Kompresja danych KSeF - kolumna bez zmian (text), stare wiersze przepakowuje compress_ksef_payloads."""
+
+    dependencies = [
+        ('invoices', '0010_company_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='invoice',
+            name='ksef_xml',
+            field=fakturex.fields.CompressedTextField(blank=True, verbose_name='XML KSeF'),
+        ),
+    ]
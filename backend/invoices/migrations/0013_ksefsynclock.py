@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:09
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0006_contractor_company_indexes'),
+        ('invoices', '0011_compressed_ksef_xml'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='KSeFSyncLock',
+            fields=[
+                ('company', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='+', serialize=False, to='customers.company')),
+                ('owner', models.CharField(max_length=32)),
+                ('locked_until', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Blokada synchronizacji KSeF',
+                'verbose_name_plural': 'Blokady synchronizacji KSeF',
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0013_ksefsynclock'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='invoice',
+            index=models.Index(fields=['company', 'numer'], name='invoice_company_numer_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 3.2.25 on 2026-10-19 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('customers', '0006_contractor_company_indexes'),
+        ('invoices', '0014_invoice_company_numer_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ksefprogressevent',
+            name='company',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='customers.company'),
+        ),
+        migrations.AddField(
+            model_name='ksefprogressevent',
+            name='user',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
@@ -1,6 +1,66 @@
+from django.conf import settings
 from django.db import models
+from django.utils import timezone
+
+from customers.models import CompanyQuerySet
+from fakturex.fields import CompressedTextField
+from django.db.models import BooleanField, Case, DateField, Func, IntegerField, Q, Value, When
 from decimal import Decimal
 from datetime import date
+import calendar
+
+
+class DaysUntil(Func):
+    """
+    Liczba dni od `today` do daty z kolumny (ujemna = po terminie).
+    Różnica dat w SQL zależy od bazy: PostgreSQL zwraca liczbę dni wprost,
+    a ExpressionWrapper(F(...) - today) dałby interwał, nie liczbę całkowitą.
+    """
+    output_field = IntegerField()
+
+    def __init__(self, expression, today, **extra):
+        super().__init__(expression, Value(today, output_field=DateField()), **extra)
+
+    def as_sql(self, compiler, connection, **extra_context):
+        # PostgreSQL i Oracle: date - date = liczba dni
+        return super().as_sql(compiler, connection, template='(%(expressions)s)', arg_joiner=' - ', **extra_context)
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(
+            compiler, connection,
+            template='CAST(julianday(%(expressions)s) AS INTEGER)',
+            arg_joiner=') - julianday(',
+            **extra_context
+        )
+
+    def as_mysql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='DATEDIFF', **extra_context)
+
+
+class InvoiceQuerySet(CompanyQuerySet):
+
+    def in_period(self, year, month=None):
+        """
+        Faktury z roku (lub miesiąca roku) jako zakres dat - korzysta z indeksu
+        (company, data), a na tabeli partycjonowanej pomija partycje innych lat.
+        """
+        if month:
+            date_from, date_to = date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+        else:
+            date_from, date_to = date(year, 1, 1), date(year, 12, 31)
+        return self.filter(data__gte=date_from, data__lte=date_to)
+
+    def with_due_info(self, today=None):
+        """Adnotacje days_until_due i is_overdue liczone w SQL dla wspólnej daty."""
+        today = today or date.today()
+        return self.annotate(
+            days_until_due=DaysUntil('termin_platnosci', today),
+            is_overdue=Case(
+                When(Q(status='niezaplacona', termin_platnosci__lt=today), then=Value(True)),
+                default=Value(False),
+                output_field=BooleanField(),
+            ),
+        )
 
 
 class Invoice(models.Model):
@@ -13,6 +73,11 @@ class Invoice(models.Model):
         ('zaplacona', 'Zapłacona'),
     ]
     
+    # Indeks kolumny zbędny - pokrywają ją indeksy złożone zaczynające się od company
+    company = models.ForeignKey(
+        'customers.Company', on_delete=models.CASCADE, related_name='faktury', db_index=False,
+        verbose_name='Firma'
+    )
     numer = models.CharField(max_length=100, verbose_name='Numer faktury')
     data = models.DateField(verbose_name='Data faktury')
     kwota = models.DecimalField(max_digits=12, decimal_places=2, verbose_name='Kwota brutto')
@@ -32,28 +97,208 @@ class Invoice(models.Model):
     
     # KSeF
     ksef_numer = models.CharField(max_length=100, blank=True, verbose_name='Numer KSeF')
-    ksef_xml = models.TextField(blank=True, verbose_name='XML KSeF')
+    # Dane KSeF (JSON) w bazie skompresowane - listy ich nie czytają (defer)
+    ksef_xml = CompressedTextField(blank=True, verbose_name='XML KSeF')
     
     notatki = models.TextField(blank=True, verbose_name='Notatki')
+    # Znormalizowany odcisk (numer, kwota, data) - wykrywanie duplikatów, dostawcę porównuje fingerprint.same_supplier
+    fingerprint = models.CharField(max_length=40, blank=True, editable=False, verbose_name='Odcisk')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = InvoiceQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Faktura'
         verbose_name_plural = 'Faktury'
         ordering = ['-data', '-id']
+        # Każde zapytanie dotyczy jednej firmy - company jest pierwszą kolumną indeksów
+        indexes = [
+            # Zakres dat + grupowanie po kontrahencie (lista, analityka dostawców, JPK)
+            models.Index(fields=['company', 'data', 'kontrahent'], name='invoice_company_data_idx'),
+            models.Index(fields=['company', 'fingerprint'], name='invoice_company_fp_idx'),
+            # Filtry i sortowanie po terminie (days_until_due, przeterminowane)
+            models.Index(fields=['company', 'status', 'termin_platnosci'], name='invoice_company_status_idx'),
+            # Feed zmian (/api/changes/) pyta o faktury zmienione po kursorze
+            models.Index(fields=['company', 'updated_at', 'id'], name='invoice_company_updated_idx'),
+            # Import z KSeF sprawdza, które numery KSeF już są w bazie
+            models.Index(fields=['company', 'ksef_numer'], name='invoice_company_ksef_idx'),
+            # Import CSV pomija faktury o istniejącym numerze od tego samego dostawcy
+            models.Index(fields=['company', 'numer'], name='invoice_company_numer_idx'),
+        ]
 
     def __str__(self):
         return f"{self.numer} - {self.dostawca}"
 
+    def save(self, *args, **kwargs):
+        self.fill_fingerprint()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'fingerprint'}
+        super().save(*args, **kwargs)
+        # Adnotacje with_due_info opisują wiersz sprzed zapisu (np. status) - liczymy od nowa z pól
+        self.__dict__.pop('_is_overdue', None)
+        self.__dict__.pop('_days_until_due', None)
+
+    def fill_fingerprint(self):
+        """Wylicz odcisk - wołać przed bulk_create, które pomija save()."""
+        from .fingerprint import invoice_fingerprint
+        self.fingerprint = invoice_fingerprint(self.numer, self.kwota, self.data)
+        return self.fingerprint
+
+    def supplier_key(self):
+        """Dostawca do porównania duplikatów o tym samym odcisku (invoices/fingerprint.py)."""
+        from .fingerprint import supplier_key
+        return supplier_key(self.kontrahent.nip if self.kontrahent_id else None, self.dostawca)
+
     @property
     def is_overdue(self):
-        """Czy faktura jest przeterminowana"""
+        """Czy faktura jest przeterminowana (z adnotacji with_due_info, jeśli jest)"""
+        if '_is_overdue' in self.__dict__:
+            return self._is_overdue
         if self.status == 'zaplacona':
             return False
         return date.today() > self.termin_platnosci
 
+    @is_overdue.setter
+    def is_overdue(self, value):
+        self._is_overdue = value
+
     @property
     def days_until_due(self):
         """Dni do terminu płatności (ujemne = przeterminowana)"""
-        return (self.termin_platnosci - date.today()).days
\ No newline at end of file
+        if '_days_until_due' in self.__dict__:
+            return self._days_until_due
+        return (self.termin_platnosci - date.today()).days
+
+    @days_until_due.setter
+    def days_until_due(self, value):
+        self._days_until_due = value
+
+class KSeFSyncRun(models.Model):
+    """
+    Przebieg synchronizacji z KSeF z czasami faz (autoryzacja, sesja, eksport,
+    kolejne odpytania, pobieranie paczki, parsowanie, zapis do bazy).
+    Zapisywany przez invoices.sync_recorder.SyncRecorder.
+    """
+    OUTCOME_CHOICES = [
+        ('success', 'Sukces'),
+        ('error', 'Błąd'),
+    ]
+
+    # Puste dla przebiegów sprzed podziału na firmy
+    company = models.ForeignKey(
+        'customers.Company', on_delete=models.CASCADE, null=True, blank=True, related_name='synchronizacje_ksef',
+        db_index=False, verbose_name='Firma'
+    )
+    trigger = models.CharField(max_length=30, verbose_name='Wywołanie')
+    environment = models.CharField(max_length=20, blank=True, verbose_name='Środowisko')
+    date_from = models.DateField(null=True, blank=True)
+    date_to = models.DateField(null=True, blank=True)
+    started_at = models.DateTimeField(db_index=True)
+    duration_ms = models.PositiveIntegerField(default=0)
+    # Lista {"name": ..., "ms": ..., dodatkowe pola} w kolejności wykonania
+    phases = models.JSONField(default=list)
+    bytes_downloaded = models.BigIntegerField(default=0)
+    invoices_parsed = models.PositiveIntegerField(default=0)
+    invoices_saved = models.PositiveIntegerField(default=0)
+    peak_memory_bytes = models.BigIntegerField(null=True, blank=True)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, verbose_name='Wynik')
+    message = models.TextField(blank=True)
+
+    class Meta:
+        verbose_name = 'Synchronizacja KSeF'
+        verbose_name_plural = 'Synchronizacje KSeF'
+        ordering = ['-started_at']
+        indexes = [
+            # Historia synchronizacji firmy i ostatni przebieg dla harmonogramu
+            models.Index(fields=['company', 'started_at'], name='ksef_sync_company_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.trigger} {self.started_at:%Y-%m-%d %H:%M} ({self.outcome}, {self.duration_ms} ms)"
+
+
+class KSeFSyncLock(models.Model):
+    """
+    Blokada synchronizacji firmy przez harmonogram (invoices/ksef_scheduler.py).
+    Wiersz w bazie, więc działa między instancjami; locked_until zwalnia
+    blokadę procesu, który padł w trakcie. owner - kto ją trzyma.
+    """
+    company = models.OneToOneField(
+        'customers.Company', on_delete=models.CASCADE, primary_key=True, related_name='+'
+    )
+    owner = models.CharField(max_length=32)
+    locked_until = models.DateTimeField()
+
+    class Meta:
+        verbose_name = 'Blokada synchronizacji KSeF'
+        verbose_name_plural = 'Blokady synchronizacji KSeF'
+
+    def __str__(self):
+        return f"{self.company_id} do {self.locked_until:%Y-%m-%d %H:%M}"
+
+
+class KSeFProgressEvent(models.Model):
+    """
+    Zdarzenie postępu pobierania z KSeF (autoryzacja, eksport, odpytania,
+    pobieranie i parsowanie paczki) oraz żądanie anulowania. Tabela jest
+    kanałem między workerami: potok zapisuje, strumień SSE czyta.
+    Patrz invoices/ksef_progress.py.
+    """
+    # Identyfikator nadany przez przeglądarkę (UUID) przed wysłaniem żądania
+    progress_id = models.CharField(max_length=64)
+    # Pobieranie należy do użytkownika i firmy, którzy je uruchomili - tylko oni
+    # widzą zdarzenia i mogą anulować (puste dla zdarzeń sprzed tej zmiany)
+    company = models.ForeignKey(
+        'customers.Company', on_delete=models.CASCADE, null=True, related_name='+', db_index=False
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, related_name='+', db_index=False
+    )
+    stage = models.CharField(max_length=30)
+    data = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        verbose_name = 'Postęp pobierania KSeF'
+        verbose_name_plural = 'Postęp pobierania KSeF'
+        ordering = ['id']
+        indexes = [
+            # Strumień pyta o zdarzenia danego pobierania nowsze niż ostatnio wysłane
+            models.Index(fields=['progress_id', 'id'], name='ksef_progress_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.progress_id} {self.stage}"
+
+
+class ChangeTombstone(models.Model):
+    """
+    Ślad usuniętej faktury lub kontrahenta dla feedu zmian (invoices/changes.py).
+    Usuniętego wiersza nie da się znaleźć po updated_at, więc klient dowiaduje
+    się o usunięciu stąd. Ślady starsze niż CHANGES_TOMBSTONE_RETENTION_DAYS
+    są usuwane - klient z tak starym kursorem dostaje pełny stan (reset).
+    """
+    MODEL_CHOICES = [
+        ('invoice', 'Faktura'),
+        ('contractor', 'Kontrahent'),
+    ]
+
+    company = models.ForeignKey(
+        'customers.Company', on_delete=models.CASCADE, related_name='+', db_index=False
+    )
+    model = models.CharField(max_length=20, choices=MODEL_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Usunięty obiekt'
+        verbose_name_plural = 'Usunięte obiekty'
+        ordering = ['deleted_at', 'id']
+        indexes = [
+            models.Index(fields=['company', 'deleted_at', 'id'], name='change_tombstone_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id} ({self.deleted_at:%Y-%m-%d %H:%M})"
@@ -0,0 +1,227 @@
+"""
+Partycjonowanie tabeli faktur po roku (opcjonalne, tylko PostgreSQL).
+
+Prawie każde zapytanie o faktury ogranicza datę (rok i miesiąc na liście,
+bieżący miesiąc w statystykach, JPK), a tabela rośnie bez końca. Po
+konwersji (manage.py partition_invoices) invoices_invoice jest tabelą
+partycjonowaną RANGE (data): partycja na każdy rok i partycja domyślna na
+daty spoza utworzonych lat. Planista pomija partycje innych lat, więc
+zapytanie o bieżący rok nie zależy od długości historii - o ile filtr jest
+zakresem dat (data__gte / data__lte, data__year), a nie EXTRACT(MONTH).
+
+Ograniczenia tabel partycjonowanych w PostgreSQL:
+- klucz główny musi zawierać klucz partycji - jest to (id, data); id nadal
+  pochodzi z jednej sekwencji, więc pozostaje unikalne,
+- żadna tabela nie może mieć klucza obcego do faktur (dziś żadna nie ma),
+- CREATE INDEX CONCURRENTLY nie działa na tabeli nadrzędnej, a zmiana
+  typu kolumny data wymaga ponownej konwersji.
+
+Partycje bieżącego i następnego roku tworzy boot.py przy każdym starcie
+(ensure_partitions). Wiersze, które trafiły wcześniej do partycji
+domyślnej, przenoszone są do nowej partycji swojego roku.
+"""
+import logging
+from datetime import date
+
+from django.db import connection, transaction
+
+from .models import Invoice
+
+logger = logging.getLogger(__name__)
+
+# Ile lat naprzód mają istnieć partycje (faktury z datą w przyszłym roku)
+YEARS_AHEAD = 1
+# Klucz blokady doradczej - kilka instancji nie tworzy partycji naraz
+PARTITION_LOCK_ID = 720_260_218
+
+
+class PartitioningError(Exception):
+    """Tabeli faktur nie da się partycjonować na tej bazie."""
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _table():
+    return Invoice._meta.db_table
+
+
+def partition_name(year):
+    return f'{_table()}_y{year}'
+
+
+def default_partition_name():
+    return f'{_table()}_default'
+
+
+def _year_bounds(year):
+    # Literały - granice partycji nie przyjmują parametrów zapytania
+    return f"'{date(year, 1, 1).isoformat()}'", f"'{date(year + 1, 1, 1).isoformat()}'"
+
+
+def is_partitioned():
+    """Czy tabela faktur jest już partycjonowana (False poza PostgreSQL)."""
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s)', [_table()])
+        return cursor.fetchone() is not None
+
+
+def partitions():
+    """Partycje tabeli faktur: lista (nazwa, szacowana liczba wierszy), rosnąco po nazwie."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname, child.reltuples::bigint
+            FROM pg_inherits
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE pg_inherits.inhparent = to_regclass(%s)
+            ORDER BY child.relname
+            """,
+            [_table()],
+        )
+        return cursor.fetchall()
+
+
+def partition_years():
+    """Lata, dla których istnieją partycje (rosnąco)."""
+    prefix = f'{_table()}_y'
+    return sorted(
+        int(name[len(prefix):]) for name, _ in partitions()
+        if name.startswith(prefix) and name[len(prefix):].isdigit()
+    )
+
+
+def _create_partition(cursor, year):
+    """
+    Dołącz partycję roku, przenosząc jego wiersze z partycji domyślnej
+    (ATTACH nie pozwala, żeby partycja domyślna miała wiersze nowego zakresu).
+    Zwraca liczbę przeniesionych wierszy.
+    """
+    table, name, default = _qn(_table()), _qn(partition_name(year)), _qn(default_partition_name())
+    lower, upper = _year_bounds(year)
+    cursor.execute(f'CREATE TABLE {name} (LIKE {table} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)')
+    cursor.execute(
+        f'WITH moved AS (DELETE FROM {default} WHERE data >= {lower} AND data < {upper} RETURNING *) '
+        f'INSERT INTO {name} SELECT * FROM moved'
+    )
+    moved = cursor.rowcount
+    # Indeksy i klucze obce tabeli nadrzędnej PostgreSQL zakłada na partycji sam
+    cursor.execute(f'ALTER TABLE {table} ATTACH PARTITION {name} FOR VALUES FROM ({lower}) TO ({upper})')
+    return moved
+
+
+def ensure_partitions(today=None, years_ahead=YEARS_AHEAD):
+    """
+    Utwórz brakujące partycje: od bieżącego roku do years_ahead lat naprzód
+    oraz dla lat, których faktury leżą w partycji domyślnej. Bez
+    partycjonowania nic nie robi. Zwraca listę utworzonych lat.
+    """
+    if not is_partitioned():
+        return []
+    year = (today or date.today()).year
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [PARTITION_LOCK_ID])
+        existing = set(partition_years())
+        cursor.execute(f'SELECT DISTINCT EXTRACT(YEAR FROM data)::int FROM {_qn(default_partition_name())}')
+        wanted = set(range(year, year + years_ahead + 1)) | {row[0] for row in cursor.fetchall()}
+        for missing in sorted(wanted - existing):
+            moved = _create_partition(cursor, missing)
+            logger.info('Created invoice partition %s (%d row(s) moved from default)', missing, moved)
+            created.append(missing)
+    return created
+
+
+def _table_definition(cursor, table):
+    """Indeksy i ograniczenia tabeli do odtworzenia na tabeli partycjonowanej."""
+    cursor.execute(
+        """
+        SELECT conname, contype, pg_get_constraintdef(oid)
+        FROM pg_constraint
+        WHERE conrelid = to_regclass(%s) AND contype IN ('f', 'c', 'u', 'x')
+        ORDER BY conname
+        """,
+        [table],
+    )
+    constraints = cursor.fetchall()
+    if any(contype in ('u', 'x') for _, contype, _ in constraints):
+        raise PartitioningError('Ograniczenia unikalności faktur muszą zawierać kolumnę data.')
+
+    # Indeksy bez tych, za którymi stoi ograniczenie (klucz główny)
+    cursor.execute(
+        """
+        SELECT pg_get_indexdef(i.indexrelid), i.indisunique
+        FROM pg_index i
+        WHERE i.indrelid = to_regclass(%s)
+          AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+        ORDER BY 1
+        """,
+        [table],
+    )
+    indexes = cursor.fetchall()
+    if any(unique for _, unique in indexes):
+        raise PartitioningError('Unikalne indeksy faktur muszą zawierać kolumnę data.')
+    return [(name, definition) for name, _, definition in constraints], [definition for definition, _ in indexes]
+
+
+def convert_to_partitioned(today=None, years_ahead=YEARS_AHEAD):
+    """
+    Zamień invoices_invoice na tabelę partycjonowaną po roku - w jednej
+    transakcji, z blokadą tabeli na czas kopiowania wierszy. Partycje
+    powstają dla lat obecnych w danych oraz od bieżącego roku do
+    years_ahead naprzód. Zwraca listę lat partycji (pusta, gdy tabela
+    już jest partycjonowana).
+    """
+    if connection.vendor != 'postgresql':
+        raise PartitioningError('Partycjonowanie faktur wymaga PostgreSQL.')
+    if is_partitioned():
+        return []
+
+    table = _table()
+    old = f'{table}_unpartitioned'
+    year = (today or date.today()).year
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {_qn(table)} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute("SELECT conname FROM pg_constraint WHERE contype = 'f' AND confrelid = to_regclass(%s)", [table])
+        references = [row[0] for row in cursor.fetchall()]
+        if references:
+            raise PartitioningError(f'Klucze obce wskazują na faktury: {", ".join(references)}.')
+        # Definicje czytane przed zmianą nazwy - odnoszą się do nazwy docelowej
+        constraints, indexes = _table_definition(cursor, table)
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [table])
+        sequence = cursor.fetchone()[0]
+        if sequence:
+            # Sekwencja id przechodzi na nową tabelę (DROP starej by ją usunął)
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY NONE')
+
+        cursor.execute(f'ALTER TABLE {_qn(table)} RENAME TO {_qn(old)}')
+        cursor.execute(f'CREATE TABLE {_qn(table)} (LIKE {_qn(old)} INCLUDING DEFAULTS) PARTITION BY RANGE (data)')
+        cursor.execute(f'CREATE TABLE {_qn(default_partition_name())} PARTITION OF {_qn(table)} DEFAULT')
+        cursor.execute(f'SELECT DISTINCT EXTRACT(YEAR FROM data)::int FROM {_qn(old)}')
+        years = sorted({row[0] for row in cursor.fetchall()} | set(range(year, year + years_ahead + 1)))
+        for partition_year in years:
+            lower, upper = _year_bounds(partition_year)
+            cursor.execute(
+                f'CREATE TABLE {_qn(partition_name(partition_year))} PARTITION OF {_qn(table)} '
+                f'FOR VALUES FROM ({lower}) TO ({upper})'
+            )
+
+        cursor.execute(f'INSERT INTO {_qn(table)} SELECT * FROM {_qn(old)}')
+        rows = cursor.rowcount
+        cursor.execute(f'DROP TABLE {_qn(old)}')
+
+        # Nazwy indeksów i ograniczeń są już wolne - odtwórz je na tabeli nadrzędnej
+        cursor.execute(f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(table + "_pkey")} PRIMARY KEY (id, data)')
+        for name, definition in constraints:
+            cursor.execute(f'ALTER TABLE {_qn(table)} ADD CONSTRAINT {_qn(name)} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+        if sequence:
+            cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {_qn(table)}.id')
+        cursor.execute(f'ANALYZE {_qn(table)}')
+
+    logger.info('Invoice table partitioned by year: %d row(s), years %s', rows, years)
+    return years
@@ -0,0 +1,308 @@
+"""
+Syntetyczne dane do testów wydajności (seed_perf_data, benchmarks/).
+
+Generuje kontrahentów z poprawnymi NIP-ami i faktury z realistycznym
+rozkładem: kwoty log-normalne, daty z ostatnich lat, starsze faktury prawie
+wszystkie zapłacone, świeże mniej więcej w połowie; część z danymi KSeF w ksef_xml (JSON jak po imporcie, z rozbiciem
+netto/VAT i pozycjami - zgodny z eksportem JPK).
+
+Faktury ładowane są paczkami: na PostgreSQL przez COPY prosto do tabeli,
+na innych bazach przez bulk_create. Wygenerowane rekordy mają znacznik
+(numer 'PERF/...', notatki kontrahenta SEED_MARKER), więc clear_seeded()
+usuwa tylko je.
+"""
+import csv
+import io
+import json
+import random
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from customers.models import Contractor
+from customers.resolver import normalize_nip
+from .fingerprint import invoice_fingerprint
+from .models import ChangeTombstone, Invoice
+
+SEED_MARKER = 'seed_perf_data'
+NUMBER_PREFIX = 'PERF/'
+DEFAULT_BATCH_SIZE = 5000
+
+NIP_WEIGHTS = (6, 5, 7, 2, 3, 4, 5, 6, 7)
+PAYMENT_TERMS = (0, 7, 14, 14, 21, 30, 30, 30, 45, 60)
+VAT_RATES = (('23', Decimal('0.23')), ('23', Decimal('0.23')), ('23', Decimal('0.23')), ('8', Decimal('0.08')), ('5', Decimal('0.05')))
+
+NAME_PREFIXES = ('Hurtownia', 'Przedsiębiorstwo', 'Zakład', 'Biuro', 'Firma Handlowa', 'Centrum', 'Studio', 'Serwis')
+NAME_CORES = (
+    'Budmax', 'Elektrotech', 'Polmet', 'Agrotex', 'Drewpol', 'Transbud', 'Mediq', 'Infosoft',
+    'Kopex', 'Gastro', 'Autoserwis', 'Papirus', 'Energa', 'Logistyka', 'Chemix', 'Stalbud',
+)
+NAME_SUFFIXES = ('Sp. z o.o.', 'S.A.', 's.c.', 'Sp. j.', '')
+CITIES = (
+    ('00-001', 'Warszawa'), ('30-001', 'Kraków'), ('50-001', 'Wrocław'), ('60-001', 'Poznań'),
+    ('80-001', 'Gdańsk'), ('90-001', 'Łódź'), ('20-001', 'Lublin'), ('40-001', 'Katowice'),
+)
+STREETS = ('Długa', 'Polna', 'Lipowa', 'Przemysłowa', 'Kwiatowa', 'Ogrodowa', 'Leśna', 'Kolejowa')
+ITEMS = (
+    ('Usługa transportowa', 'usł.'), ('Materiały biurowe', 'szt.'), ('Paliwo ON', 'l'),
+    ('Abonament serwisowy', 'mies.'), ('Stal profilowa', 'kg'), ('Licencja oprogramowania', 'szt.'),
+    ('Usługa księgowa', 'usł.'), ('Energia elektryczna', 'kWh'), ('Części zamienne', 'szt.'),
+)
+
+INVOICE_COLUMNS = (
+    'company_id', 'numer', 'data', 'kwota', 'dostawca', 'termin_platnosci', 'status',
+    'kontrahent_id', 'ksef_numer', 'ksef_xml', 'notatki', 'fingerprint', 'created_at', 'updated_at',
+)
+
+
+def random_nip(rng):
+    """NIP z poprawną sumą kontrolną."""
+    while True:
+        digits = [rng.randint(1, 9)] + [rng.randint(0, 9) for _ in range(8)]
+        check = sum(d * w for d, w in zip(digits, NIP_WEIGHTS)) % 11
+        if check != 10:
+            return ''.join(map(str, digits)) + str(check)
+
+
+def generate_contractors(count, rng, company_id=None):
+    contractors = []
+    used_nips = set()
+    for i in range(count):
+        nip = random_nip(rng)
+        while nip in used_nips:
+            nip = random_nip(rng)
+        used_nips.add(nip)
+        kod, miasto = rng.choice(CITIES)
+        suffix = rng.choice(NAME_SUFFIXES)
+        nazwa = f'{rng.choice(NAME_PREFIXES)} {rng.choice(NAME_CORES)} {i + 1}'
+        contractors.append(Contractor(
+            company_id=company_id,
+            nazwa=f'{nazwa} {suffix}'.strip(),
+            nip=nip,
+            nip_normalized=normalize_nip(nip),
+            ulica=f'ul. {rng.choice(STREETS)} {rng.randint(1, 200)}',
+            kod_pocztowy=kod,
+            miasto=miasto,
+            notatki=SEED_MARKER,
+        ))
+    return contractors
+
+
+def _ksef_data(rng, invoice_date, kwota, supplier, company):
+    """Dane KSeF jak po imporcie: netto + VAT == brutto, pozycje sumują się do netto."""
+    stawka, rate = rng.choice(VAT_RATES)
+    netto = (kwota / (1 + rate)).quantize(Decimal('0.01'))
+    vat = kwota - netto
+
+    lines = rng.randint(1, 5)
+    pozycje = []
+    remaining = netto
+    for lp in range(1, lines + 1):
+        value = remaining if lp == lines else (netto / lines).quantize(Decimal('0.01'))
+        remaining -= value
+        nazwa, jednostka = rng.choice(ITEMS)
+        pozycje.append({
+            'nazwa': nazwa,
+            'ilosc': '1',
+            'jednostka': jednostka,
+            'cena_netto': str(value),
+            'wartosc_netto': str(value),
+            'stawka_vat': stawka,
+        })
+
+    return {
+        'data_sprzedazy': invoice_date.isoformat(),
+        'dostawca_nip': supplier.nip,
+        'dostawca_adres': f'{supplier.ulica}, {supplier.kod_pocztowy} {supplier.miasto}',
+        'nabywca': company['nazwa'],
+        'nabywca_nip': company['nip'],
+        'forma_platnosci': rng.choice(('przelew', 'przelew', 'przelew', 'gotówka', 'karta')),
+        'waluta': 'PLN',
+        'kwota_netto': str(netto),
+        'kwota_vat': str(vat),
+        'pozycje': pozycje,
+    }
+
+
+def generate_invoices(count, contractors, rng, years=3, ksef_ratio=0.5, company=None, start=0, today=None,
+                      company_id=None):
+    """
+    Generator faktur (obiekty Invoice bez zapisu), numerowanych od `start`.
+    company - nabywca w danych KSeF ({'nazwa', 'nip'}), company_id - firma faktur.
+    """
+    today = today or date.today()
+    company = company or {'nazwa': 'Fakturex Sp. z o.o.', 'nip': '5250001009'}
+    span_days = max(1, years * 365)
+
+    for i in range(start, start + count):
+        supplier = rng.choice(contractors)
+        invoice_date = today - timedelta(days=rng.randrange(span_days))
+        termin = invoice_date + timedelta(days=rng.choice(PAYMENT_TERMS))
+        kwota = Decimal(str(min(round(rng.lognormvariate(7, 1.2), 2), 999999.99))).quantize(Decimal('0.01'))
+        if kwota <= 0:
+            kwota = Decimal('1.00')
+        # Starsze faktury prawie zawsze zapłacone, świeże częściej otwarte
+        paid_probability = 0.97 if termin < today - timedelta(days=60) else 0.45
+        numer = f'{NUMBER_PREFIX}{invoice_date.year}/{i + 1:07d}'
+
+        invoice = Invoice(
+            company_id=company_id,
+            numer=numer,
+            data=invoice_date,
+            kwota=kwota,
+            dostawca=supplier.nazwa,
+            termin_platnosci=termin,
+            status='zaplacona' if rng.random() < paid_probability else 'niezaplacona',
+            kontrahent_id=supplier.id,
+        )
+        if rng.random() < ksef_ratio:
+            invoice.ksef_numer = f'{supplier.nip}-{invoice_date:%Y%m%d}-{i + 1:010X}-{rng.randrange(256):02X}'
+            invoice.ksef_xml = json.dumps(
+                _ksef_data(rng, invoice_date, kwota, supplier, company), ensure_ascii=False
+            )
+        invoice.fingerprint = invoice_fingerprint(numer, kwota, invoice_date)
+        yield invoice
+
+
+def _copy_invoices(invoices):
+    """COPY paczki faktur prosto do tabeli (PostgreSQL)."""
+    now = timezone.now()
+    # COPY omija pole modelu - dane KSeF pakowane jak przy zapisie przez ORM
+    payload = Invoice._meta.get_field('ksef_xml')
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for invoice in invoices:
+        writer.writerow([
+            invoice.company_id, invoice.numer, invoice.data, invoice.kwota, invoice.dostawca, invoice.termin_platnosci,
+            invoice.status, invoice.kontrahent_id, invoice.ksef_numer, payload.get_prep_value(invoice.ksef_xml), invoice.notatki,
+            invoice.fingerprint, now, now,
+        ])
+    buffer.seek(0)
+    table = Invoice._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.copy_expert(
+            f"COPY {table} ({', '.join(INVOICE_COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def _batches(iterable, size):
+    batch = []
+    for item in iterable:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def seed(company, invoices=10000, contractors=None, years=3, ksef_ratio=0.5, batch_size=DEFAULT_BATCH_SIZE,
+         random_seed=42, progress=None):
+    """
+    Wygeneruj dane w firmie company. Kolejne wywołania dopisują faktury
+    (numeracja od liczby istniejących faktur PERF/). Zwraca statystyki
+    z czasem i tempem.
+    """
+    from .analytics import bump_analytics_version
+
+    rng = random.Random(random_seed)
+    if contractors is None:
+        contractors = max(10, invoices // 50) if invoices else 0
+    elif invoices:
+        # Faktury potrzebują co najmniej jednego dostawcy
+        contractors = max(1, contractors)
+    use_copy = connection.vendor == 'postgresql'
+    started = time.perf_counter()
+
+    company_contractors = Contractor.objects.for_company(company)
+    existing_contractors = company_contractors.filter(notatki=SEED_MARKER).count()
+    new_contractors = []
+    if existing_contractors < contractors:
+        # Inny seed niż faktury - dopisani kontrahenci nie powtarzają NIP-ów z poprzedniego uruchomienia
+        contractor_rng = random.Random(f'{random_seed}:{existing_contractors}')
+        new_contractors = generate_contractors(contractors - existing_contractors, contractor_rng, company.pk)
+        taken = set(company_contractors.filter(
+            nip_normalized__in=[c.nip_normalized for c in new_contractors]
+        ).values_list('nip_normalized', flat=True))
+        new_contractors = [c for c in new_contractors if c.nip_normalized not in taken]
+        Contractor.objects.bulk_create(new_contractors, batch_size=batch_size)
+    pool = list(company_contractors.filter(notatki=SEED_MARKER).only('id', 'nazwa', 'nip', 'ulica', 'kod_pocztowy', 'miasto'))
+
+    buyer = {
+        'nazwa': company.nazwa or 'Fakturex Sp. z o.o.',
+        'nip': company.nip or '5250001009',
+    }
+    start = Invoice.objects.for_company(company).filter(numer__startswith=NUMBER_PREFIX).count()
+
+    created = 0
+    generated = generate_invoices(
+        invoices, pool, rng, years=years, ksef_ratio=ksef_ratio, company=buyer, start=start, company_id=company.pk,
+    )
+    for batch in _batches(generated, batch_size):
+        with transaction.atomic():
+            if use_copy:
+                _copy_invoices(batch)
+            else:
+                Invoice.objects.bulk_create(batch)
+        created += len(batch)
+        if progress:
+            progress(created, time.perf_counter() - started)
+
+    if created or new_contractors:
+        # bulk_create i COPY omijają sygnały post_save
+        bump_analytics_version()
+
+    elapsed = time.perf_counter() - started
+    return {
+        'invoices': created,
+        'contractors': len(new_contractors),
+        'method': 'copy' if use_copy else 'bulk_create',
+        'seconds': round(elapsed, 2),
+        'rows_per_sec': round(created / elapsed) if elapsed else 0,
+    }
+
+
+def clear_seeded():
+    """
+    Usuń wygenerowane dane (jedno DELETE na tabelę, bez ładowania obiektów).
+    Surowe DELETE omija sygnały, więc ślady usunięć dla feedu zmian
+    (ChangeTombstone) zapisujemy tym samym INSERT ... SELECT.
+    """
+    from .analytics import bump_analytics_version
+
+    invoice_table = Invoice._meta.db_table
+    contractor_table = Contractor._meta.db_table
+    tombstone_table = ChangeTombstone._meta.db_table
+    kontrahent_column = Invoice._meta.get_field('kontrahent').column
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {tombstone_table} (company_id, model, object_id, deleted_at) "
+            f"SELECT company_id, 'invoice', id, %s FROM {invoice_table} WHERE numer LIKE %s",
+            [now, NUMBER_PREFIX + '%'],
+        )
+        cursor.execute(
+            f'DELETE FROM {invoice_table} WHERE numer LIKE %s',
+            [NUMBER_PREFIX + '%'],
+        )
+        invoices = cursor.rowcount
+        # Faktury spoza danych testowych powiązane z usuwanymi kontrahentami - SET NULL jak w modelu
+        cursor.execute(
+            f'UPDATE {invoice_table} SET {kontrahent_column} = NULL, updated_at = %s '
+            f'WHERE {kontrahent_column} IN (SELECT id FROM {contractor_table} WHERE notatki = %s)',
+            [now, SEED_MARKER],
+        )
+        cursor.execute(
+            f"INSERT INTO {tombstone_table} (company_id, model, object_id, deleted_at) "
+            f"SELECT company_id, 'contractor', id, %s FROM {contractor_table} WHERE notatki = %s",
+            [now, SEED_MARKER],
+        )
+        cursor.execute(f'DELETE FROM {contractor_table} WHERE notatki = %s', [SEED_MARKER])
+        contractors = cursor.rowcount
+    bump_analytics_version()
+    return {'invoices': invoices, 'contractors': contractors}
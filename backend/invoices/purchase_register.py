@@ -0,0 +1,211 @@
+"""
+Wyciąg z ewidencji zakupu VAT generowany z danych KSeF.
+
+To nie jest plik JPK_V7M do wysyłki: aplikacja zna tylko faktury kosztowe,
+więc nie ma deklaracji ani ewidencji sprzedaży. Wiersze mają układ części
+zakupowej JPK_V7M (ZakupWiersz, ZakupCtrl), żeby księgowość mogła je przenieść
+do programu składającego JPK.
+
+Faktury miesiąca czytane są kursorem (.iterator()), a XML zapisywany
+przyrostowo przez XMLGenerator - w pamięci jest tylko bieżący wiersz,
+więc plik dla 100k+ dokumentów można wysłać jako StreamingHttpResponse.
+
+Wszystkie zakupy trafiają do K_42/K_43 (nabycie towarów i usług pozostałych); środki trwałe (K_40/K_41)
+trzeba poprawić ręcznie.
+
+Walidacja kwot: netto + VAT z KSeF (sumy P_13_x / P_14_x) musi zgadzać się
+z kwotą brutto faktury. Faktury bez rozbicia netto/VAT lub w obcej walucie
+są pomijane i zgłaszane - w raporcie validate_purchase_register() i w komentarzu
+na końcu pliku.
+"""
+import calendar
+import io
+import json
+from datetime import date
+from decimal import Decimal, InvalidOperation
+from xml.sax.saxutils import XMLGenerator
+
+from django.utils import timezone
+
+from .models import Invoice
+
+# Dopuszczalna różnica netto + VAT względem brutto (zaokrąglenia pozycji)
+TOTALS_TOLERANCE = Decimal('0.02')
+# Ile problemów wypisać w komentarzu na końcu pliku
+MAX_LISTED_ISSUES = 100
+
+
+def month_range(year, month):
+    return date(year, month, 1), date(year, month, calendar.monthrange(year, month)[1])
+
+
+def month_invoices(year, month, company_id):
+    """Faktury zakupu firmy z miesiąca (po dacie wystawienia), czytane kursorem."""
+    date_from, date_to = month_range(year, month)
+    return (
+        Invoice.objects
+        .filter(company_id=company_id, data__gte=date_from, data__lte=date_to)
+        .select_related('kontrahent')
+        .only('id', 'numer', 'data', 'kwota', 'dostawca', 'ksef_numer', 'ksef_xml', 'kontrahent__nip')
+        .order_by('data', 'id')
+        .iterator(chunk_size=2000)
+    )
+
+
+def _decimal(value):
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value)).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        return None
+
+
+def purchase_row(invoice):
+    """
+    Zamień fakturę na wiersz ewidencji zakupu.
+    Zwraca (wiersz, problem) - dokładnie jedno z nich jest None.
+    """
+    try:
+        ksef_data = json.loads(invoice.ksef_xml) if invoice.ksef_xml else {}
+    except (ValueError, TypeError):
+        ksef_data = {}
+
+    label = f'{invoice.numer} ({invoice.dostawca})'
+    waluta = ksef_data.get('waluta') or 'PLN'
+    if waluta != 'PLN':
+        return None, f'{label}: waluta {waluta} - kwoty w JPK muszą być w PLN'
+
+    netto = _decimal(ksef_data.get('kwota_netto'))
+    vat = _decimal(ksef_data.get('kwota_vat'))
+    if netto is None or vat is None:
+        return None, f'{label}: brak rozbicia netto/VAT (odśwież dane KSeF)'
+
+    if abs(netto + vat - invoice.kwota) > TOTALS_TOLERANCE:
+        return None, f'{label}: netto {netto} + VAT {vat} != brutto {invoice.kwota}'
+
+    nip = ksef_data.get('dostawca_nip') or (invoice.kontrahent.nip if invoice.kontrahent else '')
+    return {
+        'nip': nip or 'brak',
+        'nazwa': invoice.dostawca,
+        'dowod': invoice.numer,
+        'data': invoice.data,
+        'netto': netto,
+        'vat': vat,
+    }, None
+
+
+class _Chunks(io.StringIO):
+    """Bufor XMLGenerator opróżniany po każdym wierszu."""
+
+    def take(self):
+        value = self.getvalue()
+        self.seek(0)
+        self.truncate(0)
+        return value.encode('utf-8')
+
+
+def _element(xml, name, value):
+    xml.startElement(name, {})
+    xml.characters(str(value))
+    xml.endElement(name)
+
+
+def generate_purchase_register(year, month, company, invoices=None):
+    """
+    Generator kolejnych fragmentów (bytes) wyciągu z ewidencji zakupu.
+
+    company - słownik z kluczami id, nip, nazwa.
+    invoices - opcjonalny iterowalny zbiór faktur (domyślnie month_invoices() firmy company['id']).
+    """
+    out = _Chunks()
+    xml = XMLGenerator(out, encoding='utf-8', short_empty_elements=True)
+
+    xml.startDocument()
+    out.write('<!-- Wyciąg z ewidencji zakupu (wiersze w układzie JPK_V7M), nie plik JPK do wysyłki -->\n')
+    xml.startElement('EwidencjaZakupu', {})
+
+    xml.startElement('Naglowek', {})
+    _element(xml, 'DataWytworzenia', timezone.now().replace(microsecond=0).isoformat())
+    _element(xml, 'NazwaSystemu', 'Fakturex')
+    _element(xml, 'Rok', year)
+    _element(xml, 'Miesiac', month)
+    xml.endElement('Naglowek')
+
+    xml.startElement('Podmiot1', {})
+    _element(xml, 'NIP', company.get('nip', ''))
+    _element(xml, 'PelnaNazwa', company.get('nazwa', ''))
+    xml.endElement('Podmiot1')
+    yield out.take()
+
+    count = 0
+    total_vat = Decimal('0.00')
+    issues = []
+    issues_count = 0
+    for invoice in (month_invoices(year, month, company['id']) if invoices is None else invoices):
+        row, issue = purchase_row(invoice)
+        if issue:
+            issues_count += 1
+            if len(issues) < MAX_LISTED_ISSUES:
+                issues.append(issue)
+            continue
+
+        count += 1
+        total_vat += row['vat']
+        xml.startElement('ZakupWiersz', {})
+        _element(xml, 'LpZakupu', count)
+        _element(xml, 'KodKrajuNadaniaTIN', 'PL')
+        _element(xml, 'NrDostawcy', row['nip'])
+        _element(xml, 'NazwaDostawcy', row['nazwa'])
+        _element(xml, 'DowodZakupu', row['dowod'])
+        _element(xml, 'DataZakupu', row['data'].isoformat())
+        _element(xml, 'K_42', row['netto'])
+        _element(xml, 'K_43', row['vat'])
+        xml.endElement('ZakupWiersz')
+        yield out.take()
+
+    # Sumy kontrolne liczone w trakcie zapisu - zgodne z wierszami z definicji
+    xml.startElement('ZakupCtrl', {})
+    _element(xml, 'LiczbaWierszyZakupow', count)
+    _element(xml, 'PodatekNaliczony', total_vat)
+    xml.endElement('ZakupCtrl')
+
+    xml.endElement('EwidencjaZakupu')
+    xml.endDocument()
+
+    if issues_count:
+        # '--' jest niedozwolone w komentarzu XML
+        listed = '\n'.join(f'  {issue}'.replace('--', '- -') for issue in issues)
+        more = f'\n  ... i {issues_count - len(issues)} więcej' if issues_count > len(issues) else ''
+        out.write(f'\n<!-- Fakturex: pominięto {issues_count} faktur:\n{listed}{more}\n-->')
+    out.write('\n')
+    yield out.take()
+
+
+def validate_purchase_register(year, month, company_id, invoices=None):
+    """Sprawdź faktury miesiąca firmy bez generowania pliku - sumy i lista problemów."""
+    count = 0
+    total_netto = Decimal('0.00')
+    total_vat = Decimal('0.00')
+    issues = []
+    issues_count = 0
+    for invoice in (month_invoices(year, month, company_id) if invoices is None else invoices):
+        row, issue = purchase_row(invoice)
+        if issue:
+            issues_count += 1
+            if len(issues) < MAX_LISTED_ISSUES:
+                issues.append(issue)
+            continue
+        count += 1
+        total_netto += row['netto']
+        total_vat += row['vat']
+
+    return {
+        'rok': year,
+        'miesiac': month,
+        'liczba_wierszy': count,
+        'suma_netto': str(total_netto),
+        'podatek_naliczony': str(total_vat),
+        'pominiete': issues_count,
+        'problemy': issues,
+    }
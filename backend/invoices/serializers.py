@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Invoice
+from .models import Invoice, KSeFSyncRun
+from .fingerprint import invoice_fingerprint, known_fingerprints, matching_ids, supplier_key
 
 
 class InvoiceSerializer(serializers.ModelSerializer):
@@ -9,12 +10,67 @@ class InvoiceSerializer(serializers.ModelSerializer):
     is_overdue = serializers.BooleanField(read_only=True)
     days_until_due = serializers.IntegerField(read_only=True)
     kontrahent_nazwa = serializers.CharField(source='kontrahent.nazwa', read_only=True, allow_null=True)
+    # Pozwala świadomie zapisać fakturę mimo wykrytego duplikatu
+    allow_duplicate = serializers.BooleanField(write_only=True, required=False, default=False)
     
     class Meta:
         model = Invoice
         fields = [
             'id', 'numer', 'data', 'kwota', 'dostawca', 'termin_platnosci', 
             'status', 'kontrahent', 'kontrahent_nazwa', 'ksef_numer', 'notatki',
-            'is_overdue', 'days_until_due', 'created_at', 'updated_at'
+            'is_overdue', 'days_until_due', 'created_at', 'updated_at', 'allow_duplicate'
         ]
-        read_only_fields = ['created_at', 'updated_at']
\ No newline at end of file
+        read_only_fields = ['created_at', 'updated_at']
+
+    def validate_kontrahent(self, value):
+        company = self.context.get('company')
+        if value is not None and company is not None and value.company_id != company.pk:
+            raise serializers.ValidationError('Kontrahent należy do innej firmy.')
+        return value
+
+    def validate(self, attrs):
+        allow_duplicate = attrs.pop('allow_duplicate', False)
+        if allow_duplicate:
+            return attrs
+
+        def current(field):
+            if field in attrs:
+                return attrs[field]
+            return getattr(self.instance, field, None)
+
+        kontrahent = current('kontrahent')
+        fingerprint = invoice_fingerprint(current('numer'), current('kwota'), current('data'))
+        supplier = supplier_key(kontrahent.nip if kontrahent else None, current('dostawca'))
+        if (
+            self.instance is not None and fingerprint == self.instance.fingerprint
+            and supplier == self.instance.supplier_key()
+        ):
+            # Zmiana pól spoza odcisku i dostawcy (np. status) - nie sprawdzamy ponownie
+            return attrs
+        duplicates = Invoice.objects.all()
+        # Duplikaty tylko w obrębie firmy
+        company = self.context.get('company')
+        if company is not None:
+            duplicates = duplicates.for_company(company)
+        elif self.instance is not None:
+            duplicates = duplicates.filter(company_id=self.instance.company_id)
+        if self.instance is not None:
+            duplicates = duplicates.exclude(pk=self.instance.pk)
+        candidates = known_fingerprints(duplicates, [fingerprint]).get(fingerprint, [])
+        duplicate_ids = matching_ids(candidates, supplier)[:10]
+        if duplicate_ids:
+            raise serializers.ValidationError({
+                'duplicate': 'Taka faktura już istnieje (ten sam dostawca, numer, kwota i data). '
+                             'Wyślij allow_duplicate=true, aby mimo to ją zapisać.',
+                'duplicate_of': duplicate_ids,
+            })
+        return attrs
+
+
+class KSeFSyncRunSerializer(serializers.ModelSerializer):
+    """
+    Przebieg synchronizacji KSeF (tylko odczyt).
+    """
+    class Meta:
+        model = KSeFSyncRun
+        fields = '__all__'
@@ -0,0 +1,36 @@
+"""
+Sygnały modułu faktur.
+"""
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from customers.models import Contractor
+from .models import ChangeTombstone, Invoice
+from .analytics import bump_analytics_version
+
+
+@receiver(post_save, sender=Invoice)
+@receiver(post_delete, sender=Invoice)
+@receiver(post_save, sender=Contractor)
+@receiver(post_delete, sender=Contractor)
+def invalidate_analytics_cache(sender, **kwargs):
+    """Każda zmiana faktury lub kontrahenta unieważnia cache analityk."""
+    bump_analytics_version()
+
+
+@receiver(post_delete, sender=Invoice)
+@receiver(post_delete, sender=Contractor)
+def record_tombstone(sender, instance, **kwargs):
+    """Ślad usunięcia dla feedu zmian (invoices/changes.py)."""
+    model = 'invoice' if sender is Invoice else 'contractor'
+    ChangeTombstone.objects.create(model=model, object_id=instance.pk, company_id=instance.company_id)
+
+
+@receiver(pre_delete, sender=Contractor)
+def touch_contractor_invoices(sender, instance, **kwargs):
+    """
+    SET_NULL na fakturach usuwanego kontrahenta to UPDATE bez updated_at -
+    podbijamy go tutaj, żeby feed zmian wysłał faktury bez kontrahenta.
+    """
+    Invoice.objects.filter(kontrahent=instance).update(updated_at=timezone.now())
@@ -0,0 +1,220 @@
+"""
+Pomiar faz synchronizacji z KSeF.
+
+KSeFService dostaje recorder w konstruktorze i opakowuje każdy etap
+w recorder.phase(nazwa). Po zakończeniu finish() zapisuje jeden wiersz
+KSeFSyncRun (jedno INSERT - nic nie jest zapisywane w trakcie pobierania).
+
+    recorder = SyncRecorder('fetch', environment='test', company=company)
+    service = KSeFService(token, nip, environment, recorder=recorder)
+    ...
+    recorder.finish(success, message)
+
+albo jako menedżer kontekstu (wyjątek zapisuje przebieg jako błąd):
+
+    with SyncRecorder('import') as recorder:
+        with recorder.phase('db_write'):
+            ...
+
+Szczyt pamięci mierzy tracemalloc, gdy KSEF_TRACE_MEMORY=true (domyślnie
+wyłączone - śledzenie spowalnia cały proces). tracemalloc ma jeden szczyt
+na proces, więc przebieg, który w tym samym procesie nakładał się z innym
+(np. wątki harmonogramu, KSEF_SYNC_WORKERS), nie ma zapisanego szczytu -
+zamiast wartości obejmującej obie synchronizacje.
+"""
+import logging
+import math
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+_tracing_lock = threading.Lock()
+# Recordery, które teraz śledzą pamięć, i te, które nakładały się z innym
+_tracing = set()
+_overlapped = set()
+_owns_tracing = False
+
+
+def _start_tracing(recorder):
+    """Włącz tracemalloc (nie wyłączamy cudzego śledzenia)."""
+    global _owns_tracing
+    with _tracing_lock:
+        if _tracing:
+            # Szczytu nie zerujemy pod trwającym pomiarem - oba przebiegi są bez wyniku
+            _overlapped.update(_tracing)
+            _overlapped.add(recorder)
+        else:
+            _owns_tracing = not tracemalloc.is_tracing()
+            if _owns_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        _tracing.add(recorder)
+
+
+def _stop_tracing(recorder):
+    """Wyłącz śledzenie (gdy to ostatni); zwraca szczyt w bajtach albo None po nakładaniu się."""
+    with _tracing_lock:
+        peak = tracemalloc.get_traced_memory()[1]
+        _tracing.discard(recorder)
+        if recorder in _overlapped:
+            _overlapped.discard(recorder)
+            peak = None
+        if not _tracing and _owns_tracing:
+            tracemalloc.stop()
+        return peak
+
+
+class NullRecorder:
+    """Recorder, który niczego nie mierzy - domyślny dla KSeFService."""
+
+    @contextmanager
+    def phase(self, name, **extra):
+        yield extra
+
+    def add_bytes(self, count):
+        pass
+
+    def add_parsed(self, count):
+        pass
+
+    def add_saved(self, count):
+        pass
+
+
+class SyncRecorder(NullRecorder):
+
+    def __init__(self, trigger, environment='', date_from=None, date_to=None, trace_memory=None, company=None):
+        self.trigger = trigger
+        self.company = company
+        self.environment = environment or ''
+        self.date_from = date_from
+        self.date_to = date_to
+        self.phases = []
+        self.bytes_downloaded = 0
+        self.invoices_parsed = 0
+        self.invoices_saved = 0
+        self.started_at = timezone.now()
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+        self.run = None
+
+        if trace_memory is None:
+            trace_memory = getattr(settings, 'KSEF_TRACE_MEMORY', False)
+        self._tracing = bool(trace_memory)
+        if self._tracing:
+            _start_tracing(self)
+
+    @contextmanager
+    def phase(self, name, **extra):
+        """
+        Zmierz etap. Słownik extra jest zwracany, więc etap może dopisać
+        szczegóły (np. status odpytania). Wyjątek oznacza etap jako błędny.
+        """
+        started = time.perf_counter()
+        try:
+            yield extra
+        except Exception as e:
+            extra['error'] = str(e)[:200]
+            raise
+        finally:
+            entry = {'name': name, 'ms': round((time.perf_counter() - started) * 1000, 1), **extra}
+            with self._lock:
+                self.phases.append(entry)
+
+    def add_bytes(self, count):
+        with self._lock:
+            self.bytes_downloaded += count
+
+    def add_parsed(self, count):
+        with self._lock:
+            self.invoices_parsed += count
+
+    def add_saved(self, count):
+        with self._lock:
+            self.invoices_saved += count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        # Przebieg nie zakończony jawnie przez finish() - zapisz wynik z wyjątku
+        if self.run is None:
+            self.finish(exc is None, str(exc) if exc else '')
+        return False
+
+    def finish(self, success, message=''):
+        """Zapisz przebieg. Wołać raz, w kontekście sync (zapis do bazy)."""
+        from .models import KSeFSyncRun
+
+        if self.run is not None:
+            return self.run
+
+        peak = _stop_tracing(self) if self._tracing else None
+        self._tracing = False
+        try:
+            self.run = KSeFSyncRun.objects.create(
+                trigger=self.trigger,
+                company=self.company,
+                environment=self.environment,
+                date_from=self.date_from,
+                date_to=self.date_to,
+                started_at=self.started_at,
+                duration_ms=round((time.perf_counter() - self._started) * 1000),
+                phases=self.phases,
+                bytes_downloaded=self.bytes_downloaded,
+                invoices_parsed=self.invoices_parsed,
+                invoices_saved=self.invoices_saved,
+                peak_memory_bytes=peak,
+                outcome='success' if success else 'error',
+                message=(message or '')[:2000],
+            )
+        except Exception:
+            # Historia nie może zepsuć synchronizacji
+            logger.exception('Saving KSeF sync run failed')
+        return self.run
+
+
+def percentile(values, fraction):
+    """Percentyl metodą najbliższej rangi (values posortowane rosnąco)."""
+    if not values:
+        return None
+    index = min(len(values), max(1, math.ceil(fraction * len(values)))) - 1
+    return values[index]
+
+
+def summarize_runs(runs):
+    """Percentyle czasu całkowitego i każdej fazy (fazy powtarzane, np. poll, sumowane w przebiegu)."""
+    def stats(values):
+        values = sorted(values)
+        return {
+            'count': len(values),
+            'p50': percentile(values, 0.5),
+            'p90': percentile(values, 0.9),
+            'p99': percentile(values, 0.99),
+            'max': values[-1] if values else None,
+        }
+
+    phase_totals = {}
+    outcomes = {}
+    for run in runs:
+        outcomes[run.outcome] = outcomes.get(run.outcome, 0) + 1
+        per_run = {}
+        for entry in run.phases or []:
+            per_run[entry['name']] = per_run.get(entry['name'], 0) + entry.get('ms', 0)
+        for name, ms in per_run.items():
+            phase_totals.setdefault(name, []).append(round(ms, 1))
+
+    return {
+        'runs': len(runs),
+        'outcomes': outcomes,
+        'duration_ms': stats([run.duration_ms for run in runs]),
+        'phases_ms': {name: stats(values) for name, values in phase_totals.items()},
+        'bytes_downloaded': stats([run.bytes_downloaded for run in runs]),
+        'peak_memory_bytes': stats([run.peak_memory_bytes for run in runs if run.peak_memory_bytes is not None]),
+    }
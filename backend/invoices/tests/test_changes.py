@@ -0,0 +1,120 @@
+"""
+Feed zmian /api/changes/ (lokalny cache SPA).
+
+Klient nakładający strony feedu na lokalny cache dochodzi do stanu bazy -
+także po usunięciach i SET_NULL na fakturach usuniętego kontrahenta -
+a pełna synchronizacja daje ten sam stan. Kursor nieprawidłowy kończy się
+400, a starszy niż ślady usunięć zwraca pełny stan od nowa.
+"""
+from datetime import timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from customers.models import Contractor
+from invoices.changes import to_micros
+from invoices.models import Invoice
+
+
+class Cache:
+    """Lokalny cache jak w SPA: upsert zmienionych, usunięcie z deleted."""
+
+    def __init__(self):
+        self.cursor = None
+        self.invoices = {}
+        self.contractors = {}
+
+    def sync(self, client, limit=None):
+        pages = 0
+        while True:
+            params = {'since': self.cursor} if self.cursor else {}
+            if limit:
+                params['limit'] = limit
+            response = client.get('/api/changes/', params)
+            assert response.status_code == 200, response.content[:500]
+            page = response.json()
+            pages += 1
+            if page['reset']:
+                self.invoices, self.contractors = {}, {}
+            self.invoices.update((row['id'], row) for row in page['invoices'])
+            self.contractors.update((row['id'], row) for row in page['contractors'])
+            for pk in page['deleted']['invoices']:
+                self.invoices.pop(pk, None)
+            for pk in page['deleted']['contractors']:
+                self.contractors.pop(pk, None)
+            self.cursor = page['cursor']
+            if not page['has_more']:
+                return pages
+
+
+def _assert_matches_db(cache, company):
+    invoices = dict(Invoice.objects.for_company(company).values_list('id', 'updated_at'))
+    assert set(cache.invoices) == set(invoices)
+    assert set(cache.contractors) == set(Contractor.objects.for_company(company).values_list('id', flat=True))
+    for pk, row in cache.invoices.items():
+        assert row['updated_at'] == invoices[pk].isoformat().replace('+00:00', 'Z'), pk
+
+
+@pytest.fixture
+def contractor(company, contractor_data, make_invoice):
+    contractor = Contractor.objects.create(company=company, **contractor_data())
+    for _ in range(3):
+        make_invoice(kontrahent=contractor)
+    for _ in range(5):
+        make_invoice()
+    return contractor
+
+
+@pytest.fixture
+def synced(api_client, company, contractor):
+    # Dane powstały przed chwilą - inaczej każda synchronizacja
+    # w oknie CHANGES_FEED_OVERLAP_SECONDS zwracałaby je wszystkie
+    day_ago = timezone.now() - timedelta(days=1)
+    Invoice.objects.for_company(company).update(updated_at=day_ago)
+    Contractor.objects.for_company(company).update(updated_at=day_ago)
+    cache = Cache()
+    cache.sync(api_client)
+    return cache
+
+
+def test_changes_feed_converges(api_client, company, contractor, synced, contractor_data, make_invoice):
+    linked = list(Invoice.objects.filter(kontrahent=contractor).values_list('id', flat=True))
+    others = Invoice.objects.for_company(company).exclude(kontrahent=contractor)
+    deleted_invoice = others.order_by('id').first()
+
+    make_invoice()
+    assert api_client.post('/api/contractors/', contractor_data(), format='json').status_code == 201
+    updated = others.order_by('-id').first()
+    api_client.post(f'/api/invoices/{updated.pk}/mark_paid/')
+    assert api_client.delete(f'/api/invoices/{deleted_invoice.pk}/').status_code == 204
+    # SET_NULL na fakturach kontrahenta też musi trafić do feedu
+    assert api_client.delete(f'/api/contractors/{contractor.pk}/').status_code == 204
+
+    with CaptureQueriesContext(connection) as ctx:
+        pages = synced.sync(api_client, limit=2)
+    assert pages > 1
+    assert len(ctx.captured_queries) <= pages * 4
+    _assert_matches_db(synced, company)
+    assert all(synced.invoices[pk]['kontrahent'] is None for pk in linked)
+
+    # Pełna synchronizacja stronami daje ten sam stan
+    fresh = Cache()
+    fresh.sync(api_client, limit=3)
+    assert fresh.invoices == synced.invoices
+    assert fresh.contractors == synced.contractors
+
+
+def test_changes_cursor_edge_cases(api_client, synced, settings):
+    assert api_client.get('/api/changes/', {'since': 'abc'}).status_code == 400
+    assert api_client.get('/api/changes/', {'since': synced.cursor, 'limit': 0}).status_code == 400
+
+    # Kursor starszy niż ślady usunięć - pełny stan od nowa
+    stale = timezone.now() - timedelta(days=settings.CHANGES_TOMBSTONE_RETENTION_DAYS + 1)
+    page = api_client.get('/api/changes/', {'since': str(to_micros(stale)), 'limit': 1}).json()
+    assert page['reset'] and page['has_more']
+
+    page = api_client.get('/api/changes/', {'since': synced.cursor}).json()
+    assert not page['reset']
+    assert int(page['cursor']) >= int(synced.cursor)
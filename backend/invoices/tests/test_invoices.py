@@ -0,0 +1,105 @@
+"""
+Faktury: terminy płatności po zmianie statusu, wykrywanie duplikatów przy
+imporcie CSV, z KSeF i przy ręcznym wpisie oraz parametr limit widoków
+dashboardu.
+"""
+from datetime import date, timedelta
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from invoices.models import Invoice
+
+
+def test_mark_paid_returns_fresh_due_info(api_client, make_invoice):
+    overdue = make_invoice(termin_platnosci=date.today() - timedelta(days=5))
+
+    data = api_client.post(f'/api/invoices/{overdue.pk}/mark_paid/').json()
+    assert (data['status'], data['is_overdue'], data['days_until_due']) == ('zaplacona', False, -5)
+    data = api_client.post(f'/api/invoices/{overdue.pk}/mark_unpaid/').json()
+    assert (data['status'], data['is_overdue']) == ('niezaplacona', True)
+    data = api_client.patch(f'/api/invoices/{overdue.pk}/', {
+        'termin_platnosci': (date.today() + timedelta(days=3)).isoformat(),
+    }, format='json').json()
+    assert (data['is_overdue'], data['days_until_due']) == (False, 3)
+
+
+def test_import_csv_skips_duplicates(api_client, make_invoice, unique_number):
+    batch = unique_number('CSVDUP')
+    today = date.today().isoformat()
+    manual = make_invoice(numer=f'FV {batch}', dostawca='Hurtownia CSV Sp. z o.o.')
+    lines = [
+        'numer;data;kwota;dostawca;dostawca_nip',
+        # Ręczna faktura innym zapisem numeru i nazwy - duplikat po odcisku
+        f'FV/{batch};{today};1230,00;HURTOWNIA CSV sp. z o.o.;',
+        f'{batch}/1;{today};100.00;Dostawca CSV;',
+        # Powtórzony wiersz paczki i ten sam numer od tego dostawcy z inną kwotą
+        f'{batch}/1;{today};100.00;Dostawca CSV;',
+        f'{batch}/1;{today};200.00;dostawca csv;',
+    ]
+    upload = SimpleUploadedFile('faktury.csv', '\n'.join(lines).encode('utf-8'), content_type='text/csv')
+    result = api_client.post('/api/invoices/import_csv/', {'file': upload}, format='multipart').json()
+    assert (result['imported'], result['skipped_existing'], result['duplicate_count']) == (1, 1, 2)
+    assert result['duplicates'][0] == {
+        'numer': f'FV/{batch}', 'dostawca': 'HURTOWNIA CSV sp. z o.o.', 'duplicate_of': [manual.pk],
+    }
+    assert Invoice.objects.filter(numer__startswith=f'{batch}/').count() == 1
+
+    # Świadomy duplikat z allow_duplicate nadal da się zapisać
+    response = api_client.post('/api/invoices/', {
+        'numer': f'{batch}/1', 'data': today, 'kwota': '100.00', 'dostawca': 'Dostawca CSV',
+        'termin_platnosci': today, 'allow_duplicate': True,
+    }, format='json')
+    assert response.status_code == 201, response.content
+
+
+def test_manual_invoice_then_ksef_is_duplicate(api_client, unique_number):
+    batch = unique_number('DUP')
+    today = date.today()
+    # Ręcznie: sama nazwa dostawcy, bez kontrahenta i NIP
+    response = api_client.post('/api/invoices/', {
+        'numer': f'FV {batch}', 'data': today.isoformat(), 'kwota': '1230.00',
+        'dostawca': 'Hurtownia Duplikat Sp. z o.o.', 'termin_platnosci': (today + timedelta(days=14)).isoformat(),
+        'status': 'niezaplacona',
+    }, format='json')
+    assert response.status_code == 201, response.content
+    manual_id = response.json()['id']
+
+    def ksef(suffix, dostawca, nip):
+        return {
+            'numer': f'FV/{batch}', 'data': today.isoformat(), 'kwota': '1230.00',
+            'dostawca': dostawca, 'dostawca_nip': nip,
+            'termin_platnosci': (today + timedelta(days=14)).isoformat(),
+            'ksef_numer': f'{batch}-{suffix}',
+        }
+
+    # Z KSeF: inny zapis numeru i nazwy, z NIP - kontrahent tworzony przy imporcie;
+    # ten sam numer, kwota i data od innego dostawcy to nie duplikat
+    result = api_client.post('/api/invoices/import_ksef_invoices/', {'invoices': [
+        ksef(1, 'HURTOWNIA DUPLIKAT sp. z o.o.', 'PL 525-000-77-01'),
+        ksef(2, 'Inny Dostawca S.A.', '5250007702'),
+    ]}, format='json').json()
+    assert result['imported_count'] == 1
+    assert result['duplicates'] == [{'ksef_numer': f'{batch}-1', 'numer': f'FV/{batch}', 'duplicate_of': [manual_id]}]
+
+    # Odwrotnie: ręczna faktura z kontrahentem (NIP) po imporcie z KSeF
+    imported = Invoice.objects.get(ksef_numer=f'{batch}-2')
+    response = api_client.post('/api/invoices/', {
+        'numer': f'fv-{batch}', 'data': today.isoformat(), 'kwota': '1230', 'dostawca': 'Inny Dostawca',
+        'kontrahent': imported.kontrahent_id, 'termin_platnosci': today.isoformat(), 'status': 'niezaplacona',
+    }, format='json')
+    assert response.status_code == 400
+    assert response.json()['duplicate_of'] == [str(imported.pk)]
+
+
+def test_recent_unpaid_limit(api_client, make_invoice):
+    for _ in range(101):
+        make_invoice()
+
+    assert len(api_client.get('/api/invoices/recent_unpaid/').json()) == 5
+    assert len(api_client.get('/api/invoices/recent_unpaid/', {'limit': 2}).json()) == 2
+    # Poza zakresem 1-100 - przycięte
+    assert len(api_client.get('/api/invoices/recent_unpaid/', {'limit': -3}).json()) == 1
+    assert len(api_client.get('/api/invoices/recent_unpaid/', {'limit': 10 ** 6}).json()) == 100
+    assert api_client.get('/api/invoices/recent_unpaid/', {'limit': 'abc'}).status_code == 400
+    assert len(api_client.get('/api/dashboard/', {'limit': 3}).json()['recent_unpaid']) == 3
+    assert api_client.get('/api/dashboard/', {'limit': 'abc'}).status_code == 400
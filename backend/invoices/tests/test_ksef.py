@@ -0,0 +1,203 @@
+"""
+Pobieranie z KSeF na lokalnym symulatorze (invoices.ksef_simulator).
+
+Oba backendy XML (ElementTree i lxml) dają identyczne wyniki, parsowanie
+wraca do bieżącego procesu po zabiciu puli, a potok publikuje zdarzenia
+postępu (strumień SSE ksef_progress dostępny tylko właścicielowi pobierania
+przez jednorazowy token) i da się go anulować. Szczyt pamięci w historii
+synchronizacji mierzony jest tylko na życzenie i bez nakładających się przebiegów.
+"""
+import time
+import tracemalloc
+import zipfile
+from datetime import date, timedelta
+
+import pytest
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from customers.models import Company
+from invoices.ksef_parser import _get_pool, parse_invoice_xml, parse_package, shutdown_pool
+from invoices.ksef_progress import CANCELLED_MESSAGE, ProgressChannel, read_events, request_cancel
+from invoices.ksef_service import fetch_invoices_from_ksef
+from invoices.ksef_simulator import KSeFSimulator, use_simulator, write_package
+from invoices.sync_recorder import SyncRecorder
+
+INVOICES = 50
+PACKAGE_INVOICES = 300
+NIP = '5250001009'
+DATE_TO = date.today()
+DATE_FROM = DATE_TO - timedelta(days=30)
+
+# Dokument bez przestrzeni nazw i z fragmentami, które lxml domyślnie traktuje inaczej niż ElementTree
+PLAIN_XML = '''<?xml version="1.0" encoding="UTF-8"?>
+<?xml-stylesheet href="fa.xsl"?>
+<Faktura>
+  <!-- komentarz -->
+  <Podmiot1><DaneIdentyfikacyjne><NIP>1234563218</NIP><Nazwa>Dostawca &amp; S-ka</Nazwa></DaneIdentyfikacyjne></Podmiot1>
+  <Fa><P_1>2026-01-15</P_1><P_2>FV/1/2026</P_2><P_15>123.00</P_15><P_13_1>100.00</P_13_1><P_14_1>23.00</P_14_1>
+    <FaWiersz><P_7>Usługa <![CDATA[<IT>]]></P_7><P_8B>1</P_8B><P_9A>100.00</P_9A><P_11>100.00</P_11><P_12>23</P_12></FaWiersz>
+  </Fa>
+</Faktura>'''
+
+
+@pytest.fixture(scope='module')
+def simulator():
+    with KSeFSimulator(invoices=INVOICES, lines=(1, 5), export_delay=0) as simulator:
+        yield simulator
+
+
+@pytest.fixture
+def ksef(simulator):
+    with use_simulator(simulator.url), override_settings(KSEF_EXPORT_POLL_SECONDS=0.01):
+        yield simulator
+
+
+@pytest.fixture(scope='module')
+def package(tmp_path_factory):
+    path = tmp_path_factory.mktemp('ksef') / 'paczka.zip'
+    write_package(path, PACKAGE_INVOICES, NIP, lines=(1, 5), date_from=DATE_FROM, date_to=DATE_TO)
+    yield path
+    shutdown_pool()
+
+
+@pytest.fixture
+def channel(company, user):
+    """channel(progress_id) - kanał postępu pobierania użytkownika user w firmie company."""
+    return lambda progress_id: ProgressChannel(progress_id, company.pk, user.pk)
+
+
+def _read(progress):
+    return read_events(progress.progress_id, progress.company_id, progress.user_id)
+
+
+def _stages(progress):
+    return [stage for _, stage, _ in _read(progress)]
+
+
+def _fetch(progress):
+    return fetch_invoices_from_ksef(
+        'sim-token', NIP, 'test', DATE_FROM.isoformat(), DATE_TO.isoformat(), progress=progress,
+    )
+
+
+def test_xml_backends_agree(package):
+    pytest.importorskip('lxml')
+    with zipfile.ZipFile(package) as archive:
+        documents = [(name, archive.read(name)) for name in archive.namelist() if name.endswith('.xml')]
+    documents += [('plain.xml', PLAIN_XML.encode('utf-8')), ('plain-str.xml', PLAIN_XML), ('broken.xml', b'<Faktura>')]
+
+    for name, content in documents:
+        assert parse_invoice_xml(content, name, 'lxml') == parse_invoice_xml(content, name, 'etree'), name
+    assert parse_package(package, backend='lxml') == parse_package(package, backend='etree')
+
+
+def test_parse_package_survives_killed_pool(package):
+    # Procesy robocze zabite między paczkami (jak przez OOM killera) - pula jest zepsuta
+    pool = _get_pool(2)
+    list(pool.map(abs, range(4)))
+    for process in list(pool._processes.values()):
+        process.kill()
+    for _ in range(200):
+        if pool._broken:
+            break
+        time.sleep(0.05)
+    assert pool._broken
+
+    details = {}
+    invoices = parse_package(package, workers=2, min_parallel=0, details=details)
+    assert len(invoices) == PACKAGE_INVOICES
+    assert details['workers'] == 1
+    assert invoices == parse_package(package, workers=1)
+
+
+def test_ksef_progress_events(ksef, channel):
+    progress = channel('test-progress-events')
+    invoices, message = _fetch(progress)
+    assert len(invoices) == INVOICES, message
+
+    stages = _stages(progress)
+    assert stages[:3] == ['authorized', 'export_scheduled', 'poll']
+    assert stages.index('downloaded') < stages.index('parsed')
+    last_parsed = [data for _, stage, data in _read(progress) if stage == 'parsed'][-1]
+    assert last_parsed['invoices'] == INVOICES
+    # Zdarzenia done / error / cancelled publikuje widok, nie potok
+    assert not set(stages) & {'done', 'error', 'cancelled'}
+
+
+def test_ksef_fetch_cancelled(ksef, channel):
+    progress = channel('test-progress-cancel')
+    request_cancel(progress.progress_id, progress.company_id, progress.user_id)
+
+    assert _fetch(progress) == ([], CANCELLED_MESSAGE)
+    assert progress.cancelled
+    assert 'export_scheduled' not in _stages(progress)
+
+
+def test_ksef_progress_stream(company, api_client, channel, member, jwt_client, settings):
+    progress = channel('test-progress-stream')
+    progress.publish('authorized')
+    progress.publish('poll', attempt=1, ready=False)
+    progress.publish('done', total=3)
+    first_id = _read(progress)[0][0]
+
+    url = f'/api/invoices/ksef_progress/{progress.progress_id}/'
+    anonymous = APIClient()
+    assert anonymous.get(url).status_code == 401
+    assert anonymous.post(f'{url}token/').status_code == 401
+    # JWT w adresie nie otwiera strumienia
+    jwt = api_client._credentials['HTTP_AUTHORIZATION'].split()[1]
+    assert anonymous.get(url, {'token': jwt}).status_code == 401
+
+    token = api_client.post(f'{url}token/').json()['token']
+    response = anonymous.get(url, {'stream_token': token})
+    assert response['Content-Type'].startswith('text/event-stream')
+    body = b''.join(response.streaming_content).decode()
+    assert body.startswith('retry: ')
+    assert [line for line in body.splitlines() if line.startswith('event: ')] == [
+        'event: authorized', 'event: poll', 'event: done',
+    ]
+    # Token działa raz i tylko dla swojego pobierania
+    assert anonymous.get(url, {'stream_token': token}).status_code == 401
+    token = api_client.post(f'{url}token/').json()['token']
+    assert anonymous.get('/api/invoices/ksef_progress/other-progress/', {'stream_token': token}).status_code == 401
+
+    # Wznowienie po zerwaniu - tylko zdarzenia po last_event_id
+    token = api_client.post(f'{url}token/').json()['token']
+    response = anonymous.get(url, {'stream_token': token, 'last_event_id': first_id})
+    body = b''.join(response.streaming_content).decode()
+    assert 'event: authorized' not in body and 'event: done' in body
+
+    assert api_client.post(f'{url}cancel/').status_code == 409
+
+    # Inny użytkownik tej samej firmy i inna firma nie widzą zdarzeń ani nie anulują
+    settings.KSEF_PROGRESS_STREAM_SECONDS = 0
+    other_company = Company.objects.create(nazwa='Firma Postępu')
+    other_user = member('progress-other', company)
+    other_user.memberships.create(company=other_company)
+    for target in (company, other_company):
+        client = jwt_client(other_user, target)
+        token = client.post(f'{url}token/').json()['token']
+        body = b''.join(anonymous.get(url, {'stream_token': token}).streaming_content).decode()
+        assert 'event: ' not in body
+        assert client.post(f'{url}cancel/').status_code == 200
+    assert 'cancel' not in _stages(progress)
+
+
+def test_sync_recorder_memory_peak(db):
+    # Domyślnie bez tracemalloc - śledzenie spowalnia cały proces
+    assert SyncRecorder('test').finish(True).peak_memory_bytes is None
+    assert not tracemalloc.is_tracing()
+
+    recorder = SyncRecorder('test', trace_memory=True)
+    buffer = bytearray(4 * 1024 * 1024)
+    run = recorder.finish(True)
+    del buffer
+    assert run.peak_memory_bytes >= 4 * 1024 * 1024
+
+    # Nakładające się przebiegi (wątki harmonogramu) nie dostają wspólnego szczytu
+    first, second = SyncRecorder('test', trace_memory=True), SyncRecorder('test', trace_memory=True)
+    assert second.finish(True).peak_memory_bytes is None
+    assert first.finish(True).peak_memory_bytes is None
+    assert SyncRecorder('test', trace_memory=True).finish(True).peak_memory_bytes is not None
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,91 @@
+"""
+Filtry okresu faktur (invoices/partitioning.py).
+
+Na każdej bazie filtr rok/miesiąc ma być zakresem dat, a nie
+EXTRACT(MONTH), którego planista nie umie przyciąć. Na PostgreSQL tabela
+partycjonowana po roku (konwersja wycofywana razem z transakcją testu)
+musi w planie zapytania o okres dotykać tylko partycji tego roku,
+a ensure_partitions przenosi wiersze z partycji domyślnej.
+"""
+import random
+import re
+from datetime import date, timedelta
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from customers.models import Contractor
+from invoices.models import Invoice
+from invoices.partitioning import (
+    convert_to_partitioned, default_partition_name, ensure_partitions, partition_name, partitions,
+)
+from invoices.perf_data import SEED_MARKER, generate_invoices, seed
+
+postgres_only = pytest.mark.skipif(
+    connection.vendor != 'postgresql', reason='Partycjonowanie tabeli faktur wymaga PostgreSQL'
+)
+
+
+@pytest.fixture
+def history(company):
+    """Faktury z ostatnich lat i starsza historia w tabeli partycjonowanej po roku."""
+    seed(company, invoices=300, years=1)
+    contractors = list(Contractor.objects.for_company(company).filter(notatki=SEED_MARKER))
+    Invoice.objects.bulk_create(generate_invoices(
+        600, contractors, random.Random(7), years=5, today=date(date.today().year - 1, 12, 31),
+        start=10_000_000, company_id=company.pk,
+    ))
+    convert_to_partitioned()
+    return company
+
+
+def _scanned_partitions(queryset):
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN {sql}', params)
+        plan = '\n'.join(row[0] for row in cursor.fetchall())
+    # Nazwy relacji po "on" - bez indeksów partycji, które mają ten sam przedrostek
+    names = {name for name, _ in partitions()}
+    return set(re.findall(r' on (\w+)', plan)) & names
+
+
+def test_period_filters_use_date_range(api_client):
+    today = date.today()
+    with CaptureQueriesContext(connection) as ctx:
+        assert api_client.get('/api/invoices/', {'year': today.year, 'month': today.month}).status_code == 200
+        assert api_client.get('/api/invoices/stats/', {'current_month': 'true'}).status_code == 200
+    invoice_queries = [q['sql'] for q in ctx.captured_queries if Invoice._meta.db_table in q['sql']]
+    assert len(invoice_queries) == 2
+    for sql in invoice_queries:
+        assert 'EXTRACT' not in sql.upper() and 'django_date_extract' not in sql, sql
+
+    assert api_client.get('/api/invoices/', {'year': today.year, 'month': 13}).status_code == 400
+
+
+@postgres_only
+def test_partition_pruning(history):
+    today = date.today()
+    invoices = Invoice.objects.for_company(history)
+
+    assert _scanned_partitions(invoices.in_period(today.year, today.month)) == {partition_name(today.year)}
+    assert _scanned_partitions(invoices.in_period(today.year - 1)) == {partition_name(today.year - 1)}
+
+
+@postgres_only
+def test_ensure_partitions_moves_default_rows(history, make_invoice):
+    today = date.today()
+    far = date(today.year + 5, 3, 1)
+    invoice = make_invoice(data=far, termin_platnosci=far + timedelta(days=14))
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT count(*) FROM {default_partition_name()}')
+        assert cursor.fetchone()[0] == 1
+
+    assert ensure_partitions(today) == [far.year]
+    assert ensure_partitions(today) == []
+    assert _scanned_partitions(Invoice.objects.filter(pk=invoice.pk, data=far)) == {partition_name(far.year)}
+
+    # Zmiana daty przenosi wiersz do partycji innego roku
+    invoice.data = today
+    invoice.save()
+    assert Invoice.objects.in_period(today.year).filter(pk=invoice.pk).exists()
@@ -0,0 +1,88 @@
+"""
+Skompresowane dane KSeF faktur (fakturex/fields.py, Invoice.ksef_xml).
+
+Zapis przez ORM pakuje dane, stare wiersze zapisane czystym tekstem czytają
+się bez zmian, a komenda compress_ksef_payloads przepakowuje je paczkami
+i raportuje mniejszy rozmiar.
+"""
+import io
+import json
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test import override_settings
+
+from fakturex.fields import is_compressed, text_codec
+from invoices.management.commands.compress_ksef_payloads import pending_payloads, storage_stats
+from invoices.models import Invoice
+from invoices.perf_data import seed
+
+
+def _raw_payload(invoice_id):
+    with connection.cursor() as cursor:
+        cursor.execute(f'SELECT ksef_xml FROM {Invoice._meta.db_table} WHERE id = %s', [invoice_id])
+        return cursor.fetchone()[0]
+
+
+def _set_raw_payloads(payloads):
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {Invoice._meta.db_table} SET ksef_xml = %s WHERE id = %s',
+            [(payload, invoice_id) for invoice_id, payload in payloads.items()],
+        )
+
+
+@pytest.fixture
+def ksef_invoices(company):
+    seed(company, invoices=120, contractors=10, ksef_ratio=1)
+    return Invoice.objects.for_company(company).exclude(ksef_xml='')
+
+
+def test_payload_roundtrip(make_invoice):
+    ksef_data = {'nabywca': 'Fakturex Test Sp. z o.o.', 'pozycje': [
+        {'nazwa': f'Pozycja zażółć {i}', 'ilosc': i, 'cena': '12.30'} for i in range(20)
+    ]}
+    text = json.dumps(ksef_data, ensure_ascii=False)
+    invoice = make_invoice(ksef_xml=text)
+
+    raw = _raw_payload(invoice.pk)
+    assert is_compressed(raw) and len(raw) < len(text)
+    assert Invoice.objects.get(pk=invoice.pk).ksef_xml == text
+    assert Invoice.objects.filter(pk=invoice.pk).values_list('ksef_xml', flat=True).get() == text
+
+    # Wiersz sprzed kompresji i krótka wartość - czysty tekst, czytany bez zmian
+    _set_raw_payloads({invoice.pk: text})
+    assert Invoice.objects.get(pk=invoice.pk).ksef_xml == text
+    short = make_invoice(ksef_xml='{"waluta": "PLN"}')
+    assert _raw_payload(short.pk) == '{"waluta": "PLN"}'
+
+
+def test_compress_ksef_payloads_command(ksef_invoices):
+    # Faktury jak sprzed kompresji - dane KSeF czystym tekstem
+    legacy = dict(ksef_invoices.values_list('id', 'ksef_xml'))
+    assert len(legacy) == 120
+    _set_raw_payloads(legacy)
+    before = storage_stats()
+    assert pending_payloads(text_codec()).count() == len(legacy)
+
+    out = io.StringIO()
+    call_command('compress_ksef_payloads', batch_size=50, stdout=out)
+    output = out.getvalue()
+    assert f'{len(legacy)} invoice(s) rewritten' in output
+    assert 'Before:' in output and 'After:' in output
+
+    after = storage_stats()
+    assert pending_payloads(text_codec()).count() == 0
+    assert after['compressed'] == before['compressed'] + len(legacy)
+    assert after['payload_bytes'] < before['payload_bytes']
+    for invoice in Invoice.objects.filter(id__in=legacy).only('id', 'ksef_xml'):
+        assert invoice.ksef_xml == legacy[invoice.id]
+        assert is_compressed(_raw_payload(invoice.id))
+
+    # Wycofanie kompresji: przy TEXT_COMPRESSION=none komenda zapisuje dane czystym tekstem
+    first_id = min(legacy)
+    with override_settings(TEXT_COMPRESSION='none'):
+        call_command('compress_ksef_payloads', stdout=io.StringIO())
+        assert pending_payloads('none').count() == 0
+    assert _raw_payload(first_id) == legacy[first_id]
@@ -0,0 +1,70 @@
+"""
+Harmonogram synchronizacji KSeF firm (invoices.ksef_scheduler).
+
+Działa na lokalnym symulatorze KSeF: pierwszy przebieg zapisuje faktury,
+kolejny pomija już zapisane, a firma zablokowana przez inny proces jest
+pomijana.
+"""
+from datetime import date, timedelta
+
+import pytest
+from django.test import override_settings
+from django.utils import timezone
+
+from customers.encryption import encrypt_token
+from invoices.ksef_scheduler import acquire_lock, due_companies, release_lock, sync_companies, sync_range
+from invoices.ksef_simulator import KSeFSimulator, use_simulator
+from invoices.models import Invoice, KSeFSyncLock
+
+
+@pytest.fixture
+def ksef_company(company):
+    company.ksef_token = encrypt_token('sim-token')
+    company.ksef_environment = 'test'
+    company.auto_fetch_ksef = True
+    company.save()
+    with KSeFSimulator(invoices=50, lines=(1, 3), export_delay=0) as simulator, \
+            use_simulator(simulator.url), override_settings(KSEF_EXPORT_POLL_SECONDS=0.01):
+        yield company
+
+
+def test_scheduled_sync(ksef_company):
+    company = ksef_company
+    due = due_companies()
+    assert [c.pk for c in due] == [company.pk]
+    assert sync_range(due[0], date(2026, 1, 31)) == (date(2026, 1, 1), date(2026, 1, 31))
+
+    [result] = sync_companies(due, workers=1)
+    assert result['status'] == 'success', result
+    assert result['imported_count'] == result['found'] == 50
+    assert Invoice.objects.for_company(company).count() == 50
+    assert not Invoice.objects.for_company(company).exclude(kontrahent__company=company).exists()
+
+    # Kolejny przebieg zaczyna od ostatniej synchronizacji (z nakładką)
+    [due] = due_companies([company.pk])
+    assert due.last_synced_to == date.today()
+    assert sync_range(due) == (date.today() - timedelta(days=1), date.today())
+
+    # Ten sam zakres jeszcze raz - wszystkie faktury już są w bazie
+    [result] = sync_companies([due], workers=1, days=30)
+    assert (result['status'], result['imported_count'], result['skipped_count']) == ('success', 0, 50)
+
+
+def test_scheduled_sync_locked(ksef_company):
+    owner = acquire_lock(ksef_company.pk)
+    assert owner and acquire_lock(ksef_company.pk) is None
+    [result] = sync_companies(due_companies(), workers=1)
+    assert result['status'] == 'locked'
+    assert not ksef_company.synchronizacje_ksef.exists()
+
+    # Blokada procesu, który padł, wygasa i przejmuje ją kolejny; stary właściciel jej nie zwolni
+    KSeFSyncLock.objects.filter(company=ksef_company).update(locked_until=timezone.now() - timedelta(seconds=1))
+    new_owner = acquire_lock(ksef_company.pk)
+    assert new_owner not in (None, owner)
+    release_lock(ksef_company.pk, owner)
+    assert acquire_lock(ksef_company.pk) is None
+    release_lock(ksef_company.pk, new_owner)
+
+    [result] = sync_companies(due_companies(), workers=1)
+    assert result['status'] == 'success', result
+    assert not KSeFSyncLock.objects.filter(company=ksef_company).exists()
@@ -1,10 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from .views import InvoiceViewSet
+from . import async_views
 
 router = DefaultRouter()
 router.register(r'', InvoiceViewSet, basename='invoice')
 
+# Widoki async muszą być przed routerem (inaczej 'stats/' trafi do trasy detail)
 urlpatterns = [
+    path('available_years/', async_views.available_years, name='invoice-available-years'),
+    path('stats/', async_views.stats, name='invoice-stats'),
+    path('recent_unpaid/', async_views.recent_unpaid, name='invoice-recent-unpaid'),
+    path('fetch_from_ksef/', async_views.fetch_from_ksef, name='invoice-fetch-from-ksef'),
+    path('ksef_progress/<str:progress_id>/', async_views.ksef_progress, name='invoice-ksef-progress'),
+    path('ksef_progress/<str:progress_id>/token/', async_views.ksef_progress_token,
+         name='invoice-ksef-progress-token'),
+    path('ksef_progress/<str:progress_id>/cancel/', async_views.cancel_ksef_fetch, name='invoice-ksef-cancel'),
+    path('ksef_diagnostics/', async_views.ksef_diagnostics, name='invoice-ksef-diagnostics'),
+    path('<int:pk>/refresh_ksef_data/', async_views.refresh_ksef_data, name='invoice-refresh-ksef-data'),
     path('', include(router.urls)),
-]
\ No newline at end of file
+]
@@ -1,22 +1,44 @@
 from rest_framework import viewsets, status
+from rest_framework.views import APIView
 from rest_framework.decorators import action
 from rest_framework.response import Response
-from django.db.models import Sum, Count, Q, Case, When, BooleanField
-from datetime import date, timedelta
+from rest_framework.parsers import MultiPartParser
+from rest_framework.exceptions import ValidationError
+from django.db.models import Count
+from datetime import date, datetime, timedelta
 import json
 from .models import Invoice
-from .serializers import InvoiceSerializer
+from .serializers import InvoiceSerializer, KSeFSyncRunSerializer
+from .analytics import supplier_spend
+from customers.tenancy import CompanyScopedMixin, get_request_company
+from fakturex.db_router import ReplicaReadMixin
 
 
-class InvoiceViewSet(viewsets.ModelViewSet):
+class InvoiceViewSet(CompanyScopedMixin, ReplicaReadMixin, viewsets.ModelViewSet):
     """
-    API ViewSet dla faktur kosztowych.
+    API ViewSet dla faktur kosztowych (tylko firmy bieżącego żądania).
+    Odczyty dashboardu i akcje KSeF ograniczone przez I/O są w async_views.py.
     """
+    # Akcje tylko do odczytu, które mogą iść do repliki
+    replica_actions = {'list', 'supplier_stats', 'ksef_sync_runs'}
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
     
+    # Sortowanie dozwolone parametrem ordering; days_until_due rośnie razem z terminem,
+    # więc sortujemy po kolumnie termin_platnosci (indeks) zamiast po adnotacji
+    ordering_fields = {
+        'days_until_due': ('termin_platnosci', 'id'),
+        'termin_platnosci': ('termin_platnosci', 'id'),
+        'data': ('data', 'id'),
+        'kwota': ('kwota', 'id'),
+    }
+    
     def get_queryset(self):
-        queryset = Invoice.objects.all()
+        today = date.today()
+        queryset = Invoice.objects.for_company(self.company).select_related('kontrahent').with_due_info(today)
+        # Dane KSeF (duże, skompresowane) czyta tylko ksef_data - serializer ich nie zwraca
+        if self.action != 'ksef_data':
+            queryset = queryset.defer('ksef_xml')
         
         # Filtrowanie po statusie
         status_param = self.request.query_params.get('status')
@@ -28,7 +50,7 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if overdue == 'true':
             queryset = queryset.filter(
                 status='niezaplacona',
-                termin_platnosci__lt=date.today()
+                termin_platnosci__lt=today
             )
         
         # Filtrowanie po dostawcy
@@ -36,102 +58,63 @@ class InvoiceViewSet(viewsets.ModelViewSet):
         if dostawca:
             queryset = queryset.filter(dostawca__icontains=dostawca)
         
-        # Filtrowanie po roku
+        # Filtrowanie po roku i miesiącu - zakres dat (indeks, partycje roczne)
         year = self.request.query_params.get('year')
-        if year:
-            queryset = queryset.filter(data__year=int(year))
-        
-        # Filtrowanie po miesiącu
         month = self.request.query_params.get('month')
-        if month:
-            queryset = queryset.filter(data__month=int(month))
-        
-        return queryset
-    
-    @action(detail=False, methods=['get'])
-    def available_years(self, request):
-        """
-        Zwraca listę lat, dla których istnieją faktury.
-        """
-        years = Invoice.objects.dates('data', 'year', order='DESC')
-        year_list = [d.year for d in years]
+        try:
+            if year:
+                queryset = queryset.in_period(int(year), int(month) if month else None)
+            elif month:
+                # Miesiąc dowolnego roku - bez zakresu dat
+                queryset = queryset.filter(data__month=int(month))
+        except ValueError:
+            raise ValidationError({'month' if year else 'year': 'Nieprawidłowy rok lub miesiąc.'})
+        
+        # Dni do terminu - zamiana na zakres dat, żeby filtr korzystał z indeksu
+        for lookup, date_lookup in (('days_until_due__lte', 'termin_platnosci__lte'),
+                                    ('days_until_due__gte', 'termin_platnosci__gte')):
+            days = self.request.query_params.get(lookup)
+            if days not in (None, ''):
+                try:
+                    queryset = queryset.filter(**{date_lookup: today + timedelta(days=int(days))})
+                except ValueError:
+                    raise ValidationError({lookup: 'Podaj liczbę całkowitą.'})
         
-        # Dodaj bieżący rok jeśli nie ma
-        current_year = date.today().year
-        if current_year not in year_list:
-            year_list.insert(0, current_year)
+        ordering = self.request.query_params.get('ordering')
+        if ordering:
+            fields = self.ordering_fields.get(ordering.lstrip('-'))
+            if fields is None:
+                raise ValidationError({'ordering': f"Dozwolone: {', '.join(self.ordering_fields)}"})
+            prefix = '-' if ordering.startswith('-') else ''
+            queryset = queryset.order_by(*(prefix + field for field in fields))
         
-        return Response({'years': year_list})
+        return queryset
     
     @action(detail=False, methods=['get'])
-    def stats(self, request):
+    def supplier_stats(self, request):
         """
-        Statystyki faktur dla dashboardu.
-        Opcjonalny parametr current_month=true dla statystyk tylko z bieżącego miesiąca.
+        Wydatki per dostawca: top-N wg kwoty, udział w całości i dynamika m/m.
+        Parametry: date_from, date_to (YYYY-MM-DD, domyślnie bieżący rok), limit (domyślnie 10).
         """
         today = date.today()
-        current_month_only = request.query_params.get('current_month') == 'true'
-        
-        # Wszystkie faktury (lub tylko z bieżącego miesiąca)
-        all_invoices = Invoice.objects.all()
-        if current_month_only:
-            all_invoices = all_invoices.filter(
-                data__year=today.year,
-                data__month=today.month
+        try:
+            date_from = date.fromisoformat(request.query_params.get('date_from', f'{today.year}-01-01'))
+            date_to = date.fromisoformat(request.query_params.get('date_to', f'{today.year}-12-31'))
+            limit = min(max(int(request.query_params.get('limit', 10)), 1), 100)
+        except ValueError:
+            return Response(
+                {'error': 'Nieprawidłowe parametry. Daty w formacie YYYY-MM-DD, limit jako liczba.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Statystyki
-        total_count = all_invoices.count()
-        zaplacone = all_invoices.filter(status='zaplacona')
-        niezaplacone = all_invoices.filter(status='niezaplacona')
-        przeterminowane = niezaplacone.filter(termin_platnosci__lt=today)
-        blisko_terminu = niezaplacone.filter(
-            termin_platnosci__gte=today,
-            termin_platnosci__lte=today + timedelta(days=3)
-        )
-        
-        # Sumy
-        suma_wszystkich = all_invoices.aggregate(total=Sum('kwota'))['total'] or 0
-        suma_zaplaconych = zaplacone.aggregate(total=Sum('kwota'))['total'] or 0
-        suma_niezaplaconych = niezaplacone.aggregate(total=Sum('kwota'))['total'] or 0
-        suma_przeterminowanych = przeterminowane.aggregate(total=Sum('kwota'))['total'] or 0
-        
-        return Response({
-            'total_count': total_count,
-            'zaplacone_count': zaplacone.count(),
-            'niezaplacone_count': niezaplacone.count(),
-            'przeterminowane_count': przeterminowane.count(),
-            'blisko_terminu_count': blisko_terminu.count(),
-            'suma_wszystkich': float(suma_wszystkich),
-            'suma_zaplaconych': float(suma_zaplaconych),
-            'suma_niezaplaconych': float(suma_niezaplaconych),
-            'suma_przeterminowanych': float(suma_przeterminowanych),
-            'current_month': current_month_only,
-            'month_name': today.strftime('%B %Y') if current_month_only else None,
-        })
-    
-    @action(detail=False, methods=['get'])
-    def recent_unpaid(self, request):
-        """
-        Ostatnie niezapłacone faktury dla dashboardu.
-        Domyślnie zwraca 5 faktur, można zmienić parametrem limit.
-        Sortowane: przeterminowane najpierw, potem po terminie płatności.
-        """
-        limit = int(request.query_params.get('limit', 5))
-        today = date.today()
-        
-        # Niezapłacone faktury
-        invoices = Invoice.objects.filter(status='niezaplacona').annotate(
-            is_overdue_db=Case(
-                When(termin_platnosci__lt=today, then=True),
-                default=False,
-                output_field=BooleanField()
+
+        if date_from > date_to:
+            return Response(
+                {'error': 'Data początkowa nie może być późniejsza niż końcowa.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-        ).order_by('-is_overdue_db', 'termin_platnosci')[:limit]
-        
-        serializer = InvoiceSerializer(invoices, many=True)
-        return Response(serializer.data)
-    
+
+        return Response(supplier_spend(self.company, date_from, date_to, limit))
+
     @action(detail=True, methods=['post'])
     def mark_paid(self, request, pk=None):
         """
@@ -189,231 +172,99 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             'nabywca_nip': ksef_data.get('nabywca_nip'),
             'forma_platnosci': ksef_data.get('forma_platnosci'),
             'waluta': ksef_data.get('waluta', 'PLN'),
+            'kwota_netto': ksef_data.get('kwota_netto'),
+            'kwota_vat': ksef_data.get('kwota_vat'),
             'pozycje': ksef_data.get('pozycje', []),
         })
     
-    @action(detail=True, methods=['post'])
-    def refresh_ksef_data(self, request, pk=None):
+    @action(detail=False, methods=['get'])
+    def purchase_register(self, request):
         """
-        Odśwież dane KSeF dla faktury - pobierz ponownie z KSeF bez zmiany statusu płatności.
+        Wyciąg z ewidencji zakupu za miesiąc (year, month) jako strumień XML -
+        wiersze w układzie JPK_V7M, nie kompletny plik JPK (patrz purchase_register.py).
+        validate=true zwraca tylko raport: sumy i faktury, które zostałyby pominięte.
         """
-        from customers.models import Settings
-        from customers.encryption import decrypt_token
-        from .ksef_service import KSeFService, KSEF2_AVAILABLE
-        
-        invoice = self.get_object()
-        
-        if not invoice.ksef_numer:
-            return Response(
-                {'error': 'Ta faktura nie pochodzi z KSeF.'},
-                status=status.HTTP_404_NOT_FOUND
-            )
+        from django.http import StreamingHttpResponse
+        from .purchase_register import generate_purchase_register, validate_purchase_register
         
-        # Sprawdź konfigurację KSeF
-        settings = Settings.objects.first()
-        if not settings or not settings.ksef_token or not settings.firma_nip:
+        try:
+            year = int(request.query_params.get('year', date.today().year))
+            month = int(request.query_params.get('month', date.today().month))
+            if not 1 <= month <= 12:
+                raise ValueError
+        except ValueError:
             return Response(
-                {'error': 'Brak konfiguracji KSeF. Uzupełnij token i NIP w ustawieniach.'},
+                {'error': 'Nieprawidłowy rok lub miesiąc.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if not KSEF2_AVAILABLE:
-            return Response(
-                {'error': 'Biblioteka ksef2 nie jest dostępna.'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        if request.query_params.get('validate', '').lower() in ('1', 'true'):
+            return Response(validate_purchase_register(year, month, self.company.pk))
         
-        try:
-            # Przygotuj zakres dat - dzień przed i po dacie faktury
-            date_from = (invoice.data - timedelta(days=1)).strftime('%Y-%m-%d')
-            date_to = (invoice.data + timedelta(days=1)).strftime('%Y-%m-%d')
-            
-            token = decrypt_token(settings.ksef_token)
-            service = KSeFService(token, settings.firma_nip, settings.ksef_environment)
-            
-            success, auth_msg = service.authorize()
-            if not success:
-                return Response(
-                    {'error': f'Błąd autoryzacji KSeF: {auth_msg}'},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
-            
-            try:
-                invoices_data, msg = service.fetch_invoices(date_from, date_to, 'SUBJECT2')
-                
-                # Znajdź fakturę po ksef_numer
-                found = None
-                for inv in invoices_data:
-                    if inv.get('ksef_numer') == invoice.ksef_numer:
-                        found = inv
-                        break
-                
-                if not found:
-                    return Response(
-                        {'error': f'Nie znaleziono faktury {invoice.ksef_numer} w KSeF. Spróbuj rozszerzyć zakres dat.'},
-                        status=status.HTTP_404_NOT_FOUND
-                    )
-                
-                # Zaktualizuj tylko dane KSeF (bez zmiany statusu)
-                ksef_data = {
-                    'data_sprzedazy': found.get('data_sprzedazy'),
-                    'dostawca_nip': found.get('dostawca_nip'),
-                    'dostawca_adres': found.get('dostawca_adres'),
-                    'nabywca': found.get('nabywca'),
-                    'nabywca_nip': found.get('nabywca_nip'),
-                    'forma_platnosci': found.get('forma_platnosci'),
-                    'waluta': found.get('waluta'),
-                    'pozycje': found.get('pozycje', []),
-                }
-                
-                invoice.ksef_xml = json.dumps(ksef_data, ensure_ascii=False)
-                invoice.save(update_fields=['ksef_xml'])
-                
-                return Response({
-                    'success': True,
-                    'message': 'Dane KSeF zostały zaktualizowane.',
-                    'pozycje_count': len(ksef_data.get('pozycje', [])),
-                    'nabywca': ksef_data.get('nabywca'),
-                })
-                
-            finally:
-                service.terminate_session()
-                
-        except Exception as e:
+        if not self.company.nip:
             return Response(
-                {'error': f'Błąd pobierania danych: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Uzupełnij NIP firmy w ustawieniach.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-    
-    @action(detail=False, methods=['post'])
-    def ksef_diagnostics(self, request):
-        """
-        Diagnostyka połączenia z KSeF - sprawdź konfigurację i autoryzację.
-        """
-        from customers.models import Settings
-        from customers.encryption import decrypt_token, is_token_encrypted
-        from .ksef_service import KSeFService, KSEF2_AVAILABLE, get_environment
-        from django.conf import settings as django_settings
-        import os
-        import logging
-        
-        logger = logging.getLogger(__name__)
         
-        try:
-            settings = Settings.objects.first()
-            
-            # Wyczyść NIP 
-            raw_nip = settings.firma_nip if settings else None
-            clean_nip = raw_nip.replace('-', '').replace(' ', '').strip() if raw_nip else None
-            
-            diag = {
-                'ksef2_available': KSEF2_AVAILABLE,
-                'settings_exists': settings is not None,
-                'has_token': bool(settings and settings.ksef_token),
-                'has_nip': bool(settings and settings.firma_nip),
-                'environment': settings.ksef_environment if settings else None,
-                'nip_raw': raw_nip,
-                'nip_clean': clean_nip,
-                'nip_length': len(clean_nip) if clean_nip else 0,
-                'token_length': len(settings.ksef_token) if settings and settings.ksef_token else 0,
-                'encryption_key_set': bool(getattr(django_settings, 'ENCRYPTION_KEY', None) or os.environ.get('ENCRYPTION_KEY')),
-            }
-            
-            if settings and settings.ksef_token and settings.firma_nip:
-                encrypted_token = settings.ksef_token
-                diag['token_is_encrypted'] = is_token_encrypted(encrypted_token)
-                diag['encrypted_token_starts'] = encrypted_token[:30] + '...' if len(encrypted_token) > 30 else encrypted_token
-                
-                token = decrypt_token(encrypted_token)
-                clean_token = token.strip().replace('\n', '').replace('\r', '').replace(' ', '')
-                diag['decrypted_token_length'] = len(token)
-                diag['clean_token_length'] = len(clean_token)
-                diag['decryption_worked'] = token != encrypted_token
-                diag['token_starts_with'] = clean_token[:30] + '...' if len(clean_token) > 30 else clean_token
-                diag['token_has_whitespace'] = token != clean_token
-                
-                # Spróbuj autoryzacji
-                service = KSeFService(token, settings.firma_nip, settings.ksef_environment)
-                diag['base_url'] = service.base_url
-                
-                success, auth_msg = service.authorize()
-                diag['auth_success'] = success
-                diag['auth_message'] = auth_msg
-                
-                service.terminate_session()
-            
-            return Response(diag)
-            
-        except Exception as e:
-            import traceback
-            return Response({
-                'error': str(e),
-                'traceback': traceback.format_exc()
-            }, status=500)
-
+        company = {'id': self.company.pk, 'nip': self.company.nip, 'nazwa': self.company.nazwa}
+        response = StreamingHttpResponse(
+            generate_purchase_register(year, month, company),
+            content_type='application/xml; charset=utf-8'
+        )
+        response['Content-Disposition'] = f'attachment; filename="ewidencja_zakupu_{year}_{month:02d}.xml"'
+        return response
+    
     @action(detail=False, methods=['post'])
     def ksef_test_fetch(self, request):
         """
-        Test pobierania faktur z KSeF z pełnym logowaniem.
+        Test pobierania faktur z KSeF z pomiarem faz (zapisywany w historii synchronizacji).
         """
-        from customers.models import Settings
         from customers.encryption import decrypt_token
-        from .ksef_service import KSeFService, KSEF2_AVAILABLE
-        from datetime import datetime, timedelta
-        import logging
-        import io
-        import sys
-        
-        # Capture logs
-        log_capture = io.StringIO()
-        handler = logging.StreamHandler(log_capture)
-        handler.setLevel(logging.DEBUG)
-        handler.setFormatter(logging.Formatter('%(levelname)s|%(name)s|%(message)s'))
-        
-        # Add handler to ksef logger
-        ksef_logger = logging.getLogger('invoices.ksef_service')
-        ksef_logger.addHandler(handler)
-        ksef_logger.setLevel(logging.DEBUG)
+        from .ksef_service import KSeFService, KSEF2_AVAILABLE, fetch_succeeded
+        from .sync_recorder import SyncRecorder
         
         result = {
             'ksef2_available': KSEF2_AVAILABLE,
             'steps': [],
-            'logs': '',
             'invoices': [],
             'error': None
         }
         
+        result['steps'].append('1. Loading settings')
+        company = self.company
+        
+        if not company.ksef_token:
+            result['error'] = 'No KSeF token configured'
+            return Response(result)
+        
+        date_from = request.data.get('date_from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
+        date_to = request.data.get('date_to', datetime.now().strftime('%Y-%m-%d'))
+        result['date_range'] = f'{date_from} to {date_to}'
+        
+        recorder = SyncRecorder('test_fetch', company.ksef_environment, date_from, date_to, company=company)
+        success = False
         try:
-            result['steps'].append('1. Loading settings')
-            settings = Settings.objects.first()
-            
-            if not settings or not settings.ksef_token:
-                result['error'] = 'No KSeF token configured'
-                return Response(result)
-            
             result['steps'].append('2. Decrypting token')
-            token = decrypt_token(settings.ksef_token)
-            
-            date_from = request.data.get('date_from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-            date_to = request.data.get('date_to', datetime.now().strftime('%Y-%m-%d'))
-            result['date_range'] = f'{date_from} to {date_to}'
+            token = decrypt_token(company.ksef_token)
             
             result['steps'].append('3. Creating KSeFService')
-            service = KSeFService(token, settings.firma_nip, settings.ksef_environment)
-            result['environment'] = settings.ksef_environment
+            service = KSeFService(token, company.nip, company.ksef_environment, recorder=recorder)
+            result['environment'] = company.ksef_environment
             result['base_url'] = service.base_url
             
             result['steps'].append('4. Authorizing')
-            success, auth_msg = service.authorize()
-            result['auth_success'] = success
+            auth_success, auth_msg = service.authorize()
+            result['auth_success'] = auth_success
             result['auth_message'] = auth_msg
             
-            if not success:
+            if not auth_success:
                 result['error'] = f'Auth failed: {auth_msg}'
                 return Response(result)
             
             result['steps'].append('5. Fetching invoices')
             invoices, fetch_msg = service.fetch_invoices(date_from, date_to)
+            success = fetch_succeeded(fetch_msg)
             result['fetch_message'] = fetch_msg
             result['invoice_count'] = len(invoices)
             result['invoices'] = invoices[:5]  # First 5 only
@@ -428,74 +279,117 @@ class InvoiceViewSet(viewsets.ModelViewSet):
             result['error'] = str(e)
             result['traceback'] = traceback.format_exc()
         finally:
-            # Get captured logs
-            ksef_logger.removeHandler(handler)
-            result['logs'] = log_capture.getvalue()
+            run = recorder.finish(success, result.get('fetch_message') or result['error'] or '')
+            if run is not None:
+                result['run'] = KSeFSyncRunSerializer(run).data
         
         return Response(result)
 
-    @action(detail=False, methods=['post'])
-    def fetch_from_ksef(self, request):
+    @action(detail=False, methods=['get'])
+    def ksef_sync_runs(self, request):
         """
-        Pobierz faktury z KSeF - zwraca podgląd do wyboru, nie zapisuje.
-        Wymaga skonfigurowanego tokenu KSeF w ustawieniach.
+        Historia synchronizacji KSeF z percentylami czasu faz.
+        ?limit=50 (max 500), ?trigger=fetch|refresh|import|test_fetch, ?outcome=success|error
         """
-        from customers.models import Settings
-        from customers.encryption import decrypt_token
-        from .ksef_service import fetch_invoices_from_ksef
-        from datetime import datetime, timedelta
+        from .models import KSeFSyncRun
+        from .sync_recorder import summarize_runs
         
         try:
-            settings = Settings.objects.first()
-            if not settings or not settings.ksef_token:
-                return Response(
-                    {'error': 'Brak skonfigurowanego tokenu KSeF. Przejdź do Ustawień i dodaj token.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            if not settings.firma_nip:
-                return Response(
-                    {'error': 'Brak NIP firmy w ustawieniach. Przejdź do Ustawień i dodaj NIP.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            
-            # Odszyfruj token
-            token = decrypt_token(settings.ksef_token)
-            
-            # Zakres dat
-            date_from = request.data.get('date_from', (datetime.now() - timedelta(days=30)).strftime('%Y-%m-%d'))
-            date_to = request.data.get('date_to', datetime.now().strftime('%Y-%m-%d'))
-            
-            # Pobierz faktury z KSeF
-            invoices_data, message = fetch_invoices_from_ksef(
-                token=token,
-                nip=settings.firma_nip,
-                environment=settings.ksef_environment,
-                date_from=date_from,
-                date_to=date_to
+            limit = min(int(request.query_params.get('limit', 50)), 500)
+        except ValueError:
+            return Response({'error': 'Nieprawidłowy limit'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        runs = KSeFSyncRun.objects.filter(company=self.company)
+        for param in ('trigger', 'outcome'):
+            value = request.query_params.get(param)
+            if value:
+                runs = runs.filter(**{param: value})
+        runs = list(runs[:limit])
+        
+        return Response({
+            'summary': summarize_runs(runs),
+            'runs': KSeFSyncRunSerializer(runs, many=True).data,
+        })
+
+    @action(detail=False, methods=['get'])
+    def duplicates(self, request):
+        """
+        Podejrzane duplikaty w całej firmie - grupy faktur o tym samym odcisku
+        (numer, kwota, data) od tego samego dostawcy (NIP albo nazwa).
+        Parametr limit - liczba grup (domyślnie 100).
+        """
+        try:
+            limit = min(int(request.query_params.get('limit', 100)), 1000)
+        except ValueError:
+            return Response(
+                {'error': 'Nieprawidłowy limit.'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-            
-            # Sprawdź które faktury już istnieją w bazie
-            for inv_data in invoices_data:
-                inv_data['already_exists'] = Invoice.objects.filter(ksef_numer=inv_data['ksef_numer']).exists()
-            
-            return Response({
-                'message': message,
-                'settings_configured': True,
-                'environment': settings.ksef_environment,
-                'nip': settings.firma_nip,
-                'date_from': date_from,
-                'date_to': date_to,
-                'invoices': invoices_data,
-                'total_found': len(invoices_data)
-            })
-            
-        except Exception as e:
+        
+        from .fingerprint import known_fingerprints, same_supplier
+        
+        invoices = Invoice.objects.for_company(self.company)
+        fingerprints = (
+            invoices.exclude(fingerprint='')
+            .values('fingerprint')
+            .annotate(liczba=Count('id'))
+            .filter(liczba__gt=1)
+            .values_list('fingerprint', flat=True)
+        )
+        # Ten sam odcisk od różnych dostawców to nie duplikat - dzielimy grupy po dostawcy
+        clusters = []
+        for fingerprint, candidates in known_fingerprints(invoices, fingerprints).items():
+            groups = []
+            for invoice_id, supplier in sorted(candidates, key=lambda c: c[0]):
+                group = next((g for g in groups if same_supplier(g[0][1], supplier)), None)
+                if group is None:
+                    groups.append([(invoice_id, supplier)])
+                else:
+                    group.append((invoice_id, supplier))
+            clusters.extend(
+                (fingerprint, [invoice_id for invoice_id, _ in group]) for group in groups if len(group) > 1
+            )
+        clusters.sort(key=lambda c: (-len(c[1]), c[0], c[1][0]))
+        total = len(clusters)
+        clusters = clusters[:limit]
+        
+        serialized = {
+            invoice.id: InvoiceSerializer(invoice).data
+            for invoice in invoices.filter(id__in=[i for _, ids in clusters for i in ids]).select_related('kontrahent')
+        }
+        
+        return Response({
+            'clusters_count': total,
+            'clusters': [
+                {'fingerprint': fingerprint, 'faktury': [serialized[i] for i in ids]}
+                for fingerprint, ids in clusters
+            ],
+        })
+
+    @action(detail=False, methods=['post'], parser_classes=[MultiPartParser])
+    def import_csv(self, request):
+        """
+        Masowy import faktur z pliku CSV (pole 'file').
+        Parametr dry_run=true tylko waliduje plik.
+        """
+        import io
+        from .csv_import import import_csv, CsvImportError
+        
+        upload = request.FILES.get('file')
+        if not upload:
             return Response(
-                {'error': f'Błąd podczas pobierania z KSeF: {str(e)}'},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {'error': 'Nie przesłano pliku CSV (pole "file").'},
+                status=status.HTTP_400_BAD_REQUEST
             )
-    
+        
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+        try:
+            result = import_csv(io.TextIOWrapper(upload.file, encoding='utf-8-sig'), self.company, dry_run=dry_run)
+        except (CsvImportError, UnicodeDecodeError) as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        return Response(result)
+
     @action(detail=False, methods=['post'])
     def import_ksef_invoices(self, request):
         """
@@ -509,63 +403,46 @@ class InvoiceViewSet(viewsets.ModelViewSet):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        imported_count = 0
-        skipped_count = 0
-        today = date.today()
+        from .ksef_import import import_ksef_invoices
+        from .sync_recorder import SyncRecorder
         
-        for inv_data in invoices_data:
-            # Sprawdź czy faktura już istnieje
-            if Invoice.objects.filter(ksef_numer=inv_data['ksef_numer']).exists():
-                skipped_count += 1
-                continue
-            
-            # Określ termin płatności
-            termin_str = inv_data.get('termin_platnosci', inv_data['data'])
-            if isinstance(termin_str, str):
-                try:
-                    termin = date.fromisoformat(termin_str)
-                except ValueError:
-                    termin = date.fromisoformat(inv_data['data'])
-            else:
-                termin = termin_str if termin_str else date.fromisoformat(inv_data['data'])
-            
-            # Określ status - zapłacone jeśli:
-            # - termin płatności to dziś lub jutro (<=1 dzień)
-            # - forma płatności to gotówka
-            forma_platnosci = inv_data.get('forma_platnosci', '').lower()
-            days_until_due = (termin - today).days
-            
-            if days_until_due <= 1 or 'gotówka' in forma_platnosci or 'gotowka' in forma_platnosci:
-                invoice_status = 'zaplacona'
-            else:
-                invoice_status = 'niezaplacona'
-            
-            # Utwórz fakturę z pełnymi danymi KSeF
-            ksef_data = {
-                'data_sprzedazy': inv_data.get('data_sprzedazy'),
-                'dostawca_nip': inv_data.get('dostawca_nip'),
-                'dostawca_adres': inv_data.get('dostawca_adres'),
-                'nabywca': inv_data.get('nabywca'),
-                'nabywca_nip': inv_data.get('nabywca_nip'),
-                'forma_platnosci': inv_data.get('forma_platnosci'),
-                'waluta': inv_data.get('waluta'),
-                'pozycje': inv_data.get('pozycje', []),
-            }
-            
-            Invoice.objects.create(
-                numer=inv_data['numer'],
-                data=inv_data['data'],
-                kwota=inv_data['kwota'],
-                dostawca=inv_data['dostawca'],
-                termin_platnosci=termin,
-                status=invoice_status,
-                ksef_numer=inv_data['ksef_numer'],
-                ksef_xml=json.dumps(ksef_data, ensure_ascii=False),  # Zapisz dane KSeF jako JSON
+        # Zapis do bazy mierzony jak pozostałe fazy synchronizacji KSeF
+        with SyncRecorder('import', company=self.company) as recorder:
+            result = import_ksef_invoices(
+                self.company, invoices_data,
+                allow_duplicates=bool(request.data.get('allow_duplicates')), recorder=recorder,
             )
-            imported_count += 1
         
-        return Response({
-            'message': f'Zaimportowano {imported_count} faktur.',
-            'imported_count': imported_count,
-            'skipped_count': skipped_count
-        })
\ No newline at end of file
+        return Response({'message': f"Zaimportowano {result['imported_count']} faktur.", **result})
+
+
+class ChangesView(APIView):
+    """
+    Feed zmian firmy bieżącego żądania dla lokalnego cache SPA (patrz invoices/changes.py).
+    GET ?since=<kursor>&limit=<n> - faktury i kontrahenci utworzeni lub zmienieni
+    po kursorze oraz id usuniętych. Czyta zawsze z bazy głównej - opóźnienie
+    repliki mogłoby przesunąć kursor za niewidoczne jeszcze zmiany.
+    """
+    def get(self, request):
+        from django.conf import settings
+        from customers.serializers import ContractorSerializer
+        from .changes import InvalidCursor, changes_page
+
+        try:
+            limit = min(int(request.query_params.get('limit', settings.CHANGES_FEED_PAGE_SIZE)),
+                        settings.CHANGES_FEED_PAGE_SIZE)
+        except ValueError:
+            return Response({'error': 'Nieprawidłowy parametr limit'}, status=status.HTTP_400_BAD_REQUEST)
+        if limit < 1:
+            return Response({'error': 'Nieprawidłowy parametr limit'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            page = changes_page(
+                get_request_company(request), request.query_params.get('since'), limit=limit, today=date.today()
+            )
+        except InvalidCursor:
+            return Response({'error': 'Nieprawidłowy kursor since'}, status=status.HTTP_400_BAD_REQUEST)
+
+        page['invoices'] = InvoiceSerializer(page['invoices'], many=True).data
+        page['contractors'] = ContractorSerializer(page['contractors'], many=True).data
+        return Response(page)
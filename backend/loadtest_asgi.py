@@ -0,0 +1,108 @@
+"""
+Test obciążeniowy: opóźnienia CRUD w trakcie trwających wywołań KSeF.
+
+Faza 1 mierzy same zapytania CRUD (lista faktur i kontrahentów).
+Faza 2 powtarza je, gdy równolegle trwa N wywołań POST /api/invoices/fetch_from_ksef/.
+Przy serwerze ASGI (uvicorn) p95 obu faz powinno być zbliżone; przy synchronicznych
+workerach gunicorna wywołania KSeF zajmują workery i CRUD czeka w kolejce.
+
+Użycie:
+    python loadtest_asgi.py --url http://localhost:8000 --username admin --password haslo
+"""
+import argparse
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+CRUD_PATHS = ['/api/invoices/', '/api/contractors/', '/api/invoices/stats/']
+
+
+def login(base_url, username, password):
+    response = requests.post(f'{base_url}/api/auth/login/', json={'username': username, 'password': password}, timeout=30)
+    response.raise_for_status()
+    return response.json()['access']
+
+
+def crud_latencies(base_url, token, count, concurrency):
+    """Wykonaj `count` zapytań CRUD, zwróć czasy w ms."""
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def one(i):
+        path = CRUD_PATHS[i % len(CRUD_PATHS)]
+        start = time.perf_counter()
+        response = requests.get(f'{base_url}{path}', headers=headers, timeout=60)
+        elapsed = (time.perf_counter() - start) * 1000
+        if response.status_code != 200:
+            print(f'  ! {path} -> HTTP {response.status_code}', file=sys.stderr)
+        return elapsed
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(one, range(count)))
+
+
+def ksef_calls(base_url, token, calls, stop_event, durations):
+    """Trzymaj `calls` wywołań KSeF w locie aż do stop_event."""
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def loop():
+        while not stop_event.is_set():
+            start = time.perf_counter()
+            try:
+                requests.post(f'{base_url}/api/invoices/fetch_from_ksef/', json={}, headers=headers, timeout=300)
+            except requests.RequestException as e:
+                print(f'  ! KSeF: {e}', file=sys.stderr)
+            durations.append((time.perf_counter() - start) * 1000)
+
+    threads = [threading.Thread(target=loop, daemon=True) for _ in range(calls)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+def summary(label, values):
+    values = sorted(values)
+    p50 = statistics.median(values)
+    p95 = values[max(int(len(values) * 0.95) - 1, 0)]
+    print(f'{label:<28} n={len(values):<5} p50={p50:8.1f} ms  p95={p95:8.1f} ms  max={values[-1]:8.1f} ms')
+    return p95
+
+
+def main():
+    parser = argparse.ArgumentParser(description='CRUD latency while KSeF calls are in flight')
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--username', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--requests', type=int, default=100, help='CRUD requests per phase')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel CRUD clients')
+    parser.add_argument('--ksef-calls', type=int, default=4, help='KSeF calls kept in flight')
+    parser.add_argument('--warmup', type=float, default=2.0, help='seconds before measuring phase 2')
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    token = login(base_url, args.username, args.password)
+
+    print('=== Faza 1: CRUD bez obciążenia KSeF ===')
+    baseline = summary('CRUD (baseline)', crud_latencies(base_url, token, args.requests, args.concurrency))
+
+    print(f'=== Faza 2: CRUD przy {args.ksef_calls} wywołaniach KSeF w locie ===')
+    stop_event = threading.Event()
+    ksef_durations = []
+    threads = ksef_calls(base_url, token, args.ksef_calls, stop_event, ksef_durations)
+    time.sleep(args.warmup)
+    loaded = summary('CRUD (KSeF in flight)', crud_latencies(base_url, token, args.requests, args.concurrency))
+    stop_event.set()
+    for t in threads:
+        t.join()
+    if ksef_durations:
+        summary('KSeF fetch_from_ksef', ksef_durations)
+
+    ratio = loaded / baseline if baseline else 0
+    print(f'p95 ratio (loaded / baseline): {ratio:.2f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class UsersConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'users'
+    verbose_name = 'Użytkownicy'
+
+    def ready(self):
+        # Podłącz sygnały (unieważnianie cache uwierzytelniania)
+        from . import signals  # noqa: F401
@@ -0,0 +1,75 @@
+"""
+Uwierzytelnianie JWT z krótkotrwałym cache użytkowników.
+
+Standardowe JWTAuthentication pobiera wiersz auth_user przy każdym żądaniu,
+a SPA wysyła kilka żądań na stronę. Tutaj użytkownik jest trzymany w pamięci
+procesu przez JWT_USER_CACHE_SECONDS, kluczem jest (id użytkownika, jti tokenu,
+generacja). Generacja to licznik we wspólnym cache - invalidate_user_cache()
+podbija go przy każdym zapisie i usunięciu użytkownika (users/signals.py,
+także zmiany z admina i shella) oraz przy wylogowaniu, co unieważnia wpisy
+we wszystkich workerach.
+"""
+import copy
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+
+# Limit wpisów - po przekroczeniu usuwane są wygasłe, a w razie potrzeby wszystkie
+MAX_CACHED_USERS = 1000
+
+_lock = threading.Lock()
+_users = {}
+
+
+def _generation_key(user_id):
+    return f'users:auth_generation:{user_id}'
+
+
+def get_user_generation(user_id):
+    return cache.get(_generation_key(user_id), 0)
+
+
+def invalidate_user_cache(user_id):
+    """Usuń użytkownika z cache w tym procesie i (przez generację) w pozostałych."""
+    with _lock:
+        for key in [key for key in _users if key[0] == str(user_id)]:
+            del _users[key]
+    try:
+        cache.incr(_generation_key(user_id))
+    except ValueError:
+        cache.set(_generation_key(user_id), 1, None)
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """JWTAuthentication, które nie odpytuje bazy o użytkownika przy każdym żądaniu."""
+
+    def get_user(self, validated_token):
+        try:
+            user_id = str(validated_token[api_settings.USER_ID_CLAIM])
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+
+        key = (user_id, validated_token.get(api_settings.JTI_CLAIM), get_user_generation(user_id))
+        now = time.monotonic()
+        with _lock:
+            entry = _users.get(key)
+        if entry is not None and entry[0] > now:
+            # Kopia - widok może zmieniać request.user (np. set_password)
+            return copy.copy(entry[1])
+
+        user = super().get_user(validated_token)
+
+        ttl = getattr(settings, 'JWT_USER_CACHE_SECONDS', 60)
+        with _lock:
+            if len(_users) >= MAX_CACHED_USERS:
+                for stale in [k for k, (expires, _) in _users.items() if expires <= now]:
+                    del _users[stale]
+                if len(_users) >= MAX_CACHED_USERS:
+                    _users.clear()
+            _users[key] = (now + ttl, user)
+        return copy.copy(user)
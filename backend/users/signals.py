@@ -0,0 +1,20 @@
+"""
+Sygnały modułu użytkowników.
+"""
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .authentication import invalidate_user_cache
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def invalidate_user(sender, instance, **kwargs):
+    """
+    Każda zmiana użytkownika - także z panelu admina czy shella (is_active,
+    is_staff, is_superuser, hasło) - unieważnia jego kopie w cache workerów.
+    """
+    user_id = instance.pk  # po usunięciu instance.pk jest już None
+    transaction.on_commit(lambda: invalidate_user_cache(user_id))
@@ -0,0 +1,56 @@
+"""
+Cache użytkowników uwierzytelnionych tokenem JWT (users/authentication.py).
+
+Użytkownik jest trzymany w pamięci procesu, więc każda zmiana konta - także
+z admina czy shella, z pominięciem widoków - musi go z cache usunąć
+(users/signals.py). Sygnały działają po commicie; test biegnie w wycofywanej
+transakcji, więc callbacki on_commit uruchamia django_capture_on_commit_callbacks.
+"""
+import pytest
+from django.contrib.auth.models import User
+
+
+@pytest.fixture
+def account(member, company):
+    return member('auth-cache', company, first_name='Anna')
+
+
+def test_cached_user_invalidated_on_save(account, jwt_client, django_capture_on_commit_callbacks,
+                                         django_assert_num_queries):
+    client = jwt_client(account)
+    assert client.get('/api/auth/me/').status_code == 200
+    # Drugie żądanie z cache - bez zapytania o użytkownika
+    with django_assert_num_queries(0):
+        assert client.get('/api/auth/me/').status_code == 200
+
+    # Dezaktywacja poza widokami (admin, shell)
+    with django_capture_on_commit_callbacks(execute=True):
+        User.objects.filter(pk=account.pk).update(is_active=False)
+        User.objects.get(pk=account.pk).save()
+    assert client.get('/api/auth/me/').status_code == 401
+
+
+def test_cached_user_invalidated_on_delete(account, jwt_client, django_capture_on_commit_callbacks):
+    client = jwt_client(account)
+    assert client.get('/api/auth/me/').status_code == 200
+    with django_capture_on_commit_callbacks(execute=True):
+        User.objects.get(pk=account.pk).delete()
+    assert client.get('/api/auth/me/').status_code == 401
+
+
+def test_change_password_saves_only_password(account, jwt_client, django_capture_on_commit_callbacks):
+    client = jwt_client(account)
+    assert client.get('/api/auth/me/').json()['first_name'] == 'Anna'
+    # Zmiana bez sygnałów - request.user z cache ma nieaktualne pola
+    User.objects.filter(pk=account.pk).update(first_name='Beata', is_staff=True)
+
+    with django_capture_on_commit_callbacks(execute=True):
+        response = client.post('/api/auth/change-password/', {
+            'current_password': 'auth-cache-password', 'new_password': 'new-password',
+            'confirm_password': 'new-password',
+        }, format='json')
+    assert response.status_code == 200, response.content
+    account.refresh_from_db()
+    assert (account.first_name, account.is_staff) == ('Beata', True)
+    assert account.check_password('new-password')
+    assert client.get('/api/auth/me/').json()['first_name'] == 'Beata'
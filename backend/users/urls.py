@@ -2,11 +2,10 @@ from django.urls import path
 from rest_framework_simplejwt.views import TokenRefreshView
 from .views import (
     LoginView, LogoutView, MeView, ChangePasswordView,
-    UserListView, UserCreateView, UserDeleteView, DebugLoginView
+    UserListView, UserCreateView, UserDeleteView
 )
 
 urlpatterns = [
-    path('debug/', DebugLoginView.as_view(), name='debug_login'),
     path('login/', LoginView.as_view(), name='login'),
     path('logout/', LogoutView.as_view(), name='logout'),
     path('me/', MeView.as_view(), name='me'),
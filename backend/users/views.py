@@ -4,53 +4,11 @@ from rest_framework.response import Response
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
+from django.db import transaction
 from django.contrib.auth.models import User
-
-
-class DebugLoginView(APIView):
-    """Debug endpoint - sprawdza użytkowników i hasła"""
-    permission_classes = [AllowAny]
-    
-    def get(self, request):
-        users = User.objects.all()
-        return Response({
-            'users_count': users.count(),
-            'users': [
-                {
-                    'id': u.id,
-                    'username': u.username,
-                    'is_active': u.is_active,
-                    'is_staff': u.is_staff,
-                    'is_superuser': u.is_superuser,
-                    'has_usable_password': u.has_usable_password(),
-                }
-                for u in users
-            ]
-        })
-    
-    def post(self, request):
-        username = request.data.get('username')
-        password = request.data.get('password')
-        
-        try:
-            user = User.objects.get(username=username)
-            check_password = user.check_password(password)
-            auth_result = authenticate(username=username, password=password)
-            
-            return Response({
-                'user_found': True,
-                'username': user.username,
-                'is_active': user.is_active,
-                'has_usable_password': user.has_usable_password(),
-                'check_password_result': check_password,
-                'authenticate_result': auth_result is not None,
-                'password_hash_prefix': user.password[:30] if user.password else None,
-            })
-        except User.DoesNotExist:
-            return Response({
-                'user_found': False,
-                'username': username,
-            })
+from customers.models import CompanyMembership
+from customers.tenancy import get_request_company
+from .authentication import invalidate_user_cache
 
 
 class LoginView(APIView):
@@ -100,6 +58,7 @@ class LogoutView(APIView):
             if refresh_token:
                 token = RefreshToken(refresh_token)
                 token.blacklist()
+            invalidate_user_cache(request.user.id)
             return Response({'message': 'Wylogowano pomyślnie'})
         except Exception:
             return Response({'message': 'Wylogowano pomyślnie'})
@@ -155,17 +114,20 @@ class ChangePasswordView(APIView):
             )
         
         user.set_password(new_password)
-        user.save()
+        # request.user może być kopią z cache - zapis całego wiersza nadpisałby nowsze zmiany (np. is_active)
+        user.save(update_fields=['password'])
+        invalidate_user_cache(user.id)
         
         return Response({'message': 'Hasło zostało zmienione'})
 
 
 class UserListView(APIView):
-    """Lista wszystkich użytkowników"""
+    """Lista użytkowników z dostępem do bieżącej firmy"""
     permission_classes = [IsAuthenticated]
     
     def get(self, request):
-        users = User.objects.all().order_by('username')
+        company = get_request_company(request)
+        users = User.objects.filter(memberships__company=company).order_by('username')
         return Response([{
             'id': u.id,
             'username': u.username,
@@ -179,7 +141,7 @@ class UserListView(APIView):
 
 
 class UserCreateView(APIView):
-    """Tworzenie nowego użytkownika"""
+    """Tworzenie nowego użytkownika (z dostępem do bieżącej firmy)"""
     permission_classes = [IsAuthenticated]
     
     def post(self, request):
@@ -207,13 +169,17 @@ class UserCreateView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
-            first_name=first_name,
-            last_name=last_name
-        )
+        # Nowy użytkownik dostaje dostęp do firmy, w której działa tworzący
+        company = get_request_company(request)
+        with transaction.atomic():
+            user = User.objects.create_user(
+                username=username,
+                email=email,
+                password=password,
+                first_name=first_name,
+                last_name=last_name
+            )
+            CompanyMembership.objects.create(user=user, company=company)
         
         return Response({
             'id': user.id,
@@ -226,12 +192,16 @@ class UserCreateView(APIView):
 
 
 class UserDeleteView(APIView):
-    """Usuwanie użytkownika"""
+    """
+    Usuwanie użytkownika bieżącej firmy. Użytkownik z dostępem także do
+    innych firm traci tylko dostęp do tej - konto zostaje.
+    """
     permission_classes = [IsAuthenticated]
     
     def delete(self, request, user_id):
+        company = get_request_company(request)
         try:
-            user = User.objects.get(id=user_id)
+            user = User.objects.get(id=user_id, memberships__company=company)
         except User.DoesNotExist:
             return Response(
                 {'error': 'Użytkownik nie istnieje'},
@@ -245,7 +215,21 @@ class UserDeleteView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        username = user.username
-        user.delete()
+        if user.is_superuser and not request.user.is_superuser:
+            return Response(
+                {'error': 'Nie możesz usunąć administratora'},
+                status=status.HTTP_403_FORBIDDEN
+            )
         
-        return Response({'message': f'Użytkownik {username} został usunięty'})
\ No newline at end of file
+        username = user.username
+        user_id = user.id
+        with transaction.atomic():
+            if CompanyMembership.objects.filter(user=user).exclude(company=company).exists():
+                CompanyMembership.objects.filter(user=user, company=company).delete()
+                message = f'Użytkownik {username} stracił dostęp do tej firmy'
+            else:
+                user.delete()
+                message = f'Użytkownik {username} został usunięty'
+        invalidate_user_cache(user_id)
+        
+        return Response({'message': message})
@@ -1,10 +1,31 @@
-import React from 'react';
+import React, { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
 import { useAuthContext } from '../../App';
+import { clearCurrentCompanyId, fetchCompanies, getCurrentCompanyId, setCurrentCompanyId } from '../../services/api';
+import { CompanyList } from '../../types';
 
 const Navbar: React.FC = () => {
     const { user, logout } = useAuthContext();
     const navigate = useNavigate();
+    const [companies, setCompanies] = useState<CompanyList | null>(null);
+
+    useEffect(() => {
+        if (!user) return;
+        fetchCompanies().then(setCompanies).catch((error) => {
+            // Zapamiętana firma niedostępna (np. odebrany dostęp) - wróć do domyślnej
+            if (error.response?.status === 403 && getCurrentCompanyId()) {
+                clearCurrentCompanyId();
+                window.location.reload();
+            }
+            setCompanies(null);
+        });
+    }, [user]);
+
+    // Zmiana firmy - przeładuj, żeby wszystkie widoki pobrały dane nowej firmy
+    const handleCompanyChange = (event: React.ChangeEvent<HTMLSelectElement>) => {
+        setCurrentCompanyId(Number(event.target.value));
+        window.location.reload();
+    };
 
     const handleLogout = async () => {
         await logout();
@@ -25,6 +46,20 @@ const Navbar: React.FC = () => {
             <div className="navbar-user">
                 {user && (
                     <>
+                        {companies && companies.companies.length > 1 && (
+                            <select
+                                className="company-select"
+                                value={companies.current}
+                                onChange={handleCompanyChange}
+                                title="Firma"
+                            >
+                                {companies.companies.map((company) => (
+                                    <option key={company.id} value={company.id}>
+                                        {company.nazwa}
+                                    </option>
+                                ))}
+                            </select>
+                        )}
                         <span className="user-name">{user.first_name || user.username}</span>
                         <button className="btn-logout" onClick={handleLogout}>
                             Wyloguj
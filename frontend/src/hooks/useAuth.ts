@@ -1,6 +1,7 @@
 import { useState, useEffect, useCallback } from 'react';
 import { User } from '../types';
 import { login as apiLogin, logout as apiLogout, fetchCurrentUser, isAuthenticated, getStoredUser } from '../services/api';
+import { clearChangesCache } from '../services/changesCache';
 
 interface AuthState {
   user: User | null;
@@ -80,6 +81,8 @@ const useAuth = () => {
   const logout = useCallback(async () => {
     setState(prev => ({ ...prev, loading: true }));
     await apiLogout();
+    // Lokalny cache faktur nie może przejść na kolejnego użytkownika
+    await clearChangesCache();
     setState({
       user: null,
       loading: false,
@@ -1,6 +1,6 @@
 import React, { useEffect, useState } from 'react';
 import { Link, useNavigate } from 'react-router-dom';
-import { fetchInvoiceStats, fetchRecentUnpaid } from '../services/api';
+import { fetchDashboard } from '../services/api';
 import { InvoiceStats, Invoice } from '../types';
 import { useToast } from '../components/common/Toast';
 
@@ -95,13 +95,10 @@ const Dashboard: React.FC = () => {
 
     const loadData = async () => {
         try {
-            // Ładuj tylko statystyki bieżącego miesiąca i 5 niezapłaconych faktur
-            const [statsData, unpaidInvoices] = await Promise.all([
-                fetchInvoiceStats(true), // current_month=true
-                fetchRecentUnpaid(5)     // limit=5
-            ]);
-            setStats(statsData);
-            setRecentInvoices(unpaidInvoices);
+            // Jedno żądanie: statystyki bieżącego miesiąca i 5 niezapłaconych faktur
+            const data = await fetchDashboard(5);
+            setStats(data.stats_month);
+            setRecentInvoices(data.recent_unpaid);
         } catch (error) {
             console.error('Błąd ładowania danych:', error);
         } finally {
@@ -3,8 +3,6 @@ import { useNavigate } from 'react-router-dom';
 import { Invoice, InvoiceFormData, Contractor } from '../types';
 import { useToast } from '../components/common/Toast';
 import { 
-    fetchInvoices, 
-    fetchContractors, 
     createInvoice, 
     updateInvoice, 
     deleteInvoice,
@@ -15,6 +13,7 @@ import {
     refreshInvoiceKSeFData,
     KSeFInvoice
 } from '../services/api';
+import { syncChanges } from '../services/changesCache';
 
 const emptyForm: InvoiceFormData = {
     numer: '',
@@ -30,7 +29,8 @@ const emptyForm: InvoiceFormData = {
 const Invoices: React.FC = () => {
     const navigate = useNavigate();
     const { showToast } = useToast();
-    const [invoices, setInvoices] = useState<Invoice[]>([]);
+    // Wszystkie faktury z lokalnego cache (feed /api/changes/), filtr roku i miesiąca po stronie klienta
+    const [allInvoices, setAllInvoices] = useState<Invoice[]>([]);
     const [contractors, setContractors] = useState<Contractor[]>([]);
     const [loading, setLoading] = useState(true);
     const [showModal, setShowModal] = useState(false);
@@ -66,6 +66,15 @@ const Invoices: React.FC = () => {
         { value: 12, label: 'Grudzień' },
     ];
 
+    const invoices = useMemo(() => {
+        return allInvoices.filter(invoice => {
+            const [year, month] = invoice.data.split('-').map(Number);
+            if (selectedYear && year !== selectedYear) return false;
+            if (selectedMonth && month !== selectedMonth) return false;
+            return true;
+        });
+    }, [allInvoices, selectedYear, selectedMonth]);
+
     // Filter and search - must be before keyboard shortcuts useEffect
     const filteredInvoices = useMemo(() => {
         return invoices.filter(invoice => {
@@ -90,13 +99,6 @@ const Invoices: React.FC = () => {
     useEffect(() => {
         loadInitialData();
     }, []);
-    
-    // Reload invoices when year/month changes
-    useEffect(() => {
-        if (!loading) {
-            loadInvoices();
-        }
-    }, [selectedYear, selectedMonth]);
 
     // Skróty klawiszowe
     useEffect(() => {
@@ -227,16 +229,12 @@ const Invoices: React.FC = () => {
 
     const loadInitialData = async () => {
         try {
-            // Pobierz faktury tylko z bieżącego miesiąca dla szybszego ładowania
-            const currentYear = new Date().getFullYear();
-            const currentMonth = new Date().getMonth() + 1;
-            const [invoicesData, contractorsData, yearsData] = await Promise.all([
-                fetchInvoices({ year: currentYear, month: currentMonth }),
-                fetchContractors(),
+            const [data, yearsData] = await Promise.all([
+                syncChanges(),
                 fetchAvailableYears()
             ]);
-            setInvoices(invoicesData);
-            setContractors(contractorsData);
+            setAllInvoices(data.invoices);
+            setContractors(data.contractors);
             setAvailableYears(yearsData);
         } catch (error) {
             console.error('Błąd ładowania:', error);
@@ -245,13 +243,12 @@ const Invoices: React.FC = () => {
         }
     };
     
+    // Po zapisie pobieramy tylko zmiany od ostatniej synchronizacji
     const loadInvoices = async () => {
         try {
-            const params: { year?: number; month?: number } = {};
-            if (selectedYear) params.year = selectedYear;
-            if (selectedMonth) params.month = selectedMonth;
-            const invoicesData = await fetchInvoices(params);
-            setInvoices(invoicesData);
+            const data = await syncChanges();
+            setAllInvoices(data.invoices);
+            setContractors(data.contractors);
         } catch (error) {
             console.error('Błąd ładowania faktur:', error);
         }
@@ -1,5 +1,14 @@
-import React, { useEffect, useState, useCallback } from 'react';
-import { fetchFromKSeF, fetchSettings, importKSeFInvoices, KSeFInvoice } from '../services/api';
+import React, { useEffect, useState, useCallback, useRef } from 'react';
+import {
+    cancelKSeFFetch,
+    fetchFromKSeF,
+    fetchSettings,
+    importKSeFInvoices,
+    KSeFInvoice,
+    KSeFProgressEvent,
+    KSeFProgressStream,
+    openKSeFProgress
+} from '../services/api';
 import { Settings } from '../types';
 
 interface FetchResult {
@@ -10,13 +19,33 @@ interface FetchResult {
     nip?: string;
     invoices: KSeFInvoice[];
     total_found: number;
+    cancelled?: boolean;
     error?: string;
 }
 
+const newProgressId = () =>
+    window.crypto?.randomUUID?.() ?? `${Date.now().toString(36)}-${Math.random().toString(36).slice(2, 12)}`;
+
+const progressLabel = (event: KSeFProgressEvent) => {
+    switch (event.stage) {
+        case 'started': return 'Łączenie z KSeF...';
+        case 'authorized': return 'Autoryzacja udana, zlecanie eksportu faktur...';
+        case 'export_scheduled': return 'Eksport zlecony, KSeF przygotowuje paczkę...';
+        case 'poll': return `Oczekiwanie na eksport (sprawdzenie ${event.attempt}, ${Math.round(event.elapsed || 0)} s)...`;
+        case 'downloaded': return `Pobrano paczkę: ${event.files} plików, ${((event.bytes || 0) / 1024 / 1024).toFixed(1)} MB`;
+        case 'parsed': return `Przetwarzanie faktur: ${event.done} z ${event.total} (plik ${event.file} z ${event.files})`;
+        default: return event.message || '';
+    }
+};
+
 const KSeF: React.FC = () => {
     const [settings, setSettings] = useState<Settings | null>(null);
     const [loading, setLoading] = useState(true);
     const [fetchLoading, setFetchLoading] = useState(false);
+    const [progress, setProgress] = useState<KSeFProgressEvent | null>(null);
+    const [cancelLoading, setCancelLoading] = useState(false);
+    const progressIdRef = useRef<string | null>(null);
+    const progressSourceRef = useRef<KSeFProgressStream | null>(null);
     const [message, setMessage] = useState<{ type: 'success' | 'error' | 'info' | 'warning'; text: string } | null>(null);
     
     // Date range
@@ -37,6 +66,8 @@ const KSeF: React.FC = () => {
 
     useEffect(() => {
         loadSettings();
+        // Zamknij strumień postępu przy opuszczeniu strony
+        return () => progressSourceRef.current?.close();
     }, []);
 
     const loadSettings = async () => {
@@ -62,12 +93,20 @@ const KSeF: React.FC = () => {
         setMessage(null);
         setLastFetchResult(null);
         setSelectedInvoices(new Set());
+        setProgress({ stage: 'started' });
+        
+        // Strumień postępu otwieramy przed wysłaniem żądania - nie zgubimy pierwszych zdarzeń
+        const progressId = newProgressId();
+        progressIdRef.current = progressId;
+        progressSourceRef.current = openKSeFProgress(progressId, setProgress);
         
         try {
-            const result = await fetchFromKSeF(dateFrom, dateTo);
+            const result = await fetchFromKSeF(dateFrom, dateTo, progressId);
             setLastFetchResult(result);
             
-            if (result.error) {
+            if (result.cancelled) {
+                setMessage({ type: 'warning', text: 'Pobieranie zostało anulowane.' });
+            } else if (result.error) {
                 setMessage({ type: 'error', text: result.error });
             } else if (result.invoices && result.invoices.length > 0) {
                 // Automatycznie zaznacz faktury, które jeszcze nie istnieją
@@ -87,7 +126,23 @@ const KSeF: React.FC = () => {
             const errorMsg = error.response?.data?.error || 'Błąd połączenia z KSeF. Sprawdź konfigurację.';
             setMessage({ type: 'error', text: errorMsg });
         } finally {
+            progressSourceRef.current?.close();
+            progressSourceRef.current = null;
+            progressIdRef.current = null;
+            setProgress(null);
             setFetchLoading(false);
+            setCancelLoading(false);
+        }
+    };
+
+    const handleCancelFetch = async () => {
+        if (!progressIdRef.current) return;
+        setCancelLoading(true);
+        try {
+            await cancelKSeFFetch(progressIdRef.current);
+        } catch (error) {
+            // 409 - pobieranie właśnie się zakończyło
+            setCancelLoading(false);
         }
     };
 
@@ -320,8 +375,36 @@ const KSeF: React.FC = () => {
                             </>
                         )}
                     </button>
+                    {fetchLoading && (
+                        <button
+                            className="btn btn-secondary"
+                            onClick={handleCancelFetch}
+                            disabled={cancelLoading}
+                            style={{ height: '42px' }}
+                        >
+                            {cancelLoading ? 'Anulowanie...' : 'Anuluj'}
+                        </button>
+                    )}
                 </div>
                 
+                {fetchLoading && progress && (
+                    <div style={{ marginBottom: '16px', padding: '12px 16px', background: 'var(--bg-secondary)', borderRadius: '8px' }}>
+                        <div style={{ color: '#e2e8f0', marginBottom: progress.stage === 'parsed' ? '8px' : 0 }}>
+                            {progressLabel(progress)}
+                        </div>
+                        {progress.stage === 'parsed' && progress.total ? (
+                            <div style={{ height: '6px', background: 'var(--border-color)', borderRadius: '3px', overflow: 'hidden' }}>
+                                <div style={{
+                                    width: `${Math.round(((progress.done || 0) / progress.total) * 100)}%`,
+                                    height: '100%',
+                                    background: 'var(--accent-blue)',
+                                    transition: 'width 0.3s'
+                                }} />
+                            </div>
+                        ) : null}
+                    </div>
+                )}
+                
                 <div style={{ display: 'flex', gap: '8px', flexWrap: 'wrap' }}>
                     <button 
                         type="button" 
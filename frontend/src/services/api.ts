@@ -1,5 +1,5 @@
 import axios from 'axios';
-import { Invoice, InvoiceFormData, Contractor, ContractorFormData, Settings, InvoiceStats, User, AuthTokens } from '../types';
+import { Invoice, InvoiceFormData, Contractor, ContractorFormData, Settings, CompanyList, InvoiceStats, DashboardData, User, AuthTokens } from '../types';
 
 const apiClient = axios.create({
   baseURL: import.meta.env.VITE_API_URL || 'http://localhost:8000/api',
@@ -8,13 +8,30 @@ const apiClient = axios.create({
   },
 });
 
-// Interceptor - dodaj token do każdego requestu
+// Wybrana firma (brak - pierwsza firma użytkownika po stronie serwera)
+const COMPANY_KEY = 'company_id';
+
+export const getCurrentCompanyId = (): string | null => localStorage.getItem(COMPANY_KEY);
+
+export const setCurrentCompanyId = (companyId: number): void => {
+  localStorage.setItem(COMPANY_KEY, String(companyId));
+};
+
+export const clearCurrentCompanyId = (): void => {
+  localStorage.removeItem(COMPANY_KEY);
+};
+
+// Interceptor - dodaj token i wybraną firmę do każdego requestu
 apiClient.interceptors.request.use(
   (config) => {
     const token = localStorage.getItem('access_token');
     if (token) {
       config.headers.Authorization = `Bearer ${token}`;
     }
+    const companyId = getCurrentCompanyId();
+    if (companyId) {
+      config.headers['X-Company-Id'] = companyId;
+    }
     return config;
   },
   (error) => Promise.reject(error)
@@ -47,6 +64,7 @@ apiClient.interceptors.response.use(
           localStorage.removeItem('access_token');
           localStorage.removeItem('refresh_token');
           localStorage.removeItem('user');
+          clearCurrentCompanyId();
           window.location.href = '/login';
           return Promise.reject(refreshError);
         }
@@ -80,6 +98,7 @@ export const logout = async (): Promise<void> => {
   localStorage.removeItem('access_token');
   localStorage.removeItem('refresh_token');
   localStorage.removeItem('user');
+  clearCurrentCompanyId();
 };
 
 export const fetchCurrentUser = async (): Promise<User> => {
@@ -104,6 +123,9 @@ export const fetchInvoices = async (params?: {
   dostawca?: string;
   year?: number;
   month?: number;
+  ordering?: string;
+  days_until_due__lte?: number;
+  days_until_due__gte?: number;
 }): Promise<Invoice[]> => {
   const response = await apiClient.get('/invoices/', { params });
   return response.data;
@@ -125,6 +147,11 @@ export const fetchRecentUnpaid = async (limit: number = 5): Promise<Invoice[]> =
   return response.data;
 };
 
+export const fetchDashboard = async (limit: number = 5): Promise<DashboardData> => {
+  const response = await apiClient.get('/dashboard/', { params: { limit } });
+  return response.data;
+};
+
 export const createInvoice = async (data: InvoiceFormData): Promise<Invoice> => {
   const response = await apiClient.post('/invoices/', data);
   return response.data;
@@ -179,6 +206,8 @@ export interface KSeFInvoice {
   data_sprzedazy?: string;
   termin_platnosci?: string;
   kwota: number;
+  kwota_netto?: string;
+  kwota_vat?: string;
   waluta?: string;
   dostawca: string;
   dostawca_nip?: string;
@@ -191,7 +220,7 @@ export interface KSeFInvoice {
   pozycje?: KSeFInvoicePozycja[];
 }
 
-export const fetchFromKSeF = async (dateFrom?: string, dateTo?: string): Promise<{
+export const fetchFromKSeF = async (dateFrom?: string, dateTo?: string, progressId?: string): Promise<{
   message: string;
   info?: string;
   settings_configured: boolean;
@@ -199,15 +228,105 @@ export const fetchFromKSeF = async (dateFrom?: string, dateTo?: string): Promise
   nip?: string;
   invoices: KSeFInvoice[];
   total_found: number;
+  cancelled?: boolean;
   error?: string;
 }> => {
   const response = await apiClient.post('/invoices/fetch_from_ksef/', {
     date_from: dateFrom,
-    date_to: dateTo
+    date_to: dateTo,
+    progress_id: progressId
   });
   return response.data;
 };
 
+export type KSeFProgressStage =
+  | 'started'
+  | 'authorized'
+  | 'export_scheduled'
+  | 'poll'
+  | 'downloaded'
+  | 'parsed'
+  | 'done'
+  | 'error'
+  | 'cancelled';
+
+export interface KSeFProgressEvent {
+  stage: KSeFProgressStage;
+  message?: string;
+  attempt?: number;
+  elapsed?: number;
+  timeout?: number;
+  files?: number;
+  bytes?: number;
+  file?: number;
+  done?: number;
+  total?: number;
+  invoices?: number;
+}
+
+export interface KSeFProgressStream {
+  close: () => void;
+}
+
+// Postęp pobierania z KSeF (Server-Sent Events). EventSource nie wysyła nagłówków,
+// a JWT w adresie trafiałby do logów - strumień otwiera jednorazowy token z API.
+// Po zerwaniu połączenia pobieramy nowy token i wznawiamy od ostatniego zdarzenia;
+// strumień serwer zamyka po done/error/cancelled.
+export const openKSeFProgress = (
+  progressId: string,
+  onEvent: (event: KSeFProgressEvent) => void
+): KSeFProgressStream => {
+  const stages: KSeFProgressStage[] = [
+    'started', 'authorized', 'export_scheduled', 'poll', 'downloaded', 'parsed', 'done', 'error', 'cancelled'
+  ];
+  let source: EventSource | null = null;
+  let lastEventId = '';
+  let closed = false;
+
+  const close = () => {
+    closed = true;
+    source?.close();
+  };
+
+  const open = async () => {
+    let token: string;
+    try {
+      const response = await apiClient.post(`/invoices/ksef_progress/${progressId}/token/`);
+      token = response.data.token;
+    } catch (error) {
+      return;
+    }
+    if (closed) return;
+
+    const params = new URLSearchParams({ stream_token: token });
+    if (lastEventId) params.set('last_event_id', lastEventId);
+    source = new EventSource(`${apiClient.defaults.baseURL}/invoices/ksef_progress/${progressId}/?${params}`);
+    stages.forEach((stage) => {
+      source?.addEventListener(stage, (e) => {
+        const message = e as MessageEvent;
+        lastEventId = message.lastEventId || lastEventId;
+        onEvent(JSON.parse(message.data));
+        if (stage === 'done' || stage === 'error' || stage === 'cancelled') {
+          close();
+        }
+      });
+    });
+    // Token jest jednorazowy - automatyczne wznowienie EventSource by go odrzuciło
+    source.onerror = () => {
+      source?.close();
+      if (!closed) setTimeout(open, 2000);
+    };
+  };
+
+  open();
+  return { close };
+};
+
+export const cancelKSeFFetch = async (progressId: string): Promise<{ cancelled: boolean }> => {
+  const response = await apiClient.post(`/invoices/ksef_progress/${progressId}/cancel/`);
+  return response.data;
+};
+
 export const importKSeFInvoices = async (invoices: KSeFInvoice[]): Promise<{
   message: string;
   imported_count: number;
@@ -217,6 +336,56 @@ export const importKSeFInvoices = async (invoices: KSeFInvoice[]): Promise<{
   return response.data;
 };
 
+export interface KSeFSyncPhase {
+  name: string;
+  ms: number;
+  [detail: string]: unknown;
+}
+
+export interface KSeFSyncRun {
+  id: number;
+  trigger: string;
+  environment: string;
+  date_from: string | null;
+  date_to: string | null;
+  started_at: string;
+  duration_ms: number;
+  phases: KSeFSyncPhase[];
+  bytes_downloaded: number;
+  invoices_parsed: number;
+  invoices_saved: number;
+  peak_memory_bytes: number | null;
+  outcome: 'success' | 'error';
+  message: string;
+}
+
+export interface PercentileSummary {
+  count: number;
+  p50: number | null;
+  p90: number | null;
+  p99: number | null;
+  max: number | null;
+}
+
+export const fetchKSeFSyncRuns = async (params?: {
+  limit?: number;
+  trigger?: string;
+  outcome?: string;
+}): Promise<{
+  summary: {
+    runs: number;
+    outcomes: Record<string, number>;
+    duration_ms: PercentileSummary;
+    phases_ms: Record<string, PercentileSummary>;
+    bytes_downloaded: PercentileSummary;
+    peak_memory_bytes: PercentileSummary;
+  };
+  runs: KSeFSyncRun[];
+}> => {
+  const response = await apiClient.get('/invoices/ksef_sync_runs/', { params });
+  return response.data;
+};
+
 // ============ KONTRAHENCI ============
 
 export const fetchContractors = async (search?: string): Promise<Contractor[]> => {
@@ -243,6 +412,31 @@ export const deleteContractor = async (id: number): Promise<void> => {
   await apiClient.delete(`/contractors/${id}/`);
 };
 
+// ============ FEED ZMIAN ============
+
+export interface ChangesPage {
+  cursor: string;
+  has_more: boolean;
+  reset: boolean;
+  invoices: Invoice[];
+  contractors: Contractor[];
+  deleted: { invoices: number[]; contractors: number[] };
+}
+
+// Faktury i kontrahenci zmienieni od kursora (bez kursora - pełny stan, reset=true)
+export const fetchChanges = async (since?: string | null): Promise<ChangesPage> => {
+  const response = await apiClient.get('/changes/', { params: since ? { since } : {} });
+  return response.data;
+};
+
+// ============ FIRMY ============
+
+// Firmy dostępne dla użytkownika i firma bieżąca
+export const fetchCompanies = async (): Promise<CompanyList> => {
+  const response = await apiClient.get('/companies/');
+  return response.data;
+};
+
 // ============ USTAWIENIA ============
 
 export const fetchSettings = async (): Promise<Settings> => {
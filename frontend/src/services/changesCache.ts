@@ -0,0 +1,125 @@
+import { Invoice, Contractor } from '../types';
+import { fetchChanges, getCurrentCompanyId } from './api';
+
+// Lokalny cache faktur i kontrahentów odświeżany feedem /api/changes/.
+// Pierwsze wejście pobiera pełny stan, kolejne tylko zmiany od kursora.
+// Stan trzymamy w IndexedDB (localStorage ma limit ~5 MB); bez IndexedDB
+// cache żyje tylko do przeładowania strony. Każda firma ma własny wpis.
+
+const DB_NAME = 'fakturex';
+const STORE = 'changes';
+const KEY = 'cache';
+
+const companyKey = (): string => `${KEY}:${getCurrentCompanyId() || 'default'}`;
+
+interface CacheState {
+  cursor: string | null;
+  invoices: Record<number, Invoice>;
+  contractors: Record<number, Contractor>;
+}
+
+export interface CachedData {
+  invoices: Invoice[];
+  contractors: Contractor[];
+}
+
+const emptyState = (): CacheState => ({ cursor: null, invoices: {}, contractors: {} });
+
+let memory: { key: string; state: CacheState } | null = null;
+let queue: Promise<unknown> = Promise.resolve();
+
+const openDb = (): Promise<IDBDatabase | null> =>
+  new Promise((resolve) => {
+    if (typeof indexedDB === 'undefined') {
+      resolve(null);
+      return;
+    }
+    const request = indexedDB.open(DB_NAME, 1);
+    request.onupgradeneeded = () => request.result.createObjectStore(STORE);
+    request.onsuccess = () => resolve(request.result);
+    request.onerror = () => resolve(null);
+  });
+
+const readState = async (key: string): Promise<CacheState> => {
+  const db = await openDb();
+  if (!db) return emptyState();
+  return new Promise((resolve) => {
+    const request = db.transaction(STORE, 'readonly').objectStore(STORE).get(key);
+    request.onsuccess = () => resolve(request.result || emptyState());
+    request.onerror = () => resolve(emptyState());
+  });
+};
+
+// Bez stanu - usuń wpisy wszystkich firm
+const writeState = async (key: string, state: CacheState | null): Promise<void> => {
+  const db = await openDb();
+  if (!db) return;
+  await new Promise<void>((resolve) => {
+    const tx = db.transaction(STORE, 'readwrite');
+    const store = tx.objectStore(STORE);
+    if (state) {
+      store.put(state, key);
+    } else {
+      store.clear();
+    }
+    tx.oncomplete = () => resolve();
+    tx.onerror = () => resolve();
+  });
+};
+
+// Dni do terminu liczone lokalnie - wiersz z cache mógł przyjść kilka dni temu
+const withDueInfo = (invoice: Invoice, contractors: Record<number, Contractor>): Invoice => {
+  const today = new Date();
+  today.setHours(0, 0, 0, 0);
+  const due = new Date(`${invoice.termin_platnosci}T00:00:00`);
+  const days = Math.round((due.getTime() - today.getTime()) / 86400000);
+  const kontrahent = invoice.kontrahent !== null ? contractors[invoice.kontrahent] : undefined;
+  return {
+    ...invoice,
+    days_until_due: days,
+    is_overdue: invoice.status === 'niezaplacona' && days < 0,
+    kontrahent_nazwa: kontrahent ? kontrahent.nazwa : invoice.kontrahent_nazwa,
+  };
+};
+
+const snapshot = (state: CacheState): CachedData => ({
+  invoices: Object.values(state.invoices)
+    .map((invoice) => withDueInfo(invoice, state.contractors))
+    .sort((a, b) => (a.data === b.data ? b.id - a.id : a.data < b.data ? 1 : -1)),
+  contractors: Object.values(state.contractors).sort((a, b) => a.nazwa.localeCompare(b.nazwa, 'pl')),
+});
+
+const sync = async (): Promise<CachedData> => {
+  const key = companyKey();
+  const state = memory && memory.key === key ? memory.state : await readState(key);
+  let hasMore = true;
+  while (hasMore) {
+    const page = await fetchChanges(state.cursor);
+    if (page.reset) {
+      state.invoices = {};
+      state.contractors = {};
+    }
+    page.invoices.forEach((invoice) => { state.invoices[invoice.id] = invoice; });
+    page.contractors.forEach((contractor) => { state.contractors[contractor.id] = contractor; });
+    page.deleted.invoices.forEach((id) => { delete state.invoices[id]; });
+    page.deleted.contractors.forEach((id) => { delete state.contractors[id]; });
+    state.cursor = page.cursor;
+    hasMore = page.has_more;
+  }
+  memory = { key, state };
+  await writeState(key, state);
+  return snapshot(state);
+};
+
+// Zsynchronizuj cache z serwerem i zwróć wszystkie faktury i kontrahentów.
+// Synchronizacje idą po kolei - wywołanie po zapisie widzi ten zapis.
+export const syncChanges = (): Promise<CachedData> => {
+  const result = queue.catch(() => undefined).then(sync);
+  queue = result;
+  return result;
+};
+
+export const clearChangesCache = async (): Promise<void> => {
+  memory = null;
+  await writeState(companyKey(), null);
+};
@@ -66,6 +66,18 @@ export interface ContractorFormData {
 }
 
 // Ustawienia firmy
+// Firma (dzierżawca) - wybierana nagłówkiem X-Company-Id
+export interface Company {
+  id: number;
+  nazwa: string;
+  nip: string;
+}
+
+export interface CompanyList {
+  current: number;
+  companies: Company[];
+}
+
 export interface Settings {
   id: number;
   firma_nazwa: string;
@@ -92,6 +104,15 @@ export interface InvoiceStats {
   suma_przeterminowanych: number;
 }
 
+// Wszystkie widżety dashboardu w jednym żądaniu (/api/dashboard/)
+export interface DashboardData {
+  today: string;
+  stats: InvoiceStats;
+  stats_month: InvoiceStats;
+  recent_unpaid: Invoice[];
+  available_years: number[];
+}
+
 // Użytkownik
 export interface User {
   id: number;